@@ -0,0 +1,190 @@
+"""
+Action Pre-Classifier
+Cheap local check that decides whether a chat message could be an action
+request before paying for the LLM action detector in ai_actions.
+
+Two signals, either of which lets the message through:
+- imperative verb patterns for the actions in ai_actions.AVAILABLE_ACTIONS
+  ("join the ... guild", "add ... to my cart", "release the escrow")
+- a small logistic regression over word unigrams/bigrams, trained at import
+  time on the seed examples below (fixed order and epochs, so the weights are
+  identical on every worker)
+
+Read-only lookups ("what projects are available?") are left to the regular
+intent + context pipeline, which answers them without the extra call.
+
+Run `python action_classifier.py` for accuracy and gate rate on the seeds.
+"""
+
+from typing import List, Dict, Any, Tuple
+import math
+import os
+import re
+import logging
+
+logger = logging.getLogger(__name__)
+
+ACTION_CLASSIFIER_THRESHOLD = float(os.getenv("ACTION_CLASSIFIER_THRESHOLD", "0.35"))
+
+# Imperative forms of the state-changing actions in ai_actions.AVAILABLE_ACTIONS
+ACTION_PATTERNS = {
+    "create_project": r"\b(create|start|post|make|launch|open)\b.{0,40}\bproject\b",
+    "join_guild": r"\b(join|enter|sign me up for)\b.{0,40}\b(guild|community)\b",
+    "leave_guild": r"\b(leave|quit|exit)\b.{0,40}\b(guild|community)\b",
+    "apply_to_project": r"\bapply\b.{0,30}\b(to|for)\b.{0,30}\bproject\b",
+    "create_product": r"\b(list|sell|create|post|add)\b.{0,40}\b(product|listing|item)\b.{0,40}\b(for|at|price|marketplace|\$|\d)",
+    "update_profile": r"\b(update|change|edit|set)\b.{0,20}\b(my )?(profile|bio|name|first name|last name|country)\b",
+    "create_task": r"\b(create|add|make)\b.{0,20}\btask\b",
+    "send_message": r"\b(send|dm|message)\b.{0,20}\b(a message|message to|him|her|them|@?\w+ that)\b",
+    "add_to_cart": r"\b(add|put)\b.{0,40}\b(to|in|into) (my |the )?cart\b",
+    "checkout_cart": r"\b(check ?out|place (my |the )?order|pay for (my |the )?cart)\b",
+    "escrow": r"\b(release|fund|dispute|refund)\b.{0,30}\b(escrow|payment|funds|money)\b",
+    "project_work": r"\b(submit|approve|accept)\b.{0,30}\b(work|deliverable|submission)\b",
+    "prompt_escrow": r"\b(set ?up|start)\b.{0,20}\bescrow\b",
+}
+_COMPILED_PATTERNS = [(name, re.compile(pattern, re.IGNORECASE)) for name, pattern in ACTION_PATTERNS.items()]
+
+# Seed examples: 1 = action request, 0 = question / search / chit-chat
+SEED_EXAMPLES: List[Tuple[str, int]] = [
+    ("create a new project called e-commerce site with $5000 budget", 1),
+    ("start a project for my bakery website", 1),
+    ("post a project: logo design, budget 200", 1),
+    ("join the web developers guild", 1),
+    ("please add me to the designers guild", 1),
+    ("i want to join the python community", 1),
+    ("leave the crypto guild", 1),
+    ("remove me from the art guild", 1),
+    ("apply to the mobile app project", 1),
+    ("sell my iphone 12 for 300 dollars", 1),
+    ("list my laptop on the marketplace for $800", 1),
+    ("create a product listing for handmade bags at 25 each", 1),
+    ("update my bio to full stack developer from lagos", 1),
+    ("change my last name to okafor", 1),
+    ("add a task to project 12 to design the homepage", 1),
+    ("send a message to john saying the files are ready", 1),
+    ("add the macbook to my cart", 1),
+    ("put two of those sneakers in my cart", 1),
+    ("checkout my cart", 1),
+    ("place the order", 1),
+    ("release the escrow for order 45", 1),
+    ("fund the escrow for my project", 1),
+    ("dispute the escrow, the item never arrived", 1),
+    ("submit my work for the landing page project", 1),
+    ("approve the submitted work", 1),
+    ("release payment to the freelancer", 1),
+    ("buy the dell laptop now", 1),
+    ("set up escrow for this project", 1),
+    ("what projects are available", 0),
+    ("tell me about guilds", 0),
+    ("how do i create a guild", 0),
+    ("how does escrow work", 0),
+    ("show me cheap logos", 0),
+    ("what's trending on the marketplace", 0),
+    ("find me a designer", 0),
+    ("are there any laptops under 50k", 0),
+    ("hello ava", 0),
+    ("thanks, that helps", 0),
+    ("what is a guild", 0),
+    ("how many users are on the platform", 0),
+    ("recommend some projects for me", 0),
+    ("which guild is best for writers", 0),
+    ("looking for running shoes", 0),
+    ("how do i get paid", 0),
+    ("can you explain how projects work", 0),
+    ("what can you do", 0),
+    ("show me my projects", 0),
+    ("who are the top sellers", 0),
+    ("is the macbook air good for coding", 0),
+    ("compare iphone and samsung phones", 0),
+    ("what does escrow protect against", 0),
+    ("search for web development projects", 0),
+    ("any communities for photographers", 0),
+    ("what should i sell", 0),
+]
+
+
+def tokenize(text: str) -> List[str]:
+    return re.findall(r"[a-z0-9$']+", text.lower())
+
+
+def features(text: str) -> List[str]:
+    tokens = tokenize(text)
+    feats = [f"w:{t}" for t in tokens]
+    feats.extend(f"b:{a}_{b}" for a, b in zip(tokens, tokens[1:]))
+    if tokens:
+        feats.append(f"first:{tokens[0]}")
+    if text.strip().endswith("?"):
+        feats.append("question_mark")
+    return feats
+
+
+class LinearActionModel:
+    """Binary logistic regression over sparse string features"""
+
+    def __init__(self):
+        self.weights: Dict[str, float] = {}
+        self.bias = 0.0
+
+    def train(self, examples: List[Tuple[str, int]], epochs: int = 40, learning_rate: float = 0.5, l2: float = 0.001):
+        """Plain SGD in a fixed order: deterministic weights for the same seeds"""
+        featurized = [(features(text), label) for text, label in examples]
+        for _ in range(epochs):
+            for feats, label in featurized:
+                error = self.predict_features(feats) - label
+                self.bias -= learning_rate * error
+                for f in feats:
+                    w = self.weights.get(f, 0.0)
+                    self.weights[f] = w - learning_rate * (error + l2 * w)
+        return self
+
+    def predict_features(self, feats: List[str]) -> float:
+        z = self.bias + sum(self.weights.get(f, 0.0) for f in feats)
+        return 1.0 / (1.0 + math.exp(-max(min(z, 30.0), -30.0)))
+
+    def predict(self, text: str) -> float:
+        return self.predict_features(features(text))
+
+
+model = LinearActionModel().train(SEED_EXAMPLES)
+
+
+def classify(message: str) -> Dict[str, Any]:
+    """
+    Decide whether the LLM action detector should run for this message.
+    Returns {"plausible", "probability", "matched_patterns"}.
+    """
+    matched = [name for name, pattern in _COMPILED_PATTERNS if pattern.search(message)]
+    probability = model.predict(message)
+    return {
+        "plausible": bool(matched) or probability >= ACTION_CLASSIFIER_THRESHOLD,
+        "probability": round(probability, 4),
+        "matched_patterns": matched,
+    }
+
+
+def evaluate(examples: List[Tuple[str, int]]) -> Dict[str, Any]:
+    """Recall on actions (must stay ~1.0) and how many LLM calls the gate skips"""
+    tp = fp = fn = tn = 0
+    for text, label in examples:
+        plausible = classify(text)["plausible"]
+        if label and plausible:
+            tp += 1
+        elif label:
+            fn += 1
+        elif plausible:
+            fp += 1
+        else:
+            tn += 1
+    return {
+        "examples": len(examples),
+        "action_recall": round(tp / (tp + fn), 4) if tp + fn else None,
+        "precision": round(tp / (tp + fp), 4) if tp + fp else None,
+        "llm_calls_skipped": round((tn + fn) / len(examples), 4) if examples else 0.0,
+        "missed_actions": fn,
+    }
+
+
+if __name__ == "__main__":
+    import json
+
+    print(json.dumps(evaluate(SEED_EXAMPLES), indent=2))
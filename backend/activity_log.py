@@ -0,0 +1,450 @@
+"""
+Activity Log
+Append-only record of what happened on the platform (activity_events)
+
+Mutating endpoints call emit() with who did what to which object:
+
+    activity_log.emit(db, current_user.id, "created", "post", new_post,
+                      target_type="guild", target_id=guild_id, extra={"guild": guild.name})
+
+- actor: the user who did it (None for the system)
+- verb and object: "joined" a "guild", "created" a "post", "funded" an "order" ...
+- target: the context the event belongs to. Anything that happens inside a
+  guild targets the guild (joining it included), which is what the per-guild
+  chart reads
+- extra: small JSON with the names needed to display the event, so reads
+  never look rows up elsewhere
+
+Events ride on the caller's transaction: they are kept on the session and
+handed to the writer only once it commits (rolled-back work leaves no
+event). An object that was just added can be passed instead of its id; the
+id is read after the commit. The writer buffers events in memory and inserts
+them in batches (one executemany) every ACTIVITY_FLUSH_SECONDS or once
+ACTIVITY_BATCH_SIZE are waiting, so requests never wait on the log. A batch
+that fails to insert is retried on its own, ahead of newer events but never
+merged with them, and dropped after ACTIVITY_FLUSH_ATTEMPTS tries; past
+ACTIVITY_BUFFER_MAX buffered events the oldest are dropped. Dropped events,
+and events buffered in a worker that crashes, are lost (and logged).
+
+Reads are single indexed queries: the admin feed and export (id / created_at),
+a user's history (actor_id, id), an object's history (object_type,
+object_id, id) and a guild's chart (target_type, target_id, created_at).
+"""
+
+from typing import Any, Dict, Iterator, List, Optional, Tuple, Union
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from fastapi import APIRouter, Depends, HTTPException
+from html import escape
+from string import Template
+from sqlalchemy import event, func, insert, inspect as sqlalchemy_inspect
+from sqlalchemy.orm import Session, load_only
+import json
+import os
+import threading
+import logging
+
+from database import get_db, SessionLocal, ActivityEvent, Guild, User
+from auth import get_current_user
+
+logger = logging.getLogger(__name__)
+
+ACTIVITY_FLUSH_SECONDS = float(os.getenv("ACTIVITY_FLUSH_SECONDS", "2"))
+ACTIVITY_BATCH_SIZE = int(os.getenv("ACTIVITY_BATCH_SIZE", "500"))
+# Past this many buffered events (flushes failing or falling behind) the oldest are dropped
+ACTIVITY_BUFFER_MAX = int(os.getenv("ACTIVITY_BUFFER_MAX", "20000"))
+# Tries before a batch that keeps failing to insert is dropped
+ACTIVITY_FLUSH_ATTEMPTS = int(os.getenv("ACTIVITY_FLUSH_ATTEMPTS", "3"))
+
+router = APIRouter(prefix="/activity", tags=["Activity"])
+
+_PENDING = "activity_pending"
+
+
+# ============================================================================
+# DISPLAY
+# ============================================================================
+
+@dataclass
+class Label:
+    category: str  # Feed filter/colour: user, guild, sale, project, message
+    emoji: str  # Admin feed
+    icon: str  # User history (frontend icon name)
+    title: str
+    phrase: Template  # Completes "@alice ..." / "You ..."
+
+
+LABELS = {
+    ("signed_up", "user"): Label("user", "👤", "user-plus", "New User", Template("joined the platform")),
+    ("updated", "user"): Label("user", "👤", "user", "Profile Updated", Template("updated their profile")),
+    ("created", "guild"): Label("guild", "👥", "users", "New Guild", Template('created the "$name" guild')),
+    ("updated", "guild"): Label("guild", "👥", "users", "Guild Updated", Template('updated the "$name" guild')),
+    ("joined", "guild"): Label("guild", "👥", "users", "Guild Joined", Template('joined the "$name" guild')),
+    ("left", "guild"): Label("guild", "👥", "users", "Guild Left", Template('left the "$name" guild')),
+    ("created", "post"): Label("guild", "📝", "edit", "New Post", Template('posted in "$guild"')),
+    ("liked", "post"): Label("guild", "❤️", "heart", "Post Liked", Template('liked a post in "$guild"')),
+    ("unliked", "post"): Label("guild", "👎", "thumbs-down", "Post Unliked", Template('unliked a post in "$guild"')),
+    ("created", "comment"): Label("guild", "💬", "message-circle", "New Comment",
+                                  Template('commented on a post in "$guild"')),
+    ("deleted", "comment"): Label("guild", "💬", "trash", "Comment Deleted", Template("deleted a comment")),
+    ("sent", "message"): Label("message", "✉️", "mail", "Message Sent", Template("sent a message")),
+    ("created", "order"): Label("sale", "🛒", "shopping-bag", "New Order",
+                                Template("placed order $order_number (₦$amount)")),
+    ("paid", "order"): Label("sale", "💳", "credit-card", "Order Paid",
+                             Template("paid ₦$amount into escrow for order $order_number")),
+    ("released", "order"): Label("sale", "✅", "check-circle", "Escrow Released",
+                                 Template("released ₦$amount for order $order_number")),
+    ("disputed", "order"): Label("sale", "⚠️", "alert-triangle", "Order Disputed",
+                                 Template("disputed order $order_number")),
+    ("refunded", "order"): Label("sale", "↩️", "rotate-ccw", "Order Refunded",
+                                 Template("refunded order $order_number")),
+    ("created", "product"): Label("sale", "🏷️", "tag", "New Listing", Template('listed "$name"')),
+    ("updated", "product"): Label("sale", "🏷️", "tag", "Listing Updated", Template('updated "$name"')),
+    ("created", "project"): Label("project", "📁", "briefcase", "New Project", Template('posted the project "$title"')),
+    ("funded", "project"): Label("project", "🔒", "lock", "Escrow Funded",
+                                 Template('funded ₦$amount escrow for "$title"')),
+    ("submitted", "project"): Label("project", "📤", "upload", "Work Submitted",
+                                    Template('submitted work for "$title"')),
+    ("released", "project"): Label("project", "✅", "check-circle", "Payment Released",
+                                   Template('released ₦$amount for "$title"')),
+}
+
+FALLBACK_LABEL = Label("user", "•", "activity", "Activity", Template("$verb a $object_type"))
+
+
+def _label(row: ActivityEvent) -> Label:
+    return LABELS.get((row.verb, row.object_type), FALLBACK_LABEL)
+
+
+def _phrase(row: ActivityEvent, html: bool = False) -> str:
+    extra = json.loads(row.extra_data) if row.extra_data else {}
+    values = {"verb": row.verb, "object_type": row.object_type}
+    values.update({key: f"{value:,.2f}" if isinstance(value, float) else str(value) for key, value in extra.items()})
+    if html:
+        values = {key: escape(value) for key, value in values.items()}
+    return _label(row).phrase.safe_substitute(values)
+
+
+def _ago(moment: datetime) -> str:
+    minutes = int((datetime.utcnow() - moment).total_seconds() / 60)
+    if minutes < 60:
+        return f"{minutes}m ago"
+    if minutes < 60 * 24:
+        return f"{minutes // 60}h ago"
+    return f"{minutes // (60 * 24)}d ago"
+
+
+def serialize(row: ActivityEvent) -> Dict[str, Any]:
+    return {
+        "id": row.id,
+        "actor_id": row.actor_id,
+        "verb": row.verb,
+        "object_type": row.object_type,
+        "object_id": row.object_id,
+        "target_type": row.target_type,
+        "target_id": row.target_id,
+        "extra": json.loads(row.extra_data) if row.extra_data else {},
+        "created_at": row.created_at,
+    }
+
+
+# ============================================================================
+# WRITING
+# ============================================================================
+
+def emit(db: Session, actor_id: Union[int, Any, None], verb: str, object_type: str,
+         object_id: Union[int, Any, None] = None, target_type: Optional[str] = None,
+         target_id: Union[int, Any, None] = None, extra: Optional[Dict[str, Any]] = None):
+    """
+    Record an event once the caller's transaction commits (any of the ids
+    may be an ORM object added in that transaction)
+    """
+    db.info.setdefault(_PENDING, []).append({
+        "actor_id": actor_id,
+        "verb": verb,
+        "object_type": object_type,
+        "object_id": object_id,
+        "target_type": target_type,
+        "target_id": target_id,
+        "extra_data": json.dumps(extra, default=str) if extra else None,
+        "created_at": datetime.utcnow(),
+    })
+
+
+def _resolve_id(value) -> Optional[int]:
+    if value is None or isinstance(value, int):
+        return value
+    identity = sqlalchemy_inspect(value).identity  # kept after commit, no query
+    return identity[0] if identity else None
+
+
+@event.listens_for(Session, "after_commit")
+def _record_committed(session: Session):
+    events = session.info.pop(_PENDING, None)
+    if events:
+        for row in events:
+            for key in ("actor_id", "object_id", "target_id"):
+                row[key] = _resolve_id(row[key])
+        writer.record(events)
+
+
+@event.listens_for(Session, "after_rollback")
+def _drop_rolled_back(session: Session):
+    session.info.pop(_PENDING, None)
+
+
+class ActivityWriter:
+    """Buffers committed events and inserts them in batches"""
+
+    def __init__(self, session_factory=SessionLocal):
+        self.session_factory = session_factory
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()  # one insert at a time keeps ids in commit order
+        self._buffer: List[Dict[str, Any]] = []
+        self._failed: List[Tuple[int, List[Dict[str, Any]]]] = []  # (attempts, batch), under _flush_lock
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._flusher: Optional[threading.Thread] = None
+        self.flushes = 0
+        self.events_written = 0
+        self.flush_failures = 0
+        self.events_dropped = 0
+
+    def record(self, events: List[Dict[str, Any]]):
+        # Runs in after_commit: never writes, only buffers and wakes the flusher
+        with self._lock:
+            self._buffer.extend(events)
+            overflow = len(self._buffer) - ACTIVITY_BUFFER_MAX
+            if overflow > 0:
+                del self._buffer[:overflow]
+                self.events_dropped += overflow
+            waiting = len(self._buffer)
+        if overflow > 0:
+            logger.error(f"❌ Activity log buffer full, dropped the {overflow} oldest events")
+        if waiting >= ACTIVITY_BATCH_SIZE:
+            self._wake.set()
+
+    def _insert(self, batch: List[Dict[str, Any]]) -> bool:
+        db = self.session_factory()
+        try:
+            db.execute(insert(ActivityEvent), batch)
+            db.commit()
+            return True
+        except Exception as e:
+            db.rollback()
+            self.flush_failures += 1
+            logger.error(f"❌ Activity log flush of {len(batch)} events failed: {e}")
+            return False
+        finally:
+            db.close()
+
+    def flush(self) -> int:
+        """Insert failed batches still being retried, then everything buffered; returns events written"""
+        with self._flush_lock:
+            with self._lock:
+                batch, self._buffer = self._buffer, []
+            pending, self._failed = self._failed + ([(0, batch)] if batch else []), []
+            written = 0
+            for attempts, events in pending:
+                if self._insert(events):
+                    self.flushes += 1
+                    written += len(events)
+                elif attempts + 1 < ACTIVITY_FLUSH_ATTEMPTS:
+                    self._failed.append((attempts + 1, events))
+                else:
+                    with self._lock:
+                        self.events_dropped += len(events)
+                    logger.error(f"❌ Dropped {len(events)} activity events after {attempts + 1} failed flushes")
+            self.events_written += written
+            return written
+
+    def start(self):
+        """Flush in the background every ACTIVITY_FLUSH_SECONDS (sooner when a batch fills up)"""
+        if self._flusher is not None:
+            return
+
+        def run():
+            while not self._stop.is_set():
+                self._wake.wait(ACTIVITY_FLUSH_SECONDS)
+                self._wake.clear()
+                self.flush()
+
+        self._stop.clear()
+        self._flusher = threading.Thread(target=run, name="activity-log-flusher", daemon=True)
+        self._flusher.start()
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+        self._flusher = None
+        self.flush()
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            buffered = len(self._buffer)
+        return {
+            "buffered": buffered,
+            "retrying": sum(len(events) for _, events in list(self._failed)),
+            "flushes": self.flushes,
+            "events_written": self.events_written,
+            "flush_failures": self.flush_failures,
+            "events_dropped": self.events_dropped,
+            "flush_interval_seconds": ACTIVITY_FLUSH_SECONDS,
+        }
+
+
+writer = ActivityWriter()
+
+
+# ============================================================================
+# READING
+# ============================================================================
+
+def _page(query, before: Optional[int], limit: int) -> List[ActivityEvent]:
+    if before is not None:
+        query = query.filter(ActivityEvent.id < before)
+    return query.order_by(ActivityEvent.id.desc()).limit(limit).all()
+
+
+def feed(db: Session, before: Optional[int] = None, limit: int = 20) -> List[Any]:
+    """Newest events platform-wide with their actor, (event, user or None) pairs"""
+    query = db.query(ActivityEvent, User).outerjoin(User, User.id == ActivityEvent.actor_id).options(
+        load_only(User.id, User.email, User.first_name, User.last_name)
+    )
+    return _page(query, before, limit)
+
+
+def history(db: Session, actor_id: int, before: Optional[int] = None, limit: int = 20) -> List[ActivityEvent]:
+    """One user's events, newest first"""
+    return _page(db.query(ActivityEvent).filter(ActivityEvent.actor_id == actor_id), before, limit)
+
+
+def object_history(db: Session, object_type: str, object_id: int, before: Optional[int] = None,
+                   limit: int = 20) -> List[ActivityEvent]:
+    """Everything that happened to one object (an order's lifecycle, ...), newest first"""
+    query = db.query(ActivityEvent).filter(ActivityEvent.object_type == object_type,
+                                           ActivityEvent.object_id == object_id)
+    return _page(query, before, limit)
+
+
+def daily_counts(db: Session, target_type: str, target_id: int, since: datetime) -> Dict[str, int]:
+    """{"YYYY-MM-DD": events} for one target since a time, in one grouped query"""
+    day = func.date(ActivityEvent.created_at)
+    rows = db.query(day, func.count(ActivityEvent.id)).filter(
+        ActivityEvent.target_type == target_type,
+        ActivityEvent.target_id == target_id,
+        ActivityEvent.created_at >= since
+    ).group_by(day).all()
+    return {str(date): count for date, count in rows}
+
+
+def guild_chart(db: Session, guild_id: int, period: str = "weekly", now: Optional[datetime] = None) -> List[Dict]:
+    """
+    A guild's activity in buckets (last 7 days, 4 weeks or 12 months), in
+    the shape of the admin guild activity chart
+    """
+    now = now or datetime.utcnow()
+    today = now.replace(hour=0, minute=0, second=0, microsecond=0)
+    if period == "weekly":
+        buckets = [(today - timedelta(days=6 - i), today - timedelta(days=5 - i)) for i in range(7)]
+        labels = [start.strftime("%a") for start, _ in buckets]
+    elif period == "monthly":
+        buckets = [(today - timedelta(weeks=3 - i, days=6), today - timedelta(weeks=3 - i) + timedelta(days=1))
+                   for i in range(4)]
+        labels = [f"Week {i + 1}" for i in range(4)]
+    else:  # alltime: last 12 calendar months
+        month = today.replace(day=1)
+        starts = []
+        for _ in range(12):
+            starts.insert(0, month)
+            month = (month - timedelta(days=1)).replace(day=1)
+        ends = starts[1:] + [(starts[-1] + timedelta(days=32)).replace(day=1)]
+        buckets = list(zip(starts, ends))
+        labels = [start.strftime("%b") for start in starts]
+
+    counts = daily_counts(db, "guild", guild_id, buckets[0][0])
+    chart = []
+    for label, (start, end) in zip(labels, buckets):
+        value = 0
+        day = start
+        while day < end:
+            value += counts.get(day.strftime("%Y-%m-%d"), 0)
+            day += timedelta(days=1)
+        chart.append({"day": label, "value": value, "count": value})
+    peak = max(max(item["value"] for item in chart), 1)
+    for item in chart:
+        item["percentage"] = int(item["value"] / peak * 100)
+    return chart
+
+
+def export(db: Session, since: datetime, until: datetime, batch_size: int = 1000) -> Iterator[ActivityEvent]:
+    """Every event in [since, until) in id order, streamed from one query"""
+    query = db.query(ActivityEvent).filter(
+        ActivityEvent.created_at >= since,
+        ActivityEvent.created_at < until
+    ).order_by(ActivityEvent.id).yield_per(batch_size)
+    for row in query:
+        yield row
+
+
+def describe_for_admin(row: ActivityEvent, actor: Optional[User]) -> Dict[str, Any]:
+    """An event in the admin activity feed's shape"""
+    label = _label(row)
+    handle = f"@{actor.email.split('@')[0]}" if actor else "System"
+    return {
+        "id": row.id,
+        "type": label.category,
+        "icon": label.emoji,
+        "text": f"<strong>{label.title}:</strong> {escape(handle)} {_phrase(row, html=True)}.",
+        "time": _ago(row.created_at),
+    }
+
+
+def describe_for_user(row: ActivityEvent) -> Dict[str, Any]:
+    """An event in the user's recent activity shape"""
+    label = _label(row)
+    return {
+        "id": row.id,
+        "type": label.category,
+        "title": label.title,
+        "description": f"You {_phrase(row)}",
+        "timestamp": row.created_at,
+        "icon": label.icon,
+    }
+
+
+# ============================================================================
+# ENDPOINTS
+# ============================================================================
+
+@router.get("/me")
+async def get_my_activity(
+    before: Optional[int] = None,
+    limit: int = 20,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """
+    The current user's activity, newest first. Pass next_before for the next page.
+    """
+    limit = max(1, min(limit, 100))
+    rows = history(db, current_user.id, before=before, limit=limit)
+    return {
+        "activities": [describe_for_user(row) for row in rows],
+        "next_before": rows[-1].id if len(rows) == limit else None,
+    }
+
+
+@router.get("/guilds/{guild_id}/chart")
+async def get_guild_activity_chart(
+    guild_id: int,
+    period: str = "weekly",  # weekly, monthly, alltime
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Posts, comments, likes and joins in a guild per day/week/month
+    """
+    if db.query(Guild.id).filter(Guild.id == guild_id).first() is None:
+        raise HTTPException(status_code=404, detail="Guild not found")
+    return guild_chart(db, guild_id, period)
@@ -1,16 +1,22 @@
 from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
 from sqlalchemy import func, desc, and_, or_
 from datetime import datetime, timedelta
 from typing import List, Optional
+import csv
+import io
+import json
 import random
 
 from database import (
-    get_db, User, Guild, Project, Product, Message, Order, Escrow, Payment,
+    get_db, SessionLocal, User, Guild, Project, Product, Message, Order, Escrow, Payment,
     guild_members, project_members, Admin, AIInteraction
 )
 from auth import get_current_admin
 from schemas import UserResponse
+from single_flight import coalesce
+import activity_log
 
 router = APIRouter(prefix="/admin", tags=["Admin"])
 
@@ -29,6 +35,12 @@ async def get_overview_stats(
     """
     Get overview statistics for admin dashboard
     """
+    # Dashboards poll this; concurrent loads share one set of aggregates
+    return await _overview_stats.run_async(db)
+
+
+@coalesce("admin.stats_overview")
+def _overview_stats(db: Session) -> dict:
     # Total transactions (orders + payments)
     total_orders = db.query(func.count(Order.id)).scalar() or 0
     total_payments = db.query(func.count(Payment.id)).scalar() or 0
@@ -113,71 +125,65 @@ async def get_recent_transactions(
 @router.get("/activity/feed")
 async def get_activity_feed(
     limit: int = 10,
+    before: Optional[int] = None,
     admin = Depends(get_current_admin),
     db: Session = Depends(get_db)
 ):
     """
-    Get recent activity feed
+    Get recent activity feed (newest first; pass the last id as before for older events)
     """
-    activities = []
-
-    # Recent user signups
-    recent_users = db.query(User).order_by(desc(User.created_at)).limit(3).all()
-    for user in recent_users:
-        time_diff = datetime.utcnow() - user.created_at
-        minutes = int(time_diff.total_seconds() / 60)
-        activities.append({
-            "type": "user",
-            "icon": "👤",
-            "text": f"<strong>New User:</strong> @{user.email.split('@')[0]} just joined the platform.",
-            "time": f"{minutes}m ago" if minutes < 60 else f"{minutes // 60}h ago"
-        })
-
-    # Recent high-value orders
-    high_value_orders = db.query(Order).filter(Order.total_amount > 100).order_by(
-        desc(Order.created_at)
-    ).limit(2).all()
-
-    for order in high_value_orders:
-        buyer = db.query(User).filter(User.id == order.buyer_id).first()
-        if buyer:
-            time_diff = datetime.utcnow() - order.created_at
-            minutes = int(time_diff.total_seconds() / 60)
-            activities.append({
-                "type": "sale",
-                "icon": "🛒",
-                "text": f"<strong>High-Value Sale:</strong> @{buyer.email.split('@')[0]} completed a sale of ₦{order.total_amount:,.2f}.",
-                "time": f"{minutes}m ago" if minutes < 60 else f"{minutes // 60}h ago"
-            })
+    limit = max(1, min(limit, 100))
+    rows = activity_log.feed(db, before=before, limit=limit)
+    return {"activities": [activity_log.describe_for_admin(row, actor) for row, actor in rows]}
 
-    # AI interactions
-    recent_ai_interactions = db.query(AIInteraction).order_by(desc(AIInteraction.created_at)).limit(2).all()
-    for interaction in recent_ai_interactions:
-        time_diff = datetime.utcnow() - interaction.created_at
-        minutes = int(time_diff.total_seconds() / 60)
-        user = db.query(User).filter(User.id == interaction.user_id).first() if interaction.user_id else None
-        username = user.email.split('@')[0] if user else "Anonymous"
-        activities.append({
-            "type": "ai",
-            "icon": "🤖",
-            "text": f"<strong>AI Usage:</strong> @{username} used {interaction.feature} feature.",
-            "time": f"{minutes}m ago" if minutes < 60 else f"{minutes // 60}h ago"
-        })
 
-    # Guild milestones
-    popular_guilds = db.query(Guild).filter(Guild.member_count >= 10).limit(1).all()
-    for guild in popular_guilds:
-        activities.append({
-            "type": "user",
-            "icon": "👥",
-            "text": f'<strong>Guild Milestone:</strong> The "{guild.name}" guild reached {guild.member_count} members.',
-            "time": "1h ago"
-        })
-
-    # Sort by most recent
-    activities_sorted = sorted(activities, key=lambda x: x['time'])
-
-    return {"activities": activities_sorted[:limit]}
+@router.get("/activity/export")
+async def export_activity(
+    since: datetime,
+    until: Optional[datetime] = None,
+    format: str = "jsonl",  # jsonl, csv
+    admin = Depends(get_current_admin)
+):
+    """
+    Audit export of every activity event in [since, until), streamed in id order
+    """
+    if format not in ("jsonl", "csv"):
+        raise HTTPException(status_code=400, detail="format must be jsonl or csv")
+    until = until or datetime.utcnow()
+    columns = ["id", "created_at", "actor_id", "verb", "object_type", "object_id", "target_type", "target_id", "extra"]
+
+    def lines():
+        # The request's session is closed before the body streams, so the export opens its own
+        db = SessionLocal()
+        try:
+            if format == "csv":
+                buffer = io.StringIO()
+                out = csv.writer(buffer)
+                out.writerow(columns)
+                for row in activity_log.export(db, since, until):
+                    event = activity_log.serialize(row)
+                    event["created_at"] = row.created_at.isoformat()
+                    event["extra"] = row.extra_data or ""
+                    out.writerow([event[column] for column in columns])
+                    if buffer.tell() > 64 * 1024:
+                        yield buffer.getvalue()
+                        buffer.seek(0)
+                        buffer.truncate()
+                yield buffer.getvalue()
+            else:
+                for row in activity_log.export(db, since, until):
+                    event = activity_log.serialize(row)
+                    event["created_at"] = row.created_at.isoformat()
+                    yield json.dumps(event) + "\n"
+        finally:
+            db.close()
+
+    filename = f"activity-{since:%Y%m%d}-{until:%Y%m%d}.{format}"
+    return StreamingResponse(
+        lines(),
+        media_type="text/csv" if format == "csv" else "application/x-ndjson",
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
 
 
 # ===== TRANSACTION ANALYTICS ENDPOINTS =====
@@ -285,12 +291,17 @@ async def get_guild_stats(
 @router.get("/guilds/activity")
 async def get_guild_activity(
     period: str = "weekly",  # weekly, monthly, alltime
+    guild_id: Optional[int] = None,
     admin = Depends(get_current_admin),
     db: Session = Depends(get_db)
 ):
     """
-    Get guild activity based on period - weekly, monthly, or all-time
+    Get guild activity based on period - weekly, monthly, or all-time.
+    Without guild_id: guilds created; with it: that guild's activity events.
     """
+    if guild_id is not None:
+        return activity_log.guild_chart(db, guild_id, period)
+
     activity_data = []
 
     if period == "weekly":
@@ -373,7 +384,7 @@ async def get_guild_weekly_activity(
     Get guild activity for the week - based on actual guild creation
     (Deprecated - use /guilds/activity?period=weekly instead)
     """
-    return await get_guild_activity("weekly", admin, db)
+    return await get_guild_activity("weekly", None, admin, db)
 
 
 @router.get("/guilds/trending-topics")
@@ -568,8 +579,6 @@ async def get_recent_ai_interactions(
     result = []
     for interaction in interactions:
         # Format the interaction for display
-        import json
-
         # Parse metadata
         metadata = {}
         if interaction.extra_data:
@@ -29,16 +29,11 @@ import logging
 import json
 
 from database import User, Project, Guild, Product, Task, Message, guild_members, project_members, ProjectChat
-from openai import OpenAI
-import os
 import qdrant_service  # For semantic search
+import llm_gateway
 
 logger = logging.getLogger(__name__)
 
-# Initialize OpenAI client
-openai_client = OpenAI(api_key=os.getenv("OPENAI_API_KEY")) if os.getenv("OPENAI_API_KEY") and os.getenv("OPENAI_API_KEY") != "your-openai-api-key-here" else None
-
-
 # ============================================================================
 # ACTION DEFINITIONS
 # ============================================================================
@@ -275,7 +270,7 @@ def detect_action_intent(message: str, user: Optional[User] = None) -> Dict[str,
             "confirmation_needed": bool
         }
     """
-    if not openai_client:
+    if not llm_gateway.is_configured():
         return {"has_action": False, "error": "AI not configured"}
 
     try:
@@ -320,7 +315,8 @@ User: "Tell me about guilds"
 Response: {{"has_action": false, "confidence": 0.3, "reasoning": "Just asking for information, not requesting an action"}}
 """
 
-        response = openai_client.chat.completions.create(
+        response = llm_gateway.chat(
+            "actions.detect",
             model="gpt-4o-mini",
             messages=[
                 {"role": "system", "content": system_prompt},
@@ -3,25 +3,45 @@ AI Google Box - Conversational AI Assistant
 Intelligent assistant that can answer questions, search, and help users
 """
 
-from typing import List, Dict, Any, Optional
-from openai import OpenAI
+from typing import List, Dict, Any, Optional, Iterator, Tuple
+from collections import defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from sqlalchemy.orm import Session
-from sqlalchemy import or_, and_
+from sqlalchemy import or_, and_, exists
+from starlette.concurrency import run_in_threadpool
+import anyio
 import os
 import logging
 import json
+import time
+import threading
 import requests
 
-from database import User, Project, Guild, Product, Task, Message, Post, Comment, ProductKeyword, AIConversation
+from database import User, Project, Guild, Product, Task, Message, Post, Comment, ProductKeyword, AIConversation, AIConversationSummary, SessionLocal
 import qdrant_service
 import ai_recommendations
 import ai_actions
 import ai_token_manager
+import entity_matcher
+import product_keyword_index
+import spell_correction
+import ai_response_cache
+import action_classifier
+import llm_gateway
+import conversation_summary
+import context_packer
+import ai_prompts
+from single_flight import coalesce
+import tracing
 import uuid
 from datetime import datetime, timedelta
 
 logger = logging.getLogger(__name__)
 
+# Posted in a chat when an @Ava reply job has used up its retries
+AVA_UNAVAILABLE_MESSAGE = "Sorry, I couldn't answer that right now. Please try asking again in a moment."
+
 # Currency conversion rates (cached)
 CURRENCY_RATES = {
     "NGN": 1650.0,  # 1 USD = 1650 NGN (approximate)
@@ -78,172 +98,8 @@ def convert_price(price_usd: float, target_currency: str) -> Dict[str, Any]:
         "formatted": f"{currency_symbols.get(target_currency, '$')}{converted_price:,.2f}"
     }
 
-# Initialize OpenAI client with timeout
-openai_client = OpenAI(
-    api_key=os.getenv("OPENAI_API_KEY"),
-    timeout=15.0,  # 15 second timeout
-    max_retries=2  # Retry failed requests twice
-) if os.getenv("OPENAI_API_KEY") and os.getenv("OPENAI_API_KEY") != "your-openai-api-key-here" else None
-
-
-SYSTEM_PROMPT = """You are Ava, an AI assistant for Avalanche - a collaborative marketplace platform connecting freelancers, businesses, and communities in Africa.
-
-WEBSITE STRUCTURE & PAGES:
-- Homepage: Platform overview, featured projects/products, recent activity, quick stats
-- Marketplace: Browse products by category (Electronics, Fashion, Home & Garden, Services, Digital Products, Automotive)
-- Projects: View active freelance projects, post new projects, track applications
-- Guilds: Browse communities, join skill-based groups, participate in discussions
-- Escrow: Secure payment management, transaction history, dispute resolution
-- Profile: User dashboard, portfolio, skills, earnings, settings
-- Messages: Direct messages, project chats, guild channels
-- About: Platform mission, team, story, values, impact metrics
-- Help: FAQ, guides, tutorials, contact support, troubleshooting
-- Terms of Service: Platform rules, user agreements, escrow policies
-- Privacy Policy: Data protection, cookie usage, user rights
-
-PLATFORM FEATURES & WORKFLOW:
-- Marketplace: Buy/sell products with escrow protection, categories include electronics, fashion, services, digital goods
-- Projects: Post freelance work → Freelancers apply → Negotiate terms → Set up escrow → Complete work → Release funds
-- Guilds: Communities for collaboration, skill-sharing, and networking (Tech, Design, Marketing, Writing, etc.)
-- Escrow System: Secure payment holding until work approval, supports Stripe/Paystack integration
-- AI Features: Smart search, recommendations, negotiation detection, shopping assistance
-- Communication: Direct messages, project chats, guild channels, @Ava mentions
-
-DETAILED ESCROW WORKFLOW:
-1. Project Posted → Price Agreed → Escrow Setup
-2. Buyer funds escrow via Stripe/Paystack → Funds held securely
-3. Freelancer completes work → Submits deliverables
-4. Buyer reviews & approves → Funds released to freelancer
-5. Automatic release after 7 days if no action
-6. Dispute resolution available if needed
-
-MARKETPLACE DETAILS:
-- Product Categories: Electronics, Fashion, Home & Garden, Services, Digital Products, Automotive
-- Pricing: All in Nigerian Naira (₦), supports budget filtering
-- Shopping Cart: Add multiple items, checkout with escrow protection
-- Seller Features: Product listings, inventory management, sales analytics
-- Buyer Protection: Escrow holds funds until item delivery confirmation
-
-GUILD FEATURES:
-- Public/Private guilds with member limits
-- Discussion channels, project collaboration
-- Skill-based communities (React Devs, UI/UX Designers, Content Writers)
-- Member search and networking
-
-PLATFORM MANAGEMENT:
-- Project Types: Web Development, Mobile Apps, Design, Writing, Marketing, Consulting
-- Budget Range: ₦5,000 - ₦5,000,000+ depending on scope
-- Timeline: Hours to months, with deadline tracking
-- Skills Matching: AI-powered freelancer recommendations
-- User Dashboard: Track projects, earnings, reviews, portfolio showcase
-- Analytics: Sales performance, project completion rates, community engagement
-
-PAYMENT & SECURITY:
-- Supported: Stripe Connect, Paystack, Bank transfers
-- Escrow Protection: Funds held by trusted third party
-- Currency: Nigerian Naira (₦) with automatic conversion
-- Withdrawal: Direct to bank accounts, processed within 1-3 business days
-
-SHOPPING ASSISTANCE:
-- Parse shopping lists from natural language
-- Add items to cart with quantity tracking
-- Guide through secure checkout with escrow
-- Product recommendations based on preferences
-- Budget-conscious shopping suggestions
-
-NEGOTIATION SUPPORT:
-- Detect when terms are agreed upon
-- Prompt escrow setup automatically
-- Guide through payment process
-- Ensure both parties understand terms
-
-AI CAPABILITIES:
-- Fuzzy matching for typos in product/project names
-- Semantic search across all platform content
-- Personalized recommendations
-- Context-aware responses
-- Action execution (create projects, join guilds, etc.)
-
-**CRITICAL ANTI-HALLUCINATION RULES - YOU MUST FOLLOW THESE EXACTLY:**
-1. **ONLY mention entities that are EXPLICITLY provided in the context data**
-2. **NEVER invent, guess, or hallucinate names, prices, or IDs** - if it's not in the context, it doesn't exist!
-3. **If NO matching entities are provided in context**, say "I couldn't find any [products/projects/guilds] matching that."
-4. **When entities are provided, use the EXACT data from context**:
-   - For products: EXACT name, EXACT price in ₦ (format: ₦X,XXX), EXACT ID (format: ID: #X)
-   - For projects: title, description, budget, ID
-   - For guilds: name, description, member count, category
-5. **When multiple products are found, list ALL of them** (up to 5-10), not just one
-6. **Context includes**:
-   - "mentioned_guilds": Guilds specifically mentioned by name in the message
-   - "mentioned_projects": Projects specifically mentioned by name
-   - "mentioned_products": Products specifically mentioned by name
-   - "projects": Search results for projects
-   - "guilds": Search results for guilds
-   - "matching_products": Search results for products (THIS IS THE COMPLETE LIST - mention ALL items)
-   - "user_projects": Current user's projects
-   - "user_guilds": Guilds user belongs to
-   - "trending_products": Popular items
-   - "platform_stats": User/product counts
-7. **Keep responses concise but comprehensive** - list multiple products when available
-8. **If user asks about projects, respond with project information, NOT product information**
-9. **For shopping: Help parse lists, add to cart, guide through checkout with escrow**
-10. **For negotiations: Detect completion and prompt escrow setup**
-11. **DOUBLE-CHECK: Before mentioning ANY product name or price, verify it exists in the context data**
-12. **Always mention escrow security when discussing payments or purchases**
-13. **Guide users through platform features they might not know about**
-
-**FUZZY MATCHING GUIDANCE:**
-- Correct common misspellings: "sneaker" for "snicker", "laptop" for "laptp", "keyboard" for "keybord"
-- Handle typos in product names: "runing shoes" → "running shoes", "mackbook" → "macbook"
-- Category corrections: "shoe" for "shoes", "computer" for "laptop", "fone" for "phone"
-- If unsure about a correction, use semantic search instead of guessing
-
-**SHOPPING ASSISTANCE PROTOCOLS:**
-1. Parse natural language shopping lists: "I want 2 laptops and a mouse" → Extract items and quantities
-2. Add items to cart automatically when user requests
-3. Show cart summary with totals and escrow protection
-4. Guide through checkout process with security emphasis
-5. Suggest budget-friendly alternatives when appropriate
-6. Recommend related products based on cart contents
-
-**NEGOTIATION DETECTION PATTERNS:**
-- Agreement phrases: "agreed on terms", "terms agreed", "we agree", "deal closed"
-- Completion phrases: "ready to start", "let's proceed", "terms are good", "we have a deal"
-- When detected: Immediately prompt escrow setup with project details
-- Guide through escrow workflow step-by-step
-
-**EXAMPLES:**
-Context: {"matching_products": [{"id": 24, "name": "Designer Sneakers", "price": 18000}, {"id": 31, "name": "Men's Dress Shoes", "price": 14000}, {"id": 38, "name": "Running Shoes", "price": 9500}]}
-User: "available shoes?"
-CORRECT: "Here are some shoes available: 1. Running Shoes - ₦9,500 (ID: #38): Professional running shoes. 2. Men's Dress Shoes - ₦14,000 (ID: #31). 3. Designer Sneakers - ₦18,000 (ID: #24): Limited edition athletic sneakers."
-
-Context: {"matching_products": [{"id": 3, "name": "MacBook Air M2", "price": 185000}, {"id": 4, "name": "Dell XPS 15 Laptop", "price": 165000}]}
-User: "laptops?"
-CORRECT: "Here are laptops available: 1. Dell XPS 15 Laptop - ₦165,000 (ID: #4). 2. MacBook Air M2 - ₦185,000 (ID: #3)."
-
-User: "I want to buy runing shoes and a laptp"
-CORRECT: "I can help you shop! Let me search for running shoes and laptops. Here are some running shoes: 1. Running Shoes - ₦9,500 (ID: #38). And laptops: 1. Dell XPS 15 Laptop - ₦165,000 (ID: #4). 2. MacBook Air M2 - ₦185,000 (ID: #3). Would you like me to add these to your cart?"
-
-User: "Add 2 laptops and a mouse to my cart"
-CORRECT: "I'll add these items to your cart automatically. Here's what I found: 1. MacBook Air M2 - ₦185,000 (ID: #3) x2, 2. Wireless Gaming Mouse - ₦15,000 (ID: #7) x1. Total: ₦385,000. Ready to checkout with escrow protection?"
-
-User: "We're agreed on the project terms"
-CORRECT: "Great! Since you've reached an agreement, I recommend setting up escrow to protect both parties. Would you like me to guide you through the escrow setup process? Here's what happens: 1. Buyer funds the escrow account securely, 2. Freelancer completes the work, 3. Funds are released upon approval (or automatically after 7 days)."
-
-User: "How does escrow work?"
-CORRECT: "Escrow protects both buyers and sellers: 1. Buyer funds the escrow account via Stripe/Paystack, 2. Seller delivers the work/product, 3. Buyer approves and funds are released to seller, or they're automatically released after 7 days. This ensures security for everyone! All transactions are protected by our trusted escrow system."
-
-**HALLUCINATION PREVENTION EXAMPLES:**
-❌ WRONG: "I found the Nike Air Max shoes for ₦25,000" (if not in context)
-✅ CORRECT: "I couldn't find any shoes matching 'Nike Air Max'. Here are some available shoes: [list actual products from context]"
-
-❌ WRONG: "The React Developers guild has 150 members" (if not in context)
-✅ CORRECT: "I couldn't find a guild called 'React Developers'. Here are some available guilds: [list actual guilds from context]"
-
-❌ WRONG: "Project budget is ₦500,000" (if not in context)
-✅ CORRECT: "I couldn't find that specific project. Here are some active projects: [list actual projects from context]"
-
-Be helpful but ONLY use real database data from context. List ALL available items when multiple are found. Guide users through shopping and escrow processes with security emphasis."""
+# Upper bound on unknown words sent to the batched category fallback
+MAX_AI_CATEGORY_TERMS = 8
 
 
 def generate_deep_link(entity_type: str, entity_id: int, entity_data: Dict[str, Any] = None) -> Dict[str, Any]:
@@ -361,22 +217,166 @@ def format_response_with_links(response_text: str, context: Optional[Dict[str, A
     }
 
 
-def chat_with_ai(
+# ===================================
+# Pipeline concurrency and stats
+# ===================================
+
+# Worker threads for independent chat stages (LLM calls, vector searches, history)
+_pipeline_executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv("AI_PIPELINE_WORKERS", "16")),
+    thread_name_prefix="ava-pipeline"
+)
+
+
+class PipelineStats:
+    """Rolling per-stage latencies and LLM call counters for /ai/pipeline/stats"""
+
+    def __init__(self, window: int = 1000):
+        self._lock = threading.Lock()
+        self._timings: Dict[str, deque] = defaultdict(lambda: deque(maxlen=window))
+        self._counters: Dict[str, int] = defaultdict(int)
+
+    def count(self, name: str, amount: int = 1):
+        with self._lock:
+            self._counters[name] += amount
+
+    def record(self, stage: str, seconds: float):
+        with self._lock:
+            self._timings[stage].append(seconds)
+
+    @contextmanager
+    def timed(self, stage: str):
+        started = time.perf_counter()
+        try:
+            with tracing.span(f"ai.{stage}"):
+                yield
+        finally:
+            self.record(stage, time.perf_counter() - started)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            stages = {}
+            for stage, values in self._timings.items():
+                ordered = sorted(values)
+                stages[stage] = {
+                    "count": len(ordered),
+                    "p50_ms": round(ordered[len(ordered) // 2] * 1000, 1),
+                    "p95_ms": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] * 1000, 1),
+                }
+            counters = dict(self._counters)
+        messages = counters.get("messages", 0)
+        llm_calls = counters.get("action_llm_calls", 0) + counters.get("completion_llm_calls", 0)
+        return {
+            "stages": stages,
+            "counters": counters,
+            "llm_calls_per_message": round(llm_calls / messages, 3) if messages else 0.0,
+        }
+
+
+pipeline_stats = PipelineStats()
+
+
+def _submit_stage(stage: str, fn, *args):
+    """Run a pipeline stage on the worker pool, timing it under `stage`"""
+    def run():
+        with pipeline_stats.timed(stage):
+            return fn(*args)
+    return _pipeline_executor.submit(tracing.wrap(run))
+
+
+def _load_memory_context(session_id: str) -> Dict[str, Any]:
+    """build_conversation_context on a dedicated session (runs on a worker thread)"""
+    db = SessionLocal()
+    try:
+        return build_conversation_context(session_id, db)
+    finally:
+        db.close()
+
+
+def _run_detected_action(action_detection: Dict[str, Any], user: Optional[User], db: Session) -> Dict[str, Any]:
+    """Execute an action found by ai_actions.detect_action_intent and describe the outcome"""
+    action_key = action_detection["action"]
+    parameters = action_detection.get("parameters", {})
+
+    logger.info(f"🎬 Action detected: {action_key} with params: {parameters}")
+
+    # Execute the action
+    action_result = ai_actions.execute_action(action_key, user, db, parameters)
+
+    if action_result.get("success"):
+        # Action succeeded - return success response with AI explanation
+        response_text = action_result.get("message", "Action completed successfully!")
+
+        # Generate AI explanation of what was done
+        try:
+            ai_response = llm_gateway.chat(
+                "assistant.action_explanation",
+                model="gpt-4o-mini",
+                messages=[
+                    {"role": "system", "content": "You are a helpful assistant. Explain what action was performed in a friendly, concise way."},
+                    {"role": "user", "content": f"I just performed this action: {action_result.get('message')}. Explain it briefly."}
+                ],
+                temperature=0.7,
+                max_tokens=100
+            )
+            response_text = ai_response.choices[0].message.content
+        except Exception:
+            pass  # Use default message if AI explanation fails
+
+        return {
+            "response": response_text,
+            "intent": "action",
+            "action_performed": action_key,
+            "action_result": action_result,
+            "links": [{"link": action_result.get("deep_link"), "type": "result", "label": "View Result"}] if action_result.get("deep_link") else [],
+            "sources": [],
+            "suggestions": []
+        }
+    else:
+        # Action failed - return error with suggestions
+        return {
+            "response": f"I tried to {action_key.replace('_', ' ')}, but encountered an error: {action_result.get('error')}",
+            "intent": "action_failed",
+            "action_attempted": action_key,
+            "error": action_result.get("error"),
+            "requires_auth": action_result.get("requires_auth", False),
+            "links": [],
+            "sources": [],
+            "suggestions": []
+        }
+
+
+def _answered_turn(result: Dict[str, Any]) -> Dict[str, Any]:
+    return {"result": result}
+
+
+def prepare_chat_turn(
     message: str,
     user: Optional[User],
     db: Session,
     conversation_history: List[Dict[str, str]] = None,
-    session_id: Optional[str] = None
+    session_id: Optional[str] = None,
+    commit: bool = True
 ) -> Dict[str, Any]:
     """
-    Chat with AI assistant, with access to platform data, deep links, and conversation memory
+    Run everything that comes before the main completion: quotas, actions,
+    quick answers, the response cache, intent detection and context gathering.
+    Returns {"result": ...} when the turn is already answered, otherwise the
+    prompt messages and state needed to complete and record the turn.
+    commit=False records a cached answer in the caller's transaction.
     """
-    if not openai_client:
-        return {
+    if not llm_gateway.is_configured():
+        return _answered_turn({
             "response": "AI assistant is not available. Please configure OpenAI API key.",
             "sources": [],
             "links": []
-        }
+        })
+
+    # A provided session ID or history means earlier turns may matter
+    has_history = bool(session_id or conversation_history)
+
+    # A freshly generated session has no stored memory to load
+    resumed_session = bool(session_id)
 
     # Generate or use provided session ID for conversation continuity
     if not session_id:
@@ -385,7 +385,7 @@ def chat_with_ai(
     # Check user monthly quota
     user_quota = ai_token_manager.check_user_quota(user, db)
     if not user_quota["allowed"]:
-        return {
+        return _answered_turn({
             "response": f"❌ {user_quota['message']}\n\nYou've used {user_quota['tokens_used']:,} of {user_quota['monthly_token_limit']:,} tokens this month.",
             "intent": "quota_exceeded",
             "sources": [],
@@ -393,12 +393,12 @@ def chat_with_ai(
             "links": [],
             "quota_exceeded": True,
             "quota_info": user_quota
-        }
+        })
 
     # Check session quota (prevent very long conversations)
     session_quota = ai_token_manager.check_session_quota(session_id, user, db)
     if not session_quota["allowed"] and not session_quota["session_expired"]:
-        return {
+        return _answered_turn({
             "response": f"⏱️  {session_quota['message']}\n\nThis conversation used {session_quota['session_tokens_used']:,} tokens. Please start a new chat to continue!",
             "intent": "session_limit_reached",
             "sources": [],
@@ -406,202 +406,215 @@ def chat_with_ai(
             "links": [],
             "session_limit_reached": True,
             "session_info": session_quota
-        }
+        })
+
+    # Load conversation memory (may summarize with the LLM) while the turn is prepared.
+    # Submitted after the quota checks so a refused turn leaves no stage running.
+    memory_future = _submit_stage("history", _load_memory_context, session_id) if resumed_session else None
 
     # Get tier info for AI context
     tier_info = ai_token_manager.get_tier_info(user)
     logger.info(f"👤 User tier: {tier_info['tier_name']} | Quota: {user_quota['tokens_remaining']} tokens remaining")
 
-    try:
-        # 1. FIRST: Check if user wants to perform an action
-        action_detection = ai_actions.detect_action_intent(message, user)
-        if action_detection.get("has_action") and action_detection.get("confidence", 0) >= 0.7:
-            action_key = action_detection["action"]
-            parameters = action_detection.get("parameters", {})
-
-            logger.info(f"🎬 Action detected: {action_key} with params: {parameters}")
-
-            # Execute the action
-            action_result = ai_actions.execute_action(action_key, user, db, parameters)
-
-            if action_result.get("success"):
-                # Action succeeded - return success response with AI explanation
-                response_text = action_result.get("message", "Action completed successfully!")
-
-                # Generate AI explanation of what was done
-                try:
-                    ai_response = openai_client.chat.completions.create(
-                        model="gpt-4o-mini",
-                        messages=[
-                            {"role": "system", "content": "You are a helpful assistant. Explain what action was performed in a friendly, concise way."},
-                            {"role": "user", "content": f"I just performed this action: {action_result.get('message')}. Explain it briefly."}
-                        ],
-                        temperature=0.7,
-                        max_tokens=100
-                    )
-                    response_text = ai_response.choices[0].message.content
-                except Exception:
-                    pass  # Use default message if AI explanation fails
-
-                return {
-                    "response": response_text,
-                    "intent": "action",
-                    "action_performed": action_key,
-                    "action_result": action_result,
-                    "links": [{"link": action_result.get("deep_link"), "type": "result", "label": "View Result"}] if action_result.get("deep_link") else [],
-                    "sources": [],
-                    "suggestions": []
-                }
-            else:
-                # Action failed - return error with suggestions
-                return {
-                    "response": f"I tried to {action_key.replace('_', ' ')}, but encountered an error: {action_result.get('error')}",
-                    "intent": "action_failed",
-                    "action_attempted": action_key,
-                    "error": action_result.get("error"),
-                    "requires_auth": action_result.get("requires_auth", False),
-                    "links": [],
-                    "sources": [],
-                    "suggestions": []
-                }
+    # 1. Only pay for LLM action detection when the local pre-classifier finds an
+    #    action plausible; it runs in the background while context is gathered
+    action_gate = action_classifier.classify(message)
+    action_future = None
+    if action_gate["plausible"]:
+        pipeline_stats.count("action_llm_calls")
+        action_future = _submit_stage("action_detection", ai_actions.detect_action_intent, message, user)
+    else:
+        pipeline_stats.count("action_llm_skipped")
 
-        # 2. Check for quick answers (instant response for non-action queries)
-        quick_resp = quick_answer(message, db)
-        if quick_resp:
-            logger.info(f"⚡ Quick answer provided")
-            return {
-                "response": quick_resp,
-                "intent": "quick_answer",
-                "sources": [],
-                "suggestions": [],
-                "links": [],
-                "context_type": "quick_answer"
-            }
+    # 2. Local stages: quick answers, intent, response cache
+    quick_resp = quick_answer(message, db)
 
-        # Detect user intent
-        intent = detect_intent(message)
-        logger.info(f"🎯 Detected intent: {intent} for message: '{message}'")
+    intent = detect_intent(message)
+    logger.info(f"🎯 Detected intent: {intent} for message: '{message}'")
 
-        # Gather relevant context based on intent
-        context = gather_context(message, intent, user, db)
+    cached_response, cache_state = None, {"cacheable": False}
+    if not quick_resp:
+        mentions = entity_matcher.entity_index.match(message)
+        cached_response, cache_state = ai_response_cache.response_cache.lookup(message, intent, mentions, has_history)
+
+    # 3. Gather relevant context based on intent (overlaps with action detection)
+    context = None
+    if not quick_resp and not cached_response:
+        with pipeline_stats.timed("gather_context"):
+            context = gather_context(message, intent, user, db)
         logger.info(f"📦 Context gathered: {context is not None}, sources: {context.get('sources', []) if context else 'none'}")
 
-        # Build messages for OpenAI with smart memory management
-        messages = [
-            {"role": "system", "content": SYSTEM_PROMPT}
-        ]
+    # Actions take precedence over every other kind of answer
+    if action_future is not None:
+        action_detection = action_future.result()
+        if action_detection.get("has_action") and action_detection.get("confidence", 0) >= 0.7:
+            if memory_future:
+                memory_future.cancel()
+            return _answered_turn(_run_detected_action(action_detection, user, db))
+
+    # Check for quick answers (instant response for non-action queries)
+    if quick_resp:
+        logger.info(f"⚡ Quick answer provided")
+        return _answered_turn({
+            "response": quick_resp,
+            "intent": "quick_answer",
+            "sources": [],
+            "suggestions": [],
+            "links": [],
+            "context_type": "quick_answer"
+        })
 
-        # Use database memory for better long-term context
-        memory_context = build_conversation_context(session_id, db, max_messages=3)
+    # Serve repeated, non-personalized questions from the response cache
+    if cached_response:
+        logger.info(f"♻️  Cached response served ({cached_response['cached']['tier']}) for intent: {intent}")
+        save_conversation(
+            session_id=session_id,
+            user_message=message,
+            ai_response=cached_response["response"],
+            intent=intent,
+            user=user,
+            db=db,
+            commit=commit
+        )
+        cached_response["session_id"] = session_id
+        return _answered_turn(cached_response)
+
+    # Use database memory for better long-term context (loaded in the background)
+    memory_context = memory_future.result() if memory_future else {}
+
+    # Summary, earlier turns and gathered data compete for the intent's token
+    # budget; what doesn't fit is dropped and reported
+    messages, packed = context_packer.build_messages(
+        [{"role": "system", "content": ai_prompts.build_system_prompt(intent)}],
+        message,
+        intent,
+        context,
+        memory_context,
+        fallback_history=conversation_history
+    )
+    if packed.dropped:
+        logger.info(f"📦 Context packed to {packed.tokens}/{packed.budget} tokens, dropped {len(packed.dropped)} items")
 
-        # Add conversation summary if exists (for long conversations)
-        if memory_context.get("summary"):
-            messages.append({
-                "role": "system",
-                "content": f"Previous conversation summary: {memory_context['summary']}"
-            })
+    return {
+        "message": message,
+        "intent": intent,
+        "context": context,
+        "messages": messages,
+        "session_id": session_id,
+        "cache_state": cache_state,
+        "context_report": packed.report(),
+    }
 
-        # Add recent conversation from memory (prioritize DB over passed history)
-        if memory_context.get("recent_messages"):
-            messages.extend(memory_context["recent_messages"])
-        elif conversation_history:
-            # Fallback to passed history if no DB memory
-            messages.extend(conversation_history[-3:])  # Last 3 messages only
-
-        # Add context if available (optimized - less data)
-        if context:
-            # Reduce context size - only send essential info
-            compact_context = {}
-            if context.get("matching_products"):
-                compact_context["products"] = [
-                    {"name": p["name"], "price": p["price"], "id": p["id"]}
-                    for p in context["matching_products"][:5]  # Max 5 products
-                ]
-            if context.get("guilds"):
-                compact_context["guilds"] = [
-                    {"name": g["name"], "desc": g.get("description", "")[:80]}
-                    for g in context["guilds"][:5]  # Max 5 guilds
-                ]
-            if context.get("projects"):
-                compact_context["projects"] = [
-                    {"title": p["title"], "desc": p.get("description", "")[:80]}
-                    for p in context["projects"][:5]  # Max 5 projects
-                ]
-            if context.get("user_projects"):
-                compact_context["user_projects"] = [
-                    {"title": p["title"], "status": p.get("status", "")}
-                    for p in context["user_projects"][:3]  # Max 3 user projects
-                ]
-            if context.get("user_guilds"):
-                compact_context["user_guilds"] = [
-                    {"name": g["name"], "role": g.get("role", "member")}
-                    for g in context["user_guilds"][:3]  # Max 3 user guilds
-                ]
-            if context.get("trending_products"):
-                compact_context["trending_products"] = [
-                    {"name": p["name"], "price": p["price"]}
-                    for p in context["trending_products"][:3]  # Max 3 trending
-                ]
-            if context.get("platform_stats"):
-                compact_context["platform_stats"] = context["platform_stats"]
 
-            context_message = f"\nRelevant data:\n{json.dumps(compact_context)}"
-            messages.append({"role": "system", "content": context_message})
+def build_chat_result(turn: Dict[str, Any], assistant_message: str) -> Dict[str, Any]:
+    """Format a completed answer with deep links and follow-up suggestions"""
+    intent, context = turn["intent"], turn["context"]
+    formatted_response = format_response_with_links(assistant_message, context, intent)
 
-        # Add user message
-        messages.append({"role": "user", "content": message})
+    logger.info(f"🔗 Generated {len(formatted_response.get('links', []))} links for intent: {intent}")
+    if formatted_response.get("links"):
+        for link in formatted_response["links"]:
+            logger.info(f"   Link: {link.get('link')} - {link.get('label')}")
 
-        # Get response from OpenAI with faster settings and timeout handling
-        try:
-            response = openai_client.chat.completions.create(
-                model="gpt-4o-mini",
-                messages=messages,
-                temperature=0.7,
-                max_tokens=250,  # Reduced for faster responses
-                stream=False,
-                timeout=12.0  # 12 second timeout for this specific call
-            )
-            assistant_message = response.choices[0].message.content
-        except Exception as api_error:
-            logger.error(f"OpenAI API error: {api_error}")
-            # Fallback to quick response based on intent
-            return {
-                "response": get_fallback_response(intent, context),
-                "intent": intent,
-                "sources": context.get("sources", []) if context else [],
-                "suggestions": generate_suggestions(intent, context),
-                "links": [],
-                "context_type": intent,
-                "fallback": True
-            }
+    return {
+        "response": formatted_response["response"],
+        "intent": intent,
+        "sources": context.get("sources", []) if context else [],
+        "suggestions": generate_suggestions(intent, context),
+        "links": formatted_response.get("links", []),
+        "context_type": intent,  # Track what user is looking for
+        "session_id": turn["session_id"]  # Return session ID for frontend to track
+    }
 
-        # Format response with deep links
-        formatted_response = format_response_with_links(assistant_message, context, intent)
 
-        logger.info(f"🔗 Generated {len(formatted_response.get('links', []))} links for intent: {intent}")
-        if formatted_response.get("links"):
-            for link in formatted_response["links"]:
-                logger.info(f"   Link: {link.get('link')} - {link.get('label')}")
+def record_chat_turn(
+    turn: Dict[str, Any],
+    result: Dict[str, Any],
+    total_tokens: int,
+    user: Optional[User],
+    db: Session,
+    cacheable: bool = True,
+    commit: bool = True
+):
+    """Save the exchange to conversation memory (and quota) and offer it to the response cache"""
+    save_conversation(
+        session_id=turn["session_id"],
+        user_message=turn["message"],
+        ai_response=result["response"],
+        intent=turn["intent"],
+        user=user,
+        db=db,
+        tokens_used=total_tokens,
+        commit=commit
+    )
+    conversation_summary.schedule_fold(turn["session_id"])
+
+    # Personalized context (the user's own projects/guilds) never goes in the shared cache
+    context = turn["context"]
+    if cacheable and not (context and (context.get("user_projects") or context.get("user_guilds"))):
+        ai_response_cache.response_cache.store(turn["cache_state"], result, total_tokens)
+
+
+def get_fallback_result(turn: Dict[str, Any]) -> Dict[str, Any]:
+    """Quick response based on intent when the completion fails"""
+    intent, context = turn["intent"], turn["context"]
+    return {
+        "response": get_fallback_response(intent, context),
+        "intent": intent,
+        "sources": context.get("sources", []) if context else [],
+        "suggestions": generate_suggestions(intent, context),
+        "links": [],
+        "context_type": intent,
+        "fallback": True
+    }
 
-        # Save conversation to memory for future context
-        save_conversation(
-            session_id=session_id,
-            user_message=message,
-            ai_response=formatted_response["response"],
-            intent=intent,
-            user=user,
-            db=db
+
+def complete_chat_turn(turn: Dict[str, Any], user: Optional[User], db: Session, commit: bool = True) -> Dict[str, Any]:
+    """
+    Get the completion for a prepared turn, format it and record it.
+    Provider errors propagate; commit=False records the exchange in the
+    caller's transaction (job handlers, so a failed attempt is retried whole).
+    """
+    pipeline_stats.count("completion_llm_calls")
+    with pipeline_stats.timed("completion"):
+        response = llm_gateway.chat(
+            "assistant.completion",
+            model="gpt-4o-mini",
+            messages=turn["messages"],
+            temperature=0.7,
+            max_tokens=250,  # Reduced for faster responses
+            stream=False
         )
+    result = build_chat_result(turn, response.choices[0].message.content)
+    usage = getattr(response, "usage", None)
+    record_chat_turn(turn, result, usage.total_tokens if usage else 0, user, db, commit=commit)
+    return result
 
-        return {
-            "response": formatted_response["response"],
-            "intent": intent,
-            "sources": context.get("sources", []) if context else [],
-            "suggestions": generate_suggestions(intent, context),
-            "links": formatted_response.get("links", []),
-            "context_type": intent,  # Track what user is looking for
-            "session_id": session_id  # Return session ID for frontend to track
-        }
+
+def chat_with_ai(
+    message: str,
+    user: Optional[User],
+    db: Session,
+    conversation_history: List[Dict[str, str]] = None,
+    session_id: Optional[str] = None
+) -> Dict[str, Any]:
+    """
+    Chat with AI assistant, with access to platform data, deep links, and conversation memory
+    """
+    pipeline_stats.count("messages")
+    try:
+        with pipeline_stats.timed("chat_total"):
+            with pipeline_stats.timed("prepare"):
+                turn = prepare_chat_turn(message, user, db, conversation_history, session_id)
+            if "result" in turn:
+                return turn["result"]
+
+            # Get response from OpenAI with faster settings and timeout handling
+            try:
+                return complete_chat_turn(turn, user, db)
+            except Exception as api_error:
+                logger.error(f"OpenAI API error: {api_error}")
+                return get_fallback_result(turn)
 
     except Exception as e:
         logger.error(f"Error in AI chat: {e}")
@@ -612,6 +625,187 @@ def chat_with_ai(
         }
 
 
+def stream_chat_with_ai(
+    message: str,
+    user: Optional[User],
+    db: Session,
+    conversation_history: List[Dict[str, str]] = None,
+    session_id: Optional[str] = None,
+    turn_state: Optional[Dict[str, Any]] = None
+) -> Iterator[Tuple[str, Dict[str, Any]]]:
+    """
+    Streaming variant of chat_with_ai.
+    Yields (event, data) pairs: "meta" once links and suggestions are known,
+    "token" for each completion delta, then "done" with the full result.
+
+    Persistence and quota accounting are deferred: the caller passes a
+    turn_state dict and calls finish_streamed_turn() after the stream closes.
+    """
+    turn_state = turn_state if turn_state is not None else {}
+    pipeline_stats.count("messages")
+    try:
+        turn = prepare_chat_turn(message, user, db, conversation_history, session_id)
+    except Exception as e:
+        logger.error(f"Error in AI chat stream: {e}")
+        turn = _answered_turn({
+            "response": "I'm having trouble processing your request right now. Please try again.",
+            "error": str(e),
+            "links": []
+        })
+
+    if "result" in turn:
+        # Already answered (quota, action, quick answer, cache hit): one chunk
+        result = turn["result"]
+        yield "meta", {k: v for k, v in result.items() if k != "response"}
+        yield "token", {"delta": result["response"]}
+        yield "done", result
+        return
+
+    turn_state["turn"] = turn
+    turn_state["parts"] = []
+    intent, context = turn["intent"], turn["context"]
+    yield "meta", {
+        "intent": intent,
+        "session_id": turn["session_id"],
+        "sources": context.get("sources", []) if context else [],
+        "suggestions": generate_suggestions(intent, context),
+        "links": format_response_with_links("", context, intent)["links"],
+        "context_type": intent,
+    }
+
+    pipeline_stats.count("completion_llm_calls")
+    try:
+        stream = llm_gateway.chat_stream(
+            "assistant.stream",
+            model="gpt-4o-mini",
+            messages=turn["messages"],
+            temperature=0.7,
+            max_tokens=250,
+            stream_options={"include_usage": True}
+        )
+        for chunk in stream:
+            if getattr(chunk, "usage", None):
+                turn_state["total_tokens"] = chunk.usage.total_tokens
+            if chunk.choices and chunk.choices[0].delta.content:
+                delta = chunk.choices[0].delta.content
+                turn_state["parts"].append(delta)
+                yield "token", {"delta": delta}
+        turn_state["completed"] = True
+    except Exception as api_error:
+        logger.error(f"OpenAI streaming error: {api_error}")
+        if not turn_state["parts"]:
+            turn_state.pop("turn", None)  # nothing was generated, nothing to record
+            fallback = get_fallback_result(turn)
+            yield "token", {"delta": fallback["response"]}
+            yield "done", fallback
+            return
+
+    yield "done", build_chat_result(turn, "".join(turn_state["parts"]))
+
+
+def finish_streamed_turn(turn_state: Dict[str, Any], user: Optional[User], db: Session):
+    """
+    Record a streamed turn once the response has closed.
+    Partial answers (client disconnected mid-stream) still count towards quota
+    and memory, but only complete ones are cached.
+    """
+    turn = turn_state.get("turn")
+    if not turn or not turn_state.get("parts"):
+        return
+    result = build_chat_result(turn, "".join(turn_state["parts"]))
+    record_chat_turn(turn, result, turn_state.get("total_tokens", 0), user, db,
+                     cacheable=turn_state.get("completed", False))
+
+
+class ChatStream:
+    """
+    One streamed turn (Server-Sent Events) that owns its database session,
+    since the stream outlives request-scoped dependencies.
+
+    The turn is recorded and the session closed exactly once, by whichever
+    thread ends or closes the event generator. Closing waits for a step still
+    running in the threadpool (a client that disconnects during
+    prepare_chat_turn or the LLM stream), so the session is never used from
+    two threads. finish_unstarted() is the response's background task for
+    streams the server never began iterating.
+    """
+
+    def __init__(self, message: str, user_id: Optional[int], conversation_history: List[Dict[str, str]] = None,
+                 session_id: Optional[str] = None, session_factory=SessionLocal):
+        self.message = message
+        self.conversation_history = conversation_history
+        self.session_id = session_id
+        self.turn_state: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+        self._started = False
+        self._finished = False
+        self.db = session_factory()
+        try:
+            self.user = self.db.get(User, user_id) if user_id else None
+        except Exception:
+            self.db.close()
+            raise
+
+    def _events(self) -> Iterator[str]:
+        try:
+            for event, data in stream_chat_with_ai(
+                message=self.message,
+                user=self.user,
+                db=self.db,
+                conversation_history=self.conversation_history,
+                session_id=self.session_id,
+                turn_state=self.turn_state
+            ):
+                if event == "done" and "response" in data and "ai_response" not in data:
+                    data = {**data, "ai_response": data["response"]}
+                yield f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+        finally:
+            self.finish()
+
+    async def stream(self):
+        """The SSE body; the blocking pipeline runs in the threadpool"""
+        self._started = True
+        events = self._events()
+        step_lock = threading.Lock()
+
+        def step() -> Optional[str]:
+            with step_lock:
+                return next(events, None)
+
+        def close():
+            with step_lock:  # waits for a next() still running after a disconnect
+                events.close()  # runs _events' finally if it started
+            self.finish()  # a generator that never started has no finally to run
+
+        try:
+            while True:
+                chunk = await run_in_threadpool(step)
+                if chunk is None:
+                    break
+                yield chunk
+        finally:
+            # Shielded so a disconnect can't skip it
+            with anyio.CancelScope(shield=True):
+                await run_in_threadpool(close)
+
+    def finish(self):
+        """Record the turn and release the session (once)"""
+        with self._lock:
+            if self._finished:
+                return
+            self._finished = True
+        try:
+            finish_streamed_turn(self.turn_state, self.user, self.db)
+        except Exception as e:
+            logger.error(f"Error recording streamed turn: {e}")
+        finally:
+            self.db.close()
+
+    def finish_unstarted(self):
+        if not self._started:
+            self.finish()
+
+
 def detect_intent(message: str) -> str:
     """
     Detect user intent from message
@@ -722,57 +916,60 @@ def extract_budget_from_message(message: str) -> Optional[float]:
     return None
 
 
-def detect_product_category_with_ai(search_term: str) -> Optional[str]:
+def detect_product_categories_with_ai(search_terms: List[str]) -> Dict[str, Optional[str]]:
     """
-    Use AI to determine if a search term is a valid product category
-    Returns the product category if valid, None otherwise
+    Use AI to classify several unknown search terms in a single call
+    Returns {term: product category or None if not a product}
     """
-    if not openai_client:
-        return None
+    if not llm_gateway.is_configured() or not search_terms:
+        return {}
 
     try:
-        response = openai_client.chat.completions.create(
+        response = llm_gateway.chat(
+            "assistant.category_detection",
             model="gpt-4o-mini",
             messages=[
                 {
                     "role": "system",
-                    "content": """You are a product category classifier. Determine if the given term is a searchable product/item.
+                    "content": """You are a product category classifier. For each given term, determine if it is a searchable product/item.
 
-If YES, respond with ONLY the general product category (e.g., "shoe", "laptop", "phone", "clothing", "electronics", "furniture", etc.)
-If NO (not a product), respond with "NOT_PRODUCT"
+If YES, map it to the general product category (e.g., "shoe", "laptop", "phone", "clothing", "electronics", "furniture", etc.)
+If NO (not a product), map it to "NOT_PRODUCT"
 
 Examples:
 - "sneaker" -> "shoe"
 - "hoe" -> "shoe" (user likely meant shoe)
-- "laptop" -> "laptop"
 - "macbook" -> "laptop"
 - "dress" -> "clothing"
 - "table" -> "furniture"
 - "happy" -> "NOT_PRODUCT"
 - "run" -> "NOT_PRODUCT"
 
-Be intelligent about typos and context."""
+Be intelligent about typos and context.
+Respond with ONLY a JSON object mapping every term to its category, e.g. {"sneaker": "shoe", "happy": "NOT_PRODUCT"}"""
                 },
                 {
                     "role": "user",
-                    "content": f"Is '{search_term}' a product? If yes, what category?"
+                    "content": f"Terms: {json.dumps(search_terms)}"
                 }
             ],
             temperature=0.3,
-            max_tokens=20,
-            timeout=5.0  # 5 second timeout for category detection
+            max_tokens=20 + 15 * len(search_terms),
+            response_format={"type": "json_object"}
         )
 
-        result = response.choices[0].message.content.strip().lower()
-        logger.info(f"🤖 AI category detection for '{search_term}': {result}")
+        result = json.loads(response.choices[0].message.content)
+        logger.info(f"🤖 AI category detection for {search_terms}: {result}")
 
-        if result == "not_product":
-            return None
-        return result
+        categories = {}
+        for term in search_terms:
+            category = str(result.get(term, "NOT_PRODUCT")).strip().lower()
+            categories[term] = None if category in ("not_product", "") else category
+        return categories
 
     except Exception as e:
-        logger.warning(f"AI category detection timed out or failed for '{search_term}': {e}")
-        return None  # Fail gracefully
+        logger.warning(f"AI category detection timed out or failed for {search_terms}: {e}")
+        return {}  # Fail gracefully
 
 
 def get_keywords_from_db(category: str, db: Session) -> List[str]:
@@ -802,172 +999,101 @@ def add_keyword_to_db(category: str, keyword: str, db: Session, weight: float =
 def extract_product_type_from_message(message: str, db: Session = None) -> List[str]:
     """
     Extract product types/keywords from user message
-    Now uses database + AI for dynamic expansion + fuzzy matching
+    Uses the in-memory keyword index (exact, plural and typo-tolerant matching)
+    and the local spelling corrector; only words neither of them knows go to a
+    single batched AI call
     """
-    message_lower = message.lower()
-    keywords = []
-
-    # Step 1: Check hardcoded common keywords (fast path)
-    product_terms = {
-        'shoe': ['sneaker', 'shoe', 'shoes', 'footwear', 'nike', 'adidas', 'running', 'dress shoe'],
-        'mouse': ['mouse', 'mice', 'computer mouse', 'wireless mouse'],
-        'keyboard': ['keyboard', 'mechanical keyboard'],
-        'laptop': ['laptop', 'computer', 'notebook', 'macbook', 'dell', 'hp', 'lenovo', 'thinkpad'],
-        'phone': ['phone', 'smartphone', 'mobile', 'iphone', 'samsung', 'galaxy'],
-        'headphone': ['headphone', 'earphone', 'earbud', 'airpod', 'headset'],
-        'watch': ['watch', 'smartwatch', 'wristwatch'],
-        'bag': ['bag', 'backpack', 'handbag', 'purse'],
-    }
-
-    for category, terms in product_terms.items():
-        if any(term in message_lower for term in terms):
-            if category not in keywords:
-                keywords.append(category)
-
-    # Step 2: If database available, check custom keywords
-    if db:
-        all_keywords = db.query(ProductKeyword).all()
-        for kw in all_keywords:
-            if kw.keyword.lower() in message_lower and kw.category not in keywords:
-                keywords.append(kw.category)
-                logger.info(f"📚 Found keyword from DB: {kw.keyword} -> {kw.category}")
-
-    # Step 3: Fuzzy matching - try to correct common misspellings
-    if not keywords and db:
-        corrected_terms = fuzzy_correct_search_terms(message_lower, db)
-        if corrected_terms:
-            logger.info(f"🔄 Fuzzy corrected: {message_lower} -> {corrected_terms}")
-            # Recursively check with corrected terms
-            for corrected in corrected_terms:
-                if corrected in product_terms:
-                    keywords.append(corrected)
-                # Also check database keywords
-                for kw in db.query(ProductKeyword).all():
-                    if kw.keyword.lower() == corrected and kw.category not in keywords:
-                        keywords.append(kw.category)
-
-    # Step 4: If still no keywords, try AI detection for unknown terms
-    if not keywords and db:
-        # Extract potential product words (nouns)
-        words = message_lower.split()
-        for word in words:
-            # Skip common words
-            if word in ['a', 'an', 'the', 'want', 'need', 'buy', 'get', 'find', 'show', 'me', 'looking', 'for', 'to']:
-                continue
-
-            # Try AI detection
-            category = detect_product_category_with_ai(word)
-            if category:
-                keywords.append(category)
-                # Save to database for future use
-                add_keyword_to_db(category, word, db, weight=0.8)
-                logger.info(f"🤖 AI detected new category: {word} -> {category}")
-                break  # Found one, that's enough
+    keywords, unknown_terms = product_keyword_index.keyword_index.lookup(message)
+
+    if not keywords and unknown_terms:
+        # Words more than one typo away from a keyword: try the local spelling corrector
+        corrected = spell_correction.corrector.correct_query(" ".join(unknown_terms))
+        if corrected != " ".join(unknown_terms):
+            logger.info(f"🔄 Spelling corrected: {unknown_terms} -> {corrected}")
+            keywords, unknown_terms = product_keyword_index.keyword_index.lookup(corrected)
+
+    if keywords or not unknown_terms or not db:
+        return keywords
+
+    # Fallback: classify every unknown word in one AI call
+    detected = detect_product_categories_with_ai(unknown_terms[:MAX_AI_CATEGORY_TERMS])
+    rejected = [term for term, category in detected.items() if not category]
+    if rejected:
+        product_keyword_index.keyword_index.mark_not_product(rejected)
+
+    for term, category in detected.items():
+        if category and category not in keywords:
+            keywords.append(category)
+            # Save to database for future use (the index picks it up on commit)
+            add_keyword_to_db(category, term, db, weight=0.8)
+            logger.info(f"🤖 AI detected new category: {term} -> {category}")
 
     return keywords
 
 
-def fuzzy_correct_search_terms(message: str, db: Session) -> List[str]:
-    """
-    Use AI to correct misspellings and typos in search terms
-    Returns list of corrected product categories
-    """
-    if not openai_client:
-        return []
-
-    try:
-        response = openai_client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[
-                {
-                    "role": "system",
-                    "content": """You are a search term corrector. Look for common product categories in the user's message that might have typos or misspellings.
-
-Common categories: shoe/sneaker, mouse, keyboard, laptop, phone, headphone, watch, bag, clothing, electronics, furniture
-
-If you find a likely misspelling, correct it to the proper category name.
-Return ONLY a JSON array of corrected category names, or empty array if none found.
-
-Examples:
-"i want to buy runnign shoes" -> ["shoe"]
-"looking for a keybord" -> ["keyboard"]
-"need a lap top" -> ["laptop"]
-"no corrections needed" -> []"""
-                },
-                {
-                    "role": "user",
-                    "content": f"Correct any misspellings in product categories: {message}"
-                }
-            ],
-            temperature=0.3,
-            max_tokens=50,
-            timeout=5.0
-        )
-
-        result = json.loads(response.choices[0].message.content)
-        if isinstance(result, list):
-            return result
-        return []
-
-    except Exception as e:
-        logger.warning(f"Fuzzy correction failed: {e}")
-        return []
-
-
+@tracing.traced("ai.find_mentioned_entities")
 def find_mentioned_entities(message: str, db: Session) -> Dict[str, Any]:
     """
-    Search database for any entities mentioned by name in the message
-    Returns matching guilds, projects, products, users
+    Find entities mentioned by name in the message using the in-memory entity index
+    Returns matching guilds, projects, products, users (with match spans)
     """
     mentioned = {"guilds": [], "projects": [], "products": [], "users": []}
-    message_lower = message.lower()
 
-    # Search for guilds by name
-    guilds = db.query(Guild).all()
-    for guild in guilds:
-        if guild.name and guild.name.lower() in message_lower:
+    matches = entity_matcher.entity_index.match(message)
+    if not matches:
+        return mentioned
+
+    spans = {(m["type"], m["id"]): {"start": m["start"], "end": m["end"]} for m in matches}
+    ids_by_type = {}
+    for m in matches:
+        ids_by_type.setdefault(m["type"], []).append(m["id"])
+
+    # Hydrate only the matched rows (primary-key lookups, never a table scan)
+    if ids_by_type.get("guild"):
+        for guild in db.query(Guild).filter(Guild.id.in_(ids_by_type["guild"])).all():
             mentioned["guilds"].append({
                 "id": guild.id,
                 "name": guild.name,
                 "description": guild.description[:200] if guild.description else "",
                 "member_count": guild.member_count or 0,
-                "category": guild.category or "General"
+                "category": guild.category or "General",
+                "match": spans[("guild", guild.id)]
             })
 
-    # Search for projects by name/title
-    projects = db.query(Project).all()
-    for project in projects:
-        if project.title and project.title.lower() in message_lower:
+    if ids_by_type.get("project"):
+        for project in db.query(Project).filter(Project.id.in_(ids_by_type["project"])).all():
             mentioned["projects"].append({
                 "id": project.id,
                 "title": project.title,
                 "description": project.description[:200] if project.description else "",
                 "budget": float(project.budget) if project.budget else 0,
-                "status": project.status or "active"
+                "status": project.status or "active",
+                "match": spans[("project", project.id)]
             })
 
-    # Search for products by name
-    products = db.query(Product).filter(Product.is_active == True).all()
-    for product in products:
-        if product.name and product.name.lower() in message_lower:
+    if ids_by_type.get("product"):
+        products = db.query(Product).filter(
+            Product.id.in_(ids_by_type["product"]),
+            Product.is_active == True
+        ).all()
+        for product in products:
             mentioned["products"].append({
                 "id": product.id,
                 "name": product.name,
                 "description": product.description[:200] if product.description else "",
                 "price": float(product.price) if product.price else 0,
-                "image": product.image_url
+                "image": product.image_url,
+                "match": spans[("product", product.id)]
             })
 
-    # Search for users by name
-    users = db.query(User).all()
-    for u in users:
-        full_name = f"{u.first_name} {u.last_name}".lower() if u.first_name and u.last_name else ""
-        if full_name and full_name in message_lower:
+    if ids_by_type.get("user"):
+        for u in db.query(User).filter(User.id.in_(ids_by_type["user"])).all():
             mentioned["users"].append({
                 "id": u.id,
                 "name": f"{u.first_name} {u.last_name}",
                 "email": u.email,
-                "avatar": u.avatar_url
+                "avatar": u.avatar_url,
+                "match": spans[("user", u.id)]
             })
 
     return mentioned
@@ -1276,9 +1402,10 @@ def gather_context(
 
         elif intent == "general_search":
             # Do a broad search across all types with enhanced limits
-            projects = qdrant_service.semantic_search_projects(message, limit=5, score_threshold=0.5)
-            guilds = qdrant_service.semantic_search_guilds(message, limit=5, score_threshold=0.5)
-            products = qdrant_service.semantic_search_products(message, limit=5, score_threshold=0.5)
+            # (the three vector searches run concurrently with the database queries below)
+            project_search = _submit_stage("vector_search", qdrant_service.semantic_search_projects, message, 5, 0.5)
+            guild_search = _submit_stage("vector_search", qdrant_service.semantic_search_guilds, message, 5, 0.5)
+            product_search = _submit_stage("vector_search", qdrant_service.semantic_search_products, message, 5, 0.5)
 
             # Also search users and tasks
             users_results = search_users(message, db, limit=5)
@@ -1287,6 +1414,10 @@ def gather_context(
             # Get platform stats for overview
             platform_stats = get_platform_stats(db)
 
+            projects = project_search.result()
+            guilds = guild_search.result()
+            products = product_search.result()
+
             if projects:
                 context["projects"] = [{"title": p["title"], "description": p["description"][:200], "id": p.get("project_id", p.get("id"))} for p in projects]
             if guilds:
@@ -1484,6 +1615,7 @@ def analyze_user_query(
         }
 
 
+@coalesce("assistant.platform_stats")
 def get_platform_stats(db: Session) -> Dict[str, Any]:
     """
     Get comprehensive platform statistics
@@ -1566,11 +1698,12 @@ def extract_shopping_list_items(message: str, db: Session) -> List[Dict[str, Any
     Extract shopping list items from user message
     Returns list of items with quantities and product types
     """
-    if not openai_client:
+    if not llm_gateway.is_configured():
         return []
 
     try:
-        response = openai_client.chat.completions.create(
+        response = llm_gateway.chat(
+            "assistant.shopping_list",
             model="gpt-4o-mini",
             messages=[
                 {
@@ -1595,8 +1728,7 @@ Only extract actual products/items, ignore other text."""
                 }
             ],
             temperature=0.3,
-            max_tokens=200,
-            timeout=8.0
+            max_tokens=200
         )
 
         result = json.loads(response.choices[0].message.content)
@@ -1620,32 +1752,30 @@ def get_or_create_session_id(user: Optional[User] = None) -> str:
     return str(uuid.uuid4())
 
 
+@tracing.traced("ai.save_conversation")
 def save_conversation(
     session_id: str,
     user_message: str,
     ai_response: str,
     intent: str,
     user: Optional[User],
-    db: Session
+    db: Session,
+    tokens_used: int = 0,
+    commit: bool = True
 ):
-    """Save conversation to database for memory with token tracking"""
+    """
+    Save conversation to database for memory with token tracking.
+    tokens_used is the provider-reported usage of the completion (0 if the
+    answer didn't need one). commit=False adds the row to the caller's
+    transaction instead (errors propagate, quota is charged once it commits).
+    """
     try:
         # Get previous session total for running count
-        last_conv = db.query(AIConversation).filter(
+        last_total = db.query(AIConversation.session_total_tokens).filter(
             AIConversation.session_id == session_id
         ).order_by(AIConversation.created_at.desc()).first()
 
-        session_total = last_conv.session_total_tokens if last_conv else 0
-
-        # Update usage and get token count
-        tokens_used = ai_token_manager.update_usage(
-            user=user,
-            session_id=session_id,
-            user_message=user_message,
-            ai_response=ai_response,
-            session_total_tokens=session_total,
-            db=db
-        )
+        session_total = (last_total[0] or 0) if last_total else 0
 
         # Save conversation with token info
         conversation = AIConversation(
@@ -1657,12 +1787,22 @@ def save_conversation(
             context_summary=None,  # Will be filled by summarization if needed
             tokens_used=tokens_used,
             session_total_tokens=session_total + tokens_used,
+            usage_flushed=user is None,  # Nothing to charge for anonymous users
             last_activity_at=datetime.utcnow()
         )
         db.add(conversation)
+        if not commit:
+            db.flush()
+            ai_token_manager.record_usage_on_commit(db, user, tokens_used, conversation.id)
+            return
         db.commit()
+
+        # Quota is charged write-behind; the row above is the durable record
+        ai_token_manager.record_usage(user, tokens_used, conversation.id)
         logger.info(f"💾 Saved conversation for session: {session_id[:8]}... ({tokens_used} tokens, {session_total + tokens_used} total)")
     except Exception as e:
+        if not commit:
+            raise
         logger.error(f"Error saving conversation: {e}")
         db.rollback()
 
@@ -1684,171 +1824,45 @@ def get_conversation_history(
         return []
 
 
-def summarize_long_context(conversations: List[AIConversation]) -> str:
-    """
-    Enhanced summarization of long conversation history into compact context
-    Uses AI to create detailed summary of previous conversations with better context retention
-    """
-    if not openai_client or not conversations:
-        return ""
-
-    try:
-        # Build conversation text with more context (last 15 messages)
-        conv_text = "\n".join([
-            f"User: {conv.user_message}\nAI: {conv.ai_response}\nIntent: {conv.intent}"
-            for conv in conversations[-15:]  # Last 15 messages for better context
-        ])
-
-        # Enhanced summarization prompt for better context retention
-        system_prompt = """You are an expert conversation summarizer for an AI assistant on a marketplace platform.
-
-Analyze this conversation history and create a comprehensive summary that captures:
-
-1. **User's main interests/goals**: What are they trying to accomplish? (shopping, freelancing, guild joining, etc.)
-2. **Key preferences**: Budget ranges, preferred categories, skill interests, location preferences
-3. **Ongoing tasks**: Any incomplete actions or pending decisions
-4. **Platform familiarity**: How well they know the platform features
-5. **Previous recommendations**: What was suggested and their responses
-6. **Negotiation context**: Any ongoing project discussions or agreements
-7. **Shopping cart state**: Any items added to cart or shopping intentions
-
-Format as a structured summary with clear sections. Keep it concise but comprehensive.
-Focus on actionable information that would help continue the conversation naturally."""
-
-        # Ask AI to create enhanced summary
-        response = openai_client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[
-                {
-                    "role": "system",
-                    "content": system_prompt
-                },
-                {
-                    "role": "user",
-                    "content": f"Conversation History:\n{conv_text}\n\nCreate a comprehensive summary focusing on user goals, preferences, and ongoing context."
-                }
-            ],
-            temperature=0.2,  # Lower temperature for more consistent summaries
-            max_tokens=300,  # Increased for more detailed summaries
-            timeout=10.0  # Longer timeout for better processing
-        )
-
-        summary = response.choices[0].message.content.strip()
-        logger.info(f"📝 Enhanced context summary created: {summary[:100]}...")
-
-        # Validate summary quality - ensure it's not too short or generic
-        if len(summary) < 50 or "conversation" in summary.lower() and len(summary.split()) < 20:
-            logger.warning("Summary too generic, falling back to basic summary")
-            # Fallback to simpler summary
-            summary = f"Previous conversation involved: {', '.join(set(conv.intent for conv in conversations[-5:] if conv.intent != 'general_question'))}"
-
-        return summary
-
-    except Exception as e:
-        logger.warning(f"Failed to create enhanced summary: {e}")
-        # Fallback to basic summary
-        try:
-            intents = [conv.intent for conv in conversations[-5:] if conv.intent]
-            if intents:
-                return f"Recent conversation topics: {', '.join(set(intents))}"
-        except:
-            pass
-        return ""
-
-
 def build_conversation_context(
     session_id: str,
     db: Session,
-    max_messages: int = 8
+    max_messages: int = 25
 ) -> Dict[str, Any]:
     """
-    Enhanced conversation context building with better long-term memory retention
-    Includes intelligent summarization and context prioritization
+    Conversation memory for the next prompt
+    Older turns come from the session's stored rolling summary (see
+    conversation_summary); turns after its watermark are returned verbatim.
+    Nothing is truncated here: context_packer decides how many turns fit the
+    intent's token budget, newest first.
     """
-    history = get_conversation_history(session_id, db, limit=25)  # Get more history for better context
+    history = get_conversation_history(session_id, db, limit=max_messages)
 
     if not history:
         return {"recent_messages": [], "summary": ""}
 
-    # Calculate total conversation length
-    total_length = sum(len(conv.user_message + conv.ai_response) for conv in history)
-
-    # For short conversations, include all messages with enhanced formatting
-    if total_length < 3000 and len(history) <= 12:
-        recent_messages = []
-        for conv in history:
-            recent_messages.extend([
-                {"role": "user", "content": f"{conv.user_message} [Intent: {conv.intent}]"},
-                {"role": "assistant", "content": conv.ai_response}
-            ])
-        return {
-            "recent_messages": recent_messages,
-            "summary": "",
-            "total_messages": len(history)
-        }
-
-    # For longer conversations, use intelligent context management
-    try:
-        # Get recent messages with enhanced metadata
-        recent = history[-max_messages:]
-        recent_messages = []
-
-        for conv in recent:
-            # Include intent and context for better AI understanding
-            user_content = conv.user_message
-            if conv.intent and conv.intent != "general_question":
-                user_content += f" [Context: {conv.intent}]"
-
-            recent_messages.extend([
-                {"role": "user", "content": user_content},
-                {"role": "assistant", "content": conv.ai_response}
-            ])
-
-        # Create comprehensive summary of older conversations
-        summary = ""
-        if len(history) > max_messages:
-            older = history[:-max_messages]
-            summary = summarize_long_context(older)
-
-        # Ensure context doesn't exceed token limits (rough estimate: 4 chars per token)
-        total_context_length = sum(len(str(msg["content"])) for msg in recent_messages)
-        if summary:
-            total_context_length += len(summary)
-
-        if total_context_length > 3000:
-            # Truncate older messages while keeping summary and recent messages
-            logger.info(f"Truncating context to fit token limit: {total_context_length} -> 3000")
-            # Keep summary and last 6 exchanges (12 messages)
-            if summary:
-                truncated_messages = [{"role": "system", "content": f"📝 CONVERSATION SUMMARY:\n{summary}\n\n💡 Continue naturally from this context."}]
-                truncated_messages.extend(recent_messages[-12:])  # Keep last 6 exchanges
-                recent_messages = truncated_messages
-            else:
-                recent_messages = recent_messages[-12:]  # Keep last 6 exchanges
+    stored_summary = conversation_summary.get_summary(session_id, db)
+    watermark = stored_summary.summarized_through_id if stored_summary is not None else 0
+    recent = [conv for conv in history if conv.id > watermark] or history[-conversation_summary.KEEP_RECENT_TURNS:]
 
-        logger.info(f"🧠 Built enhanced conversation context: {len(recent_messages)} messages, {len(history)} total")
-        return {
-            "recent_messages": recent_messages,
-            "summary": summary,
-            "total_messages": len(history)
-        }
+    recent_messages = []
+    for conv in recent:
+        # Include intent and context for better AI understanding
+        user_content = conv.user_message
+        if conv.intent and conv.intent != "general_question":
+            user_content += f" [Context: {conv.intent}]"
 
-    except Exception as e:
-        logger.warning(f"Error building enhanced context: {e}")
-        # Fallback to simple recent context
-        recent = history[-5:]
-        recent_messages = [
-            {"role": "user", "content": conv.user_message}
-            for conv in recent
-        ] + [
+        recent_messages.extend([
+            {"role": "user", "content": user_content},
             {"role": "assistant", "content": conv.ai_response}
-            for conv in recent
-        ]
-        return {
-            "recent_messages": recent_messages,
-            "summary": "",
-            "total_messages": len(history)
-        }
+        ])
+
+    logger.info(f"🧠 Built conversation context: {len(recent)} turns after summary, {len(history)} total")
+    return {
+        "recent_messages": recent_messages,
+        "summary": stored_summary.summary if stored_summary is not None else "",
+        "total_messages": len(history)
+    }
 
 
 def cleanup_old_conversations(db: Session, days_old: int = 30):
@@ -1858,6 +1872,11 @@ def cleanup_old_conversations(db: Session, days_old: int = 30):
         deleted = db.query(AIConversation).filter(
             AIConversation.created_at < cutoff_date
         ).delete()
+        # Summaries go once none of their session's turns are left
+        db.query(AIConversationSummary).filter(
+            AIConversationSummary.updated_at < cutoff_date,
+            ~exists().where(AIConversation.session_id == AIConversationSummary.session_id)
+        ).delete(synchronize_session=False)
         db.commit()
         logger.info(f"🧹 Cleaned up {deleted} old conversations")
     except Exception as e:
@@ -1870,11 +1889,12 @@ def detect_negotiation_end(conversation_text: str) -> bool:
     Use AI to detect if a project negotiation has reached completion
     Returns True if negotiation appears to be finished
     """
-    if not openai_client:
+    if not llm_gateway.is_configured():
         return False
 
     try:
-        response = openai_client.chat.completions.create(
+        response = llm_gateway.chat(
+            "assistant.negotiation",
             model="gpt-4o-mini",
             messages=[
                 {
@@ -1905,8 +1925,7 @@ Examples of ongoing negotiations:
                 }
             ],
             temperature=0.2,
-            max_tokens=10,
-            timeout=5.0
+            max_tokens=10
         )
 
         result = response.choices[0].message.content.strip().lower()
@@ -5,24 +5,20 @@ Uses embeddings and user behavior to recommend relevant content
 
 from typing import List, Dict, Any, Optional
 from sqlalchemy.orm import Session
-from openai import OpenAI
-import os
 import logging
 
 from database import User, Project, Guild, Product
 import qdrant_service
+import llm_gateway
+from single_flight import coalesce
 
 logger = logging.getLogger(__name__)
 
-# Initialize OpenAI client
-openai_client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-
-
 def generate_user_profile_embedding(user: User, db: Session) -> Optional[List[float]]:
     """
     Generate an embedding representing a user's interests and profile
     """
-    if not qdrant_service.openai_client:
+    if not llm_gateway.is_configured():
         return None
 
     # Collect user's profile information
@@ -60,6 +56,7 @@ def generate_user_profile_embedding(user: User, db: Session) -> Optional[List[fl
         return None
 
 
+@coalesce("recommendations.projects_for_user")
 def recommend_projects_for_user(
     user: User,
     db: Session,
@@ -69,7 +66,7 @@ def recommend_projects_for_user(
     """
     Recommend projects based on user's profile and interests
     """
-    if not qdrant_service.qdrant_client or not qdrant_service.openai_client:
+    if not qdrant_service.http_client or not llm_gateway.is_configured():
         logger.warning("Recommendations not available. Qdrant or OpenAI not configured.")
         return []
 
@@ -80,9 +77,9 @@ def recommend_projects_for_user(
             return []
 
         # Search for similar projects in Qdrant
-        results = qdrant_service.qdrant_client.search(
-            collection_name=qdrant_service.PROJECTS_COLLECTION,
-            query_vector=user_embedding,
+        results = qdrant_service.search_points(
+            qdrant_service.PROJECTS_COLLECTION,
+            vector=user_embedding,
             limit=limit * 2,  # Get more to filter out user's own projects
             score_threshold=0.6
         )
@@ -90,10 +87,10 @@ def recommend_projects_for_user(
         # Format and filter results
         recommendations = []
         for result in results:
-            project_id = result.payload.get("project_id")
+            project_id = result["payload"].get("project_id")
 
             # Skip user's own projects if requested
-            if exclude_own and result.payload.get("owner_id") == user.id:
+            if exclude_own and result["payload"].get("owner_id") == user.id:
                 continue
 
             # Get full project details from database
@@ -101,9 +98,9 @@ def recommend_projects_for_user(
             if project:
                 recommendations.append({
                     "project_id": project_id,
-                    "title": result.payload.get("title"),
-                    "description": result.payload.get("description"),
-                    "score": result.score,
+                    "title": result["payload"].get("title"),
+                    "description": result["payload"].get("description"),
+                    "score": result["score"],
                     "reason": "Based on your interests and profile",
                     "project": {
                         "id": project.id,
@@ -128,6 +125,7 @@ def recommend_projects_for_user(
         return []
 
 
+@coalesce("recommendations.similar_projects")
 def recommend_similar_projects(
     project_id: int,
     db: Session,
@@ -136,7 +134,7 @@ def recommend_similar_projects(
     """
     Find projects similar to a given project
     """
-    if not qdrant_service.qdrant_client:
+    if not qdrant_service.http_client:
         return []
 
     try:
@@ -152,9 +150,9 @@ def recommend_similar_projects(
             return []
 
         # Search for similar projects
-        results = qdrant_service.qdrant_client.search(
-            collection_name=qdrant_service.PROJECTS_COLLECTION,
-            query_vector=embedding,
+        results = qdrant_service.search_points(
+            qdrant_service.PROJECTS_COLLECTION,
+            vector=embedding,
             limit=limit + 1,  # +1 to exclude the project itself
             score_threshold=0.7
         )
@@ -162,7 +160,7 @@ def recommend_similar_projects(
         # Format results, excluding the original project
         similar_projects = []
         for result in results:
-            result_project_id = result.payload.get("project_id")
+            result_project_id = result["payload"].get("project_id")
 
             # Skip the original project
             if result_project_id == project_id:
@@ -173,9 +171,9 @@ def recommend_similar_projects(
             if similar_project:
                 similar_projects.append({
                     "project_id": result_project_id,
-                    "title": result.payload.get("title"),
-                    "description": result.payload.get("description"),
-                    "score": result.score,
+                    "title": result["payload"].get("title"),
+                    "description": result["payload"].get("description"),
+                    "score": result["score"],
                     "project": {
                         "id": similar_project.id,
                         "title": similar_project.title,
@@ -198,6 +196,7 @@ def recommend_similar_projects(
         return []
 
 
+@coalesce("recommendations.guilds_for_user")
 def recommend_guilds_for_user(
     user: User,
     db: Session,
@@ -206,7 +205,7 @@ def recommend_guilds_for_user(
     """
     Recommend guilds/communities based on user's interests
     """
-    if not qdrant_service.qdrant_client or not qdrant_service.openai_client:
+    if not qdrant_service.http_client or not llm_gateway.is_configured():
         return []
 
     try:
@@ -216,9 +215,9 @@ def recommend_guilds_for_user(
             return []
 
         # Search for relevant guilds
-        results = qdrant_service.qdrant_client.search(
-            collection_name=qdrant_service.GUILDS_COLLECTION,
-            query_vector=user_embedding,
+        results = qdrant_service.search_points(
+            qdrant_service.GUILDS_COLLECTION,
+            vector=user_embedding,
             limit=limit,
             score_threshold=0.6
         )
@@ -226,15 +225,15 @@ def recommend_guilds_for_user(
         # Format results
         recommendations = []
         for result in results:
-            guild_id = result.payload.get("guild_id")
+            guild_id = result["payload"].get("guild_id")
             guild = db.query(Guild).filter(Guild.id == guild_id).first()
 
             if guild:
                 recommendations.append({
                     "guild_id": guild_id,
-                    "name": result.payload.get("name"),
-                    "description": result.payload.get("description"),
-                    "score": result.score,
+                    "name": result["payload"].get("name"),
+                    "description": result["payload"].get("description"),
+                    "score": result["score"],
                     "reason": "Matches your interests",
                     "guild": {
                         "id": guild.id,
@@ -252,6 +251,7 @@ def recommend_guilds_for_user(
         return []
 
 
+@coalesce("recommendations.products_for_project")
 def recommend_products_for_project(
     project: Project,
     db: Session,
@@ -260,7 +260,7 @@ def recommend_products_for_project(
     """
     Recommend products/tools that might be useful for a project
     """
-    if not qdrant_service.qdrant_client:
+    if not qdrant_service.http_client:
         return []
 
     try:
@@ -271,9 +271,9 @@ def recommend_products_for_project(
             return []
 
         # Search for relevant products
-        results = qdrant_service.qdrant_client.search(
-            collection_name=qdrant_service.PRODUCTS_COLLECTION,
-            query_vector=embedding,
+        results = qdrant_service.search_points(
+            qdrant_service.PRODUCTS_COLLECTION,
+            vector=embedding,
             limit=limit,
             score_threshold=0.6
         )
@@ -281,15 +281,15 @@ def recommend_products_for_project(
         # Format results
         recommendations = []
         for result in results:
-            product_id = result.payload.get("product_id")
+            product_id = result["payload"].get("product_id")
             product = db.query(Product).filter(Product.id == product_id).first()
 
             if product:
                 recommendations.append({
                     "product_id": product_id,
-                    "name": result.payload.get("name"),
-                    "description": result.payload.get("description"),
-                    "score": result.score,
+                    "name": result["payload"].get("name"),
+                    "description": result["payload"].get("description"),
+                    "score": result["score"],
                     "reason": "Relevant to your project",
                     "product": {
                         "id": product.id,
@@ -309,6 +309,7 @@ def recommend_products_for_project(
         return []
 
 
+@coalesce("recommendations.trending_projects")
 def get_trending_projects(
     db: Session,
     user: Optional[User] = None,
@@ -324,7 +325,7 @@ def get_trending_projects(
             Project.created_at.desc()
         ).limit(limit * 2).all()
 
-        if not user or not qdrant_service.openai_client:
+        if not user or not llm_gateway.is_configured():
             # Return without personalization
             return [
                 {
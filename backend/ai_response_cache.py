@@ -0,0 +1,346 @@
+"""
+AI Response Cache
+Two-tier cache for Ava's answers to repeated, non-personalized questions
+
+Tier 1 is an exact hash of (normalized message, intent, mentioned entities,
+context version). Tier 2 compares the query embedding against cached queries
+in the same bucket and serves an answer when cosine similarity is at least
+AI_CACHE_SIMILARITY_THRESHOLD.
+
+The context version is built from change_tracker stamps of the tables an
+intent reads, so a committed product/guild/project change makes every answer
+that depended on it unreachable. Version stamps are per process, so every
+entry also has a TTL, and semantic hits must contain the same numbers as the
+query ("under 50k" never answers "under 80k").
+"""
+
+from typing import List, Dict, Any, Optional, Tuple
+from collections import OrderedDict
+from dataclasses import dataclass, field
+import os
+import re
+import time
+import hashlib
+import threading
+import logging
+
+import numpy as np
+
+import change_tracker
+
+logger = logging.getLogger(__name__)
+
+AI_CACHE_ENABLED = os.getenv("AI_CACHE_ENABLED", "true").lower() == "true"
+AI_CACHE_TTL_SECONDS = int(os.getenv("AI_CACHE_TTL_SECONDS", "900"))
+AI_CACHE_SIMILARITY_THRESHOLD = float(os.getenv("AI_CACHE_SIMILARITY_THRESHOLD", "0.95"))
+AI_CACHE_MAX_ENTRIES = int(os.getenv("AI_CACHE_MAX_ENTRIES", "2000"))
+
+# Tables whose contents each cacheable intent's answer depends on.
+# Intents missing from this map are never cached. general_search is left out on
+# purpose: its context carries other users' profiles and live platform stats,
+# and users rows change too often (quota writes) to be a useful dependency.
+INTENT_DEPENDENCIES: Dict[str, Tuple[str, ...]] = {
+    "search_products": ("products", "product_keywords"),
+    "search_products_budget": ("products", "product_keywords"),
+    "suggest_selling": ("products",),
+    "search_guilds": ("guilds",),
+    "suggest_guilds": ("guilds",),
+    "search_projects": ("projects",),
+    "get_platform_stats": (),
+    "help": (),
+    "create": (),
+    "general_question": (),
+}
+
+# Answers built from live counters go stale faster than the default TTL
+INTENT_TTL_SECONDS = {
+    "get_platform_stats": 60,
+}
+
+# Intents that depend on earlier turns when the user is mid-conversation
+CONVERSATIONAL_INTENTS = {"general_question"}
+
+# Tables the entity index can match names from
+_MENTION_TABLES = {"guild": "guilds", "project": "projects", "product": "products"}
+
+_NUMBER_RE = re.compile(r"\d+(?:[.,]\d+)*\s*k?")
+_PUNCT_RE = re.compile(r"[^\w\s$]")
+
+
+def normalize_message(message: str) -> str:
+    """Lowercase, drop punctuation and collapse whitespace"""
+    return " ".join(_PUNCT_RE.sub(" ", message.lower()).split())
+
+
+def _numbers(text: str) -> Tuple[str, ...]:
+    return tuple(n.replace(" ", "").replace(",", "") for n in _NUMBER_RE.findall(text))
+
+
+@dataclass
+class CacheEntry:
+    key: str
+    bucket: str
+    normalized: str
+    numbers: Tuple[str, ...]
+    response: Dict[str, Any]
+    tokens: int
+    created_at: float
+    ttl: int
+    embedding: Optional[np.ndarray] = None
+    hits: int = 0
+
+
+@dataclass
+class CacheStats:
+    lookups: int = 0
+    exact_hits: int = 0
+    semantic_hits: int = 0
+    misses: int = 0
+    bypassed: int = 0
+    stores: int = 0
+    stale_evictions: int = 0
+    number_guard_rejections: int = 0
+    embedding_calls: int = 0
+    tokens_saved: int = 0
+    by_intent: Dict[str, Dict[str, int]] = field(default_factory=dict)
+
+
+class ResponseCache:
+    """Thread-safe LRU of cached assistant responses"""
+
+    def __init__(self, max_entries: int = AI_CACHE_MAX_ENTRIES,
+                 similarity_threshold: float = AI_CACHE_SIMILARITY_THRESHOLD,
+                 ttl_seconds: int = AI_CACHE_TTL_SECONDS,
+                 embed=None):
+        self.max_entries = max_entries
+        self.similarity_threshold = similarity_threshold
+        self.ttl_seconds = ttl_seconds
+        self._embed = embed
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, CacheEntry]" = OrderedDict()
+        self._buckets: Dict[str, List[str]] = {}
+        self.stats = CacheStats()
+
+    # ------------------------------------------------------------------
+    # Keys
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def is_cacheable(intent: str, mentions: List[Dict[str, Any]], has_history: bool) -> bool:
+        if intent not in INTENT_DEPENDENCIES:
+            return False
+        # Answers about a specific person are personal data; don't share them
+        if any(m["type"] == "user" for m in mentions):
+            return False
+        if has_history and intent in CONVERSATIONAL_INTENTS:
+            return False
+        return True
+
+    @staticmethod
+    def bucket_key(intent: str, mentions: List[Dict[str, Any]]) -> str:
+        mentioned = sorted({(m["type"], m["id"]) for m in mentions})
+        tables = set(INTENT_DEPENDENCIES.get(intent, ()))
+        tables.update(_MENTION_TABLES[kind] for kind, _ in mentioned if kind in _MENTION_TABLES)
+        versions = [(table, change_tracker.get_version(table)) for table in sorted(tables)]
+        return f"{intent}|{mentioned}|{versions}"
+
+    @staticmethod
+    def _exact_key(bucket: str, normalized: str) -> str:
+        return hashlib.sha256(f"{bucket}|{normalized}".encode()).hexdigest()
+
+    # ------------------------------------------------------------------
+    # Lookup / store
+    # ------------------------------------------------------------------
+
+    def _embedding(self, normalized: str) -> Optional[np.ndarray]:
+        if self._embed is None:
+            return None
+        self.stats.embedding_calls += 1
+        try:
+            vector = self._embed(normalized)
+        except Exception as e:
+            logger.warning(f"Cache embedding failed: {e}")
+            return None
+        if not vector:
+            return None
+        vector = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else None
+
+    def _is_stale(self, entry: CacheEntry, now: float) -> bool:
+        return now - entry.created_at > entry.ttl
+
+    def _drop(self, key: str):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        members = self._buckets.get(entry.bucket)
+        if members is not None:
+            try:
+                members.remove(key)
+            except ValueError:
+                pass
+            if not members:
+                del self._buckets[entry.bucket]
+
+    def _count(self, intent: str, outcome: str):
+        counts = self.stats.by_intent.setdefault(intent, {})
+        counts[outcome] = counts.get(outcome, 0) + 1
+
+    def lookup(self, message: str, intent: str, mentions: List[Dict[str, Any]],
+               has_history: bool = False) -> Tuple[Optional[Dict[str, Any]], Dict[str, Any]]:
+        """
+        Look up a cached response.
+        Returns (response or None, lookup state to pass back to store()).
+        """
+        state = {"cacheable": False}
+        if not AI_CACHE_ENABLED or not self.is_cacheable(intent, mentions, has_history):
+            with self._lock:
+                self.stats.bypassed += 1
+            return None, state
+
+        normalized = normalize_message(message)
+        bucket = self.bucket_key(intent, mentions)
+        key = self._exact_key(bucket, normalized)
+        state = {"cacheable": True, "intent": intent, "normalized": normalized, "bucket": bucket, "key": key,
+                 "has_history": has_history}
+        now = time.time()
+
+        with self._lock:
+            self.stats.lookups += 1
+            entry = self._entries.get(key)
+            if entry and self._is_stale(entry, now):
+                self._drop(key)
+                self.stats.stale_evictions += 1
+                entry = None
+            if entry:
+                return self._hit(entry, "exact_hits", intent), state
+            has_candidates = bool(self._buckets.get(bucket))
+
+        # Tier 2: embed outside the lock (network call), then compare
+        embedding = self._embedding(normalized) if has_candidates else None
+        state["embedding"] = embedding
+
+        if embedding is not None:
+            numbers = _numbers(normalized)
+            with self._lock:
+                candidates = [self._entries[k] for k in self._buckets.get(bucket, ()) if k in self._entries]
+                candidates = [c for c in candidates if c.embedding is not None]
+                if candidates:
+                    matrix = np.stack([c.embedding for c in candidates])
+                    scores = matrix @ embedding
+                    for index in np.argsort(-scores):
+                        if scores[index] < self.similarity_threshold:
+                            break
+                        candidate = candidates[index]
+                        if self._is_stale(candidate, now):
+                            self._drop(candidate.key)
+                            self.stats.stale_evictions += 1
+                            continue
+                        if candidate.numbers != numbers:
+                            self.stats.number_guard_rejections += 1
+                            continue
+                        return self._hit(candidate, "semantic_hits", intent, float(scores[index])), state
+
+        with self._lock:
+            self.stats.misses += 1
+            self._count(intent, "misses")
+        return None, state
+
+    def _hit(self, entry: CacheEntry, tier: str, intent: str, score: float = 1.0) -> Dict[str, Any]:
+        """Record a hit (lock held) and return a copy of the cached response"""
+        self._entries.move_to_end(entry.key)
+        entry.hits += 1
+        setattr(self.stats, tier, getattr(self.stats, tier) + 1)
+        self.stats.tokens_saved += entry.tokens
+        self._count(intent, tier)
+        response = dict(entry.response)
+        response["cached"] = {
+            "tier": tier[:-len("_hits")],
+            "similarity": round(score, 4),
+            "age_seconds": int(time.time() - entry.created_at),
+        }
+        return response
+
+    def store(self, state: Dict[str, Any], response: Dict[str, Any], tokens: int):
+        """
+        Cache a freshly generated response for a lookup that missed.
+        Answers generated with earlier turns in the prompt may echo them, so
+        only first-turn answers are shared.
+        """
+        if not state.get("cacheable") or state.get("has_history"):
+            return
+
+        intent = state["intent"]
+        entry = CacheEntry(
+            key=state["key"],
+            bucket=state["bucket"],
+            normalized=state["normalized"],
+            numbers=_numbers(state["normalized"]),
+            response={k: v for k, v in response.items() if k != "session_id"},
+            tokens=tokens,
+            created_at=time.time(),
+            ttl=min(self.ttl_seconds, INTENT_TTL_SECONDS.get(intent, self.ttl_seconds)),
+            embedding=state.get("embedding"),
+        )
+        with self._lock:
+            self._drop(entry.key)
+            self._entries[entry.key] = entry
+            self._buckets.setdefault(entry.bucket, []).append(entry.key)
+            self.stats.stores += 1
+            while len(self._entries) > self.max_entries:
+                self._drop(next(iter(self._entries)))
+
+        # The exact tier works right away; embed in the background so the
+        # response isn't held up by a second network call
+        if entry.embedding is None and self._embed is not None:
+            threading.Thread(target=self._attach_embedding, args=(entry,), daemon=True).start()
+
+    def _attach_embedding(self, entry: CacheEntry):
+        embedding = self._embedding(entry.normalized)
+        if embedding is not None:
+            with self._lock:
+                entry.embedding = embedding
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._buckets.clear()
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = self.stats
+            hits = stats.exact_hits + stats.semantic_hits
+            now = time.time()
+            ages = [now - e.created_at for e in self._entries.values()]
+            return {
+                "enabled": AI_CACHE_ENABLED,
+                "entries": len(self._entries),
+                "buckets": len(self._buckets),
+                "lookups": stats.lookups,
+                "exact_hits": stats.exact_hits,
+                "semantic_hits": stats.semantic_hits,
+                "misses": stats.misses,
+                "bypassed": stats.bypassed,
+                "hit_rate": round(hits / stats.lookups, 4) if stats.lookups else 0.0,
+                "stores": stats.stores,
+                "tokens_saved": stats.tokens_saved,
+                "embedding_calls": stats.embedding_calls,
+                "staleness": {
+                    "ttl_seconds": self.ttl_seconds,
+                    "stale_evictions": stats.stale_evictions,
+                    "number_guard_rejections": stats.number_guard_rejections,
+                    "oldest_entry_seconds": int(max(ages)) if ages else 0,
+                },
+                "similarity_threshold": self.similarity_threshold,
+                "by_intent": {intent: dict(counts) for intent, counts in stats.by_intent.items()},
+            }
+
+
+def _embed_with_qdrant_service(text: str) -> Optional[List[float]]:
+    # Imported lazily: qdrant_service initializes its OpenAI client at startup
+    import qdrant_service
+    return qdrant_service.get_embedding(text)
+
+
+response_cache = ResponseCache(embed=_embed_with_qdrant_service)
@@ -1,19 +1,42 @@
 """
 AI Token Management & Usage Tracking
 Handles token counting, quota enforcement, and session management
+
+Monthly usage is charged from the provider-reported `usage` of each
+completion. Charges go into an in-memory UsageLedger and reach
+users.ai_tokens_used / ai_requests_used in periodic batched flushes, so the
+AI request path never commits to the User row. Admission reads the stored
+counters plus this worker's unflushed deltas.
+
+Every charge is also on its AIConversation row (tokens_used, with
+usage_flushed=False until the flush that counts it). reconcile_usage()
+replays rows a crashed worker never flushed.
+
+Callers that record the row inside a larger transaction (job handlers) use
+record_usage_on_commit(): the charge reaches the ledger only once that
+transaction commits, so a rolled-back attempt is never billed.
 """
 
 import tiktoken
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List
+from dataclasses import dataclass, field
+from sqlalchemy import event, update, func, bindparam, or_
 from sqlalchemy.orm import Session
 from datetime import datetime, timedelta
+import os
+import threading
 import logging
 
-from database import User, AIConversation
+from database import User, AIConversation, SessionLocal
 from ai_subscription_routes import TIER_LIMITS
 
 logger = logging.getLogger(__name__)
 
+AI_USAGE_FLUSH_SECONDS = float(os.getenv("AI_USAGE_FLUSH_SECONDS", "5"))
+# Unflushed conversation rows older than this belong to a worker that died
+AI_USAGE_RECONCILE_GRACE_SECONDS = int(os.getenv("AI_USAGE_RECONCILE_GRACE_SECONDS", "300"))
+QUOTA_PERIOD = timedelta(days=30)
+
 # Initialize tokenizer for GPT models
 try:
     tokenizer = tiktoken.encoding_for_model("gpt-4o-mini")
@@ -31,6 +54,201 @@ def count_tokens(text: str) -> int:
         return len(text) // 4
 
 
+@dataclass
+class PendingUsage:
+    tokens: int = 0
+    requests: int = 0
+    conversation_ids: List[int] = field(default_factory=list)
+    new_period_reset_at: Optional[datetime] = None  # Monthly reset not yet written
+
+
+class UsageLedger:
+    """Per-user usage deltas waiting to be flushed to the users table"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pending: Dict[int, PendingUsage] = {}
+        self._flusher: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self.flushes = 0
+        self.rows_flushed = 0
+        self.flush_failures = 0
+
+    def charge(self, user_id: int, tokens: int, conversation_id: Optional[int] = None):
+        with self._lock:
+            pending = self._pending.setdefault(user_id, PendingUsage())
+            pending.tokens += tokens
+            pending.requests += 1
+            if conversation_id is not None:
+                pending.conversation_ids.append(conversation_id)
+
+    def start_new_period(self, user_id: int, reset_at: datetime) -> datetime:
+        """Begin a new monthly period in memory; returns the period's reset time"""
+        with self._lock:
+            pending = self._pending.setdefault(user_id, PendingUsage())
+            if pending.new_period_reset_at is None:
+                # Deltas recorded so far belong to the old period
+                pending.tokens = 0
+                pending.requests = 0
+                pending.new_period_reset_at = reset_at
+            return pending.new_period_reset_at
+
+    def usage(self, user: User) -> Dict[str, Any]:
+        """Stored counters plus this worker's unflushed deltas"""
+        with self._lock:
+            pending = self._pending.get(user.id)
+            tokens = pending.tokens if pending else 0
+            requests = pending.requests if pending else 0
+            new_period = pending.new_period_reset_at if pending else None
+        if new_period is not None:
+            return {"tokens_used": tokens, "requests_used": requests, "resets_at": new_period}
+        return {
+            "tokens_used": (user.ai_tokens_used or 0) + tokens,
+            "requests_used": (user.ai_requests_used or 0) + requests,
+            "resets_at": user.ai_tokens_reset_at,
+        }
+
+    def flush(self) -> int:
+        """Write all pending deltas in one transaction; returns users flushed"""
+        with self._lock:
+            batch, self._pending = self._pending, {}
+        if not batch:
+            return 0
+
+        db = SessionLocal()
+        try:
+            _apply_usage(db, batch)
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            self.flush_failures += 1
+            logger.error(f"❌ AI usage flush failed, will retry: {e}")
+            self._restore(batch)
+            return 0
+        finally:
+            db.close()
+
+        self.flushes += 1
+        self.rows_flushed += sum(len(p.conversation_ids) for p in batch.values())
+        return len(batch)
+
+    def _restore(self, batch: Dict[int, PendingUsage]):
+        with self._lock:
+            for user_id, old in batch.items():
+                current = self._pending.get(user_id)
+                if current is None:
+                    self._pending[user_id] = old
+                    continue
+                if current.new_period_reset_at is not None and old.new_period_reset_at is None:
+                    continue  # a newer period started; the old deltas no longer count
+                current.tokens += old.tokens
+                current.requests += old.requests
+                current.conversation_ids = old.conversation_ids + current.conversation_ids
+                current.new_period_reset_at = current.new_period_reset_at or old.new_period_reset_at
+
+    def start(self):
+        """Flush in the background every AI_USAGE_FLUSH_SECONDS"""
+        if self._flusher is not None:
+            return
+
+        def run():
+            while not self._stop.wait(AI_USAGE_FLUSH_SECONDS):
+                self.flush()
+
+        self._stop.clear()
+        self._flusher = threading.Thread(target=run, name="ai-usage-flusher", daemon=True)
+        self._flusher.start()
+
+    def stop(self):
+        self._stop.set()
+        self._flusher = None
+        self.flush()
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            pending_users = len(self._pending)
+            pending_rows = sum(len(p.conversation_ids) for p in self._pending.values())
+        return {
+            "pending_users": pending_users,
+            "pending_conversations": pending_rows,
+            "flushes": self.flushes,
+            "conversations_flushed": self.rows_flushed,
+            "flush_failures": self.flush_failures,
+            "flush_interval_seconds": AI_USAGE_FLUSH_SECONDS,
+        }
+
+
+def _apply_usage(db: Session, batch: Dict[int, PendingUsage]):
+    """Increment (or, for a new period, overwrite) user counters and mark rows counted"""
+    now = datetime.utcnow()
+    increments = []
+    for user_id, pending in batch.items():
+        if pending.new_period_reset_at is not None:
+            # Only the first worker to reset the period overwrites the counters
+            reset = db.execute(
+                update(User)
+                .where(User.id == user_id, or_(User.ai_tokens_reset_at.is_(None), User.ai_tokens_reset_at < now))
+                .values(ai_tokens_used=pending.tokens, ai_requests_used=pending.requests,
+                        ai_tokens_reset_at=pending.new_period_reset_at)
+                .execution_options(synchronize_session=False)
+            )
+            if reset.rowcount:
+                continue
+        if pending.tokens or pending.requests:
+            increments.append({"uid": user_id, "tokens": pending.tokens, "requests": pending.requests})
+
+    if increments:
+        db.connection().execute(
+            update(User.__table__)
+            .where(User.__table__.c.id == bindparam("uid"))
+            .values(
+                ai_tokens_used=func.coalesce(User.__table__.c.ai_tokens_used, 0) + bindparam("tokens"),
+                ai_requests_used=func.coalesce(User.__table__.c.ai_requests_used, 0) + bindparam("requests"),
+            ),
+            increments,
+        )
+
+    conversation_ids = [cid for pending in batch.values() for cid in pending.conversation_ids]
+    if conversation_ids:
+        db.execute(
+            update(AIConversation)
+            .where(AIConversation.id.in_(conversation_ids))
+            .values(usage_flushed=True)
+            .execution_options(synchronize_session=False)
+        )
+
+
+usage_ledger = UsageLedger()
+
+
+def reconcile_usage(db: Session) -> Dict[str, int]:
+    """
+    Charge conversation rows whose usage never reached the users table (the
+    worker that recorded them died before flushing). Rows newer than the grace
+    period may still be pending on a live worker and are left alone.
+    """
+    cutoff = datetime.utcnow() - timedelta(seconds=AI_USAGE_RECONCILE_GRACE_SECONDS)
+    rows = db.query(AIConversation.id, AIConversation.user_id, AIConversation.tokens_used).filter(
+        AIConversation.usage_flushed.is_(False),
+        AIConversation.user_id.isnot(None),
+        AIConversation.created_at < cutoff
+    ).all()
+    if not rows:
+        return {"conversations": 0, "users": 0}
+
+    batch: Dict[int, PendingUsage] = {}
+    for row in rows:
+        pending = batch.setdefault(row.user_id, PendingUsage())
+        pending.tokens += row.tokens_used or 0
+        pending.requests += 1
+        pending.conversation_ids.append(row.id)
+
+    _apply_usage(db, batch)
+    db.commit()
+    logger.info(f"🧮 Reconciled AI usage from {len(rows)} unflushed conversations for {len(batch)} users")
+    return {"conversations": len(rows), "users": len(batch)}
+
+
 def check_user_quota(user: Optional[User], db: Session) -> Dict[str, Any]:
     """
     Check if user has quota remaining
@@ -50,23 +268,22 @@ def check_user_quota(user: Optional[User], db: Session) -> Dict[str, Any]:
     tier = user.ai_tier or "free"
     tier_config = TIER_LIMITS.get(tier, TIER_LIMITS["free"])
 
-    # Reset monthly counters if needed
+    # Reset monthly counters if needed (written by the next ledger flush)
     now = datetime.utcnow()
     if user.ai_tokens_reset_at and now > user.ai_tokens_reset_at:
-        user.ai_tokens_used = 0
-        user.ai_requests_used = 0
-        user.ai_tokens_reset_at = now + timedelta(days=30)
-        db.commit()
+        usage_ledger.start_new_period(user.id, now + QUOTA_PERIOD)
         logger.info(f"🔄 Reset monthly quota for user {user.id}")
 
+    usage = usage_ledger.usage(user)
+
     # Check token limit
     monthly_token_limit = tier_config["monthly_tokens"]
-    tokens_used = user.ai_tokens_used or 0
+    tokens_used = usage["tokens_used"]
     tokens_remaining = monthly_token_limit - tokens_used if monthly_token_limit > 0 else -1
 
     # Check request limit
     monthly_request_limit = tier_config["monthly_requests"]
-    requests_used = user.ai_requests_used or 0
+    requests_used = usage["requests_used"]
     requests_remaining = monthly_request_limit - requests_used if monthly_request_limit > 0 else -1
 
     # Determine if allowed
@@ -90,7 +307,7 @@ def check_user_quota(user: Optional[User], db: Session) -> Dict[str, Any]:
         "requests_used": requests_used,
         "requests_remaining": requests_remaining,
         "monthly_request_limit": monthly_request_limit,
-        "resets_at": user.ai_tokens_reset_at,
+        "resets_at": usage["resets_at"],
         "message": message
     }
 
@@ -154,32 +371,38 @@ def check_session_quota(session_id: str, user: Optional[User], db: Session) -> D
     }
 
 
-def update_usage(
-    user: Optional[User],
-    session_id: str,
-    user_message: str,
-    ai_response: str,
-    session_total_tokens: int,
-    db: Session
-) -> int:
+def record_usage(user: Optional[User], tokens_used: int, conversation_id: Optional[int] = None):
     """
-    Update user and session token usage
-    Returns tokens used in this exchange
+    Charge an exchange to the user's monthly quota.
+    tokens_used is the provider-reported total for the exchange (0 when no
+    model call was made, e.g. a cached answer); it still counts as a request.
     """
-    # Count tokens
-    message_tokens = count_tokens(user_message)
-    response_tokens = count_tokens(ai_response)
-    total_tokens = message_tokens + response_tokens
+    if not user:
+        return
+    usage_ledger.charge(user.id, tokens_used, conversation_id)
+    logger.info(f"📊 Tokens: {tokens_used} charged to user {user.id}")
+
+
+_PENDING = "ai_usage_pending"
+
+
+def record_usage_on_commit(db: Session, user: Optional[User], tokens_used: int, conversation_id: int):
+    """record_usage() once db's transaction commits (nothing is charged if it rolls back)"""
+    if not user:
+        return
+    db.info.setdefault(_PENDING, []).append((user.id, tokens_used, conversation_id))
+
 
-    logger.info(f"📊 Tokens: {message_tokens} (user) + {response_tokens} (AI) = {total_tokens} total")
+@event.listens_for(Session, "after_commit")
+def _charge_committed(session: Session):
+    for user_id, tokens_used, conversation_id in session.info.pop(_PENDING, []):
+        usage_ledger.charge(user_id, tokens_used, conversation_id)
+        logger.info(f"📊 Tokens: {tokens_used} charged to user {user_id}")
 
-    # Update user monthly totals
-    if user:
-        user.ai_tokens_used = (user.ai_tokens_used or 0) + total_tokens
-        user.ai_requests_used = (user.ai_requests_used or 0) + 1
-        db.commit()
 
-    return total_tokens
+@event.listens_for(Session, "after_rollback")
+def _drop_rolled_back(session: Session):
+    session.info.pop(_PENDING, None)
 
 
 def get_next_tier(current_tier: str) -> str:
@@ -0,0 +1,95 @@
+"""
+Benchmark time-to-first-token for /ai/chat vs /ai/chat/stream
+Runs the app against a local fake OpenAI completion server, so results reflect
+our own pipeline plus a controlled, reproducible model latency. Per-stage
+pipeline timings and LLM calls per message are printed at the end.
+
+Usage:
+    python benchmark_ai_stream.py --runs 20 --first-token-ms 400 --token-ms 30
+
+The fake server (fake_services.FakeOpenAI) answers /v1/chat/completions and
+/v1/embeddings. The app is pointed at it through OPENAI_BASE_URL.
+"""
+
+import argparse
+import json
+import os
+import statistics
+import tempfile
+import threading
+import time
+
+from fake_services import FakeOpenAI, FakeServer
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def summarize(name, values):
+    return (f"{name:<28} p50={statistics.median(values) * 1000:7.1f} ms  "
+            f"p95={percentile(values, 95) * 1000:7.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=20)
+    parser.add_argument("--first-token-ms", type=int, default=400, help="fake model latency before the first token")
+    parser.add_argument("--token-ms", type=int, default=30, help="fake model delay between tokens")
+    parser.add_argument("--message", default="show me laptops on the marketplace")
+    args = parser.parse_args()
+
+    fake = FakeServer(FakeOpenAI(first_token_ms=args.first_token_ms, token_ms=args.token_ms)).start()
+
+    # Configure the app before importing it
+    os.environ["OPENAI_API_KEY"] = "sk-fake-benchmark"
+    os.environ["OPENAI_BASE_URL"] = f"{fake.url}/v1"
+    os.environ["AI_CACHE_ENABLED"] = "false"  # every run must reach the model
+    os.environ.setdefault("DATABASE_URL", f"sqlite:///{tempfile.mkdtemp()}/benchmark.db")
+
+    import httpx
+    import uvicorn
+    from main import app
+
+    config = uvicorn.Config(app, host="127.0.0.1", port=0, log_level="warning")
+    server = uvicorn.Server(config)
+    start_server_thread = threading.Thread(target=server.run, daemon=True)
+    start_server_thread.start()
+    while not server.started:
+        time.sleep(0.05)
+    port = server.servers[0].sockets[0].getsockname()[1]
+    base_url = f"http://127.0.0.1:{port}"
+
+    blocking, ttft, stream_total = [], [], []
+    with httpx.Client(base_url=base_url, timeout=60) as client:
+        for _ in range(args.runs):
+            started = time.perf_counter()
+            client.post("/ai/chat", json={"message": args.message}).raise_for_status()
+            blocking.append(time.perf_counter() - started)
+
+            started = time.perf_counter()
+            first_token = None
+            with client.stream("POST", "/ai/chat/stream", json={"message": args.message}) as response:
+                response.raise_for_status()
+                for line in response.iter_lines():
+                    if first_token is None and line == "event: token":
+                        first_token = time.perf_counter() - started
+            stream_total.append(time.perf_counter() - started)
+            ttft.append(first_token if first_token is not None else stream_total[-1])
+
+    server.should_exit = True
+    fake.stop()
+
+    print(f"runs={args.runs} fake first token={args.first_token_ms} ms, inter-token={args.token_ms} ms")
+    print(summarize("/ai/chat (full response)", blocking))
+    print(summarize("/ai/chat/stream first token", ttft))
+    print(summarize("/ai/chat/stream complete", stream_total))
+
+    # The app runs in this process, so its pipeline stats are directly readable
+    import ai_assistant
+    print(json.dumps(ai_assistant.pipeline_stats.snapshot(), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,183 @@
+"""
+Digest Benchmark
+Generates a full digest run for a large user base
+
+Seeds a throwaway SQLite database (or --database-url) with --users opted-in
+users, guild memberships and posts, unread notifications, orders and
+products, then runs digest.run_digest() the way the digest.run job does
+(DIGEST_MAX_BATCHES batches per call, checkpointing after every batch) into
+a Maildir, and reports digests per second, time per batch and the process's
+memory growth (which should stay flat: only one batch is in memory).
+
+--interrupt-after stops the run after that many batches and resumes it with
+a fresh session, as after a restart.
+
+Usage:
+    python benchmark_digest.py --users 100000
+    python benchmark_digest.py --users 20000 --batch-size 1000 --interrupt-after 5
+    python benchmark_digest.py --transport smtp://localhost:1025
+"""
+
+import argparse
+import os
+import random
+import resource
+import shutil
+import statistics
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+
+def rss_mb() -> float:
+    try:
+        with open("/proc/self/status") as status:
+            for line in status:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024  # peak, not current
+
+
+def seed(args, rng: random.Random, now: datetime):
+    """Bulk-insert the data set with executemany, in chunks"""
+    from database import (
+        engine, Base, User, NotificationPreference, Guild, Post, Notification, Order, Product, guild_members
+    )
+
+    Base.metadata.create_all(engine)
+    recent = lambda: now - timedelta(minutes=rng.randint(1, 6 * 24 * 60))
+    chunk = 20000
+
+    def insert(table, rows):
+        with engine.begin() as conn:
+            for start in range(0, len(rows), chunk):
+                conn.execute(table.insert(), rows[start:start + chunk])
+
+    users = range(1, args.users + 1)
+    insert(User.__table__, [
+        {"id": i, "email": f"digest{i}@example.com", "first_name": "Digest", "last_name": f"User{i}",
+         "country": "Nigeria", "hashed_password": "x", "is_active": True}
+        for i in users
+    ])
+    insert(NotificationPreference.__table__, [
+        {"user_id": i, "email_notifications": True, "push_notifications": True, "guild_updates": True,
+         "marketplace_updates": True, "project_updates": True, "message_notifications": True, "ai_insights": True,
+         "weekly_digest": rng.random() < args.opt_in}
+        for i in users
+    ])
+    insert(Guild.__table__, [
+        {"id": g, "name": f"Guild {g}", "owner_id": rng.randint(1, args.users), "member_count": 0}
+        for g in range(1, args.guilds + 1)
+    ])
+    insert(guild_members, [
+        {"user_id": i, "guild_id": g}
+        for i in users for g in rng.sample(range(1, args.guilds + 1), min(args.guilds_per_user, args.guilds))
+    ])
+    insert(Post.__table__, [
+        {"content": "post", "author_id": rng.randint(1, args.users), "guild_id": rng.randint(1, args.guilds),
+         "created_at": recent()}
+        for _ in range(args.posts)
+    ])
+    insert(Notification.__table__, [
+        {"user_id": i, "type": "message.received", "title": "New Message", "message": "You have a new message",
+         "link": "/messages", "is_read": False, "created_at": recent()}
+        for i in users for _ in range(rng.randint(0, args.notifications_per_user * 2))
+    ])
+    categories = ["electronics", "fashion", "home & garden", "sports & outdoors", "books & media"]
+    insert(Product.__table__, [
+        {"id": p, "name": f"Product {p}", "price": rng.randrange(5, 500), "category": rng.choice(categories),
+         "stock": rng.randint(1, 20), "seller_id": rng.randint(1, args.users), "is_active": True, "created_at": now}
+        for p in range(1, args.products + 1)
+    ])
+    insert(Order.__table__, [
+        {"order_number": f"AV-BENCH-{o}", "buyer_id": rng.randint(1, args.users),
+         "seller_id": rng.randint(1, args.users), "product_id": rng.randint(1, args.products),
+         "item_name": f"Product {o % args.products}", "item_cost": 10.0, "service_fee": 0.5, "total_amount": 10.5,
+         "status": rng.choice(["paid", "processing", "completed"]), "created_at": recent(), "updated_at": recent()}
+        for o in range(1, args.orders + 1)
+    ])
+
+
+class TimedTransport:
+    """Wraps the real transport to time each batch's delivery"""
+
+    def __init__(self, transport):
+        self.transport = transport
+        self.batch_seconds = []
+
+    def send(self, messages):
+        started = time.perf_counter()
+        self.transport.send(messages)
+        self.batch_seconds.append(time.perf_counter() - started)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=100000)
+    parser.add_argument("--opt-in", type=float, default=1.0, help="share of users with weekly_digest on")
+    parser.add_argument("--guilds", type=int, default=500)
+    parser.add_argument("--guilds-per-user", type=int, default=3)
+    parser.add_argument("--posts", type=int, default=20000)
+    parser.add_argument("--notifications-per-user", type=int, default=2, help="average unread notifications")
+    parser.add_argument("--products", type=int, default=5000)
+    parser.add_argument("--orders", type=int, default=50000)
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--interrupt-after", type=int, default=0, help="batches before a simulated restart")
+    parser.add_argument("--transport", help="DIGEST_TRANSPORT URL (default: a temporary Maildir)")
+    parser.add_argument("--database-url", help="database to seed and use (default: a temporary SQLite file)")
+    parser.add_argument("--keep", action="store_true", help="keep the temporary database and Maildir")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="digest-bench-")
+    # Configure the app before importing it
+    os.environ["DATABASE_URL"] = args.database_url or f"sqlite:///{workdir}/digest.db"
+    os.environ["DIGEST_BATCH_SIZE"] = str(args.batch_size)
+
+    from database import SessionLocal, DigestRun
+    import digest
+
+    now = datetime.utcnow()
+    started = time.perf_counter()
+    seed(args, random.Random(args.seed), now)
+    print(f"🌱 Seeded {args.users} users in {time.perf_counter() - started:.1f}s")
+
+    transport = TimedTransport(digest.transport_from_url(args.transport or f"maildir:{workdir}/Maildir"))
+    rss_before = rss_mb()
+    started = time.perf_counter()
+    calls, result = 0, None
+    while result is None or not result["finished"]:
+        db = SessionLocal()  # a new session per call, like each digest.run job
+        try:
+            max_batches = digest.DIGEST_MAX_BATCHES
+            if args.interrupt_after and calls == 0:
+                max_batches = args.interrupt_after
+            result = digest.run_digest(db, transport, now=now, max_batches=max_batches)
+        finally:
+            db.close()
+        calls += 1
+        if args.interrupt_after and calls == 1:
+            print(f"⏸  Interrupted after {result['sent'] + result['skipped']} users, resuming from the checkpoint")
+    elapsed = time.perf_counter() - started
+
+    db = SessionLocal()
+    run = db.get(DigestRun, result["run_id"])
+    db.close()
+    batches = len(transport.batch_seconds)
+    print(f"📬 {result['sent']} digests sent, {result['skipped']} users without activity, "
+          f"{batches} batches over {calls} job-sized calls")
+    print(f"⏱  {elapsed:.1f}s total, {result['sent'] / elapsed:.0f} digests/s, "
+          f"{elapsed / max(batches, 1) * 1000:.0f} ms per batch "
+          f"(delivery p50 {statistics.median(transport.batch_seconds or [0]) * 1000:.0f} ms)")
+    print(f"🧠 RSS {rss_before:.0f} MB before, {rss_mb():.0f} MB after; checkpoint at user {run.last_user_id}")
+
+    if not args.keep:
+        shutil.rmtree(workdir, ignore_errors=True)
+    else:
+        print(f"📁 Kept {workdir}")
+
+
+if __name__ == "__main__":
+    main()
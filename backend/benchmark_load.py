@@ -0,0 +1,285 @@
+"""
+Offline Load Test
+Drives /ai/chat, /marketplace/semantic-search and /recommendations/* at a
+fixed concurrency against fake OpenAI and Qdrant servers (fake_services), so
+it runs anywhere without API keys, quota or network.
+
+A throwaway SQLite database (or --database-url) is seeded with users,
+products, projects and guilds, which are embedded and indexed through the
+app's own indexing code. Per-endpoint latency percentiles, status codes and
+throughput are printed, followed by upstream call counts, request coalescing
+and LLM gateway stats.
+
+Usage:
+    python benchmark_load.py --requests 400 --concurrency 32
+    python benchmark_load.py --mix chat=1 --first-token-ms 800 --openai-error-rate 0.05
+    python benchmark_load.py --qdrant-ms 50 --mix semantic=3,recommendations=1
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import tempfile
+import threading
+import time
+from collections import Counter, defaultdict
+
+from fake_services import FakeOpenAI, FakeQdrant, FakeServices
+
+PRODUCT_NAMES = {
+    "electronics": ["Laptop", "Smartphone", "Wireless Headphones", "Gaming Mouse", "Mechanical Keyboard", "Smart Watch"],
+    "fashion": ["Running Shoes", "Leather Bag", "Denim Jacket", "Ankara Dress", "Sneakers", "Sunglasses"],
+    "home & garden": ["Office Chair", "Blender", "Standing Desk", "Garden Hose", "Table Lamp", "Cookware Set"],
+    "sports & outdoors": ["Yoga Mat", "Football", "Camping Tent", "Dumbbells", "Bicycle Helmet"],
+    "books & media": ["Python Programming Book", "Notebook Set", "Business Strategy Book", "Novel Collection"],
+    "toys & games": ["Board Game", "Puzzle Set", "Remote Control Car", "Building Blocks"],
+    "art & crafts": ["Acrylic Paint Set", "Sketchbook", "Beading Kit", "Canvas Pack"],
+}
+ADJECTIVES = ["Premium", "Budget", "Portable", "Classic", "Pro", "Compact", "Handmade", "Durable"]
+PROJECT_TOPICS = [
+    ("Build an e-commerce website", "React frontend and FastAPI backend for an online store"),
+    ("Mobile app for food delivery", "Flutter app with payments and order tracking"),
+    ("Logo and brand identity", "Design a logo, colour palette and brand guide"),
+    ("SEO content writing", "Write blog articles about fintech and payments"),
+    ("Data dashboard", "Python analytics dashboard for sales data"),
+    ("Marketing campaign", "Social media marketing for a fashion brand"),
+]
+GUILD_TOPICS = [
+    ("React Developers", "Frontend developers sharing React and TypeScript tips"),
+    ("UI/UX Designers", "Designers collaborating on product design and user research"),
+    ("Content Writers", "Writers sharing copywriting and SEO work"),
+    ("Python Engineers", "Backend engineers working with Python, FastAPI and data"),
+    ("Fashion Entrepreneurs", "Sellers and designers building fashion brands"),
+]
+BIOS = [
+    "Frontend developer who loves React and design systems",
+    "Python backend engineer interested in data dashboards",
+    "Brand designer focused on logos and identity",
+    "Content writer covering fintech and marketing",
+    "Fashion entrepreneur selling handmade bags",
+]
+CHAT_MESSAGES = [
+    "show me laptops on the marketplace",
+    "any running shoes under 20000?",
+    "find me a React developer guild",
+    "what projects need a designer?",
+    "how does escrow work?",
+    "recommend something for my home office",
+]
+SEARCH_QUERIES = [
+    "laptop for programming", "running shoes", "office chair", "wireless headphones",
+    "camping gear", "board games for kids", "paint set", "leather bag", "python book",
+]
+
+
+def parse_mix(text: str) -> dict:
+    mix = {}
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        mix[name.strip()] = float(weight or 1)
+    unknown = set(mix) - {"chat", "semantic", "recommendations"}
+    if unknown:
+        raise SystemExit(f"Unknown endpoints in --mix: {', '.join(sorted(unknown))}")
+    return mix
+
+
+def seed_catalog(args, rng: random.Random) -> list:
+    """Create users, products, projects and guilds and index them; returns user emails"""
+    from database import SessionLocal, User, Product, Project, Guild
+    from auth import get_password_hash
+    import qdrant_service
+    import marketplace_semantic_search
+
+    marketplace_semantic_search.initialize_marketplace_collection()
+    db = SessionLocal()
+    try:
+        users = []
+        for i in range(args.users):
+            user = User(email=f"load{i}@example.com", username=f"load{i}", first_name="Load", last_name=f"User{i}",
+                        country="Nigeria", hashed_password=get_password_hash("load-test"), bio=BIOS[i % len(BIOS)])
+            db.add(user)
+            users.append(user)
+        db.flush()
+
+        products = []
+        for i in range(args.products):
+            category = rng.choice(list(PRODUCT_NAMES))
+            name = f"{rng.choice(ADJECTIVES)} {rng.choice(PRODUCT_NAMES[category])}"
+            products.append(Product(name=name, description=f"{name} in great condition", category=category,
+                                    price=rng.randrange(2000, 400000, 500), stock=rng.randint(1, 50),
+                                    seller_id=rng.choice(users).id))
+        projects = [
+            Project(title=title, description=description, budget=rng.randrange(20000, 2000000, 5000),
+                    owner_id=rng.choice(users).id)
+            for title, description in (rng.choice(PROJECT_TOPICS) for _ in range(args.projects))
+        ]
+        guilds = [
+            Guild(name=f"{name} {i}", description=description, category="Tech", owner_id=rng.choice(users).id)
+            for i, (name, description) in enumerate(rng.choice(GUILD_TOPICS) for _ in range(args.guilds))
+        ]
+        db.add_all(products + projects + guilds)
+        db.commit()
+
+        for product in products:
+            marketplace_semantic_search.index_product(product.id, product.name, product.description, product.category,
+                                                      product.price, stock=product.stock, seller_id=product.seller_id)
+            qdrant_service.index_product(product.id, product.name, product.description,
+                                         {"category": product.category, "price": product.price})
+        for project in projects:
+            qdrant_service.index_project(project.id, project.title, project.description,
+                                         {"owner_id": project.owner_id, "budget": project.budget})
+        for guild in guilds:
+            qdrant_service.index_guild(guild.id, guild.name, guild.description, {"owner_id": guild.owner_id})
+        return [user.email for user in users]
+    finally:
+        db.close()
+
+
+def make_requests(args, emails: list, rng: random.Random) -> list:
+    from auth import create_access_token
+    from datetime import timedelta
+
+    tokens = [create_access_token({"sub": email}, timedelta(hours=1)) for email in emails]
+    mix = parse_mix(args.mix)
+    names, weights = list(mix), list(mix.values())
+    requests = []
+    for _ in range(args.requests):
+        kind = rng.choices(names, weights)[0]
+        if kind == "chat":
+            requests.append(("POST /ai/chat", "POST", "/ai/chat", {"json": {"message": rng.choice(CHAT_MESSAGES)}}))
+        elif kind == "semantic":
+            requests.append(("GET /marketplace/semantic-search", "GET", "/marketplace/semantic-search",
+                             {"params": {"q": rng.choice(SEARCH_QUERIES), "limit": 10}}))
+        else:
+            path = rng.choice(["/recommendations/projects", "/recommendations/guilds"])
+            requests.append((f"GET {path}", "GET", path,
+                             {"headers": {"Authorization": f"Bearer {rng.choice(tokens)}"}}))
+    return requests
+
+
+async def run_load(base_url: str, requests: list, concurrency: int) -> dict:
+    import httpx
+
+    latencies = defaultdict(list)
+    statuses = defaultdict(Counter)
+    pending = iter(requests)
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async with httpx.AsyncClient(base_url=base_url, timeout=120, limits=limits) as client:
+        async def worker():
+            for name, method, path, kwargs in pending:
+                started = time.perf_counter()
+                try:
+                    response = await client.request(method, path, **kwargs)
+                    status = response.status_code
+                except httpx.HTTPError as e:
+                    status = type(e).__name__
+                latencies[name].append(time.perf_counter() - started)
+                statuses[name][status] += 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+    return {"latencies": latencies, "statuses": statuses, "elapsed": elapsed}
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def print_results(result: dict, args):
+    print(f"\n{args.requests} requests, concurrency {args.concurrency}, "
+          f"{result['elapsed']:.1f}s, {args.requests / result['elapsed']:.1f} req/s")
+    print(f"{'endpoint':<36}{'n':>6}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}  statuses")
+    for name in sorted(result["latencies"]):
+        values = result["latencies"][name]
+        codes = ", ".join(f"{code}x{count}" for code, count in sorted(result["statuses"][name].items(), key=str))
+        print(f"{name:<36}{len(values):>6}{statistics.median(values) * 1000:>10.1f}"
+              f"{percentile(values, 95) * 1000:>10.1f}{percentile(values, 99) * 1000:>10.1f}  {codes}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--mix", default="chat=2,semantic=3,recommendations=3",
+                        help="relative weights of chat, semantic and recommendations")
+    parser.add_argument("--first-token-ms", type=float, default=400, help="fake model latency before the first token")
+    parser.add_argument("--token-ms", type=float, default=10, help="fake model delay between tokens")
+    parser.add_argument("--embedding-ms", type=float, default=40, help="fake embedding latency")
+    parser.add_argument("--qdrant-ms", type=float, default=5, help="fake Qdrant latency per request")
+    parser.add_argument("--jitter-ms", type=float, default=0, help="uniform +/- jitter on every fake latency")
+    parser.add_argument("--openai-error-rate", type=float, default=0.0, help="share of OpenAI requests that fail")
+    parser.add_argument("--openai-error-status", type=int, default=429)
+    parser.add_argument("--qdrant-error-rate", type=float, default=0.0, help="share of Qdrant requests that fail")
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--products", type=int, default=300)
+    parser.add_argument("--projects", type=int, default=100)
+    parser.add_argument("--guilds", type=int, default=40)
+    parser.add_argument("--database-url", help="database to seed and use (default: a temporary SQLite file)")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--json", action="store_true", help="print upstream and app stats as JSON")
+    args = parser.parse_args()
+
+    fakes = FakeServices(
+        openai=FakeOpenAI(args.first_token_ms, args.token_ms, args.embedding_ms, args.jitter_ms,
+                          seed=args.seed),
+        qdrant=FakeQdrant(args.qdrant_ms, args.jitter_ms, seed=args.seed),
+    ).start()
+
+    # Configure the app before importing it
+    os.environ.update(fakes.environ())
+    os.environ["AI_CACHE_ENABLED"] = "false"  # every chat must reach the model
+    os.environ["DATABASE_URL"] = args.database_url or f"sqlite:///{tempfile.mkdtemp()}/load.db"
+    os.environ.setdefault("SECRET_KEY", "offline-load-test")  # signs the seeded users' tokens
+
+    import uvicorn
+    from main import app
+    import llm_gateway
+    import single_flight
+
+    config = uvicorn.Config(app, host="127.0.0.1", port=0, log_level="warning")
+    server = uvicorn.Server(config)
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    base_url = f"http://127.0.0.1:{server.servers[0].sockets[0].getsockname()[1]}"
+
+    rng = random.Random(args.seed)
+    started = time.perf_counter()
+    fakes.openai.embedding_ms = 0  # seeding isn't measured
+    emails = seed_catalog(args, rng)
+    fakes.openai.embedding_ms = args.embedding_ms
+    print(f"🌱 Seeded {args.users} users, {args.products} products, {args.projects} projects, "
+          f"{args.guilds} guilds in {time.perf_counter() - started:.1f}s")
+
+    # Faults only apply to the measured run, not to seeding
+    fakes.openai.faults.error_rate = args.openai_error_rate
+    fakes.openai.faults.error_status = args.openai_error_status
+    fakes.qdrant.faults.error_rate = args.qdrant_error_rate
+    baseline = fakes.stats()
+
+    result = asyncio.run(run_load(base_url, make_requests(args, emails, rng), args.concurrency))
+    server.should_exit = True
+
+    print_results(result, args)
+    upstream = {
+        service: {name: count - baseline[service].get(name, 0) for name, count in counts.items()}
+        for service, counts in fakes.stats().items()
+    }
+    fakes.stop()
+    stats = {"upstream": upstream, "coalescing": single_flight.get_stats(), "llm_gateway": llm_gateway.get_stats()}
+    if args.json:
+        print(json.dumps(stats, indent=2, default=str))
+    else:
+        print(f"\nupstream calls: openai {upstream['openai']}, qdrant {upstream['qdrant']}")
+        coalescing = stats["coalescing"]
+        print(f"coalescing: {coalescing['executions']} executions, {coalescing['collapsed']} collapsed")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,354 @@
+"""
+Realtime Load Test
+Polling vs push for direct messages on one worker
+
+Seeds a throwaway SQLite database with pairs of users who have a
+conversation, serves the app on one uvicorn worker, then runs two phases
+from a separate client process (so client sockets don't count against the
+server):
+
+1. polling: --pollers clients re-fetch /messages/conversation/{id} every
+   --poll-interval seconds, the way the frontend did before the hub
+2. push: --connections idle WebSockets (several per user, each subscribed to
+   its dm channel) are opened and held; the server's memory, idle CPU and
+   HTTP request count are measured, then --messages are sent through
+   POST /messages/send and the fan-out latency to every subscriber is timed
+
+Usage:
+    python benchmark_realtime.py --connections 10000
+    python benchmark_realtime.py --connections 2000 --pollers 500 --poll-interval 1
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+
+from fake_services import FakeServices
+
+
+def raise_fd_limit():
+    """Each connection is a file descriptor on both ends"""
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft < hard:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+    return resource.getrlimit(resource.RLIMIT_NOFILE)[0]
+
+
+def rss_mb() -> float:
+    try:
+        with open("/proc/self/status") as status:
+            for line in status:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024  # peak, not current
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def summarize(values) -> str:
+    if not values:
+        return "n/a"
+    return (f"p50 {statistics.median(values) * 1000:.1f} ms, p95 {percentile(values, 95) * 1000:.1f} ms, "
+            f"p99 {percentile(values, 99) * 1000:.1f} ms")
+
+
+class RequestCounter:
+    """ASGI wrapper counting HTTP requests by path, to show what polling costs"""
+
+    def __init__(self, app):
+        self.app = app
+        self.counts = Counter()
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http":
+            self.counts[scope["path"].rsplit("/", 1)[0]] += 1
+        await self.app(scope, receive, send)
+
+    def total(self) -> int:
+        return sum(self.counts.values())
+
+
+# ============================================================================
+# CLIENT PROCESS
+# ============================================================================
+
+def emit(**payload):
+    print(json.dumps(payload), flush=True)
+
+
+async def run_pollers(args, users):
+    import httpx
+
+    latencies, statuses = [], Counter()
+    deadline = time.monotonic() + args.duration
+
+    async with httpx.AsyncClient(base_url=args.url, timeout=30,
+                                 limits=httpx.Limits(max_connections=args.pollers)) as client:
+        async def poller(user):
+            headers = {"Authorization": f"Bearer {user['token']}"}
+            await asyncio.sleep(args.poll_interval * (user["id"] % 100) / 100)  # spread the timers
+            while time.monotonic() < deadline:
+                started = time.perf_counter()
+                try:
+                    response = await client.get(f"/messages/conversation/{user['partner_id']}", headers=headers)
+                    statuses[response.status_code] += 1
+                except httpx.HTTPError as e:
+                    statuses[type(e).__name__] += 1
+                latencies.append(time.perf_counter() - started)
+                await asyncio.sleep(args.poll_interval)
+
+        await asyncio.gather(*(poller(users[i % len(users)]) for i in range(args.pollers)))
+    emit(event="polled", requests=len(latencies), statuses=dict(statuses), latencies=latencies)
+
+
+async def run_sockets(args, users):
+    from websockets.asyncio.client import connect
+
+    ws_url = args.url.replace("http://", "ws://") + "/realtime/ws"
+    opening = asyncio.Semaphore(args.connect_concurrency)
+    sockets, failures = [], Counter()
+    latencies, received = [], Counter()
+    per_channel = Counter()
+    done = asyncio.Event()
+
+    async def open_socket(user):
+        async with opening:
+            try:
+                ws = await connect(f"{ws_url}?token={user['token']}", open_timeout=60, max_queue=None)
+                await ws.recv()  # ready
+                await ws.send(json.dumps({"type": "subscribe", "channel": user["channel"]}))
+                await ws.recv()  # subscribed
+                sockets.append(ws)
+                per_channel[user["channel"]] += 1
+            except Exception as e:
+                failures[type(e).__name__] += 1
+
+    async def listen(ws):
+        try:
+            async for raw in ws:
+                frame = json.loads(raw)
+                received[frame.get("event")] += 1
+                if frame.get("event") == "message.created":
+                    sent_at = float(frame["data"]["content"].split()[-1])
+                    latencies.append(time.time() - sent_at)
+                    if len(latencies) >= expected:
+                        done.set()
+        except Exception:
+            pass
+
+    started = time.perf_counter()
+    await asyncio.gather(*(open_socket(users[i % len(users)]) for i in range(args.connections)))
+    # The server sends message n to pair n (both users' sockets receive it)
+    pairs = users[::2]
+    expected = sum(per_channel[pairs[n % len(pairs)]["channel"]] for n in range(args.messages))
+    emit(event="connected", connections=len(sockets), failures=dict(failures),
+         seconds=time.perf_counter() - started)
+    listeners = [asyncio.create_task(listen(ws)) for ws in sockets]
+
+    try:
+        await asyncio.wait_for(done.wait(), args.duration + args.messages + 60)
+    except asyncio.TimeoutError:
+        pass
+    emit(event="pushed", latencies=latencies, expected=expected, received=dict(received))
+    for ws in sockets:
+        await ws.close()
+    for listener in listeners:
+        listener.cancel()
+
+
+def client_main(args):
+    raise_fd_limit()
+    with open(args.users_file) as users_file:
+        users = json.load(users_file)
+    if args.client == "poll":
+        asyncio.run(run_pollers(args, users))
+    else:
+        asyncio.run(run_sockets(args, users))
+
+
+# ============================================================================
+# SERVER PROCESS
+# ============================================================================
+
+def seed_users(count: int) -> list:
+    """Pairs of users (2i, 2i+1) with a short conversation each"""
+    from database import SessionLocal, User, Message
+    from auth import create_access_token
+    import migrate_conversations
+    import realtime_hub
+
+    db = SessionLocal()
+    try:
+        users = [User(email=f"realtime{i}@example.com", first_name="Load", last_name=f"User{i}",
+                      country="Nigeria", hashed_password="not-used") for i in range(count)]
+        db.add_all(users)
+        db.flush()
+        for a, b in zip(users[::2], users[1::2]):
+            db.add_all([Message(sender_id=a.id, recipient_id=b.id, content=f"Hi, message {n}", is_read=True)
+                        for n in range(20)])
+        db.commit()
+        migrate_conversations.migrate()
+        seeded = []
+        for index, user in enumerate(users):
+            partner = users[index ^ 1]
+            seeded.append({
+                "id": user.id, "partner_id": partner.id,
+                "token": create_access_token({"sub": user.email}),
+                "channel": realtime_hub.dm_channel(user.id, partner.id),
+            })
+        return seeded
+    finally:
+        db.close()
+
+
+def spawn_client(args, mode: str, base_url: str, users_file: str) -> subprocess.Popen:
+    command = [sys.executable, os.path.abspath(__file__), "--client", mode, "--url", base_url,
+               "--users-file", users_file, "--pollers", str(args.pollers),
+               "--poll-interval", str(args.poll_interval), "--duration", str(args.duration),
+               "--connections", str(args.connections), "--messages", str(args.messages),
+               "--connections-per-user", str(args.connections_per_user),
+               "--connect-concurrency", str(args.connect_concurrency)]
+    return subprocess.Popen(command, stdout=subprocess.PIPE, text=True)
+
+
+def read_event(client: subprocess.Popen) -> dict:
+    line = client.stdout.readline()
+    if not line:
+        raise RuntimeError(f"client process exited with {client.wait()}")
+    return json.loads(line)
+
+
+def measure(counter: RequestCounter, wait) -> dict:
+    """Server CPU seconds and HTTP requests while wait() runs"""
+    cpu, requests, started = time.process_time(), counter.total(), time.perf_counter()
+    value = wait()
+    return {"cpu_seconds": time.process_time() - cpu, "http_requests": counter.total() - requests,
+            "seconds": time.perf_counter() - started, "value": value}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--connections", type=int, default=10000, help="idle WebSockets held open")
+    parser.add_argument("--connections-per-user", type=int, default=5)
+    parser.add_argument("--pollers", type=int, default=200, help="simulated polling clients")
+    parser.add_argument("--poll-interval", type=float, default=3.0, help="seconds between polls per client")
+    parser.add_argument("--duration", type=float, default=15.0, help="seconds measured per phase")
+    parser.add_argument("--messages", type=int, default=50, help="messages sent during the push phase")
+    parser.add_argument("--connect-concurrency", type=int, default=200, help="handshakes in flight")
+    parser.add_argument("--deflate", action="store_true", help="enable per-message deflate on the server")
+    parser.add_argument("--json", action="store_true", help="print the results as JSON")
+    parser.add_argument("--client", choices=["poll", "push"], help=argparse.SUPPRESS)
+    parser.add_argument("--url", help=argparse.SUPPRESS)
+    parser.add_argument("--users-file", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.client:
+        client_main(args)
+        return
+
+    fd_limit = raise_fd_limit()
+    if fd_limit < args.connections + 1000:
+        print(f"⚠️ File descriptor limit is {fd_limit}; lower --connections or raise the hard limit")
+
+    # Configure the app before importing it (no AI calls are made; the fakes keep startup offline)
+    fakes = FakeServices().start()
+    os.environ.update(fakes.environ())
+    workdir = tempfile.mkdtemp()
+    os.environ["DATABASE_URL"] = f"sqlite:///{workdir}/realtime.db"
+    os.environ.setdefault("SECRET_KEY", "offline-load-test")
+    os.environ["REALTIME_BROKER_URL"] = ""
+    os.environ["TRACING_ENABLED"] = "false"
+
+    import uvicorn
+    from main import app
+    import realtime_hub
+
+    counter = RequestCounter(app)
+    # Deployed with --ws-per-message-deflate false (see Procfile)
+    config = uvicorn.Config(counter, host="127.0.0.1", port=0, log_level="warning", backlog=4096,
+                            ws_per_message_deflate=args.deflate)
+    server = uvicorn.Server(config)
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    base_url = f"http://127.0.0.1:{server.servers[0].sockets[0].getsockname()[1]}"
+
+    user_count = max(2, -(-args.connections // args.connections_per_user))
+    user_count += user_count % 2
+    users = seed_users(user_count)
+    users_file = os.path.join(workdir, "users.json")
+    with open(users_file, "w") as f:
+        json.dump(users, f)
+    print(f"🌱 Seeded {user_count} users in {user_count // 2} conversations")
+    results = {}
+
+    # Phase 1: polling
+    client = spawn_client(args, "poll", base_url, users_file)
+    window = measure(counter, lambda: read_event(client))
+    polled = window["value"]
+    client.wait()
+    results["polling"] = {
+        "clients": args.pollers, "interval_seconds": args.poll_interval,
+        "http_requests": window["http_requests"], "requests_per_second": polled["requests"] / args.duration,
+        "server_cpu_seconds": window["cpu_seconds"], "statuses": polled["statuses"],
+    }
+    print(f"\npolling: {args.pollers} clients every {args.poll_interval:g}s -> "
+          f"{results['polling']['requests_per_second']:.1f} req/s, server CPU {window['cpu_seconds']:.2f}s "
+          f"over {window['seconds']:.0f}s, latency {summarize(polled['latencies'])}")
+
+    # Phase 2: push
+    rss_before = rss_mb()
+    client = spawn_client(args, "push", base_url, users_file)
+    connected = read_event(client)
+    rss_after = rss_mb()
+    idle = measure(counter, lambda: time.sleep(args.duration))
+    hub_stats = realtime_hub.get_stats()
+    per_connection_kb = (rss_after - rss_before) * 1024 / max(1, connected["connections"])
+    print(f"\npush: {connected['connections']} idle WebSockets open in {connected['seconds']:.1f}s "
+          f"(failures {connected['failures'] or 0}), server RSS {rss_before:.0f} -> {rss_after:.0f} MB "
+          f"(~{per_connection_kb:.1f} KB per connection)")
+    print(f"idle {args.duration:g}s with every client connected: {idle['http_requests']} HTTP requests, "
+          f"server CPU {idle['cpu_seconds']:.2f}s")
+
+    import httpx
+    pairs = users[::2]
+    with httpx.Client(base_url=base_url, timeout=30) as http:
+        for n in range(args.messages):
+            sender = pairs[n % len(pairs)]
+            http.post("/messages/send", headers={"Authorization": f"Bearer {sender['token']}"},
+                      json={"recipient_id": sender["partner_id"], "content": f"ping {n} {time.time()}"})
+    pushed = read_event(client)
+    client.wait()
+    server.should_exit = True
+    fakes.stop()
+
+    results["push"] = {
+        "connections": connected["connections"], "connect_seconds": connected["seconds"],
+        "connect_failures": connected["failures"], "server_rss_mb_before": rss_before,
+        "server_rss_mb_after": rss_after, "kb_per_connection": per_connection_kb,
+        "idle_http_requests": idle["http_requests"], "idle_server_cpu_seconds": idle["cpu_seconds"],
+        "messages": args.messages, "deliveries": len(pushed["latencies"]), "expected_deliveries": pushed["expected"],
+        "hub": hub_stats,
+    }
+    print(f"fan-out: {args.messages} messages -> {len(pushed['latencies'])}/{pushed['expected']} deliveries, "
+          f"{summarize(pushed['latencies'])}")
+    if args.json:
+        print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -14,6 +14,8 @@ import string
 
 from database import get_db, Order, Escrow, Payment, User, Product
 from auth import get_current_user
+import activity_log
+import notifications
 
 router = APIRouter()
 
@@ -137,6 +139,13 @@ async def checkout_cart(
         # Get seller info
         seller = db.query(User).filter(User.id == seller_id).first()
         seller_name = f"{seller.first_name} {seller.last_name}" if seller else "Unknown Seller"
+        notifications.notify(
+            db, seller_id, "order.created", "New Order",
+            f"New order {order_number}: {item_names}",
+            link=f"/orders/{new_order.id}", actor_id=current_user.id
+        )
+        activity_log.emit(db, current_user.id, "created", "order", new_order.id,
+                          extra={"order_number": order_number, "amount": float(order_total)})
 
         orders.append(OrderSummary(
             order_id=new_order.id,
@@ -232,6 +241,13 @@ async def complete_cart_payment(
         )
 
         db.add(new_escrow)
+        notifications.notify(
+            db, order.seller_id, "order.escrow_funded", "Payment Held in Escrow",
+            f"${order.total_amount:.2f} for order {order.order_number} is held in escrow",
+            link=f"/orders/{order.id}", actor_id=current_user.id
+        )
+        activity_log.emit(db, current_user.id, "paid", "order", order.id,
+                          extra={"order_number": order.order_number, "amount": float(order.total_amount)})
         escrows_created.append({
             "order_id": order.id,
             "seller_id": order.seller_id,
@@ -291,6 +307,13 @@ async def confirm_delivery(
     # Update order
     order.status = "completed"
     order.completed_at = datetime.utcnow()
+    notifications.notify(
+        db, order.seller_id, "order.escrow_released", "Escrow Released",
+        f"${escrow.amount:.2f} for order {order.order_number} was released to you",
+        link=f"/orders/{order.id}", actor_id=current_user.id
+    )
+    activity_log.emit(db, current_user.id, "released", "order", order.id,
+                      extra={"order_number": order.order_number, "amount": float(escrow.amount)})
 
     db.commit()
 
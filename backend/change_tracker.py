@@ -0,0 +1,155 @@
+"""
+Committed Change Tracking
+Lets in-process caches follow database writes without polling the tables.
+
+Every ORM flush records which rows were inserted, updated or deleted. Once the
+surrounding transaction commits, subscribers registered for that table are
+called with a plain-dict snapshot of the row and the table's version stamp is
+bumped. Rolled-back work is discarded, so caches never see phantom rows.
+Subscribers that maintain derived counts register with previous=True and
+also get the old values of the columns an update changed, so they can apply
+just the delta. Old values the session never loaded (an attribute set after
+a commit expired it) are read in before_flush, one column-only query per
+such row, and only for tables with a previous=True subscriber.
+
+Version stamps are per process. Caches that must also notice writes made by
+other workers combine them with a periodic refresh.
+"""
+
+from typing import Any, Callable, Dict, List, Tuple
+from collections import defaultdict
+import threading
+import logging
+
+from sqlalchemy import and_, event, inspect, select
+from sqlalchemy.orm import Session
+
+logger = logging.getLogger(__name__)
+
+# table name -> monotonically increasing version
+_versions: Dict[str, int] = defaultdict(int)
+# table name -> (callback, wants previous values)
+_subscribers: Dict[str, List[Tuple[Callable[..., None], bool]]] = defaultdict(list)
+_lock = threading.Lock()
+
+_PENDING_KEY = "change_tracker.pending"
+_UNLOADED_KEY = "change_tracker.unloaded"
+
+
+def subscribe(table_name: str, callback: Callable[..., None], previous: bool = False):
+    """
+    Register a callback for committed changes to a table.
+    The callback receives the operation ("insert", "update" or "delete") and a
+    dict of the row's column values as they were at flush time. With
+    previous=True it also receives a dict of the changed columns' values
+    before the update (empty for inserts and deletes).
+    """
+    with _lock:
+        _subscribers[table_name].append((callback, previous))
+
+
+def get_version(table_name: str) -> int:
+    """Current version stamp of a table (0 if it never changed in this process)"""
+    return _versions.get(table_name, 0)
+
+
+def get_versions(*table_names: str) -> Tuple[int, ...]:
+    """Version stamps for several tables, in the order given"""
+    return tuple(_versions.get(name, 0) for name in table_names)
+
+
+def bump_version(table_name: str):
+    """Force a version bump, e.g. after a bulk UPDATE that bypasses the ORM"""
+    with _lock:
+        _versions[table_name] += 1
+
+
+def _snapshot(obj) -> Dict[str, Any]:
+    """Copy column values off an instance while they are still loaded"""
+    mapper = inspect(obj).mapper
+    return {attr.key: getattr(obj, attr.key, None) for attr in mapper.column_attrs}
+
+
+def _previous(session: Session, obj) -> Dict[str, Any]:
+    """Pre-update values of the columns this flush changed (history is still intact in after_flush)"""
+    state = inspect(obj)
+    previous = dict(session.info.get(_UNLOADED_KEY, {}).pop(state, {}))
+    for attr in state.mapper.column_attrs:
+        deleted = state.attrs[attr.key].history.deleted
+        if deleted:
+            previous[attr.key] = deleted[0]
+    return previous
+
+
+@event.listens_for(Session, "before_flush")
+def _load_unloaded_previous(session: Session, flush_context, instances):
+    with _lock:
+        wanted = {table for table, callbacks in _subscribers.items() if any(previous for _, previous in callbacks)}
+    if not wanted:
+        return
+    for obj in session.dirty:
+        if getattr(obj, "__tablename__", None) not in wanted:
+            continue
+        state = inspect(obj)
+        if state.key is None:
+            continue
+        unloaded = [attr for attr in state.mapper.column_attrs
+                    if state.attrs[attr.key].history.added and not state.attrs[attr.key].history.deleted]
+        if not unloaded:
+            continue
+        mapper = state.mapper
+        # The row still holds the old values until this flush writes it
+        row = session.connection().execute(
+            select(*(attr.columns[0] for attr in unloaded)).where(
+                and_(*(column == value for column, value in zip(mapper.primary_key, state.identity)))
+            )
+        ).first()
+        if row is not None:
+            session.info.setdefault(_UNLOADED_KEY, {})[state] = {
+                attr.key: value for attr, value in zip(unloaded, row)
+            }
+
+
+@event.listens_for(Session, "after_flush")
+def _record_flush(session: Session, flush_context):
+    pending = session.info.setdefault(_PENDING_KEY, [])
+    for op, objects in (("insert", session.new), ("update", session.dirty), ("delete", session.deleted)):
+        for obj in objects:
+            table = getattr(obj, "__tablename__", None)
+            if table is None:
+                continue
+            if op == "update" and not session.is_modified(obj, include_collections=False):
+                continue
+            try:
+                pending.append((table, op, _snapshot(obj), _previous(session, obj) if op == "update" else {}))
+            except Exception as e:
+                logger.warning(f"Change tracking skipped {table} row: {e}")
+
+
+@event.listens_for(Session, "after_commit")
+def _dispatch_commit(session: Session):
+    session.info.pop(_UNLOADED_KEY, None)
+    pending = session.info.pop(_PENDING_KEY, None)
+    if not pending:
+        return
+
+    with _lock:
+        for table, _, _, _ in pending:
+            _versions[table] += 1
+        callbacks = {table: list(_subscribers.get(table, ())) for table, _, _, _ in pending}
+
+    for table, op, snapshot, previous in pending:
+        for callback, wants_previous in callbacks.get(table, ()):
+            try:
+                if wants_previous:
+                    callback(op, snapshot, previous)
+                else:
+                    callback(op, snapshot)
+            except Exception as e:
+                logger.error(f"Change subscriber for {table} failed: {e}")
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_rollback(session: Session):
+    session.info.pop(_PENDING_KEY, None)
+    session.info.pop(_UNLOADED_KEY, None)
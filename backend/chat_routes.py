@@ -1,14 +1,18 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy.orm import Session
-from sqlalchemy import func, desc, or_, and_
+from sqlalchemy import desc
 from typing import List, Optional
-from datetime import datetime
 import json
 
-from database import get_db, User, Message
+from database import get_db, User, Message, Conversation
 from auth import get_current_user
 from schemas import MessageCreate, MessageResponse
 import ai_assistant
+import conversations
+import job_queue
+import activity_log
+import notifications
+import realtime_hub
 import logging
 
 logger = logging.getLogger(__name__)
@@ -16,67 +20,50 @@ logger = logging.getLogger(__name__)
 router = APIRouter(prefix="/messages", tags=["Messages"])
 
 
+def message_event(msg: Message, is_read: bool = False) -> dict:
+    """Realtime payload for a direct message (clients derive is_from_me)"""
+    return {
+        "id": msg.id,
+        "content": msg.content,
+        "sender_id": msg.sender_id,
+        "recipient_id": msg.recipient_id,
+        "sent_at": msg.created_at,
+        "is_read": is_read
+    }
+
+
 @router.get("/conversations")
 async def get_conversations(
+    limit: int = 50,
+    before: Optional[int] = None,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """
-    Get list of conversations for current user
+    Get list of conversations for current user, most recent activity first
+
+    One indexed read of the conversations table. Pages are keyed on the
+    last message id: pass the last row's last_message.id as `before` to get
+    the next page.
     """
-    # Get all users current user has messaged with
-    sent_to = db.query(Message.recipient_id).filter(
-        Message.sender_id == current_user.id
-    ).distinct()
-    
-    received_from = db.query(Message.sender_id).filter(
-        Message.recipient_id == current_user.id
-    ).distinct()
-    
-    # Combine and get unique user IDs
-    user_ids = set([uid[0] for uid in sent_to] + [uid[0] for uid in received_from])
-    
-    conversations = []
-    for user_id in user_ids:
-        user = db.query(User).filter(User.id == user_id).first()
-        if not user:
-            continue
-        
-        # Get last message
-        last_message = db.query(Message).filter(
-            or_(
-                and_(Message.sender_id == current_user.id, Message.recipient_id == user_id),
-                and_(Message.sender_id == user_id, Message.recipient_id == current_user.id)
-            )
-        ).order_by(desc(Message.created_at)).first()
-        
-        # Count unread messages
-        unread_count = db.query(func.count(Message.id)).filter(
-            Message.sender_id == user_id,
-            Message.recipient_id == current_user.id,
-            Message.is_read == False
-        ).scalar() or 0
-        
-        conversations.append({
+    limit = max(1, min(limit, 100))
+    me = current_user.id
+    return [
+        {
             "user_id": user.id,
             "user_name": f"{user.first_name} {user.last_name}",
             "user_avatar": user.avatar_url,
             "last_message": {
+                "id": last_message.id,
                 "content": last_message.content,
                 "sent_at": last_message.created_at,
-                "is_from_me": last_message.sender_id == current_user.id
-            } if last_message else None,
-            "unread_count": unread_count,
+                "is_from_me": last_message.sender_id == me
+            },
+            "unread_count": conversations.unread_count(conversation, me),
             "is_online": False  # TODO: Implement online status
-        })
-    
-    # Sort by last message time
-    conversations.sort(
-        key=lambda x: x["last_message"]["sent_at"] if x["last_message"] else datetime.min,
-        reverse=True
-    )
-    
-    return conversations
+        }
+        for conversation, user, last_message in conversations.inbox(db, me, limit, before)
+    ]
 
 
 @router.get("/conversation/{user_id}")
@@ -95,24 +82,17 @@ async def get_conversation_messages(
     if not other_user:
         raise HTTPException(status_code=404, detail="User not found")
     
-    # Get messages between users (including Ava messages with sender_id=0)
-    messages = db.query(Message).filter(
-        or_(
-            and_(Message.sender_id == current_user.id, Message.recipient_id == user_id),
-            and_(Message.sender_id == user_id, Message.recipient_id == current_user.id),
-            and_(Message.sender_id == 0, Message.recipient_id == current_user.id)  # Ava messages
-        )
-    ).order_by(Message.created_at.asc()).offset(skip).limit(limit).all()
-    
-    # Mark received messages as read
-    db.query(Message).filter(
-        Message.sender_id == user_id,
-        Message.recipient_id == current_user.id,
-        Message.is_read == False
-    ).update({"is_read": True})
-    db.commit()
-    
-    # Format messages
+    conversation = conversations.find(db, current_user.id, user_id)
+    if conversation is None:
+        messages = []
+    else:
+        # Messages between users, plus Ava's replies to the current user (sender_id=0)
+        messages = conversations.thread_query(db, conversation, current_user.id).offset(skip).limit(limit).all()
+
+    # Mark received messages as read: one cursor update, whatever the backlog
+    marked = conversation is not None and conversations.mark_read(db, conversation, current_user.id)
+
+    # Format messages (before committing, which would expire every loaded row)
     result = []
     for msg in messages:
         # Handle Ava messages (sender_id = 0)
@@ -122,7 +102,7 @@ async def get_conversation_messages(
                 "content": msg.content,
                 "is_from_me": False,
                 "sent_at": msg.created_at,
-                "is_read": msg.is_read,
+                "is_read": True,
                 "sender_name": "Ava AI",
                 "sender_avatar": "/ava-avatar.png"
             })
@@ -132,8 +112,16 @@ async def get_conversation_messages(
                 "content": msg.content,
                 "is_from_me": msg.sender_id == current_user.id,
                 "sent_at": msg.created_at,
-                "is_read": msg.is_read
+                "is_read": conversations.is_read(conversation, msg)
             })
+
+    if marked:
+        last_read_id = conversation.last_message_id
+        db.commit()
+        realtime_hub.publish(realtime_hub.dm_channel(current_user.id, user_id), "messages.read", {
+            "reader_id": current_user.id,
+            "last_read_id": last_read_id
+        })
     
     return {
         "other_user": {
@@ -155,98 +143,147 @@ async def send_message(
     """
     Send a message to another user
     """
+    new_message = deliver_message(db, current_user, message_data)
+    return {
+        "id": new_message.id,
+        "content": new_message.content,
+        "is_from_me": True,
+        "sent_at": new_message.created_at,
+        "is_read": False
+    }
+
+
+def deliver_message(db: Session, current_user: User, message_data: MessageCreate) -> Message:
+    """
+    Send a direct message through its conversation (every endpoint that sends
+    DMs goes through here): commits, then pushes it to both participants
+    """
     # Verify recipient exists
     recipient = db.query(User).filter(User.id == message_data.recipient_id).first()
     if not recipient:
         raise HTTPException(status_code=404, detail="Recipient not found")
-    
+
     # Prevent sending message to self
     if recipient.id == current_user.id:
         raise HTTPException(status_code=400, detail="Cannot send message to yourself")
-    
-    # Create message
+
+    # Create message and update the conversation in the same transaction
+    conversation = conversations.get_or_create(db, current_user.id, recipient.id)
     new_message = Message(
         content=message_data.content,
         sender_id=current_user.id,
-        recipient_id=message_data.recipient_id
+        recipient_id=message_data.recipient_id,
+        conversation_id=conversation.id
     )
 
     db.add(new_message)
+    db.flush()
+    conversations.record_message(db, conversation, new_message)
+    notifications.notify(
+        db, recipient.id, "message.received", "New Message",
+        f"You have a new message from {current_user.first_name} {current_user.last_name}",
+        link="/messages", actor_id=current_user.id, collapse_key=f"dm:{current_user.id}"
+    )
+    activity_log.emit(db, current_user.id, "sent", "message", new_message, target_type="user", target_id=recipient.id)
+
+    # @Ava replies are generated by the job queue, so the sender isn't held up by the LLM
+    if "@ava" in message_data.content.lower():
+        logger.info(f"🤖 @Ava mentioned in direct message by user {current_user.id}")
+        job_queue.enqueue(db, "ava_reply.dm", {
+            "user_id": current_user.id,
+            "recipient_id": recipient.id,
+            "conversation_id": conversation.id,
+            "message_id": new_message.id,
+            "query": message_data.content.replace("@Ava", "").replace("@ava", "").strip()
+        })
     db.commit()
     db.refresh(new_message)
 
-    # Check if message mentions @Ava
-    if "@ava" in message_data.content.lower() or "@Ava" in message_data.content:
-        logger.info(f"🤖 @Ava mentioned in direct message by user {current_user.id}")
+    realtime_hub.publish(realtime_hub.dm_channel(current_user.id, recipient.id), "message.created", message_event(new_message))
+    # Recipients not looking at this conversation still get their unread badge updated
+    realtime_hub.publish(realtime_hub.user_channel(recipient.id), "dm.received", {
+        "message_id": new_message.id,
+        "sender_id": current_user.id
+    })
+    return new_message
 
-        # Get recent messages for context (last 10 messages between these users)
-        recent_messages = db.query(Message).filter(
-            or_(
-                and_(Message.sender_id == current_user.id, Message.recipient_id == message_data.recipient_id),
-                and_(Message.sender_id == message_data.recipient_id, Message.recipient_id == current_user.id)
-            )
-        ).order_by(desc(Message.created_at)).limit(10).all()
-
-        # Build conversation context
-        conversation_context = []
-        for msg in reversed(recent_messages):
-            # Determine if message is from current user or recipient
-            if msg.sender_id == current_user.id:
-                sender_name = current_user.first_name
-                role = "user"
-            elif msg.sender_id == message_data.recipient_id:
-                other_user = db.query(User).filter(User.id == message_data.recipient_id).first()
-                sender_name = other_user.first_name if other_user else "User"
-                role = "user"
-            else:
-                # This is an Ava message (sender_id = 0)
-                sender_name = "Ava"
-                role = "assistant"
-
-            conversation_context.append({
-                "role": role,
-                "content": f"{sender_name}: {msg.content}"
-            })
 
-        # Extract the query (remove @Ava mention)
-        query = message_data.content.replace("@Ava", "").replace("@ava", "").strip()
-
-        # Get AI response with chat context
-        try:
-            ai_response = ai_assistant.chat_with_ai(
-                message=query,
-                user=current_user,
-                db=db,
-                conversation_history=conversation_context
-            )
-
-            # Create Ava's response message (sender_id=0, sent to current user)
-            # If links are present, append them to the content in a parseable format
-            message_content = ai_response["response"]
-            if ai_response.get("links"):
-                links_json = json.dumps(ai_response["links"])
-                message_content += f"\n\n__LINKS__:{links_json}"
-
-            ava_message = Message(
-                content=message_content,
-                sender_id=0,  # Special ID for Ava
-                recipient_id=current_user.id
-            )
-
-            db.add(ava_message)
-            db.commit()
-            logger.info(f"✅ Ava responded in direct message to user {current_user.id}")
-
-        except Exception as e:
-            logger.error(f"❌ Error getting Ava response: {e}")
+def ava_reply_failed(db: Session, payload: dict, error: str):
+    """Dead-lettered Ava reply: tell the user instead of leaving the mention unanswered"""
+    return post_ava_reply(db, payload, ai_assistant.AVA_UNAVAILABLE_MESSAGE)
 
-    return {
-        "id": new_message.id,
-        "content": new_message.content,
-        "is_from_me": True,
-        "sent_at": new_message.created_at,
-        "is_read": False
-    }
+
+@job_queue.handler("ava_reply.dm", on_dead=ava_reply_failed)
+def ava_reply(db: Session, payload: dict):
+    """Answer an @Ava mention in a direct message (job queue handler)"""
+    current_user = db.get(User, payload["user_id"])
+    recipient = db.get(User, payload["recipient_id"])
+    conversation = db.get(Conversation, payload["conversation_id"])
+    if current_user is None or recipient is None or conversation is None:
+        logger.warning(f"⚠️ Dropping Ava reply for message {payload['message_id']}: chat no longer exists")
+        return None
+
+    # Get recent messages for context (last 10 up to the mention, with Ava's earlier replies)
+    recent_messages = conversations.thread_query(db, conversation, current_user.id).filter(
+        Message.id <= payload["message_id"]
+    ).order_by(None).order_by(desc(Message.id)).limit(10).all()
+
+    # Build conversation context
+    conversation_context = []
+    for msg in reversed(recent_messages):
+        # Determine if message is from current user or recipient
+        if msg.sender_id == current_user.id:
+            sender_name = current_user.first_name
+            role = "user"
+        elif msg.sender_id == recipient.id:
+            sender_name = recipient.first_name
+            role = "user"
+        else:
+            # This is an Ava message (sender_id = 0)
+            sender_name = "Ava"
+            role = "assistant"
+
+        conversation_context.append({
+            "role": role,
+            "content": f"{sender_name}: {msg.content}"
+        })
+
+    # Get AI response with chat context (LLM errors raise, so the queue retries, then dead-letters;
+    # the exchange and its quota charge commit with the reply)
+    turn = ai_assistant.prepare_chat_turn(payload["query"], current_user, db, conversation_context, commit=False)
+    if "result" in turn:
+        ai_response = turn["result"]
+    else:
+        ai_response = ai_assistant.complete_chat_turn(turn, current_user, db, commit=False)
+
+    # If links are present, append them to the content in a parseable format
+    message_content = ai_response["response"]
+    if ai_response.get("links"):
+        links_json = json.dumps(ai_response["links"])
+        message_content += f"\n\n__LINKS__:{links_json}"
+
+    return post_ava_reply(db, payload, message_content)
+
+
+def post_ava_reply(db: Session, payload: dict, content: str):
+    """Add Ava's reply (sender_id=0, sent to the user who asked); returns the push to run after commit"""
+    ava_message = Message(
+        content=content,
+        sender_id=0,  # Special ID for Ava
+        recipient_id=payload["user_id"],
+        conversation_id=payload["conversation_id"]
+    )
+    db.add(ava_message)
+    db.flush()
+
+    def push():
+        # Ava's reply is private to the user who asked, so it goes to their own channel
+        realtime_hub.publish(realtime_hub.user_channel(payload["user_id"]), "ava.message", {
+            **message_event(ava_message, is_read=True),
+            "conversation_user_id": payload["recipient_id"]
+        })
+        logger.info(f"✅ Ava responded in direct message to user {payload['user_id']}")
+    return push
 
 
 @router.get("/unread-count")
@@ -257,12 +294,7 @@ async def get_unread_count(
     """
     Get count of unread messages
     """
-    count = db.query(func.count(Message.id)).filter(
-        Message.recipient_id == current_user.id,
-        Message.is_read == False
-    ).scalar() or 0
-    
-    return {"unread_count": count}
+    return {"unread_count": conversations.unread_total(db, current_user.id)}
 
 
 @router.delete("/{message_id}")
@@ -281,8 +313,14 @@ async def delete_message(
     if message.sender_id != current_user.id:
         raise HTTPException(status_code=403, detail="Not authorized to delete this message")
     
+    channel = realtime_hub.dm_channel(message.sender_id, message.recipient_id)
+    conversation = db.query(Conversation).filter(Conversation.id == message.conversation_id).first()
     db.delete(message)
+    db.flush()
+    if conversation is not None:
+        conversations.forget_message(db, conversation, message)
     db.commit()
+    realtime_hub.publish(channel, "message.deleted", {"id": message_id})
     
     return {"message": "Message deleted successfully"}
 
@@ -303,8 +341,14 @@ async def mark_message_read(
     if message.recipient_id != current_user.id:
         raise HTTPException(status_code=403, detail="Not authorized")
     
-    message.is_read = True
-    db.commit()
+    # Reading a message reads everything before it (the cursor only moves forward)
+    conversation = db.query(Conversation).filter(Conversation.id == message.conversation_id).first()
+    if conversation is not None and conversations.mark_read(db, conversation, current_user.id, up_to=message_id):
+        db.commit()
+        realtime_hub.publish(realtime_hub.dm_channel(message.sender_id, current_user.id), "messages.read", {
+            "reader_id": current_user.id,
+            "last_read_id": message_id
+        })
     
     return {"message": "Marked as read"}
 
@@ -318,11 +362,12 @@ async def mark_conversation_read(
     """
     Mark all messages from a user as read
     """
-    db.query(Message).filter(
-        Message.sender_id == user_id,
-        Message.recipient_id == current_user.id,
-        Message.is_read == False
-    ).update({"is_read": True})
-    db.commit()
+    conversation = conversations.find(db, current_user.id, user_id)
+    if conversation is not None and conversations.mark_read(db, conversation, current_user.id):
+        db.commit()
+        realtime_hub.publish(realtime_hub.dm_channel(current_user.id, user_id), "messages.read", {
+            "reader_id": current_user.id,
+            "last_read_id": conversation.last_message_id
+        })
     
     return {"message": "All messages marked as read"}
@@ -12,6 +12,7 @@ from database import (
     SessionLocal, User, Guild, Project, Product, Message, Order, Escrow, Payment,
     Post, Comment, Task, Wallet, WalletTransaction, init_db
 )
+import migrate_conversations
 from auth import get_password_hash
 import random
 from datetime import datetime, timedelta
@@ -434,6 +435,7 @@ def seed_comprehensive():
             message_count += 1
 
         db.commit()
+        migrate_conversations.migrate()  # thread the new messages into conversations
         print(f"✅ Created {message_count} messages")
 
         # Create tasks for projects
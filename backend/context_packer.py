@@ -0,0 +1,349 @@
+"""
+Context Packer
+Fits Ava's dynamic prompt context into a fixed, per-intent token budget
+
+Conversation turns, the rolling summary, mentioned entities, search hits,
+user data and platform stats are turned into scored ContextItems. pack()
+greedily takes items by value density (value / tokens) until the intent's
+budget is full, then renders the survivors in a stable order:
+
+    summary -> conversation turns (chronological) -> "Relevant data" block
+
+Prompt size is therefore bounded by system prompt + budget + capped user
+message, and every dropped item is reported so budgets can be tuned.
+"""
+
+from typing import List, Dict, Any, Optional, Tuple
+from dataclasses import dataclass, field
+from functools import lru_cache
+import os
+import json
+import threading
+import logging
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CONTEXT_BUDGET = int(os.getenv("AI_CONTEXT_BUDGET_TOKENS", "800"))
+MAX_USER_MESSAGE_TOKENS = int(os.getenv("AI_MAX_MESSAGE_TOKENS", "400"))
+
+# Tokens available for history + data, per intent. Search intents need room
+# for result cards; conversational ones mostly need earlier turns.
+INTENT_CONTEXT_BUDGETS: Dict[str, int] = {
+    "search_products": 1000,
+    "search_products_budget": 1000,
+    "search_projects": 900,
+    "search_guilds": 900,
+    "search_collaborators": 1000,
+    "general_search": 1200,
+    "recommendations": 900,
+    "suggest_selling": 800,
+    "suggest_guilds": 800,
+    "parse_shopping_list": 900,
+    "get_platform_stats": 500,
+    "help": 600,
+    "create": 600,
+    "general_question": 800,
+}
+
+# Base value of each kind of item; intents that depend on one kind boost it
+KIND_WEIGHTS: Dict[str, float] = {
+    "fact": 3.0,        # budget, no_results, counts: tiny and decisive
+    "mentioned": 3.0,   # entities the user named explicitly
+    "history": 2.0,     # earlier turns (decays with age)
+    "hit": 2.0,         # search results (scaled by relevance / rank)
+    "summary": 1.5,
+    "user_data": 1.2,   # the user's own projects / guilds
+    "stats": 0.6,
+}
+INTENT_KIND_WEIGHTS: Dict[str, Dict[str, float]] = {
+    "get_platform_stats": {"stats": 4.0},
+    "general_question": {"history": 3.0, "summary": 2.5},
+    "help": {"history": 2.5},
+    "recommendations": {"user_data": 2.5},
+}
+
+HISTORY_DECAY = 0.75  # value multiplier per turn of age
+RANK_DECAY = 0.15     # hit value = weight / (1 + RANK_DECAY * rank) when no score
+MESSAGE_OVERHEAD_TOKENS = 4  # chat format cost per message
+MAX_FIELD_CHARS = 120
+
+# Context keys: (item kind, how entries are labelled in the data block)
+CONTEXT_KEYS: Dict[str, str] = {
+    "mentioned_guilds": "mentioned",
+    "mentioned_projects": "mentioned",
+    "mentioned_products": "mentioned",
+    "mentioned_users": "mentioned",
+    "matching_products": "hit",
+    "products": "hit",
+    "projects": "hit",
+    "guilds": "hit",
+    "collaborators": "hit",
+    "users": "hit",
+    "tasks": "hit",
+    "recommended_projects": "hit",
+    "trending_products": "hit",
+    "shopping_list": "hit",
+    "user_projects": "user_data",
+    "user_guilds": "user_data",
+    "platform_stats": "stats",
+}
+# Scalar / small facts worth one line each
+FACT_KEYS = ("budget", "no_results", "total_found", "mentioned_skills", "product_categories",
+             "selling_suggestions", "matched_product_ids", "auto_cart_ready", "negotiation_complete",
+             "escrow_ready")
+# Never sent to the model (not useful, or personal data). Also covers the context keys
+# that are bookkeeping or ORM objects: sources, and popular_products (its names are
+# already in selling_suggestions)
+DROP_FIELDS = {"image", "image_url", "avatar", "avatar_url", "email", "score", "start", "end",
+               "sources", "popular_products"}
+
+
+# ----------------------------------------------------------------------
+# Tokenizer
+# ----------------------------------------------------------------------
+
+_encoder_lock = threading.Lock()
+_encoder = None
+_encoder_failed = False
+
+
+def _get_encoder():
+    """Load the tokenizer once; fall back to a length estimate if unavailable"""
+    global _encoder, _encoder_failed
+    if _encoder is None and not _encoder_failed:
+        with _encoder_lock:
+            if _encoder is None and not _encoder_failed:
+                try:
+                    import tiktoken
+                    _encoder = tiktoken.encoding_for_model("gpt-4o-mini")
+                except Exception as e:
+                    logger.warning(f"Tokenizer unavailable, estimating tokens from length: {e}")
+                    _encoder_failed = True
+    return _encoder
+
+
+@lru_cache(maxsize=8192)
+def count_tokens(text: str) -> int:
+    """Token count, memoized: prompt modules and entity cards repeat a lot"""
+    encoder = _get_encoder()
+    if encoder is None:
+        return max(1, len(text) // 4) if text else 0
+    return len(encoder.encode(text))
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    if count_tokens(text) <= max_tokens:
+        return text
+    encoder = _get_encoder()
+    if encoder is None:
+        return text[:max_tokens * 4]
+    return encoder.decode(encoder.encode(text)[:max_tokens])
+
+
+# ----------------------------------------------------------------------
+# Items
+# ----------------------------------------------------------------------
+
+@dataclass
+class ContextItem:
+    kind: str
+    key: str                 # context key / "turn" / "summary"
+    value: float
+    order: int               # position in the rendered prompt
+    messages: List[Dict[str, str]] = field(default_factory=list)  # history / summary
+    data: Any = None         # entry for the data block
+    tokens: int = 0
+
+
+def _card(entry: Dict[str, Any]) -> Dict[str, Any]:
+    card = {}
+    for name, value in entry.items():
+        if name in DROP_FIELDS or value in (None, "", []):
+            continue
+        if isinstance(value, str) and len(value) > MAX_FIELD_CHARS:
+            value = value[:MAX_FIELD_CHARS]
+        card[name] = value
+    return card
+
+
+def _weights(intent: str) -> Dict[str, float]:
+    return {**KIND_WEIGHTS, **INTENT_KIND_WEIGHTS.get(intent, {})}
+
+
+def _data_tokens(key: str, data: Any) -> int:
+    # Cost of one entry inside the data block, including its key
+    return count_tokens(json.dumps({key: data}, default=str))
+
+
+def items_from_context(context: Optional[Dict[str, Any]], intent: str, start_order: int = 1000) -> List[ContextItem]:
+    """Score gather_context() output. Non-serializable entries (ORM objects) are skipped."""
+    if not context:
+        return []
+    weights = _weights(intent)
+    items = []
+    order = start_order
+    for key, kind in CONTEXT_KEYS.items():
+        entries = context.get(key)
+        if not entries:
+            continue
+        if isinstance(entries, dict):
+            entries = [entries]
+        for rank, entry in enumerate(entries):
+            if not isinstance(entry, dict):
+                continue
+            score = entry.get("score")
+            relevance = float(score) if isinstance(score, (int, float)) else 1.0 / (1 + RANK_DECAY * rank)
+            data = _card(entry)
+            items.append(ContextItem(kind=kind, key=key, value=weights[kind] * relevance, order=order,
+                                     data=data, tokens=_data_tokens(key, data)))
+            order += 1
+    for key in FACT_KEYS:
+        if key in context and context[key] not in (None, "", []):
+            data = context[key]
+            items.append(ContextItem(kind="fact", key=key, value=weights["fact"], order=order,
+                                     data=data, tokens=_data_tokens(key, data)))
+            order += 1
+    return items
+
+
+def items_from_memory(memory_context: Optional[Dict[str, Any]], intent: str,
+                      fallback_history: Optional[List[Dict[str, str]]] = None) -> List[ContextItem]:
+    """Score the stored summary and earlier turns (newest turns are worth most)"""
+    weights = _weights(intent)
+    memory_context = memory_context or {}
+    items = []
+
+    summary = memory_context.get("summary")
+    if summary:
+        message = {"role": "system", "content": f"Previous conversation summary: {summary}"}
+        items.append(ContextItem(kind="summary", key="summary", value=weights["summary"], order=0,
+                                 messages=[message], tokens=_messages_tokens([message])))
+
+    history = memory_context.get("recent_messages") or fallback_history or []
+    turns: List[List[Dict[str, str]]] = []
+    for message in history:
+        if message["role"] == "user" or not turns:
+            turns.append([message])
+        else:
+            turns[-1].append(message)
+    for index, turn in enumerate(turns):
+        age = len(turns) - 1 - index
+        items.append(ContextItem(kind="history", key="turn", value=weights["history"] * HISTORY_DECAY ** age,
+                                 order=1 + index, messages=turn, tokens=_messages_tokens(turn)))
+    return items
+
+
+def _messages_tokens(messages: List[Dict[str, str]]) -> int:
+    return sum(count_tokens(m["content"]) + MESSAGE_OVERHEAD_TOKENS for m in messages)
+
+
+# ----------------------------------------------------------------------
+# Packing
+# ----------------------------------------------------------------------
+
+@dataclass
+class PackResult:
+    messages: List[Dict[str, str]]
+    budget: int
+    tokens: int
+    selected: List[ContextItem]
+    dropped: List[ContextItem]
+
+    def report(self) -> Dict[str, Any]:
+        by_kind: Dict[str, int] = {}
+        for item in self.selected:
+            by_kind[item.kind] = by_kind.get(item.kind, 0) + 1
+        return {
+            "budget": self.budget,
+            "tokens": self.tokens,
+            "selected": by_kind,
+            "dropped": [
+                {"kind": item.kind, "key": item.key, "tokens": item.tokens, "value": round(item.value, 3)}
+                for item in self.dropped
+            ],
+        }
+
+
+def budget_for(intent: str) -> int:
+    return INTENT_CONTEXT_BUDGETS.get(intent, DEFAULT_CONTEXT_BUDGET)
+
+
+def _render(selected: List[ContextItem]) -> List[Dict[str, str]]:
+    ordered = sorted(selected, key=lambda item: item.order)
+    messages = [m for item in ordered if item.messages for m in item.messages]
+    data: Dict[str, Any] = {}
+    for item in ordered:
+        if item.data is None:
+            continue
+        if item.kind == "fact" or item.kind == "stats":
+            data[item.key] = item.data
+        else:
+            data.setdefault(item.key, []).append(item.data)
+    if data:
+        messages.append({"role": "system", "content": f"Relevant data:\n{json.dumps(data, default=str)}"})
+    return messages
+
+
+def pack(items: List[ContextItem], budget: int) -> PackResult:
+    """Greedy by value density; rendered output is guaranteed to fit the budget"""
+    ranked = sorted(items, key=lambda item: (-item.value / max(item.tokens, 1), item.order))
+    selected, dropped = [], []
+    used = 0
+    for item in ranked:
+        if used + item.tokens <= budget:
+            selected.append(item)
+            used += item.tokens
+        else:
+            dropped.append(item)
+
+    # Per-item costs are estimates of their share of the rendered block; trim
+    # the least dense items until the real rendering fits
+    messages = _render(selected)
+    tokens = _messages_tokens(messages)
+    while tokens > budget and selected:
+        dropped.append(selected.pop())
+        messages = _render(selected)
+        tokens = _messages_tokens(messages)
+
+    _record(tokens, dropped)
+    return PackResult(messages=messages, budget=budget, tokens=tokens, selected=selected, dropped=dropped)
+
+
+def build_messages(system_messages: List[Dict[str, str]], message: str, intent: str,
+                   context: Optional[Dict[str, Any]], memory_context: Optional[Dict[str, Any]],
+                   fallback_history: Optional[List[Dict[str, str]]] = None) -> Tuple[List[Dict[str, str]], PackResult]:
+    """Full prompt: system messages, packed context, then the (capped) user message"""
+    items = items_from_memory(memory_context, intent, fallback_history) + items_from_context(context, intent)
+    result = pack(items, budget_for(intent))
+    user_message = {"role": "user", "content": truncate_to_tokens(message, MAX_USER_MESSAGE_TOKENS)}
+    return system_messages + result.messages + [user_message], result
+
+
+# ----------------------------------------------------------------------
+# Stats
+# ----------------------------------------------------------------------
+
+_stats_lock = threading.Lock()
+_stats = {"packs": 0, "tokens_packed": 0, "items_dropped": 0, "tokens_dropped": 0}
+_dropped_by_key: Dict[str, int] = {}
+
+
+def _record(tokens: int, dropped: List[ContextItem]):
+    with _stats_lock:
+        _stats["packs"] += 1
+        _stats["tokens_packed"] += tokens
+        _stats["items_dropped"] += len(dropped)
+        _stats["tokens_dropped"] += sum(item.tokens for item in dropped)
+        for item in dropped:
+            _dropped_by_key[item.key] = _dropped_by_key.get(item.key, 0) + 1
+
+
+def get_stats() -> Dict[str, Any]:
+    with _stats_lock:
+        packs = _stats["packs"]
+        return {
+            **_stats,
+            "avg_context_tokens": round(_stats["tokens_packed"] / packs, 1) if packs else 0.0,
+            "dropped_by_key": dict(_dropped_by_key),
+            "cache": count_tokens.cache_info()._asdict(),
+        }
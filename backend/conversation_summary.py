@@ -0,0 +1,230 @@
+"""
+Conversation Summaries
+Persisted rolling summaries for long AI assistant sessions
+
+Each session has one ai_conversation_summaries row holding the summary text
+and a watermark: the last ai_conversations.id folded into it. Turns after the
+watermark are sent to the model verbatim, so the summary never has to be
+rebuilt on the request path.
+
+After a reply has been sent, schedule_fold() looks at the unsummarized tail,
+leaving the KEEP_RECENT_TURNS newest turns verbatim. Only once the rest of
+the tail holds AI_SUMMARY_FOLD_TOKENS tokens is it folded into the stored
+summary, so a long session pays for one summarization every few turns
+instead of one per turn. A tail longer than MAX_FOLD_TURNS (sessions that
+predate summaries) is folded in chunks, oldest first, each advancing the
+watermark only past the turns it actually summarized.
+"""
+
+from typing import List, Dict, Any, Optional
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, asdict
+from sqlalchemy.orm import Session
+from sqlalchemy.exc import IntegrityError
+import os
+import threading
+import logging
+
+from database import AIConversation, AIConversationSummary, SessionLocal
+import ai_token_manager
+import llm_gateway
+import tracing
+
+logger = logging.getLogger(__name__)
+
+# Newest turns always sent verbatim (matches the assistant's memory window)
+KEEP_RECENT_TURNS = 3
+# Unsummarized tokens (beyond the verbatim window) that trigger a fold
+AI_SUMMARY_FOLD_TOKENS = int(os.getenv("AI_SUMMARY_FOLD_TOKENS", "1200"))
+# Upper bound on turns sent in one summarization call; longer tails fold in chunks
+MAX_FOLD_TURNS = 30
+
+SUMMARY_PROMPT = """You are an expert conversation summarizer for an AI assistant on a marketplace platform.
+
+You maintain a running summary of a conversation. You are given the current summary (possibly empty) and the turns that happened since it was written. Return the updated summary, capturing:
+
+1. **User's main interests/goals**: What are they trying to accomplish? (shopping, freelancing, guild joining, etc.)
+2. **Key preferences**: Budget ranges, preferred categories, skill interests, location preferences
+3. **Ongoing tasks**: Any incomplete actions or pending decisions
+4. **Platform familiarity**: How well they know the platform features
+5. **Previous recommendations**: What was suggested and their responses
+6. **Negotiation context**: Any ongoing project discussions or agreements
+7. **Shopping cart state**: Any items added to cart or shopping intentions
+
+Keep facts from the current summary unless the new turns supersede them.
+Format as a structured summary with clear sections. Keep it concise but comprehensive."""
+
+_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="summary-fold")
+_lock = threading.Lock()
+_in_flight = set()
+
+
+@dataclass
+class SummaryStats:
+    scheduled: int = 0
+    already_running: int = 0
+    below_threshold: int = 0
+    folds: int = 0
+    turns_folded: int = 0
+    conflicts: int = 0
+    failures: int = 0
+
+
+stats = SummaryStats()
+
+
+def _bump(counter: str, amount: int = 1):
+    with _lock:
+        setattr(stats, counter, getattr(stats, counter) + amount)
+
+
+def get_summary(session_id: str, db: Session) -> Optional[AIConversationSummary]:
+    return db.query(AIConversationSummary).filter(
+        AIConversationSummary.session_id == session_id
+    ).first()
+
+
+def summarize_turns(previous_summary: str, turns: List[Any]) -> Optional[str]:
+    """Fold turns into the previous summary; None if the model call failed"""
+    conv_text = "\n".join(
+        f"User: {turn.user_message}\nAI: {turn.ai_response}\nIntent: {turn.intent}"
+        for turn in turns
+    )
+    try:
+        response = llm_gateway.chat(
+            "assistant.summary",
+            model="gpt-4o-mini",
+            messages=[
+                {"role": "system", "content": SUMMARY_PROMPT},
+                {
+                    "role": "user",
+                    "content": f"Current summary:\n{previous_summary or '(none yet)'}\n\nNew turns:\n{conv_text}\n\nReturn the updated summary."
+                }
+            ],
+            temperature=0.2,
+            max_tokens=300
+        )
+        summary = (response.choices[0].message.content or "").strip()
+    except Exception as e:
+        logger.warning(f"Failed to fold conversation summary: {e}")
+        return None
+
+    if len(summary) < 50:
+        # Too thin to be useful; keep something rather than losing the turns
+        intents = sorted({turn.intent for turn in turns if turn.intent and turn.intent != "general_question"})
+        summary = "\n".join(part for part in (previous_summary, f"Later topics: {', '.join(intents)}" if intents else "") if part)
+    return summary
+
+
+def _write_fold(db: Session, session_id: str, stored: Optional[AIConversationSummary], watermark: int,
+                chunk: List[Any], summary: str) -> Optional[AIConversationSummary]:
+    """Advance the summary past chunk; None (rolled back) if another worker folded first"""
+    try:
+        if stored is None:
+            stored = AIConversationSummary(
+                session_id=session_id,
+                user_id=chunk[-1].user_id,
+                summary=summary,
+                summarized_through_id=chunk[-1].id,
+                summarized_turns=len(chunk),
+            )
+            db.add(stored)
+        else:
+            # Only advance from the watermark we read; another worker may have folded meanwhile
+            updated = db.query(AIConversationSummary).filter(
+                AIConversationSummary.id == stored.id,
+                AIConversationSummary.summarized_through_id == watermark
+            ).update({
+                "summary": summary,
+                "summarized_through_id": chunk[-1].id,
+                "summarized_turns": AIConversationSummary.summarized_turns + len(chunk),
+            }, synchronize_session=False)
+            if not updated:
+                db.rollback()
+                return None
+        db.commit()
+    except IntegrityError:
+        db.rollback()
+        return None
+    return stored
+
+
+def fold_session(session_id: str, db: Session) -> bool:
+    """
+    Fold the session's unsummarized tail into its stored summary if it has
+    grown past AI_SUMMARY_FOLD_TOKENS. Returns True when a fold was written.
+    """
+    stored = get_summary(session_id, db)
+    watermark = stored.summarized_through_id if stored else 0
+
+    tail = db.query(
+        AIConversation.id, AIConversation.user_id, AIConversation.user_message,
+        AIConversation.ai_response, AIConversation.intent
+    ).filter(
+        AIConversation.session_id == session_id,
+        AIConversation.id > watermark
+    ).order_by(AIConversation.id).all()
+
+    foldable = tail[:-KEEP_RECENT_TURNS]
+    tail_tokens = sum(ai_token_manager.count_tokens(t.user_message + t.ai_response) for t in foldable)
+    if tail_tokens < AI_SUMMARY_FOLD_TOKENS:
+        _bump("below_threshold")
+        return False
+
+    summary = stored.summary if stored else ""
+    folded = 0
+    for start in range(0, len(foldable), MAX_FOLD_TURNS):
+        chunk = foldable[start:start + MAX_FOLD_TURNS]
+        summary = summarize_turns(summary, chunk)
+        if summary is None:
+            _bump("failures")
+            break
+        stored = _write_fold(db, session_id, stored, watermark, chunk, summary)
+        if stored is None:
+            _bump("conflicts")
+            break
+        watermark = chunk[-1].id
+        folded += len(chunk)
+        _bump("folds")
+        _bump("turns_folded", len(chunk))
+
+    if not folded:
+        return False
+    logger.info(f"📝 Folded {folded} turns ({tail_tokens} tokens) into summary for session {session_id[:8]}...")
+    return True
+
+
+def _fold_in_background(session_id: str):
+    db = SessionLocal()
+    try:
+        with tracing.trace("summary.fold", **{"session_id": session_id}):
+            fold_session(session_id, db)
+    except Exception as e:
+        logger.warning(f"Summary fold failed for session {session_id[:8]}...: {e}")
+        db.rollback()
+        _bump("failures")
+    finally:
+        db.close()
+        with _lock:
+            _in_flight.discard(session_id)
+
+
+def schedule_fold(session_id: str):
+    """Check (and if needed fold) the session's summary off the request path"""
+    if not llm_gateway.is_configured():
+        return
+    with _lock:
+        if session_id in _in_flight:
+            stats.already_running += 1
+            return
+        _in_flight.add(session_id)
+        stats.scheduled += 1
+    _executor.submit(_fold_in_background, session_id)
+
+
+def get_stats() -> Dict[str, Any]:
+    with _lock:
+        snapshot = asdict(stats)
+        snapshot["in_flight"] = len(_in_flight)
+    snapshot["fold_threshold_tokens"] = AI_SUMMARY_FOLD_TOKENS
+    return snapshot
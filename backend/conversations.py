@@ -0,0 +1,180 @@
+"""
+Conversations
+Direct message threads with maintained last-message pointers, unread counters and read cursors
+
+Every direct message belongs to a conversations row for its pair of users
+(stored low id first). chat_routes keeps the row in step inside the same
+transaction as the message:
+
+- sending bumps last_message_id and the recipient's unread counter
+- reading moves the reader's cursor (last message id read) forward and
+  resets or recounts their unread counter; cursors never move backwards
+- deleting the newest or an unread message repairs the pointer/counter
+
+so the inbox, the unread badge and "mark as read" are single-row or
+single-index reads and writes instead of scans over messages. A message is
+read by its recipient when its id is at or below the recipient's cursor.
+Ava's replies (sender_id 0) are attached to the conversation they answered
+but are private to the user who asked and don't touch counters.
+"""
+
+from typing import List, Optional, Tuple
+from datetime import datetime
+from sqlalchemy import case, func, or_
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+import logging
+
+from database import Conversation, Message, User
+
+logger = logging.getLogger(__name__)
+
+AVA_SENDER_ID = 0
+
+
+def pair(user_a: int, user_b: int) -> Tuple[int, int]:
+    return (user_a, user_b) if user_a < user_b else (user_b, user_a)
+
+
+def _side(conversation: Conversation, user_id: int) -> str:
+    return "low" if conversation.user_low_id == user_id else "high"
+
+
+def partner_id(conversation: Conversation, user_id: int) -> int:
+    return conversation.user_high_id if conversation.user_low_id == user_id else conversation.user_low_id
+
+
+def unread_count(conversation: Conversation, user_id: int) -> int:
+    return getattr(conversation, f"{_side(conversation, user_id)}_unread_count") or 0
+
+
+def last_read_id(conversation: Conversation, user_id: int) -> int:
+    return getattr(conversation, f"{_side(conversation, user_id)}_last_read_id") or 0
+
+
+def is_read(conversation: Optional[Conversation], message: Message) -> bool:
+    """Whether the message's recipient has read it (by their cursor)"""
+    if conversation is None:
+        return bool(message.is_read)
+    return message.id <= last_read_id(conversation, message.recipient_id)
+
+
+def find(db: Session, user_a: int, user_b: int) -> Optional[Conversation]:
+    low, high = pair(user_a, user_b)
+    return db.query(Conversation).filter(
+        Conversation.user_low_id == low,
+        Conversation.user_high_id == high
+    ).first()
+
+
+def get_or_create(db: Session, user_a: int, user_b: int) -> Conversation:
+    """The pair's conversation, created inside the caller's transaction if new"""
+    conversation = find(db, user_a, user_b)
+    if conversation is not None:
+        return conversation
+    low, high = pair(user_a, user_b)
+    try:
+        with db.begin_nested():
+            conversation = Conversation(user_low_id=low, user_high_id=high, last_activity_at=datetime.utcnow())
+            db.add(conversation)
+        return conversation
+    except IntegrityError:
+        # Another request created it between our lookup and insert
+        return find(db, user_a, user_b)
+
+
+def record_message(db: Session, conversation: Conversation, message: Message):
+    """Point the conversation at a just-flushed message and count it as unread for the recipient"""
+    if message.sender_id == AVA_SENDER_ID:
+        return
+    unread = getattr(Conversation, f"{_side(conversation, message.recipient_id)}_unread_count")
+    newer = or_(Conversation.last_message_id == None, Conversation.last_message_id < message.id)
+    db.query(Conversation).filter(Conversation.id == conversation.id).update({
+        # Concurrent sends can commit out of order; the pointer only moves forward
+        Conversation.last_message_id: case((newer, message.id), else_=Conversation.last_message_id),
+        Conversation.last_activity_at: case((newer, message.created_at), else_=Conversation.last_activity_at),
+        unread: unread + 1
+    }, synchronize_session=False)
+    db.expire(conversation)
+
+
+def mark_read(db: Session, conversation: Conversation, user_id: int, up_to: Optional[int] = None) -> bool:
+    """
+    Move user_id's read cursor to up_to (default: the newest message) in one
+    row update. Idempotent and monotonic; returns whether anything changed.
+    """
+    target = conversation.last_message_id if up_to is None else up_to
+    if target is None or target <= last_read_id(conversation, user_id):
+        return False
+    side = _side(conversation, user_id)
+    cursor = getattr(Conversation, f"{side}_last_read_id")
+    unread = getattr(Conversation, f"{side}_unread_count")
+    row = db.query(Conversation).filter(Conversation.id == conversation.id)
+
+    if up_to is None or (conversation.last_message_id is not None and up_to >= conversation.last_message_id):
+        # Evaluated in the row itself, so a message sent meanwhile is either read or still counted
+        changed = row.filter(cursor < Conversation.last_message_id).update(
+            {cursor: Conversation.last_message_id, unread: 0}, synchronize_session=False)
+    else:
+        remaining = db.query(func.count(Message.id)).filter(
+            Message.conversation_id == conversation.id,
+            Message.sender_id == partner_id(conversation, user_id),
+            Message.id > up_to
+        ).scalar() or 0
+        changed = row.filter(cursor < up_to).update({cursor: up_to, unread: remaining}, synchronize_session=False)
+    db.expire(conversation)
+    return bool(changed)
+
+
+def forget_message(db: Session, conversation: Conversation, message: Message):
+    """Repair the pointer and the recipient's counter after message is deleted (call after the delete is flushed)"""
+    if message.sender_id == AVA_SENDER_ID:
+        return
+    if message.id > last_read_id(conversation, message.recipient_id):
+        unread = getattr(Conversation, f"{_side(conversation, message.recipient_id)}_unread_count")
+        db.query(Conversation).filter(Conversation.id == conversation.id, unread > 0).update(
+            {unread: unread - 1}, synchronize_session=False)
+    if conversation.last_message_id == message.id:
+        newest = db.query(Message.id, Message.created_at).filter(
+            Message.conversation_id == conversation.id,
+            Message.sender_id != AVA_SENDER_ID
+        ).order_by(Message.id.desc()).first()
+        db.query(Conversation).filter(Conversation.id == conversation.id).update({
+            Conversation.last_message_id: newest.id if newest else None,
+            Conversation.last_activity_at: newest.created_at if newest else conversation.created_at
+        }, synchronize_session=False)
+    db.expire(conversation)
+
+
+def unread_total(db: Session, user_id: int) -> int:
+    """Unread direct messages across all of a user's conversations"""
+    total = db.query(func.sum(case(
+        (Conversation.user_low_id == user_id, Conversation.low_unread_count),
+        else_=Conversation.high_unread_count
+    ))).filter(
+        or_(Conversation.user_low_id == user_id, Conversation.user_high_id == user_id)
+    ).scalar()
+    return int(total or 0)
+
+
+def inbox(db: Session, user_id: int, limit: int = 50, before: Optional[int] = None) -> List[Tuple[Conversation, User, Message]]:
+    """A page of (conversation, partner, last message), most recent first, keyed on last_message_id"""
+    partner = case((Conversation.user_low_id == user_id, Conversation.user_high_id), else_=Conversation.user_low_id)
+    query = db.query(Conversation, User, Message).join(
+        User, User.id == partner
+    ).join(
+        Message, Message.id == Conversation.last_message_id
+    ).filter(
+        or_(Conversation.user_low_id == user_id, Conversation.user_high_id == user_id)
+    )
+    if before is not None:
+        query = query.filter(Conversation.last_message_id < before)
+    return query.order_by(Conversation.last_message_id.desc()).limit(limit).all()
+
+
+def thread_query(db: Session, conversation: Conversation, viewer_id: int):
+    """Messages of a conversation as viewer_id sees them (only their own Ava replies), oldest first"""
+    return db.query(Message).filter(
+        Message.conversation_id == conversation.id,
+        or_(Message.sender_id != AVA_SENDER_ID, Message.recipient_id == viewer_id)
+    ).order_by(Message.id.asc())
@@ -1,4 +1,4 @@
-from sqlalchemy import create_engine, Column, Integer, String, DateTime, Boolean, Text, Float, ForeignKey, Table
+from sqlalchemy import create_engine, Column, Integer, String, DateTime, Boolean, Text, Float, ForeignKey, Table, Index, UniqueConstraint
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, relationship
 from datetime import datetime
@@ -35,7 +35,8 @@ guild_members = Table(
     Base.metadata,
     Column('user_id', Integer, ForeignKey('users.id')),
     Column('guild_id', Integer, ForeignKey('guilds.id')),
-    Column('joined_at', DateTime, default=datetime.utcnow)
+    Column('joined_at', DateTime, default=datetime.utcnow),
+    Index("ix_guild_members_user_id", "user_id", "guild_id")
 )
 
 project_members = Table(
@@ -229,6 +230,7 @@ class AIConversation(Base):
     context_summary = Column(Text, nullable=True)  # Summary of context for this message
     tokens_used = Column(Integer, default=0)  # Tokens consumed in this exchange
     session_total_tokens = Column(Integer, default=0)  # Running total for session
+    usage_flushed = Column(Boolean, default=False, index=True)  # Counted into users.ai_tokens_used yet
     created_at = Column(DateTime, default=datetime.utcnow, index=True)
     last_activity_at = Column(DateTime, default=datetime.utcnow)  # For session timeout tracking
 
@@ -236,6 +238,20 @@ class AIConversation(Base):
     user = relationship("User", backref="ai_conversations")
 
 
+class AIConversationSummary(Base):
+    """Rolling summary of a session's older AI conversation turns"""
+    __tablename__ = "ai_conversation_summaries"
+
+    id = Column(Integer, primary_key=True, index=True)
+    session_id = Column(String, nullable=False, unique=True, index=True)
+    user_id = Column(Integer, ForeignKey('users.id'), nullable=True, index=True)
+    summary = Column(Text, nullable=False, default="")
+    summarized_through_id = Column(Integer, nullable=False, default=0)  # Watermark: last ai_conversations.id folded in
+    summarized_turns = Column(Integer, nullable=False, default=0)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
 class Message(Base):
     __tablename__ = "messages"
 
@@ -243,12 +259,52 @@ class Message(Base):
     content = Column(Text, nullable=False)
     sender_id = Column(Integer, ForeignKey('users.id'))
     recipient_id = Column(Integer, ForeignKey('users.id'))
-    is_read = Column(Boolean, default=False)
+    conversation_id = Column(Integer, ForeignKey('conversations.id'), nullable=True)
+    is_read = Column(Boolean, default=False)  # Legacy; read state lives on conversations
     created_at = Column(DateTime, default=datetime.utcnow)
 
     # Relationships
     sender = relationship("User", back_populates="sent_messages", foreign_keys=[sender_id])
 
+    # Both directions of a conversation, newest last (inbox and thread queries)
+    __table_args__ = (
+        Index("ix_messages_sender_recipient_id", "sender_id", "recipient_id", "id"),
+        Index("ix_messages_recipient_sender_id", "recipient_id", "sender_id", "id"),
+        Index("ix_messages_conversation_id", "conversation_id", "id"),
+        # Read cursors and inbox pages compare ids, so SQLite must not reuse a deleted max id
+        {"sqlite_autoincrement": True},
+    )
+
+
+class Conversation(Base):
+    """
+    One row per pair of users who have exchanged direct messages, kept in
+    step with messages by chat_routes (see conversations.py). The pair is
+    stored low id first; each participant has an unread counter and a read
+    cursor (the last message id they have read).
+    """
+    __tablename__ = "conversations"
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_low_id = Column(Integer, ForeignKey('users.id'), nullable=False)
+    user_high_id = Column(Integer, ForeignKey('users.id'), nullable=False)
+    last_message_id = Column(Integer, nullable=True)  # Newest message between the two (not Ava's)
+    last_activity_at = Column(DateTime, default=datetime.utcnow)
+    low_unread_count = Column(Integer, default=0, nullable=False)
+    high_unread_count = Column(Integer, default=0, nullable=False)
+    low_last_read_id = Column(Integer, default=0, nullable=False)
+    high_last_read_id = Column(Integer, default=0, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        UniqueConstraint("user_low_id", "user_high_id", name="uq_conversations_pair"),
+        # Inbox for either participant, most recent first
+        Index("ix_conversations_low_last_message", "user_low_id", "last_message_id"),
+        Index("ix_conversations_high_last_message", "user_high_id", "last_message_id"),
+        # Retention keeps every conversation's last message in the hot table
+        Index("ix_conversations_last_message_id", "last_message_id"),
+    )
+
 
 class Post(Base):
     __tablename__ = "posts"
@@ -271,6 +327,11 @@ class Post(Base):
     author = relationship("User")
     guild = relationship("Guild")
 
+    # A guild's posts over a time window (digests)
+    __table_args__ = (
+        Index("ix_posts_guild_created", "guild_id", "created_at"),
+    )
+
 
 # Post likes association table
 post_likes = Table(
@@ -342,6 +403,12 @@ class Order(Base):
     product = relationship("Product", foreign_keys=[product_id])
     project = relationship("Project", foreign_keys=[project_id])
 
+    # A user's recent orders on either side (digests)
+    __table_args__ = (
+        Index("ix_orders_buyer_updated", "buyer_id", "updated_at"),
+        Index("ix_orders_seller_updated", "seller_id", "updated_at"),
+    )
+
 
 class Escrow(Base):
     __tablename__ = "escrows"
@@ -465,6 +532,11 @@ class GuildChatMessage(Base):
     guild_chat = relationship("GuildChat", back_populates="messages")
     sender = relationship("User")
 
+    # Pages and unread counts are id ranges within a chat
+    __table_args__ = (
+        Index("ix_guild_chat_messages_chat_id", "guild_chat_id", "id"),
+    )
+
 
 class ProjectChat(Base):
     __tablename__ = "project_chats"
@@ -496,6 +568,175 @@ class ProjectChatMessage(Base):
     chat = relationship("ProjectChat", back_populates="messages")
     sender = relationship("User")
 
+    # Pages and unread counts are id ranges within a chat
+    __table_args__ = (
+        Index("ix_project_chat_messages_chat_id", "chat_id", "id"),
+    )
+
+
+class ReadCursor(Base):
+    """
+    The last message a user has read in a guild or project chat, keyed by
+    the realtime channel name (guild_chat:{guild_id}, project_chat:{chat_id}).
+    Direct message cursors live on the conversations row. See read_state.py.
+    """
+    __tablename__ = "read_cursors"
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey('users.id'), nullable=False)
+    channel = Column(String, nullable=False)
+    last_read_message_id = Column(Integer, default=0, nullable=False)
+    updated_at = Column(DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        UniqueConstraint("user_id", "channel", name="uq_read_cursors_user_channel"),
+    )
+
+
+class Notification(Base):
+    """An in-app notification for one user (see notifications.py)"""
+    __tablename__ = "notifications"
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey('users.id'), nullable=False)
+    type = Column(String, nullable=False)  # order.created, order.escrow_funded, message.received, ...
+    title = Column(String, nullable=False)
+    message = Column(Text, nullable=False)
+    link = Column(String, nullable=True)
+    actor_id = Column(Integer, ForeignKey('users.id'), nullable=True)  # Who caused it
+    collapse_key = Column(String, nullable=True)  # One unread notification per key (e.g. per DM sender)
+    is_read = Column(Boolean, default=False, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+    # Listing pages and unread counts are id ranges per recipient
+    __table_args__ = (
+        Index("ix_notifications_user_id", "user_id", "id"),
+        Index("ix_notifications_user_unread", "user_id", "is_read", "id"),
+    )
+
+
+class NotificationPreference(Base):
+    """Per-user notification switches; users without a row get the defaults"""
+    __tablename__ = "notification_preferences"
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey('users.id'), unique=True, nullable=False)
+    email_notifications = Column(Boolean, default=True, nullable=False)
+    push_notifications = Column(Boolean, default=True, nullable=False)  # Live delivery over realtime
+    guild_updates = Column(Boolean, default=True, nullable=False)
+    marketplace_updates = Column(Boolean, default=True, nullable=False)
+    project_updates = Column(Boolean, default=True, nullable=False)
+    message_notifications = Column(Boolean, default=True, nullable=False)
+    ai_insights = Column(Boolean, default=True, nullable=False)
+    weekly_digest = Column(Boolean, default=False, nullable=False)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+class ActivityEvent(Base):
+    """
+    One thing that happened on the platform: actor did verb to object (in
+    target). Append-only, written in batches by activity_log.py.
+    """
+    __tablename__ = "activity_events"
+
+    id = Column(Integer, primary_key=True, index=True)
+    actor_id = Column(Integer, ForeignKey('users.id'), nullable=True)  # None for the system
+    verb = Column(String, nullable=False)  # created, joined, paid, released, ...
+    object_type = Column(String, nullable=False)  # guild, post, order, project, ...
+    object_id = Column(Integer, nullable=True)
+    target_type = Column(String, nullable=True)  # Context, e.g. the guild a post is in
+    target_id = Column(Integer, nullable=True)
+    extra_data = Column(Text, nullable=True)  # JSON: names needed to display the event
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+    __table_args__ = (
+        Index("ix_activity_events_actor", "actor_id", "id"),
+        Index("ix_activity_events_object", "object_type", "object_id", "id"),
+        Index("ix_activity_events_target", "target_type", "target_id", "created_at"),
+        Index("ix_activity_events_created_at", "created_at"),
+    )
+
+
+class Job(Base):
+    """
+    A durable background job (e.g. an @Ava reply). Workers claim queued rows
+    with FOR UPDATE SKIP LOCKED; failed jobs are retried with backoff and end
+    as status "dead" after max_attempts. See job_queue.py.
+    """
+    __tablename__ = "jobs"
+
+    id = Column(Integer, primary_key=True, index=True)
+    kind = Column(String, nullable=False)
+    payload = Column(Text, nullable=False)  # JSON
+    status = Column(String, default="queued", nullable=False)  # queued, running, done, dead
+    attempts = Column(Integer, default=0, nullable=False)
+    max_attempts = Column(Integer, default=3, nullable=False)
+    run_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    locked_by = Column(String, nullable=True)
+    locked_at = Column(DateTime, nullable=True)
+    last_error = Column(Text, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    finished_at = Column(DateTime, nullable=True)
+
+    __table_args__ = (
+        Index("ix_jobs_status_run_at", "status", "run_at"),
+    )
+
+
+class DigestRun(Base):
+    """
+    One pass of digest emails over a time window (digest.py). last_user_id is
+    the checkpoint: a run interrupted by a restart resumes after it.
+    """
+    __tablename__ = "digest_runs"
+
+    id = Column(Integer, primary_key=True, index=True)
+    window_start = Column(DateTime, nullable=False)
+    window_end = Column(DateTime, nullable=False)
+    status = Column(String, default="running", nullable=False)  # running, done
+    last_user_id = Column(Integer, default=0, nullable=False)
+    sent = Column(Integer, default=0, nullable=False)
+    skipped = Column(Integer, default=0, nullable=False)  # Opted in but nothing to report
+    started_at = Column(DateTime, default=datetime.utcnow)
+    checkpointed_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
+
+
+class ArchiveSegment(Base):
+    """
+    A gzip JSONL file of rows moved out of a hot table by retention
+    (retention.py). Rows in a segment have ids first_id..last_id.
+    """
+    __tablename__ = "archive_segments"
+
+    id = Column(Integer, primary_key=True, index=True)
+    table_name = Column(String, nullable=False)
+    path = Column(String, nullable=False)  # Relative to RETENTION_ARCHIVE_DIR
+    first_id = Column(Integer, nullable=False)
+    last_id = Column(Integer, nullable=False)
+    row_count = Column(Integer, nullable=False)
+    oldest_at = Column(DateTime, nullable=True)
+    newest_at = Column(DateTime, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        Index("ix_archive_segments_table_last_id", "table_name", "last_id"),
+    )
+
+
+class ArchiveSegmentScope(Base):
+    """Which chats (or users) have rows in an archive segment, for history lookups"""
+    __tablename__ = "archive_segment_scopes"
+
+    id = Column(Integer, primary_key=True, index=True)
+    segment_id = Column(Integer, ForeignKey('archive_segments.id'), nullable=False)
+    table_name = Column(String, nullable=False)
+    scope_id = Column(Integer, nullable=False)
+
+    __table_args__ = (
+        Index("ix_archive_segment_scopes_lookup", "table_name", "scope_id", "segment_id"),
+    )
+
 
 class AIInteraction(Base):
     __tablename__ = "ai_interactions"
@@ -0,0 +1,389 @@
+"""
+Entity Mention Matcher
+Finds guilds, projects, products and users mentioned by name in a chat message
+
+Entity names are compiled into an Aho-Corasick automaton, so matching a message
+costs O(message length + matches) no matter how many entities exist. The
+pattern set is kept current incrementally through change_tracker write hooks and
+fully reloaded from the database every ENTITY_INDEX_REFRESH_SECONDS, which also
+picks up writes made by other workers; changes applied while a reload is
+querying are re-applied to the reloaded set before it is published.
+
+Readers never see the pattern set being edited: each rebuild compiles it into
+an IndexSnapshot (automaton, owners and display names) that is published with
+a single assignment, and match() reads one snapshot throughout. Once start()
+has run, rebuilds and reloads happen on a background thread, so requests
+never pay for them; without it (scripts, tests) they run inline. Each
+published snapshot bumps the index version.
+"""
+
+from typing import List, Dict, Any, Optional, Set, Tuple
+from collections import deque, defaultdict
+from dataclasses import dataclass
+import os
+import time
+import threading
+import logging
+
+from sqlalchemy.orm import Session
+
+from database import SessionLocal, Guild, Project, Product, User
+import change_tracker
+
+logger = logging.getLogger(__name__)
+
+ENTITY_INDEX_REFRESH_SECONDS = int(os.getenv("ENTITY_INDEX_REFRESH_SECONDS", "600"))
+
+# Very short names ("AI", "Go") produce too many false positives in free text
+MIN_PATTERN_LENGTH = 3
+
+
+def normalize(text: str) -> str:
+    """
+    Lowercase text character by character so offsets in the normalized string
+    line up with offsets in the original message
+    """
+    return "".join(c.lower() if len(c.lower()) == 1 else c for c in text)
+
+
+def _is_word_char(c: str) -> bool:
+    return c.isalnum() or c == "_"
+
+
+class AhoCorasick:
+    """
+    Multi-pattern string matcher.
+    Patterns are added first, then build() computes failure links; the automaton
+    is immutable afterwards and safe to share between threads.
+    """
+
+    def __init__(self):
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._out: List[List[int]] = [[]]
+        self.patterns: List[str] = []
+
+    def add(self, pattern: str) -> int:
+        """Add a pattern and return its index"""
+        state = 0
+        for c in pattern:
+            nxt = self._goto[state].get(c)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[state][c] = nxt
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append([])
+            state = nxt
+        self.patterns.append(pattern)
+        self._out[state].append(len(self.patterns) - 1)
+        return len(self.patterns) - 1
+
+    def build(self):
+        """Compute failure links breadth-first and merge output sets"""
+        queue = deque()
+        for state in self._goto[0].values():
+            self._fail[state] = 0
+            queue.append(state)
+
+        while queue:
+            current = queue.popleft()
+            for c, nxt in self._goto[current].items():
+                queue.append(nxt)
+                fallback = self._fail[current]
+                while fallback and c not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                self._fail[nxt] = self._goto[fallback].get(c, 0)
+                self._out[nxt] = self._out[nxt] + self._out[self._fail[nxt]]
+        return self
+
+    def iter_matches(self, text: str):
+        """Yield (start, end, pattern_index) for every occurrence in text"""
+        state = 0
+        for i, c in enumerate(text):
+            while state and c not in self._goto[state]:
+                state = self._fail[state]
+            state = self._goto[state].get(c, 0)
+            for pattern_index in self._out[state]:
+                end = i + 1
+                yield end - len(self.patterns[pattern_index]), end, pattern_index
+
+
+@dataclass(frozen=True)
+class IndexSnapshot:
+    """A compiled pattern set; never modified once published"""
+    automaton: AhoCorasick
+    # normalized pattern -> ((kind, entity_id), ...)
+    owners: Dict[str, Tuple[Tuple[str, int], ...]]
+    # (kind, entity_id) -> display name
+    names: Dict[Tuple[str, int], str]
+    version: int
+
+
+class EntityIndex:
+    """
+    In-memory name -> entity index backed by an Aho-Corasick automaton.
+    Changes edit a working pattern set under a lock; rebuild() compiles it
+    (in memory, without touching the database) into the snapshot match() reads.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._build_lock = threading.Lock()  # one rebuild at a time, so snapshots publish in order
+        self._refresh_lock = threading.Lock()  # one reload at a time
+        # normalized pattern -> {(kind, entity_id)}
+        self._patterns: Dict[str, Set[Tuple[str, int]]] = defaultdict(set)
+        # (kind, entity_id) -> (display name, [normalized patterns])
+        self._entities: Dict[Tuple[str, int], Tuple[str, List[str]]] = {}
+        self._snapshot: Optional[IndexSnapshot] = None
+        self._dirty = True
+        self.loaded_at = 0.0
+        self._pending: Optional[List[Tuple[str, str, Dict[str, Any]]]] = None  # changes seen mid-reload
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._builder: Optional[threading.Thread] = None
+
+    @property
+    def version(self) -> int:
+        snapshot = self._snapshot
+        return snapshot.version if snapshot else 0
+
+    # ------------------------------------------------------------------
+    # Pattern maintenance
+    # ------------------------------------------------------------------
+
+    def _remove(self, key: Tuple[str, int]):
+        existing = self._entities.pop(key, None)
+        if not existing:
+            return
+        for pattern in existing[1]:
+            owners = self._patterns.get(pattern)
+            if owners:
+                owners.discard(key)
+                if not owners:
+                    del self._patterns[pattern]
+
+    def _put(self, kind: str, entity_id: int, display_name: str, names: List[Optional[str]]) -> bool:
+        """Index an entity under its names; returns False if nothing changed"""
+        key = (kind, entity_id)
+        patterns = []
+        for name in names:
+            if not name:
+                continue
+            pattern = normalize(name.strip())
+            if len(pattern) >= MIN_PATTERN_LENGTH and pattern not in patterns:
+                patterns.append(pattern)
+
+        if self._entities.get(key) == (display_name, patterns):
+            return False
+
+        self._remove(key)
+        for pattern in patterns:
+            self._patterns[pattern].add(key)
+        if patterns:
+            self._entities[key] = (display_name, patterns)
+        return True
+
+    def apply_change(self, kind: str, op: str, row: Dict[str, Any]):
+        """Apply one committed insert/update/delete to the pattern set"""
+        if row.get("id") is None:
+            return
+        with self._lock:
+            changed = self._apply(kind, op, row)
+            if self._pending is not None:
+                self._pending.append((kind, op, row))
+            # Most user/product updates (quota counters, stock) leave names untouched
+            if changed:
+                self._dirty = True
+        if changed:
+            self._wake.set()
+
+    def _apply(self, kind: str, op: str, row: Dict[str, Any]) -> bool:
+        entity_id = row["id"]
+        if op == "delete" or not _is_indexable(kind, row):
+            changed = (kind, entity_id) in self._entities
+            self._remove((kind, entity_id))
+            return changed
+        display_name, names = _names_for(kind, row)
+        return self._put(kind, entity_id, display_name, names)
+
+    def refresh(self, db: Optional[Session] = None):
+        """Reload the full pattern set from the database (column-only queries) and publish it"""
+        with self._refresh_lock:
+            with self._lock:
+                self._pending = []
+            try:
+                self._load(db)
+            finally:
+                with self._lock:
+                    self._pending = None
+        snapshot = self.rebuild()
+        logger.info(f"🧭 Entity index loaded: {len(snapshot.names)} entities, {len(snapshot.owners)} names")
+
+    def _load(self, db: Optional[Session] = None):
+        own_session = db is None
+        db = db or SessionLocal()
+        try:
+            rows = []
+            for gid, name in db.query(Guild.id, Guild.name).all():
+                rows.append(("guild", {"id": gid, "name": name}))
+            for pid, title in db.query(Project.id, Project.title).all():
+                rows.append(("project", {"id": pid, "title": title}))
+            for pid, name in db.query(Product.id, Product.name).filter(Product.is_active == True).all():
+                rows.append(("product", {"id": pid, "name": name, "is_active": True}))
+            for uid, first, last, username in db.query(User.id, User.first_name, User.last_name, User.username).all():
+                rows.append(("user", {"id": uid, "first_name": first, "last_name": last, "username": username}))
+        finally:
+            if own_session:
+                db.close()
+
+        with self._lock:
+            self._patterns = defaultdict(set)
+            self._entities = {}
+            for kind, row in rows:
+                display_name, names = _names_for(kind, row)
+                self._put(kind, row["id"], display_name, names)
+            # Changes committed after the queries ran would otherwise be lost
+            for kind, op, row in self._pending:
+                self._apply(kind, op, row)
+            self._dirty = True
+            self.loaded_at = time.time()
+
+    def rebuild(self) -> IndexSnapshot:
+        """Compile the pattern set into a new snapshot if it changed, and publish it"""
+        with self._build_lock:
+            with self._lock:
+                if not self._dirty and self._snapshot is not None:
+                    return self._snapshot
+                owners = {pattern: tuple(sorted(keys)) for pattern, keys in self._patterns.items()}
+                names = {key: entity[0] for key, entity in self._entities.items()}
+                self._dirty = False
+            # Compiled outside the lock: changes keep arriving and mark the next rebuild
+            automaton = AhoCorasick()
+            for pattern in owners:
+                automaton.add(pattern)
+            snapshot = IndexSnapshot(automaton.build(), owners, names, self.version + 1)
+            self._snapshot = snapshot
+            return snapshot
+
+    def _reload(self):
+        try:
+            self.refresh()
+        except Exception as e:
+            # Keep serving the previous pattern set; retry on the next refresh window
+            logger.error(f"Entity index refresh failed: {e}")
+            self.loaded_at = time.time()
+
+    def _current(self) -> IndexSnapshot:
+        snapshot = self._snapshot
+        if self._builder is not None and snapshot is not None:
+            return snapshot  # the builder thread keeps it current
+        if time.time() - self.loaded_at > ENTITY_INDEX_REFRESH_SECONDS:
+            self._reload()
+        return self.rebuild()
+
+    def start(self):
+        """Rebuild in the background as changes arrive, and reload every ENTITY_INDEX_REFRESH_SECONDS"""
+        if self._builder is not None:
+            return
+
+        def run():
+            while not self._stop.is_set():
+                due = self.loaded_at + ENTITY_INDEX_REFRESH_SECONDS - time.time()
+                self._wake.wait(min(max(due, 0), ENTITY_INDEX_REFRESH_SECONDS))
+                self._wake.clear()
+                if self._stop.is_set():
+                    break
+                if time.time() - self.loaded_at > ENTITY_INDEX_REFRESH_SECONDS:
+                    self._reload()
+                try:
+                    self.rebuild()
+                except Exception as e:
+                    logger.error(f"Entity index rebuild failed: {e}")
+
+        self._stop.clear()
+        self._builder = threading.Thread(target=run, name="entity-index-builder", daemon=True)
+        self._builder.start()
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+        self._builder = None
+
+    # ------------------------------------------------------------------
+    # Matching
+    # ------------------------------------------------------------------
+
+    def match(self, message: str) -> List[Dict[str, Any]]:
+        """
+        Find entities whose name appears in the message as whole words.
+        Returns [{"type", "id", "name", "start", "end"}], one per entity,
+        using the first occurrence for the span.
+        """
+        snapshot = self._current()
+        automaton = snapshot.automaton
+        text = normalize(message)
+        seen: Set[Tuple[str, int]] = set()
+        results = []
+
+        for start, end, pattern_index in automaton.iter_matches(text):
+            if start > 0 and _is_word_char(text[start - 1]):
+                continue
+            if end < len(text) and _is_word_char(text[end]):
+                continue
+            for kind, entity_id in snapshot.owners.get(automaton.patterns[pattern_index], ()):
+                if (kind, entity_id) in seen:
+                    continue
+                seen.add((kind, entity_id))
+                results.append({
+                    "type": kind,
+                    "id": entity_id,
+                    "name": snapshot.names.get((kind, entity_id)) or message[start:end],
+                    "start": start,
+                    "end": end,
+                })
+
+        return results
+
+    def stats(self) -> Dict[str, Any]:
+        snapshot = self._snapshot
+        return {
+            "entities": len(snapshot.names) if snapshot else 0,
+            "names": len(snapshot.owners) if snapshot else 0,
+            "version": self.version,
+            "loaded_at": self.loaded_at,
+        }
+
+
+def _is_indexable(kind: str, row: Dict[str, Any]) -> bool:
+    # Only active products are offered to the assistant
+    if kind == "product":
+        return row.get("is_active", True) is not False
+    return True
+
+
+def _names_for(kind: str, row: Dict[str, Any]) -> Tuple[str, List[Optional[str]]]:
+    """Display name and the searchable names for an entity row"""
+    if kind == "guild":
+        return row.get("name") or "", [row.get("name")]
+    if kind == "project":
+        return row.get("title") or "", [row.get("title")]
+    if kind == "product":
+        return row.get("name") or "", [row.get("name")]
+    full_name = f"{row.get('first_name')} {row.get('last_name')}" if row.get("first_name") and row.get("last_name") else None
+    return full_name or row.get("username") or "", [full_name, row.get("username")]
+
+
+entity_index = EntityIndex()
+
+
+def _subscriber(kind: str):
+    def callback(op: str, row: Dict[str, Any]):
+        entity_index.apply_change(kind, op, row)
+    return callback
+
+
+change_tracker.subscribe(Guild.__tablename__, _subscriber("guild"))
+change_tracker.subscribe(Project.__tablename__, _subscriber("project"))
+change_tracker.subscribe(Product.__tablename__, _subscriber("product"))
+change_tracker.subscribe(User.__tablename__, _subscriber("user"))
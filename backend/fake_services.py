@@ -0,0 +1,579 @@
+"""
+Fake OpenAI and Qdrant Servers
+Offline stand-ins for load and integration testing
+
+FakeOpenAI answers /v1/chat/completions (streaming and non-streaming) and
+/v1/embeddings:
+- embeddings are deterministic and hashed from the words of the text, so
+  texts sharing words are close and semantic search returns sensible matches
+- completions come from a script of (regex, template) rules matched against
+  the request's messages; templates see {message} (last user message), {model}
+  and {json}. Requests asking for a JSON object fall back to "{}".
+- latency (time to first token, per token, jitter) and error injection
+  (a fraction of requests fail with 429/500, 429s carry Retry-After)
+
+FakeQdrant keeps collections in memory and speaks the REST endpoints used by
+qdrant_service (httpx) and qdrant_client: collections, upsert, delete, payload
+indexes and scored search with payload filters (match, range, has_id), with the
+same latency and error injection.
+
+Both are wired in through the usual settings (OPENAI_BASE_URL, QDRANT_URL):
+
+    with FakeServices(openai=FakeOpenAI(first_token_ms=300)) as fakes:
+        os.environ.update(fakes.environ())
+        from main import app
+        ...
+
+or run standalone and point a local backend at them:
+
+    python fake_services.py --openai-port 8100 --qdrant-port 6334 --first-token-ms 300
+    OPENAI_BASE_URL=http://127.0.0.1:8100/v1 QDRANT_URL=http://127.0.0.1:6334 uvicorn main:app
+
+Script files (--script) are JSON lists of {"match": regex, "response": template}
+with an optional "role" ("user", "system" or "any", default "any").
+"""
+
+from typing import Any, Dict, List, Optional, Tuple
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+import argparse
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+
+import numpy as np
+
+EMBEDDING_DIMENSION = 1536
+
+# Share of every fake embedding that points in one common direction. Unrelated
+# texts then score about this much (real embeddings never score near zero) and
+# texts sharing words score higher, so real search thresholds stay meaningful.
+EMBEDDING_BASELINE = 0.5
+
+DEFAULT_ANSWER = (
+    "Here are a few options I found on the marketplace. The first one is a solid "
+    "pick for everyday use, and the second is great value if you are on a budget. "
+    "Tap any item below to see details, or ask me to narrow it down further."
+)
+
+_WORD_RE = re.compile(r"[a-z0-9]+")
+
+
+def _stem(word: str) -> str:
+    # Just enough stemming that "laptops" finds "laptop"
+    return word[:-1] if len(word) > 3 and word.endswith("s") and not word.endswith("ss") else word
+
+
+def embed_text(text: str, dimension: int = EMBEDDING_DIMENSION, baseline: float = EMBEDDING_BASELINE) -> List[float]:
+    """Deterministic unit vector: common baseline direction plus hashed bag of words"""
+    words = np.zeros(dimension)
+    for word in _WORD_RE.findall(str(text).lower()):
+        digest = hashlib.sha256(_stem(word).encode()).digest()
+        index = int.from_bytes(digest[:4], "little") % dimension
+        words[index] += 1.0 if digest[4] & 1 else -1.0
+    norm = np.linalg.norm(words)
+    if norm:
+        words /= norm
+    vector = np.full(dimension, np.sqrt(baseline / dimension)) + np.sqrt(1 - baseline) * words
+    return (vector / np.linalg.norm(vector)).tolist()
+
+
+class FaultInjector:
+    """Seeded latency and error decisions shared by both fakes"""
+
+    def __init__(self, latency_ms: float = 0, jitter_ms: float = 0, error_rate: float = 0.0,
+                 error_status: int = 500, seed: int = 0):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def delay(self, base_ms: Optional[float] = None) -> float:
+        base = self.latency_ms if base_ms is None else base_ms
+        with self._lock:
+            jitter = self._random.uniform(-self.jitter_ms, self.jitter_ms) if self.jitter_ms else 0.0
+        return max(0.0, base + jitter) / 1000
+
+    def sleep(self, base_ms: Optional[float] = None):
+        seconds = self.delay(base_ms)
+        if seconds:
+            time.sleep(seconds)
+
+    def should_fail(self) -> bool:
+        if not self.error_rate:
+            return False
+        with self._lock:
+            return self._random.random() < self.error_rate
+
+
+class _FakeHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    service = None  # set by FakeServer
+
+    def log_message(self, format, *args):
+        pass
+
+    def _read_json(self) -> Dict[str, Any]:
+        length = int(self.headers.get("Content-Length", 0))
+        return json.loads(self.rfile.read(length) or b"{}")
+
+    def _json(self, payload: Any, status: int = 200, headers: Optional[Dict[str, str]] = None):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _dispatch(self, method: str):
+        path = urlparse(self.path).path
+        body = self._read_json() if method in ("POST", "PUT", "PATCH") else {}
+        self.service.handle(self, method, path, body)
+
+    def do_GET(self):
+        self._dispatch("GET")
+
+    def do_POST(self):
+        self._dispatch("POST")
+
+    def do_PUT(self):
+        self._dispatch("PUT")
+
+    def do_PATCH(self):
+        self._dispatch("PATCH")
+
+    def do_DELETE(self):
+        self._dispatch("DELETE")
+
+
+class _FakeService:
+    """Shared request accounting; subclasses implement route()"""
+
+    def __init__(self, faults: FaultInjector):
+        self.faults = faults
+        self._stats_lock = threading.Lock()
+        self.stats: Dict[str, int] = {"requests": 0, "errors_injected": 0}
+
+    def count(self, name: str, amount: int = 1):
+        with self._stats_lock:
+            self.stats[name] = self.stats.get(name, 0) + amount
+
+    def handle(self, handler: _FakeHandler, method: str, path: str, body: Dict[str, Any]):
+        self.count("requests")
+        if self.faults.should_fail():
+            self.count("errors_injected")
+            self.faults.sleep()
+            return self.inject_error(handler)
+        self.route(handler, method, path, body)
+
+    def inject_error(self, handler: _FakeHandler):
+        handler._json({"status": {"error": "injected failure"}}, status=self.faults.error_status)
+
+    def route(self, handler: _FakeHandler, method: str, path: str, body: Dict[str, Any]):
+        raise NotImplementedError
+
+
+class FakeOpenAI(_FakeService):
+    """Enough of the OpenAI API for the assistant, search and recommendations"""
+
+    def __init__(self, first_token_ms: float = 0, token_ms: float = 0, embedding_ms: float = 0,
+                 jitter_ms: float = 0, error_rate: float = 0.0, error_status: int = 429,
+                 script: Optional[List[Dict[str, str]]] = None, default_answer: str = DEFAULT_ANSWER,
+                 seed: int = 0):
+        super().__init__(FaultInjector(first_token_ms, jitter_ms, error_rate, error_status, seed))
+        self.token_ms = token_ms
+        self.embedding_ms = embedding_ms
+        self.default_answer = default_answer
+        self.rules: List[Tuple[re.Pattern, str, str]] = [
+            (re.compile(rule["match"], re.IGNORECASE), rule["response"], rule.get("role", "any"))
+            for rule in (script or [])
+        ]
+
+    def inject_error(self, handler: _FakeHandler):
+        status = self.faults.error_status
+        headers = {"Retry-After": "0"} if status == 429 else None
+        handler._json({"error": {"message": "Injected failure", "type": "fake_error", "code": status}},
+                      status=status, headers=headers)
+
+    def completion_for(self, request: Dict[str, Any]) -> str:
+        messages = request.get("messages", [])
+        last_user = next((m.get("content") or "" for m in reversed(messages) if m.get("role") == "user"), "")
+        values = {"message": last_user, "model": request.get("model", "fake"), "json": "{}"}
+        for pattern, template, role in self.rules:
+            if any(pattern.search(m.get("content") or "") for m in messages if role in ("any", m.get("role"))):
+                return template.format(**values)
+        if (request.get("response_format") or {}).get("type") == "json_object":
+            return "{}"
+        return self.default_answer.format(**values)
+
+    def route(self, handler: _FakeHandler, method: str, path: str, body: Dict[str, Any]):
+        if method == "POST" and path.endswith("/embeddings"):
+            return self._embeddings(handler, body)
+        if method == "POST" and path.endswith("/chat/completions"):
+            return self._chat(handler, body)
+        handler._json({"error": {"message": f"Unknown route {method} {path}"}}, status=404)
+
+    def _embeddings(self, handler: _FakeHandler, request: Dict[str, Any]):
+        self.count("embeddings")
+        self.faults.sleep(self.embedding_ms)
+        inputs = request.get("input")
+        inputs = inputs if isinstance(inputs, list) else [inputs]
+        dimension = request.get("dimensions") or EMBEDDING_DIMENSION
+        data = [{"object": "embedding", "index": i, "embedding": embed_text(text, dimension)}
+                for i, text in enumerate(inputs)]
+        tokens = sum(len(str(text).split()) for text in inputs)
+        handler._json({"object": "list", "data": data, "model": request.get("model"),
+                       "usage": {"prompt_tokens": tokens, "total_tokens": tokens}})
+
+    def _chat(self, handler: _FakeHandler, request: Dict[str, Any]):
+        self.count("completions")
+        answer = self.completion_for(request)
+        tokens = [word + " " for word in answer.split(" ")]
+        tokens[-1] = tokens[-1].rstrip(" ")
+        prompt_tokens = sum(len(m.get("content") or "") for m in request.get("messages", [])) // 4
+        usage = {"prompt_tokens": prompt_tokens, "completion_tokens": len(tokens),
+                 "total_tokens": prompt_tokens + len(tokens)}
+        base = {"id": "chatcmpl-fake", "created": int(time.time()), "model": request.get("model", "fake")}
+
+        self.faults.sleep()
+        if not request.get("stream"):
+            time.sleep(self.token_ms * len(tokens) / 1000)
+            return handler._json({**base, "object": "chat.completion", "usage": usage, "choices": [{
+                "index": 0, "finish_reason": "stop",
+                "message": {"role": "assistant", "content": answer},
+            }]})
+
+        self.count("streams")
+        handler.send_response(200)
+        handler.send_header("Content-Type", "text/event-stream")
+        handler.send_header("Connection", "close")
+        handler.end_headers()
+
+        def send(chunk):
+            handler.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode())
+            handler.wfile.flush()
+
+        for i, token in enumerate(tokens):
+            if i and self.token_ms:
+                time.sleep(self.token_ms / 1000)
+            send({**base, "object": "chat.completion.chunk", "choices": [
+                {"index": 0, "delta": {"content": token}, "finish_reason": None}]})
+        send({**base, "object": "chat.completion.chunk", "choices": [
+            {"index": 0, "delta": {}, "finish_reason": "stop"}]})
+        send({**base, "object": "chat.completion.chunk", "choices": [], "usage": usage})
+        handler.wfile.write(b"data: [DONE]\n\n")
+        handler.wfile.flush()
+        handler.close_connection = True
+
+
+class _Collection:
+    def __init__(self, name: str, size: int, distance: str):
+        self.name = name
+        self.size = size
+        self.distance = distance
+        self.lock = threading.Lock()
+        self.points: Dict[Any, Tuple[np.ndarray, Dict[str, Any]]] = {}
+        self.payload_indexes: Dict[str, Any] = {}
+
+    def upsert(self, points: List[Dict[str, Any]]):
+        with self.lock:
+            for point in points:
+                vector = np.asarray(point["vector"], dtype=float)
+                if self.distance.lower() == "cosine":
+                    norm = np.linalg.norm(vector)
+                    vector = vector / norm if norm else vector
+                self.points[point["id"]] = (vector, point.get("payload") or {})
+
+    def delete(self, selector: Dict[str, Any]) -> int:
+        with self.lock:
+            if "points" in selector:
+                ids = selector["points"]
+            else:
+                ids = [pid for pid, (_, payload) in self.points.items()
+                       if _matches(pid, payload, selector.get("filter") or {})]
+            return sum(self.points.pop(pid, None) is not None for pid in ids)
+
+    def search(self, vector: List[float], limit: int = 10, offset: int = 0,
+               score_threshold: Optional[float] = None, query_filter: Optional[Dict[str, Any]] = None,
+               with_payload: Any = True) -> List[Dict[str, Any]]:
+        with self.lock:
+            candidates = [(pid, vec, payload) for pid, (vec, payload) in self.points.items()
+                          if not query_filter or _matches(pid, payload, query_filter)]
+        if not candidates:
+            return []
+        query = np.asarray(vector, dtype=float)
+        matrix = np.stack([vec for _, vec, _ in candidates])
+        if self.distance.lower() == "cosine":
+            norm = np.linalg.norm(query)
+            scores = matrix @ (query / norm if norm else query)
+        elif self.distance.lower() == "euclid":
+            scores = -np.linalg.norm(matrix - query, axis=1)
+        else:
+            scores = matrix @ query
+        order = np.argsort(-scores, kind="stable")
+        results = []
+        for i in order:
+            score = float(scores[i])
+            if score_threshold is not None and score < score_threshold:
+                break
+            pid, _, payload = candidates[i]
+            results.append({"id": pid, "version": 0, "score": score,
+                            "payload": payload if with_payload else None, "vector": None})
+        return results[offset:offset + limit]
+
+
+def _payload_values(payload: Dict[str, Any], key: str) -> List[Any]:
+    values = [payload]
+    for part in key.split("."):
+        next_values = []
+        for value in values:
+            if isinstance(value, dict) and part in value:
+                found = value[part]
+                next_values.extend(found if isinstance(found, list) else [found])
+        values = next_values
+    return values
+
+
+def _condition_matches(pid: Any, payload: Dict[str, Any], condition: Dict[str, Any]) -> bool:
+    if any(clause in condition for clause in ("must", "should", "must_not")):
+        return _matches(pid, payload, condition)
+    if "has_id" in condition:
+        return pid in condition["has_id"]
+    values = _payload_values(payload, condition.get("key", ""))
+    match = condition.get("match")
+    if match is not None:
+        if "value" in match:
+            return match["value"] in values
+        if "any" in match:
+            return any(v in match["any"] for v in values)
+        if "except" in match:
+            return all(v not in match["except"] for v in values)
+        if "text" in match:
+            return any(isinstance(v, str) and match["text"] in v for v in values)
+    bounds = condition.get("range")
+    if bounds is not None:
+        checks = {"gt": lambda v, b: v > b, "gte": lambda v, b: v >= b,
+                  "lt": lambda v, b: v < b, "lte": lambda v, b: v <= b}
+        return any(
+            isinstance(v, (int, float)) and all(checks[op](v, b) for op, b in bounds.items() if b is not None and op in checks)
+            for v in values
+        )
+    if condition.get("is_empty"):
+        return not values
+    return False
+
+
+def _matches(pid: Any, payload: Dict[str, Any], query_filter: Dict[str, Any]) -> bool:
+    must = query_filter.get("must") or []
+    should = query_filter.get("should") or []
+    must_not = query_filter.get("must_not") or []
+    must = must if isinstance(must, list) else [must]
+    should = should if isinstance(should, list) else [should]
+    must_not = must_not if isinstance(must_not, list) else [must_not]
+    return (all(_condition_matches(pid, payload, c) for c in must)
+            and (not should or any(_condition_matches(pid, payload, c) for c in should))
+            and not any(_condition_matches(pid, payload, c) for c in must_not))
+
+
+class FakeQdrant(_FakeService):
+    """In-memory Qdrant speaking the REST API"""
+
+    def __init__(self, latency_ms: float = 0, jitter_ms: float = 0, error_rate: float = 0.0,
+                 error_status: int = 503, seed: int = 0):
+        super().__init__(FaultInjector(latency_ms, jitter_ms, error_rate, error_status, seed))
+        self._lock = threading.Lock()
+        self.collections: Dict[str, _Collection] = {}
+
+    @staticmethod
+    def _ok(handler: _FakeHandler, result: Any, started: float):
+        handler._json({"result": result, "status": "ok", "time": round(time.perf_counter() - started, 6)})
+
+    @staticmethod
+    def _not_found(handler: _FakeHandler, name: str):
+        handler._json({"status": {"error": f"Not found: Collection `{name}` doesn't exist!"}, "time": 0.0},
+                      status=404)
+
+    def create_collection(self, name: str, size: int = EMBEDDING_DIMENSION, distance: str = "Cosine") -> _Collection:
+        with self._lock:
+            collection = self.collections.get(name)
+            if collection is None:
+                collection = self.collections[name] = _Collection(name, size, distance)
+            return collection
+
+    def route(self, handler: _FakeHandler, method: str, path: str, body: Dict[str, Any]):
+        started = time.perf_counter()
+        self.faults.sleep()
+        parts = [p for p in path.split("/") if p]
+        if parts == ["collections"] and method == "GET":
+            with self._lock:
+                names = sorted(self.collections)
+            return self._ok(handler, {"collections": [{"name": name} for name in names]}, started)
+        if not parts or parts[0] != "collections" or len(parts) < 2:
+            return handler._json({"status": {"error": f"Unknown route {method} {path}"}}, status=404)
+
+        name, rest = parts[1], parts[2:]
+        if not rest and method == "PUT":
+            vectors = body.get("vectors") or {}
+            self.create_collection(name, vectors.get("size", EMBEDDING_DIMENSION), vectors.get("distance", "Cosine"))
+            return self._ok(handler, True, started)
+        if not rest and method == "DELETE":
+            with self._lock:
+                removed = self.collections.pop(name, None) is not None
+            return self._ok(handler, removed, started)
+
+        collection = self.collections.get(name)
+        if collection is None:
+            return self._not_found(handler, name)
+        update_result = {"operation_id": 0, "status": "completed"}
+
+        if not rest and method == "PATCH":
+            return self._ok(handler, True, started)
+        if not rest and method == "GET":
+            return self._ok(handler, {
+                "status": "green", "optimizer_status": "ok", "points_count": len(collection.points),
+                "indexed_vectors_count": len(collection.points), "segments_count": 1,
+                "config": {"params": {"vectors": {"size": collection.size, "distance": collection.distance}}},
+                "payload_schema": collection.payload_indexes,
+            }, started)
+        if rest == ["index"] and method == "PUT":
+            collection.payload_indexes[body.get("field_name")] = {"data_type": body.get("field_schema"), "points": 0}
+            return self._ok(handler, update_result, started)
+        if rest == ["points"] and method == "PUT":
+            if "batch" in body:
+                batch = body["batch"]
+                payloads = batch.get("payloads") or [None] * len(batch["ids"])
+                points = [{"id": pid, "vector": vec, "payload": payload}
+                          for pid, vec, payload in zip(batch["ids"], batch["vectors"], payloads)]
+            else:
+                points = body.get("points", [])
+            collection.upsert(points)
+            self.count("upserted", len(points))
+            return self._ok(handler, update_result, started)
+        if rest == ["points", "delete"] and method == "POST":
+            self.count("deleted", collection.delete(body))
+            return self._ok(handler, update_result, started)
+        if rest == ["points", "search"] and method == "POST":
+            self.count("searches")
+            vector = body.get("vector")
+            if isinstance(vector, dict):  # named vector
+                vector = vector.get("vector")
+            return self._ok(handler, collection.search(
+                vector, limit=body.get("limit", 10), offset=body.get("offset") or 0,
+                score_threshold=body.get("score_threshold"), query_filter=body.get("filter"),
+                with_payload=body.get("with_payload", False),
+            ), started)
+        handler._json({"status": {"error": f"Unknown route {method} {path}"}}, status=404)
+
+
+class FakeServer:
+    """One fake service on a background ThreadingHTTPServer"""
+
+    def __init__(self, service: _FakeService, host: str = "127.0.0.1", port: int = 0):
+        handler = type(f"{type(service).__name__}Handler", (_FakeHandler,), {"service": service})
+        self.service = service
+        self.httpd = ThreadingHTTPServer((host, port), handler)
+        self.httpd.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "FakeServer":
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+class FakeServices:
+    """Fake OpenAI plus fake Qdrant, started together"""
+
+    def __init__(self, openai: Optional[FakeOpenAI] = None, qdrant: Optional[FakeQdrant] = None,
+                 openai_port: int = 0, qdrant_port: int = 0):
+        self.openai = openai or FakeOpenAI()
+        self.qdrant = qdrant or FakeQdrant()
+        self.openai_server = FakeServer(self.openai, port=openai_port)
+        self.qdrant_server = FakeServer(self.qdrant, port=qdrant_port)
+
+    def environ(self) -> Dict[str, str]:
+        """Settings that point the backend at the fakes (apply before importing it)"""
+        return {
+            "OPENAI_API_KEY": "sk-fake-offline",
+            "OPENAI_BASE_URL": f"{self.openai_server.url}/v1",
+            "QDRANT_URL": self.qdrant_server.url,
+            "QDRANT_API_KEY": "",
+        }
+
+    def start(self) -> "FakeServices":
+        self.openai_server.start()
+        self.qdrant_server.start()
+        return self
+
+    def stop(self):
+        self.openai_server.stop()
+        self.qdrant_server.stop()
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        return {"openai": dict(self.openai.stats), "qdrant": dict(self.qdrant.stats)}
+
+    def __enter__(self) -> "FakeServices":
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def load_script(path: str) -> List[Dict[str, str]]:
+    with open(path) as f:
+        return json.load(f)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--openai-port", type=int, default=8100)
+    parser.add_argument("--qdrant-port", type=int, default=6334)
+    parser.add_argument("--first-token-ms", type=float, default=300)
+    parser.add_argument("--token-ms", type=float, default=20)
+    parser.add_argument("--embedding-ms", type=float, default=30)
+    parser.add_argument("--qdrant-ms", type=float, default=5)
+    parser.add_argument("--jitter-ms", type=float, default=0)
+    parser.add_argument("--openai-error-rate", type=float, default=0.0)
+    parser.add_argument("--openai-error-status", type=int, default=429)
+    parser.add_argument("--qdrant-error-rate", type=float, default=0.0)
+    parser.add_argument("--script", help="JSON list of completion rules")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    openai = FakeOpenAI(args.first_token_ms, args.token_ms, args.embedding_ms, args.jitter_ms,
+                        args.openai_error_rate, args.openai_error_status,
+                        load_script(args.script) if args.script else None, seed=args.seed)
+    qdrant = FakeQdrant(args.qdrant_ms, args.jitter_ms, args.qdrant_error_rate, seed=args.seed)
+    openai_server = FakeServer(openai, args.host, args.openai_port)
+    qdrant_server = FakeServer(qdrant, args.host, args.qdrant_port)
+    print(f"🤖 Fake OpenAI on {openai_server.url}/v1")
+    print(f"🗄️  Fake Qdrant on {qdrant_server.url}")
+    qdrant_server.start()
+    try:
+        openai_server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        qdrant_server.stop()
+        openai_server.httpd.server_close()
+
+
+if __name__ == "__main__":
+    main()
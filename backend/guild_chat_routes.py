@@ -9,6 +9,10 @@ from database import get_db, User, Guild, GuildChat, GuildChatMessage, guild_mem
 from auth import get_current_user
 from schemas import GuildChatMessageCreate, GuildChatMessageResponse, GuildChatResponse
 import ai_assistant
+import hydration
+import job_queue
+import read_state
+import realtime_hub
 import logging
 
 logger = logging.getLogger(__name__)
@@ -46,36 +50,39 @@ async def get_user_guild_chats(
         GuildChat.guild_id.in_(all_guild_ids)
     ).all()
     
+    unread = read_state.unread_counts(db, current_user.id, "guild_chat", {
+        realtime_hub.guild_chat_channel(chat.guild_id): chat.id for chat in guild_chats
+    })
+
+    guilds = {guild.id: guild for guild in db.query(Guild).filter(Guild.id.in_(all_guild_ids)).all()}
+    last_messages = hydration.last_messages(
+        db, GuildChatMessage, GuildChatMessage.guild_chat_id, [chat.id for chat in guild_chats],
+        GuildChatMessage.is_deleted == False
+    )
+    senders = hydration.load_users(db, (msg.sender_id for msg in last_messages.values()))
+
     result = []
     for chat in guild_chats:
-        guild = db.query(Guild).filter(Guild.id == chat.guild_id).first()
+        guild = guilds.get(chat.guild_id)
         if not guild:
             continue
         
-        # Get last message
-        last_message_obj = db.query(GuildChatMessage).filter(
-            GuildChatMessage.guild_chat_id == chat.id,
-            GuildChatMessage.is_deleted == False
-        ).order_by(desc(GuildChatMessage.created_at)).first()
-        
         last_message = None
+        last_message_obj = last_messages.get(chat.id)
         if last_message_obj:
             last_message = {
                 "content": last_message_obj.content,
                 "sent_at": last_message_obj.created_at,
-                "sender_name": f"{last_message_obj.sender.first_name} {last_message_obj.sender.last_name}"
+                "sender_name": hydration.sender_name(senders, last_message_obj.sender_id)
             }
         
-        # Count unread messages (for now, all messages are "read")
-        unread_count = 0
-        
         result.append(GuildChatResponse(
             id=chat.id,
             guild_id=guild.id,
             guild_name=guild.name,
             guild_avatar=guild.avatar_url,
             created_at=chat.created_at,
-            unread_count=unread_count,
+            unread_count=unread[realtime_hub.guild_chat_channel(chat.guild_id)],
             last_message=last_message
         ))
     
@@ -129,33 +136,26 @@ async def get_guild_chat_messages(
         GuildChatMessage.is_deleted == False
     ).order_by(GuildChatMessage.created_at.asc()).offset(skip).limit(limit).all()
 
-    # Format messages
-    result = []
-    for msg in messages:
-        # Handle Ava messages (sender_id = 0)
-        if msg.sender_id == 0:
-            result.append(GuildChatMessageResponse(
-                id=msg.id,
-                guild_chat_id=msg.guild_chat_id,
-                sender_id=0,
-                sender_name="Ava AI",
-                sender_avatar="/ava-avatar.png",  # Special avatar for Ava
-                content=msg.content,
-                created_at=msg.created_at,
-                is_deleted=msg.is_deleted
-            ))
-        else:
-            sender = db.query(User).filter(User.id == msg.sender_id).first()
-            result.append(GuildChatMessageResponse(
-                id=msg.id,
-                guild_chat_id=msg.guild_chat_id,
-                sender_id=msg.sender_id,
-                sender_name=f"{sender.first_name} {sender.last_name}" if sender else "Unknown",
-                sender_avatar=sender.avatar_url if sender else None,
-                content=msg.content,
-                created_at=msg.created_at,
-                is_deleted=msg.is_deleted
-            ))
+    # Format messages (Ava, sender_id 0, has a fixed name and avatar)
+    senders = hydration.load_users(db, (msg.sender_id for msg in messages))
+    result = [
+        GuildChatMessageResponse(
+            id=msg.id,
+            guild_chat_id=msg.guild_chat_id,
+            sender_id=msg.sender_id,
+            sender_name=hydration.sender_name(senders, msg.sender_id),
+            sender_avatar=hydration.sender_avatar(senders, msg.sender_id),
+            content=msg.content,
+            created_at=msg.created_at,
+            is_deleted=msg.is_deleted
+        )
+        for msg in messages
+    ]
+
+    # Everything up to the newest message on this page has been seen
+    if messages:
+        read_state.commit_read(db, current_user.id, realtime_hub.guild_chat_channel(guild_id),
+                               max(msg.id for msg in messages))
 
     return result
 
@@ -202,60 +202,20 @@ async def send_guild_chat_message(
     )
 
     db.add(new_message)
-    db.commit()
-    db.refresh(new_message)
+    db.flush()
 
-    # Check if message mentions @Ava
-    if "@ava" in message_data.content.lower() or "@Ava" in message_data.content:
+    # @Ava replies are generated by the job queue, so the sender isn't held up by the LLM
+    if "@ava" in message_data.content.lower():
         logger.info(f"🤖 @Ava mentioned in guild {guild_id} by user {current_user.id}")
-
-        # Get recent messages for context (last 10 messages)
-        recent_messages = db.query(GuildChatMessage).filter(
-            GuildChatMessage.guild_chat_id == guild_chat.id,
-            GuildChatMessage.is_deleted == False
-        ).order_by(desc(GuildChatMessage.created_at)).limit(10).all()
-
-        # Build conversation context
-        conversation_context = []
-        for msg in reversed(recent_messages):
-            sender = db.query(User).filter(User.id == msg.sender_id).first()
-            role = "assistant" if msg.sender_id == 0 else "user"  # 0 = Ava
-            conversation_context.append({
-                "role": role,
-                "content": f"{sender.first_name if sender else 'User'}: {msg.content}"
-            })
-
-        # Extract the query (remove @Ava mention)
-        query = message_data.content.replace("@Ava", "").replace("@ava", "").strip()
-
-        # Get AI response with chat context
-        try:
-            ai_response = ai_assistant.chat_with_ai(
-                message=query,
-                user=current_user,
-                db=db,
-                conversation_history=conversation_context
-            )
-
-            # Create Ava's response message
-            # If links are present, append them to the content in a parseable format
-            message_content = ai_response["response"]
-            if ai_response.get("links"):
-                links_json = json.dumps(ai_response["links"])
-                message_content += f"\n\n__LINKS__:{links_json}"
-
-            ava_message = GuildChatMessage(
-                guild_chat_id=guild_chat.id,
-                sender_id=0,  # Special ID for Ava
-                content=message_content
-            )
-
-            db.add(ava_message)
-            db.commit()
-            logger.info(f"✅ Ava responded in guild {guild_id}")
-
-        except Exception as e:
-            logger.error(f"❌ Error getting Ava response: {e}")
+        job_queue.enqueue(db, "ava_reply.guild_chat", {
+            "user_id": current_user.id,
+            "guild_id": guild_id,
+            "guild_chat_id": guild_chat.id,
+            "message_id": new_message.id,
+            "query": message_data.content.replace("@Ava", "").replace("@ava", "").strip()
+        })
+    db.commit()
+    db.refresh(new_message)
 
     message_response = GuildChatMessageResponse(
         id=new_message.id,
@@ -267,10 +227,84 @@ async def send_guild_chat_message(
         created_at=new_message.created_at,
         is_deleted=new_message.is_deleted
     )
+    realtime_hub.publish(realtime_hub.guild_chat_channel(guild_id), "message.created", message_response.model_dump())
 
     return message_response
 
 
+def ava_reply_failed(db: Session, payload: dict, error: str):
+    """Dead-lettered Ava reply: tell the guild instead of leaving the mention unanswered"""
+    return post_ava_reply(db, payload, ai_assistant.AVA_UNAVAILABLE_MESSAGE)
+
+
+@job_queue.handler("ava_reply.guild_chat", on_dead=ava_reply_failed)
+def ava_reply(db: Session, payload: dict):
+    """Answer an @Ava mention in a guild chat (job queue handler)"""
+    current_user = db.get(User, payload["user_id"])
+    if current_user is None:
+        logger.warning(f"⚠️ Dropping Ava reply for guild message {payload['message_id']}: sender no longer exists")
+        return None
+
+    # Get recent messages for context (last 10 up to the mention)
+    recent_messages = db.query(GuildChatMessage).filter(
+        GuildChatMessage.guild_chat_id == payload["guild_chat_id"],
+        GuildChatMessage.id <= payload["message_id"],
+        GuildChatMessage.is_deleted == False
+    ).order_by(desc(GuildChatMessage.id)).limit(10).all()
+
+    # Build conversation context
+    senders = hydration.load_users(db, (msg.sender_id for msg in recent_messages))
+    conversation_context = []
+    for msg in reversed(recent_messages):
+        sender = senders.get(msg.sender_id)
+        role = "assistant" if msg.sender_id == 0 else "user"  # 0 = Ava
+        conversation_context.append({
+            "role": role,
+            "content": f"{sender.first_name if sender else 'User'}: {msg.content}"
+        })
+
+    # Get AI response with chat context (LLM errors raise, so the queue retries, then dead-letters;
+    # the exchange and its quota charge commit with the reply)
+    turn = ai_assistant.prepare_chat_turn(payload["query"], current_user, db, conversation_context, commit=False)
+    if "result" in turn:
+        ai_response = turn["result"]
+    else:
+        ai_response = ai_assistant.complete_chat_turn(turn, current_user, db, commit=False)
+
+    # If links are present, append them to the content in a parseable format
+    message_content = ai_response["response"]
+    if ai_response.get("links"):
+        links_json = json.dumps(ai_response["links"])
+        message_content += f"\n\n__LINKS__:{links_json}"
+
+    return post_ava_reply(db, payload, message_content)
+
+
+def post_ava_reply(db: Session, payload: dict, content: str):
+    """Add Ava's reply to the guild chat; returns the push to run after commit"""
+    ava_message = GuildChatMessage(
+        guild_chat_id=payload["guild_chat_id"],
+        sender_id=0,  # Special ID for Ava
+        content=content
+    )
+    db.add(ava_message)
+    db.flush()
+
+    def push():
+        realtime_hub.publish(realtime_hub.guild_chat_channel(payload["guild_id"]), "message.created", GuildChatMessageResponse(
+            id=ava_message.id,
+            guild_chat_id=ava_message.guild_chat_id,
+            sender_id=0,
+            sender_name=hydration.AVA_NAME,
+            sender_avatar=hydration.AVA_AVATAR,
+            content=ava_message.content,
+            created_at=ava_message.created_at,
+            is_deleted=False
+        ).model_dump())
+        logger.info(f"✅ Ava responded in guild {payload['guild_id']}")
+    return push
+
+
 @router.delete("/messages/{message_id}")
 async def delete_guild_chat_message(
     message_id: int,
@@ -297,5 +331,6 @@ async def delete_guild_chat_message(
     
     message.is_deleted = True
     db.commit()
+    realtime_hub.publish(realtime_hub.guild_chat_channel(guild.id), "message.deleted", {"id": message_id})
     
     return {"message": "Message deleted successfully"}
@@ -0,0 +1,69 @@
+"""
+Hydration
+Batched loading of the users and latest rows behind list endpoints
+
+List endpoints used to resolve each row's sender/author with its own query
+(and each chat's last message with another), so a 50-message page cost ~51
+queries. These helpers collect the ids first and load them in one query:
+
+- load_users: one IN query for the users behind a page of rows, loading only
+  the columns the responses show
+- last_messages: the newest message of every chat in one window-function query
+
+Used by guild chat, project chat, direct messages, posts and comments.
+"""
+
+from typing import Dict, Iterable, Optional
+from sqlalchemy import func
+from sqlalchemy.orm import Session, load_only
+import logging
+
+from database import User
+
+logger = logging.getLogger(__name__)
+
+AVA_SENDER_ID = 0
+AVA_NAME = "Ava AI"
+AVA_AVATAR = "/ava-avatar.png"
+
+
+def load_users(db: Session, user_ids: Iterable[Optional[int]]) -> Dict[int, User]:
+    """{id: User} for the given ids in one query (Ava's 0 and None are skipped)"""
+    ids = {user_id for user_id in user_ids if user_id}
+    if not ids:
+        return {}
+    users = db.query(User).options(
+        load_only(User.id, User.first_name, User.last_name, User.email, User.avatar_url)
+    ).filter(User.id.in_(ids)).all()
+    return {user.id: user for user in users}
+
+
+def display_name(user: Optional[User], default: str = "Unknown") -> str:
+    return f"{user.first_name} {user.last_name}" if user else default
+
+
+def sender_name(users: Dict[int, User], sender_id: int, default: str = "Unknown") -> str:
+    if sender_id == AVA_SENDER_ID:
+        return AVA_NAME
+    return display_name(users.get(sender_id), default)
+
+
+def sender_avatar(users: Dict[int, User], sender_id: int) -> Optional[str]:
+    if sender_id == AVA_SENDER_ID:
+        return AVA_AVATAR
+    user = users.get(sender_id)
+    return user.avatar_url if user else None
+
+
+def last_messages(db: Session, model, chat_column, chat_ids: Iterable[int], *criteria) -> Dict:
+    """
+    {chat id: newest message} for every chat in one query, ranking each chat's
+    messages by id with ROW_NUMBER() (criteria filter messages before ranking)
+    """
+    chat_ids = list(chat_ids)
+    if not chat_ids:
+        return {}
+    rank = func.row_number().over(partition_by=chat_column, order_by=model.id.desc()).label("rank")
+    ranked = db.query(model.id.label("id"), rank).filter(chat_column.in_(chat_ids), *criteria).subquery()
+    rows = db.query(model).join(ranked, ranked.c.id == model.id).filter(ranked.c.rank == 1).all()
+    return {getattr(row, chat_column.key): row for row in rows}
@@ -0,0 +1,292 @@
+"""
+Job Queue
+Durable background jobs for slow side effects (e.g. @Ava replies in chats)
+
+Jobs are rows in the jobs table, inserted in the caller's transaction, so a
+job exists exactly when the change that asked for it was committed. A pool
+of worker threads claims due jobs and runs the handler registered for their
+kind:
+
+- claiming selects queued rows with FOR UPDATE SKIP LOCKED (Postgres; other
+  workers skip rows being claimed) and flips them to running with a
+  status-guarded UPDATE, which is also the lock on SQLite, where writes are
+  serialized
+- a handler gets its own session and the job's payload. It adds its writes
+  without committing: they commit together with the job being marked done,
+  so a retry never duplicates them. It may return a callable that runs after
+  that commit (e.g. a realtime push)
+- failures are retried with exponential backoff; after max_attempts the job
+  is dead-lettered (status "dead", last_error kept) and the handler's
+  on_dead callback runs (same contract: add writes, optionally return a
+  post-commit callable)
+- running jobs whose lock is older than JOB_LOCK_TIMEOUT_SECONDS belonged to
+  a worker that died and are claimed again. Long handlers that commit as
+  they go (retention, digests) call heartbeat() between batches to renew
+  the lock; a job's outcome is only written while its worker still holds
+  the lock, so a reclaimed run stops (LockLost) and its pending writes,
+  including any follow-up job it queued, are rolled back
+
+Handlers register at import time with @job_queue.handler("kind").
+"""
+
+from typing import Any, Callable, Dict, List, Optional
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from sqlalchemy import event, func, or_, and_
+from sqlalchemy.orm import Session
+import json
+import os
+import socket
+import threading
+import logging
+
+from database import Job, SessionLocal
+
+logger = logging.getLogger(__name__)
+
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+JOB_POLL_SECONDS = float(os.getenv("JOB_POLL_SECONDS", "2"))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+JOB_RETRY_BASE_SECONDS = float(os.getenv("JOB_RETRY_BASE_SECONDS", "5"))
+# A running job locked longer than this belongs to a worker that died
+JOB_LOCK_TIMEOUT_SECONDS = int(os.getenv("JOB_LOCK_TIMEOUT_SECONDS", "300"))
+
+
+@dataclass
+class Handler:
+    run: Callable[[Session, Dict[str, Any]], Optional[Callable[[], None]]]
+    on_dead: Optional[Callable[[Session, Dict[str, Any], str], Optional[Callable[[], None]]]] = None
+
+
+_handlers: Dict[str, Handler] = {}
+
+_LOCK = "job_lock"
+
+
+class LockLost(Exception):
+    """The running job was reclaimed by another worker"""
+
+
+def handler(kind: str, on_dead=None):
+    """Register the function that runs jobs of this kind"""
+    def register(func):
+        _handlers[kind] = Handler(run=func, on_dead=on_dead)
+        return func
+    return register
+
+
+def enqueue(db: Session, kind: str, payload: Dict[str, Any], max_attempts: Optional[int] = None,
+            delay_seconds: float = 0) -> Job:
+    """Add a job in the caller's transaction; workers are woken when it commits"""
+    job = Job(
+        kind=kind,
+        payload=json.dumps(payload, default=str),
+        max_attempts=max_attempts or JOB_MAX_ATTEMPTS,
+        run_at=datetime.utcnow() + timedelta(seconds=delay_seconds)
+    )
+    db.add(job)
+    event.listen(db, "after_commit", lambda session: worker.wake(), once=True)
+    return job
+
+
+def claim(db: Session, worker_id: str, limit: int = 1) -> List[Job]:
+    """Claim up to limit due jobs for worker_id (committed, status running)"""
+    now = datetime.utcnow()
+    stale = now - timedelta(seconds=JOB_LOCK_TIMEOUT_SECONDS)
+    claimable = or_(
+        and_(Job.status == "queued", Job.run_at <= now),
+        and_(Job.status == "running", Job.locked_at < stale)
+    )
+    candidates = db.query(Job.id, Job.status).filter(claimable).order_by(Job.run_at, Job.id).limit(limit).with_for_update(
+        skip_locked=True
+    ).all()
+
+    claimed = []
+    for job_id, status in candidates:
+        won = db.query(Job).filter(Job.id == job_id, Job.status == status, claimable).update({
+            Job.status: "running",
+            Job.locked_by: worker_id,
+            Job.locked_at: now,
+            Job.attempts: Job.attempts + 1
+        }, synchronize_session=False)
+        if won:
+            claimed.append(job_id)
+    db.commit()
+    if not claimed:
+        return []
+    return db.query(Job).filter(Job.id.in_(claimed)).order_by(Job.id).all()
+
+
+def heartbeat(db: Session):
+    """
+    Renew the lock of the job running on this session (no-op outside a job).
+    Commits, so only for handlers that commit as they go; raises LockLost if
+    the job was reclaimed meanwhile.
+    """
+    lock = db.info.get(_LOCK)
+    if lock is None:
+        return
+    job_id, worker_id = lock
+    renewed = db.query(Job).filter(Job.id == job_id, Job.locked_by == worker_id).update(
+        {Job.locked_at: datetime.utcnow()}, synchronize_session=False
+    )
+    db.commit()
+    if not renewed:
+        raise LockLost(f"Job {job_id} was reclaimed from {worker_id}")
+
+
+def _finish(db: Session, job_id: int, worker_id: str, values: Dict[Any, Any]) -> bool:
+    """Write a job's outcome if worker_id still holds its lock"""
+    return bool(db.query(Job).filter(Job.id == job_id, Job.locked_by == worker_id).update(
+        {**values, Job.locked_by: None}, synchronize_session=False
+    ))
+
+
+def run_job(db: Session, job: Job) -> str:
+    """Run a claimed job to its next status (done, queued for retry, dead, or lost to another worker)"""
+    job_id, kind, attempts, max_attempts = job.id, job.kind, job.attempts, job.max_attempts
+    worker_id = job.locked_by
+    payload = json.loads(job.payload)
+    registered = _handlers.get(kind)
+    db.info[_LOCK] = (job_id, worker_id)
+    try:
+        if registered is None:
+            raise LookupError(f"No handler for job kind {kind}")
+        after_commit = registered.run(db, payload)
+        if not _finish(db, job_id, worker_id, {Job.status: "done", Job.finished_at: datetime.utcnow()}):
+            raise LockLost(f"Job {job_id} was reclaimed from {worker_id}")
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        error = f"{type(e).__name__}: {e}"
+        if attempts < max_attempts:
+            status = "queued"
+            values = {Job.status: status, Job.last_error: error,
+                      Job.run_at: datetime.utcnow() + timedelta(seconds=JOB_RETRY_BASE_SECONDS * 2 ** (attempts - 1))}
+        else:
+            status = "dead"
+            values = {Job.status: status, Job.last_error: error, Job.finished_at: datetime.utcnow()}
+        if not _finish(db, job_id, worker_id, values):
+            db.rollback()
+            logger.warning(f"⚠️ Job {job_id} ({kind}) was reclaimed by another worker, dropping this run: {error}")
+            return "lost"
+        db.commit()
+        if status == "queued":
+            logger.warning(f"⚠️ Job {job_id} ({kind}) failed, retry {attempts}/{max_attempts}: {error}")
+        else:
+            logger.error(f"❌ Job {job_id} ({kind}) dead after {attempts} attempts: {error}")
+        if status == "dead" and registered is not None and registered.on_dead is not None:
+            try:
+                after_dead = registered.on_dead(db, payload, error)
+                db.commit()
+                if after_dead is not None:
+                    after_dead()
+            except Exception as dead_error:
+                db.rollback()
+                logger.error(f"❌ Dead-letter callback for job {job_id} failed: {dead_error}")
+        return status
+    finally:
+        db.info.pop(_LOCK, None)
+
+    if after_commit is not None:
+        try:
+            after_commit()
+        except Exception as e:
+            logger.error(f"❌ Post-commit step of job {job_id} failed: {e}")
+    return "done"
+
+
+def retry_dead(db: Session, job_id: int) -> bool:
+    """Put a dead-lettered job back in the queue with a fresh attempt budget"""
+    requeued = db.query(Job).filter(Job.id == job_id, Job.status == "dead").update({
+        Job.status: "queued",
+        Job.attempts: 0,
+        Job.run_at: datetime.utcnow(),
+        Job.finished_at: None
+    }, synchronize_session=False)
+    db.commit()
+    if requeued:
+        worker.wake()
+    return bool(requeued)
+
+
+class JobWorker:
+    """Worker threads that claim and run due jobs"""
+
+    def __init__(self, session_factory=SessionLocal):
+        self.session_factory = session_factory
+        self._threads: List[threading.Thread] = []
+        self._stop = threading.Event()
+        self._wake = threading.Condition()
+        self._lock = threading.Lock()
+        self.outcomes = {"done": 0, "queued": 0, "dead": 0, "lost": 0}
+
+    def wake(self):
+        with self._wake:
+            self._wake.notify_all()
+
+    def run_pending(self, worker_id: str = "inline", limit: int = 100) -> int:
+        """Claim and run due jobs until none are left (or limit is reached); returns jobs run"""
+        ran = 0
+        while ran < limit:
+            db = self.session_factory()
+            try:
+                jobs = claim(db, worker_id)
+                if not jobs:
+                    return ran
+                status = run_job(db, jobs[0])
+            finally:
+                db.close()
+            with self._lock:
+                self.outcomes[status] += 1
+            ran += 1
+        return ran
+
+    def start(self, workers: int = JOB_WORKERS):
+        if self._threads:
+            return
+        self._stop.clear()
+        host = socket.gethostname()
+
+        def run(index):
+            worker_id = f"{host}:{os.getpid()}:{index}"
+            while not self._stop.is_set():
+                try:
+                    self.run_pending(worker_id)
+                except Exception as e:
+                    logger.error(f"❌ Job worker {worker_id} error: {e}")
+                with self._wake:
+                    if not self._stop.is_set():
+                        self._wake.wait(JOB_POLL_SECONDS)
+
+        for index in range(workers):
+            thread = threading.Thread(target=run, args=(index,), name=f"job-worker-{index}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        logger.info(f"✅ Job queue started with {workers} workers")
+
+    def stop(self, timeout: float = 5):
+        self._stop.set()
+        self.wake()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def get_stats(self) -> Dict[str, Any]:
+        db = self.session_factory()
+        try:
+            counts = dict(db.query(Job.status, func.count(Job.id)).group_by(Job.status).all())
+        finally:
+            db.close()
+        with self._lock:
+            outcomes = dict(self.outcomes)
+        return {
+            "workers": len(self._threads),
+            "queued": counts.get("queued", 0),
+            "running": counts.get("running", 0),
+            "dead": counts.get("dead", 0),
+            "handled": outcomes,
+        }
+
+
+worker = JobWorker()
@@ -0,0 +1,550 @@
+"""
+LLM Gateway
+Single entry point for every OpenAI call the backend makes
+
+All requests run on one AsyncOpenAI client owned by a background event loop,
+so every worker thread shares one connection pool and one set of limits:
+
+- per-call-site deadlines (CALL_SITES): the whole call, retries included,
+  must finish inside the deadline or it fails fast
+- a token bucket (LLM_RATE_PER_SECOND / LLM_RATE_BURST) plus a cap on
+  in-flight requests (LLM_MAX_CONCURRENCY)
+- retries with jittered exponential backoff for 429/5xx/connection errors,
+  honouring Retry-After, and never sleeping past the deadline
+- a circuit breaker per upstream (chat, embeddings, assistants) that opens
+  after LLM_BREAKER_FAILURES consecutive failures; while open, calls raise
+  LLMUnavailable immediately and callers serve their own fallback answers
+- per-call-site metrics: calls, errors by reason, retries, latency and tokens
+
+Sync callers use chat() / embed() / chat_stream() / run(); async callers use
+achat() / aembed() / arun() from any event loop.
+"""
+
+from typing import List, Dict, Any, Optional, Callable, Awaitable, Iterator
+from collections import deque
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+import os
+import time
+import queue
+import random
+import asyncio
+import threading
+import logging
+
+import openai
+from openai import AsyncOpenAI
+
+import tracing
+
+logger = logging.getLogger(__name__)
+
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "32"))
+LLM_RATE_PER_SECOND = float(os.getenv("LLM_RATE_PER_SECOND", "20"))
+LLM_RATE_BURST = int(os.getenv("LLM_RATE_BURST", "40"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "2"))
+LLM_RETRY_BASE_SECONDS = float(os.getenv("LLM_RETRY_BASE_SECONDS", "0.25"))
+LLM_RETRY_MAX_SECONDS = float(os.getenv("LLM_RETRY_MAX_SECONDS", "4"))
+LLM_BREAKER_FAILURES = int(os.getenv("LLM_BREAKER_FAILURES", "5"))
+LLM_BREAKER_COOLDOWN_SECONDS = float(os.getenv("LLM_BREAKER_COOLDOWN_SECONDS", "30"))
+LLM_STREAM_IDLE_SECONDS = float(os.getenv("LLM_STREAM_IDLE_SECONDS", "10"))
+
+EMBEDDING_MODEL = "text-embedding-3-small"
+
+_PLACEHOLDER_KEY = "your-openai-api-key-here"
+
+
+@dataclass(frozen=True)
+class CallSite:
+    deadline: float
+    retries: int = LLM_MAX_RETRIES
+    upstream: str = "chat"
+
+
+# Deadlines are end-to-end budgets for each place we call the model from.
+# User-facing answers get one retry; background work can afford more.
+CALL_SITES: Dict[str, CallSite] = {
+    "assistant.completion": CallSite(12.0, 1),
+    "assistant.stream": CallSite(12.0, 1),  # deadline covers time to first token
+    "assistant.action_explanation": CallSite(4.0, 0),
+    "assistant.category_detection": CallSite(5.0, 1),
+    "assistant.shopping_list": CallSite(8.0, 1),
+    "assistant.summary": CallSite(10.0, 2),
+    "assistant.negotiation": CallSite(5.0, 1),
+    "actions.detect": CallSite(6.0, 1),
+    "embeddings.search": CallSite(5.0, 2, "embeddings"),
+    "embeddings.marketplace": CallSite(5.0, 2, "embeddings"),
+    "mcp.assistants": CallSite(30.0, 2, "assistants"),
+}
+DEFAULT_CALL_SITE = CallSite(10.0)
+
+
+class LLMUnavailable(Exception):
+    """The call was not attempted or could not finish in time"""
+
+    def __init__(self, call_site: str, reason: str):
+        super().__init__(f"LLM call '{call_site}' unavailable: {reason}")
+        self.call_site = call_site
+        self.reason = reason
+
+
+def is_retryable(error: BaseException) -> bool:
+    """Rate limits, server errors and dropped connections are worth retrying"""
+    if isinstance(error, openai.APIConnectionError):  # includes APITimeoutError
+        return True
+    if isinstance(error, openai.APIStatusError):
+        return error.status_code == 429 or error.status_code >= 500
+    return False
+
+
+def _is_upstream_failure(error: BaseException) -> bool:
+    return is_retryable(error) or isinstance(error, asyncio.TimeoutError)
+
+
+def _retry_after(error: BaseException) -> Optional[float]:
+    response = getattr(error, "response", None)
+    value = response.headers.get("retry-after") if response is not None else None
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+def backoff_delay(attempt: int, retry_after: Optional[float] = None) -> float:
+    """Full-jitter exponential backoff; a server-supplied Retry-After is a floor"""
+    delay = random.uniform(0, min(LLM_RETRY_MAX_SECONDS, LLM_RETRY_BASE_SECONDS * (2 ** attempt)))
+    return max(delay, retry_after) if retry_after else delay
+
+
+class TokenBucket:
+    """Request rate limiter. Only touched from the gateway loop, so no lock."""
+
+    def __init__(self, rate: float, capacity: int, clock: Callable[[], float] = time.monotonic):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self._clock = clock
+        self._updated = clock()
+
+    def reserve(self) -> float:
+        """Take a token; returns how long the caller must wait before using it"""
+        now = self._clock()
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+        self.tokens -= 1
+        return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+    def refund(self):
+        self.tokens += 1
+
+
+class CircuitBreaker:
+    """Closed -> open after N consecutive failures -> half-open single probe"""
+
+    def __init__(self, name: str, failure_threshold: int = LLM_BREAKER_FAILURES,
+                 cooldown_seconds: float = LLM_BREAKER_COOLDOWN_SECONDS,
+                 clock: Callable[[], float] = time.monotonic):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.cooldown_seconds = cooldown_seconds
+        self._clock = clock
+        self._lock = threading.Lock()
+        self.state = "closed"
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self.times_opened = 0
+        self._probe_in_flight = False
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == "closed":
+                return True
+            if self.state == "open" and self._clock() - self.opened_at >= self.cooldown_seconds:
+                self.state = "half_open"
+            if self.state == "half_open" and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return True
+            return False
+
+    def record(self, error: Optional[BaseException]):
+        """Record the outcome of an allowed call (None = success)"""
+        with self._lock:
+            probe = self._probe_in_flight
+            self._probe_in_flight = False
+            if isinstance(error, asyncio.CancelledError):
+                return  # caller went away; no verdict on the upstream
+            if error is None or not _is_upstream_failure(error):
+                # The upstream answered (even a 400 means it's up)
+                self.state = "closed"
+                self.consecutive_failures = 0
+                return
+            self.consecutive_failures += 1
+            if probe or self.consecutive_failures >= self.failure_threshold:
+                if self.state != "open":
+                    self.times_opened += 1
+                    logger.warning(f"⚡ LLM circuit '{self.name}' opened after {self.consecutive_failures} failures")
+                self.state = "open"
+                self.opened_at = self._clock()
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "state": self.state,
+                "consecutive_failures": self.consecutive_failures,
+                "times_opened": self.times_opened,
+            }
+
+
+@dataclass
+class CallSiteMetrics:
+    calls: int = 0
+    successes: int = 0
+    retries: int = 0
+    errors: Dict[str, int] = field(default_factory=dict)
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    latencies: deque = field(default_factory=lambda: deque(maxlen=500))
+
+    def snapshot(self) -> Dict[str, Any]:
+        ordered = sorted(self.latencies)
+
+        def pct(p):
+            return round(ordered[min(len(ordered) - 1, int(len(ordered) * p))] * 1000, 1) if ordered else None
+
+        return {
+            "calls": self.calls,
+            "successes": self.successes,
+            "errors": dict(self.errors),
+            "retries": self.retries,
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "latency_ms": {"p50": pct(0.5), "p95": pct(0.95)},
+        }
+
+
+def _error_reason(error: BaseException) -> str:
+    if isinstance(error, LLMUnavailable):
+        return error.reason
+    if isinstance(error, asyncio.TimeoutError):
+        return "timeout"
+    if isinstance(error, asyncio.CancelledError):
+        return "cancelled"
+    if isinstance(error, openai.RateLimitError):
+        return "rate_limited"
+    if isinstance(error, openai.APIStatusError):
+        return f"http_{error.status_code}"
+    if isinstance(error, openai.APIConnectionError):
+        return "connection"
+    return type(error).__name__
+
+
+class LLMGateway:
+    """Shared async OpenAI client with deadlines, limits, retries and breakers"""
+
+    def __init__(self, max_concurrency: int = LLM_MAX_CONCURRENCY,
+                 rate_per_second: float = LLM_RATE_PER_SECOND, burst: int = LLM_RATE_BURST):
+        self.max_concurrency = max_concurrency
+        self._bucket = TokenBucket(rate_per_second, burst)
+        self.breakers = {name: CircuitBreaker(name) for name in ("chat", "embeddings", "assistants")}
+        self._metrics: Dict[str, CallSiteMetrics] = {}
+        self._metrics_lock = threading.Lock()
+        self._start_lock = threading.Lock()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread: Optional[threading.Thread] = None
+        self._client: Optional[AsyncOpenAI] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+
+    # ------------------------------------------------------------------
+    # Setup
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def is_configured() -> bool:
+        api_key = os.getenv("OPENAI_API_KEY")
+        return bool(api_key) and api_key != _PLACEHOLDER_KEY
+
+    def _ensure_loop(self) -> asyncio.AbstractEventLoop:
+        if self._loop is not None:
+            return self._loop
+        with self._start_lock:
+            if self._loop is None:
+                loop = asyncio.new_event_loop()
+                ready = threading.Event()
+
+                def run():
+                    asyncio.set_event_loop(loop)
+                    # Retries and timeouts are ours; the SDK must not add its own
+                    # (base URL comes from OPENAI_BASE_URL when set)
+                    self._client = AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"), max_retries=0, timeout=60.0)
+                    self._semaphore = asyncio.Semaphore(self.max_concurrency)
+                    ready.set()
+                    loop.run_forever()
+
+                self._loop_thread = threading.Thread(target=run, name="llm-gateway", daemon=True)
+                self._loop_thread.start()
+                ready.wait()
+                self._loop = loop
+        return self._loop
+
+    def _submit(self, coro):
+        return asyncio.run_coroutine_threadsafe(coro, self._ensure_loop())
+
+    def _run_sync(self, coro):
+        if threading.current_thread() is self._loop_thread:
+            coro.close()
+            raise RuntimeError("Sync LLM gateway calls can't be made from the gateway loop")
+        return self._submit(coro).result()
+
+    async def _run_async(self, coro):
+        loop = self._ensure_loop()
+        if asyncio.get_running_loop() is loop:
+            return await coro
+        return await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(coro, loop))
+
+    def _site_metrics(self, call_site: str) -> CallSiteMetrics:
+        metrics = self._metrics.get(call_site)
+        if metrics is None:
+            with self._metrics_lock:
+                metrics = self._metrics.setdefault(call_site, CallSiteMetrics())
+        return metrics
+
+    def _record(self, call_site: str, started: float, result: Any = None, error: Optional[BaseException] = None):
+        metrics = self._site_metrics(call_site)
+        with self._metrics_lock:
+            metrics.latencies.append(time.monotonic() - started)
+            if error is not None:
+                reason = _error_reason(error)
+                metrics.errors[reason] = metrics.errors.get(reason, 0) + 1
+                return
+            metrics.successes += 1
+            usage = getattr(result, "usage", None)
+            if usage is not None:
+                metrics.prompt_tokens += getattr(usage, "prompt_tokens", 0) or 0
+                metrics.completion_tokens += getattr(usage, "completion_tokens", 0) or 0
+
+    def _count(self, call_site: str, counter: str):
+        metrics = self._site_metrics(call_site)
+        with self._metrics_lock:
+            setattr(metrics, counter, getattr(metrics, counter) + 1)
+
+    # ------------------------------------------------------------------
+    # Core (runs on the gateway loop)
+    # ------------------------------------------------------------------
+
+    @asynccontextmanager
+    async def _admitted(self, call_site: str, breaker: CircuitBreaker, deadline: float):
+        """Rate limit, concurrency slot and breaker check for one attempt"""
+        wait = self._bucket.reserve()
+        if time.monotonic() + wait >= deadline:
+            self._bucket.refund()
+            raise LLMUnavailable(call_site, "throttled")
+        if wait > 0:
+            await asyncio.sleep(wait)
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), max(deadline - time.monotonic(), 0))
+        except asyncio.TimeoutError:
+            raise LLMUnavailable(call_site, "throttled")
+        try:
+            if not breaker.allow():
+                raise LLMUnavailable(call_site, "circuit_open")
+            yield
+        finally:
+            self._semaphore.release()
+
+    async def _execute(self, call_site: str, operation: Callable[[AsyncOpenAI], Awaitable[Any]]) -> Any:
+        site = CALL_SITES.get(call_site, DEFAULT_CALL_SITE)
+        breaker = self.breakers[site.upstream]
+        started = time.monotonic()
+        deadline = started + site.deadline
+        self._count(call_site, "calls")
+        attempt = 0
+        try:
+            if not self.is_configured():
+                raise LLMUnavailable(call_site, "not_configured")
+            while True:
+                try:
+                    async with self._admitted(call_site, breaker, deadline):
+                        try:
+                            result = await asyncio.wait_for(operation(self._client), deadline - time.monotonic())
+                        except BaseException as error:
+                            breaker.record(error)
+                            raise
+                        breaker.record(None)
+                    self._record(call_site, started, result=result)
+                    return result
+                except LLMUnavailable:
+                    raise
+                except Exception as error:
+                    if not is_retryable(error) or attempt >= site.retries:
+                        raise
+                    delay = backoff_delay(attempt, _retry_after(error))
+                    if time.monotonic() + delay >= deadline:
+                        raise
+                    attempt += 1
+                    self._count(call_site, "retries")
+                    tracing.set_attribute("llm.retries", attempt)
+                    logger.info(f"🔁 Retrying LLM call '{call_site}' in {delay:.2f}s ({_error_reason(error)})")
+                    await asyncio.sleep(delay)
+        except asyncio.TimeoutError as error:
+            self._record(call_site, started, error=error)
+            raise LLMUnavailable(call_site, "timeout") from error
+        except Exception as error:
+            self._record(call_site, started, error=error)
+            raise
+
+    async def _pump_stream(self, call_site: str, params: Dict[str, Any], out: "queue.Queue"):
+        """Open a streaming completion and push its chunks to a thread queue"""
+        site = CALL_SITES.get(call_site, DEFAULT_CALL_SITE)
+        breaker = self.breakers[site.upstream]
+        started = time.monotonic()
+        deadline = started + site.deadline
+        self._count(call_site, "calls")
+        attempt = 0
+        delivered = False
+        usage = None
+        try:
+            if not self.is_configured():
+                raise LLMUnavailable(call_site, "not_configured")
+            while True:
+                try:
+                    async with self._admitted(call_site, breaker, deadline):
+                        stream = None
+                        try:
+                            stream = await asyncio.wait_for(
+                                self._client.chat.completions.create(stream=True, **params),
+                                deadline - time.monotonic())
+                            chunks = stream.__aiter__()
+                            while True:
+                                # Deadline covers the first token; after that only stalls count
+                                timeout = LLM_STREAM_IDLE_SECONDS if delivered else deadline - time.monotonic()
+                                try:
+                                    chunk = await asyncio.wait_for(chunks.__anext__(), timeout)
+                                except StopAsyncIteration:
+                                    break
+                                if not delivered:
+                                    breaker.record(None)
+                                    delivered = True
+                                usage = getattr(chunk, "usage", None) or usage
+                                out.put(("chunk", chunk))
+                            if not delivered:
+                                breaker.record(None)
+                        except BaseException as error:
+                            if not delivered:
+                                breaker.record(error)
+                            raise
+                        finally:
+                            if stream is not None:
+                                await stream.close()
+                    self._record(call_site, started, result=type("Streamed", (), {"usage": usage})())
+                    if usage is not None:
+                        tracing.set_attribute("llm.total_tokens", usage.total_tokens)
+                    return
+                except LLMUnavailable:
+                    raise
+                except Exception as error:
+                    # Once tokens have reached the caller the answer can't be restarted
+                    if delivered or not is_retryable(error) or attempt >= site.retries:
+                        raise
+                    delay = backoff_delay(attempt, _retry_after(error))
+                    if time.monotonic() + delay >= deadline:
+                        raise
+                    attempt += 1
+                    self._count(call_site, "retries")
+                    await asyncio.sleep(delay)
+        except asyncio.TimeoutError as error:
+            self._record(call_site, started, error=error)
+            out.put(("error", LLMUnavailable(call_site, "timeout")))
+        except asyncio.CancelledError as error:
+            self._record(call_site, started, error=error)  # consumer closed the stream
+            raise
+        except Exception as error:
+            self._record(call_site, started, error=error)
+            out.put(("error", error))
+        finally:
+            out.put(("end", None))
+
+    def _traced(self, call_site: str, coro: Awaitable[Any]) -> Awaitable[Any]:
+        """Wrap a gateway coroutine in an llm.<call_site> span under the caller's span"""
+        parent = tracing.current_span()
+
+        async def run():
+            with tracing.span(f"llm.{call_site}", parent=parent, **{"llm.call_site": call_site}) as span:
+                result = await coro
+                usage = getattr(result, "usage", None)
+                if usage is not None:
+                    span.set(**{
+                        "llm.prompt_tokens": getattr(usage, "prompt_tokens", 0) or 0,
+                        "llm.completion_tokens": getattr(usage, "completion_tokens", 0) or 0,
+                    })
+                return result
+        return run()
+
+    # ------------------------------------------------------------------
+    # Public API
+    # ------------------------------------------------------------------
+
+    def run(self, call_site: str, operation: Callable[[AsyncOpenAI], Awaitable[Any]]) -> Any:
+        """Run any client operation, e.g. lambda client: client.beta.threads.create()"""
+        return self._run_sync(self._traced(call_site, self._execute(call_site, operation)))
+
+    async def arun(self, call_site: str, operation: Callable[[AsyncOpenAI], Awaitable[Any]]) -> Any:
+        return await self._run_async(self._traced(call_site, self._execute(call_site, operation)))
+
+    def chat(self, call_site: str, **params) -> Any:
+        """chat.completions.create(**params); returns the ChatCompletion"""
+        return self.run(call_site, lambda client: client.chat.completions.create(**params))
+
+    async def achat(self, call_site: str, **params) -> Any:
+        return await self.arun(call_site, lambda client: client.chat.completions.create(**params))
+
+    def embed(self, call_site: str, text: str, model: str = EMBEDDING_MODEL) -> List[float]:
+        response = self.run(call_site, lambda client: client.embeddings.create(model=model, input=text))
+        return response.data[0].embedding
+
+    async def aembed(self, call_site: str, text: str, model: str = EMBEDDING_MODEL) -> List[float]:
+        response = await self.arun(call_site, lambda client: client.embeddings.create(model=model, input=text))
+        return response.data[0].embedding
+
+    def chat_stream(self, call_site: str, **params) -> Iterator[Any]:
+        """Streaming completion as a sync iterator of chunks; closing it cancels the request"""
+        out: "queue.Queue" = queue.Queue()
+        future = self._submit(self._traced(call_site, self._pump_stream(call_site, params, out)))
+        try:
+            while True:
+                kind, item = out.get()
+                if kind == "chunk":
+                    yield item
+                elif kind == "error":
+                    raise item
+                else:
+                    return
+        finally:
+            future.cancel()
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._metrics_lock:
+            sites = {name: metrics.snapshot() for name, metrics in sorted(self._metrics.items())}
+        return {
+            "configured": self.is_configured(),
+            "limits": {
+                "max_concurrency": self.max_concurrency,
+                "rate_per_second": self._bucket.rate,
+                "burst": self._bucket.capacity,
+            },
+            "breakers": {name: breaker.snapshot() for name, breaker in self.breakers.items()},
+            "call_sites": sites,
+            "deadlines": {name: site.deadline for name, site in CALL_SITES.items()},
+        }
+
+
+gateway = LLMGateway()
+
+is_configured = gateway.is_configured
+run = gateway.run
+arun = gateway.arun
+chat = gateway.chat
+achat = gateway.achat
+embed = gateway.embed
+aembed = gateway.aembed
+chat_stream = gateway.chat_stream
+get_stats = gateway.get_stats
@@ -1,12 +1,15 @@
 from fastapi import FastAPI, Depends, HTTPException, status, Query, File, UploadFile, Form
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
+from fastapi.responses import StreamingResponse, PlainTextResponse
+from starlette.background import BackgroundTask
 from sqlalchemy.orm import Session
 from sqlalchemy import or_
 from datetime import timedelta, datetime
 from typing import List, Optional, Dict, Any
 from pydantic import BaseModel
 import os
+import json
 import shutil
 import time
 import random
@@ -20,7 +23,8 @@ from cloudinary_ai_generator import get_ai_guild_avatar
 
 from database import (
     get_db, init_db, User, Guild, Project, Task, Product, Message, Order, Escrow, Payment, Post,
-    GuildChat, ProjectChat, ProjectChatMessage, guild_members, project_members, SellerPaymentInfo, Admin, SessionLocal
+    GuildChat, ProjectChat, ProjectChatMessage, guild_members, project_members, SellerPaymentInfo, Admin, SessionLocal,
+    engine
 )
 from slowapi import Limiter, _rate_limit_exceeded_handler
 from slowapi.util import get_remote_address
@@ -57,6 +61,15 @@ import oauth_routes
 import notification_routes
 import guild_chat_routes
 import project_chat
+import realtime_routes
+import realtime_hub
+import read_state
+import hydration
+import notifications
+import activity_log
+import job_queue
+import retention
+import digest
 import cart_checkout
 import seller_payment_routes
 import qdrant_service
@@ -72,6 +85,17 @@ import paystack_payout_routes
 import project_escrow_routes
 import mcp_server
 import mcp_openai_integration
+import entity_matcher
+import product_keyword_index
+import spell_correction
+import ai_response_cache
+import llm_gateway
+import conversation_summary
+import context_packer
+import negotiation_detector
+import single_flight
+import tracing
+import ai_token_manager
 
 load_dotenv()
 
@@ -125,6 +149,13 @@ app.add_middleware(
     expose_headers=["*"],
 )
 
+# Request tracing: a root span per request (outermost middleware), with DB
+# statements and outbound HTTP calls recorded as child spans
+app.add_middleware(tracing.TracingMiddleware)
+tracing.instrument_sqlalchemy(engine)
+tracing.instrument_httpx()
+tracing.instrument_requests()
+
 # Include routers
 app.include_router(payment_escrow.router, tags=["Payments & Escrow"])
 app.include_router(stripe_integration.router, prefix="/stripe", tags=["Stripe"])
@@ -135,10 +166,14 @@ app.include_router(marketplace_routes.router, tags=["Marketplace"])
 app.include_router(chat_routes.router, tags=["Chat"])
 app.include_router(guild_chat_routes.router, tags=["Guild Chats"])
 app.include_router(project_chat.router, tags=["Project Chats"])
+app.include_router(realtime_routes.router, tags=["Realtime"])
+app.include_router(read_state.router, tags=["Read State"])
+app.include_router(retention.router, tags=["Archive"])
 app.include_router(ai_routes.router, tags=["AI Assistant"])
 app.include_router(ai_subscription_routes.router, tags=["AI Subscription"])
 app.include_router(oauth_routes.router, tags=["OAuth"])
 app.include_router(notification_routes.router, tags=["Notifications"])
+app.include_router(activity_log.router, tags=["Activity"])
 app.include_router(user_settings_routes.router, tags=["User Settings"])
 app.include_router(wallet_routes.router, tags=["Wallet"])
 app.include_router(stripe_connect_routes.router, tags=["Stripe Connect"])
@@ -227,6 +262,42 @@ def create_default_admin():
         db.close()
 
 
+def reconcile_ai_usage():
+    """Charge conversation usage that a crashed worker never flushed to users"""
+    db = SessionLocal()
+    try:
+        ai_token_manager.reconcile_usage(db)
+    except Exception as e:
+        db.rollback()
+        print(f"⚠️  AI usage reconciliation failed: {e}")
+    finally:
+        db.close()
+
+
+def schedule_retention():
+    """Make sure a retention run is queued (runs reschedule themselves)"""
+    db = SessionLocal()
+    try:
+        retention.schedule(db)
+    except Exception as e:
+        db.rollback()
+        print(f"⚠️  Could not schedule retention: {e}")
+    finally:
+        db.close()
+
+
+def schedule_digest():
+    """Make sure a digest run is queued when a mail transport is configured"""
+    db = SessionLocal()
+    try:
+        digest.schedule(db)
+    except Exception as e:
+        db.rollback()
+        print(f"⚠️  Could not schedule digest emails: {e}")
+    finally:
+        db.close()
+
+
 @app.on_event("startup")
 async def startup_event():
     """Initialize database on startup"""
@@ -234,10 +305,35 @@ async def startup_event():
     create_default_admin()
     qdrant_service.init_qdrant_clients() # Initialize Qdrant and OpenAI clients
     qdrant_service.initialize_collections() # Ensure collections exist
+    entity_matcher.entity_index.refresh() # Warm the @mention entity index
+    entity_matcher.entity_index.start() # Rebuild it off the request path as names change
+    product_keyword_index.keyword_index.refresh() # Warm the product keyword index
+    product_keyword_index.keyword_index.start() # Reload it off the request path
+    spell_correction.corrector.refresh() # Warm the search spelling dictionary
+    spell_correction.corrector.start() # Reload it off the request path
+    reconcile_ai_usage() # Charge AI usage a crashed worker never flushed
+    ai_token_manager.usage_ledger.start() # Write-behind AI quota counters
+    activity_log.writer.start() # Buffered activity log inserts
+    await realtime_hub.hub.start() # WebSocket/SSE push for chats
+    job_queue.worker.start() # Background jobs (@Ava replies in chats)
+    schedule_retention() # Archive old chat history, purge soft-deleted messages
+    schedule_digest() # Digest emails for users who opted in
     print("✅ Database initialized")
     print(f"✅ CORS enabled for: {FRONTEND_URL}")
 
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Flush buffered AI usage and activity, stop job workers and close realtime connections before the worker exits"""
+    job_queue.worker.stop()
+    entity_matcher.entity_index.stop()
+    product_keyword_index.keyword_index.stop()
+    spell_correction.corrector.stop()
+    ai_token_manager.usage_ledger.stop()
+    activity_log.writer.stop()
+    await realtime_hub.hub.stop()
+
+
 @app.get("/")
 async def root():
     """Health check endpoint"""
@@ -272,6 +368,7 @@ async def signup(user_data: UserCreate, db: Session = Depends(get_db)):
     )
     
     db.add(new_user)
+    activity_log.emit(db, new_user, "signed_up", "user", new_user)
     db.commit()
     db.refresh(new_user)
     
@@ -602,8 +699,10 @@ async def update_user(
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
 
-    for field, value in user_update.dict(exclude_unset=True).items():
+    changes = user_update.dict(exclude_unset=True)
+    for field, value in changes.items():
         setattr(user, field, value)
+    activity_log.emit(db, user.id, "updated", "user", user.id, extra={"fields": sorted(changes)})
 
     db.commit()
     db.refresh(user)
@@ -713,6 +812,8 @@ async def create_guild(
     )
     
     db.add(new_guild)
+    activity_log.emit(db, current_user.id, "created", "guild", new_guild, "guild", new_guild,
+                      extra={"name": new_guild.name})
     db.commit()
     db.refresh(new_guild)
     
@@ -869,6 +970,7 @@ async def update_guild(
             print(f"Error uploading banner to Cloudinary: {e}")
             raise HTTPException(status_code=500, detail="Failed to upload banner")
     
+    activity_log.emit(db, current_user.id, "updated", "guild", guild.id, "guild", guild.id, extra={"name": guild.name})
     db.commit()
     db.refresh(guild)
     
@@ -912,6 +1014,12 @@ async def join_guild(
     
     # Update member count
     guild.member_count += 1
+    notifications.notify(
+        db, guild.owner_id, "guild.joined", "New Guild Member",
+        f"{current_user.first_name} {current_user.last_name} joined {guild.name}",
+        link=f"/guilds/{guild_id}", actor_id=current_user.id
+    )
+    activity_log.emit(db, current_user.id, "joined", "guild", guild_id, "guild", guild_id, extra={"name": guild.name})
     
     db.commit()
     
@@ -958,6 +1066,7 @@ async def leave_guild(
     
     # Update member count
     guild.member_count = max(1, guild.member_count - 1)  # Keep minimum of 1 for the owner
+    activity_log.emit(db, current_user.id, "left", "guild", guild_id, "guild", guild_id, extra={"name": guild.name})
     
     db.commit()
     
@@ -1040,22 +1149,25 @@ async def get_guild_posts(
     
     posts = query.order_by(Post.is_pinned.desc(), Post.created_at.desc()).offset(skip).limit(limit).all()
     
+    # Authors and the viewer's reactions for the whole page, one query each
+    authors = hydration.load_users(db, (post.author_id for post in posts))
+    liked_ids, unliked_ids = set(), set()
+    if current_user and posts:
+        post_ids = [post.id for post in posts]
+        liked_ids = {row.post_id for row in db.query(post_likes.c.post_id).filter(
+            post_likes.c.user_id == current_user.id,
+            post_likes.c.post_id.in_(post_ids)
+        )}
+        unliked_ids = {row.post_id for row in db.query(post_unlikes.c.post_id).filter(
+            post_unlikes.c.user_id == current_user.id,
+            post_unlikes.c.post_id.in_(post_ids)
+        )}
+    
     result = []
     for post in posts:
-        is_liked = False
-        is_unliked = False
-        if current_user:
-            liked = db.query(post_likes).filter(
-                post_likes.c.user_id == current_user.id,
-                post_likes.c.post_id == post.id
-            ).first()
-            is_liked = liked is not None
-            
-            unliked = db.query(post_unlikes).filter(
-                post_unlikes.c.user_id == current_user.id,
-                post_unlikes.c.post_id == post.id
-            ).first()
-            is_unliked = unliked is not None
+        author = authors[post.author_id]
+        is_liked = post.id in liked_ids
+        is_unliked = post.id in unliked_ids
         
         result.append({
             "id": post.id,
@@ -1063,9 +1175,9 @@ async def get_guild_posts(
             "content": post.content,
             "image_url": post.image_url,
             "author": {
-                "id": post.author.id,
-                "name": f"{post.author.first_name} {post.author.last_name}",
-                "email": post.author.email,
+                "id": author.id,
+                "name": hydration.display_name(author),
+                "email": author.email,
             },
             "is_pinned": post.is_pinned,
             "post_type": post.post_type,
@@ -1140,6 +1252,14 @@ async def create_guild_post(
     )
     
     db.add(new_post)
+    db.flush()
+    notifications.fan_out_to_guild(
+        db, guild_id, "guild.post", "New Guild Post",
+        f"{current_user.first_name} {current_user.last_name} posted in {guild.name}",
+        link=f"/guilds/{guild_id}/posts/{new_post.id}", actor_id=current_user.id
+    )
+    activity_log.emit(db, current_user.id, "created", "post", new_post.id, "guild", guild_id,
+                      extra={"guild": guild.name})
     db.commit()
     db.refresh(new_post)
     
@@ -1211,6 +1331,8 @@ async def toggle_like_post(
             post_id=post_id
         ))
         post.likes_count += 1
+        activity_log.emit(db, current_user.id, "liked", "post", post_id, "guild", post.guild_id,
+                          extra={"guild": post.guild.name if post.guild else ""})
         db.commit()
         return {"liked": True, "likes_count": post.likes_count, "unlikes_count": post.unlikes_count}
 
@@ -1265,6 +1387,8 @@ async def toggle_unlike_post(
             post_id=post_id
         ))
         post.unlikes_count += 1
+        activity_log.emit(db, current_user.id, "unliked", "post", post_id, "guild", post.guild_id,
+                          extra={"guild": post.guild.name if post.guild else ""})
         db.commit()
         return {"unliked": True, "likes_count": post.likes_count, "unlikes_count": post.unlikes_count}
 
@@ -1294,9 +1418,16 @@ async def get_post_reactions(
         post_likes.select().where(post_likes.c.post_id == post_id)
     ).fetchall()
     
+    # Get users who unliked
+    unlikes = db.execute(
+        post_unlikes.select().where(post_unlikes.c.post_id == post_id)
+    ).fetchall()
+    
+    users = hydration.load_users(db, [row.user_id for row in likes] + [row.user_id for row in unlikes])
+    
     liked_users = []
     for like in likes:
-        user = db.query(User).filter(User.id == like.user_id).first()
+        user = users.get(like.user_id)
         if user:
             liked_users.append({
                 "id": user.id,
@@ -1305,14 +1436,9 @@ async def get_post_reactions(
                 "avatar_url": user.avatar_url,
             })
     
-    # Get users who unliked
-    unlikes = db.execute(
-        post_unlikes.select().where(post_unlikes.c.post_id == post_id)
-    ).fetchall()
-    
     unliked_users = []
     for unlike in unlikes:
-        user = db.query(User).filter(User.id == unlike.user_id).first()
+        user = users.get(unlike.user_id)
         if user:
             unliked_users.append({
                 "id": user.id,
@@ -1345,23 +1471,32 @@ async def get_post_comments(
         Comment.parent_id == None
     ).order_by(Comment.created_at.desc()).offset(skip).limit(limit).all()
     
-    def format_comment(comment):
-        # Get replies for this comment
+    # All replies on the post in one query, grouped by parent in memory
+    replies_by_parent = {}
+    if top_level_comments:
         replies = db.query(Comment).filter(
-            Comment.parent_id == comment.id
+            Comment.post_id == post_id,
+            Comment.parent_id != None
         ).order_by(Comment.created_at.asc()).all()
-        
+        for reply in replies:
+            replies_by_parent.setdefault(reply.parent_id, []).append(reply)
+    else:
+        replies = []
+    authors = hydration.load_users(db, (c.author_id for c in top_level_comments + replies))
+    
+    def format_comment(comment):
+        author = authors[comment.author_id]
         return {
             "id": comment.id,
             "content": comment.content,
             "image_url": comment.image_url,
             "author": {
-                "id": comment.author.id,
-                "name": f"{comment.author.first_name} {comment.author.last_name}",
-                "email": comment.author.email,
+                "id": author.id,
+                "name": hydration.display_name(author),
+                "email": author.email,
             },
             "created_at": comment.created_at.isoformat(),
-            "replies": [format_comment(reply) for reply in replies]
+            "replies": [format_comment(reply) for reply in replies_by_parent.get(comment.id, [])]
         }
     
     return [format_comment(comment) for comment in top_level_comments]
@@ -1419,6 +1554,19 @@ async def create_comment(
     db.add(new_comment)
     # Increment post comment count for all comments (including replies)
     post.comments_count += 1
+    commenter = f"{current_user.first_name} {current_user.last_name}"
+    link = f"/guilds/{post.guild_id}/posts/{post_id}" if post.guild_id else f"/posts/{post_id}"
+    notifications.notify(
+        db, post.author_id, "post.replied", "New Comment", f"{commenter} commented on your post",
+        link=link, actor_id=current_user.id, collapse_key=f"post:{post_id}"
+    )
+    if parent_id and parent_comment.author_id != post.author_id:
+        notifications.notify(
+            db, parent_comment.author_id, "post.replied", "New Reply", f"{commenter} replied to your comment",
+            link=link, actor_id=current_user.id, collapse_key=f"comment:{parent_id}"
+        )
+    activity_log.emit(db, current_user.id, "created", "comment", new_comment, "guild", post.guild_id,
+                      extra={"guild": post.guild.name if post.guild else "", "post_id": post_id})
     db.commit()
     db.refresh(new_comment)
     
@@ -1471,6 +1619,8 @@ async def delete_comment(
     post.comments_count = max(0, post.comments_count - 1 - replies_count)
     
     db.delete(comment)
+    activity_log.emit(db, current_user.id, "deleted", "comment", comment_id, "guild", post.guild_id,
+                      extra={"post_id": post.id, "replies": replies_count})
     db.commit()
     
     return {"message": "Comment deleted successfully"}
@@ -1495,6 +1645,7 @@ async def update_guild(
     
     for field, value in guild_update.dict(exclude_unset=True).items():
         setattr(guild, field, value)
+    activity_log.emit(db, current_user.id, "updated", "guild", guild.id, "guild", guild.id, extra={"name": guild.name})
     
     db.commit()
     db.refresh(guild)
@@ -1527,6 +1678,12 @@ async def join_guild(
     
     db.execute(guild_members.insert().values(user_id=current_user.id, guild_id=guild_id))
     guild.member_count += 1
+    notifications.notify(
+        db, guild.owner_id, "guild.joined", "New Guild Member",
+        f"{current_user.first_name} {current_user.last_name} joined {guild.name}",
+        link=f"/guilds/{guild_id}", actor_id=current_user.id
+    )
+    activity_log.emit(db, current_user.id, "joined", "guild", guild_id, "guild", guild_id, extra={"name": guild.name})
     db.commit()
     
     return {"message": "Successfully joined guild"}
@@ -1578,6 +1735,9 @@ async def create_project(
     )
 
     db.add(new_project)
+    activity_log.emit(db, current_user.id, "created", "project", new_project,
+                      "guild" if new_project.guild_id else None, new_project.guild_id,
+                      extra={"title": new_project.title})
     db.commit()
     db.refresh(new_project)
 
@@ -1658,6 +1818,7 @@ async def create_product(
     )
     
     db.add(new_product)
+    activity_log.emit(db, current_user.id, "created", "product", new_product, extra={"name": new_product.name})
     db.commit()
     db.refresh(new_product)
     return new_product
@@ -1764,6 +1925,7 @@ async def update_product(
         product.stock = stock
     if is_active is not None:
         product.is_active = is_active
+    activity_log.emit(db, current_user.id, "updated", "product", product.id, extra={"name": product.name})
 
     db.commit()
     db.refresh(product)
@@ -1778,18 +1940,9 @@ async def send_message(
     db: Session = Depends(get_db)
 ):
     """
-    Send a message
+    Send a message (same path as /messages/send: conversation, unread count, notification)
     """
-    new_message = Message(
-        content=message_data.content,
-        sender_id=current_user.id,
-        recipient_id=message_data.recipient_id
-    )
-    
-    db.add(new_message)
-    db.commit()
-    db.refresh(new_message)
-    return new_message
+    return chat_routes.deliver_message(db, current_user, message_data)
 
 
 @app.get("/messages", response_model=List[MessageResponse])
@@ -1834,7 +1987,7 @@ async def search_projects_semantic(
     """
     Perform semantic search on projects using Qdrant
     """
-    results = qdrant_service.semantic_search_projects(query, limit, score_threshold)
+    results = await qdrant_service.semantic_search_projects.run_async(query, limit, score_threshold)
 
     # Enrich results with full project data from database
     enriched_results = []
@@ -1872,7 +2025,7 @@ async def search_products_semantic(
     """
     Perform semantic search on products using Qdrant
     """
-    results = qdrant_service.semantic_search_products(query, limit, score_threshold)
+    results = await qdrant_service.semantic_search_products.run_async(query, limit, score_threshold)
 
     # Enrich results with full product data from database
     enriched_results = []
@@ -1909,7 +2062,7 @@ async def search_guilds_semantic(
     """
     Perform semantic search on guilds using Qdrant
     """
-    results = qdrant_service.semantic_search_guilds(query, limit, score_threshold)
+    results = await qdrant_service.semantic_search_guilds.run_async(query, limit, score_threshold)
 
     # Enrich results with full guild data from database
     enriched_results = []
@@ -2046,7 +2199,7 @@ async def get_project_recommendations(
     """
     Get personalized project recommendations for the current user
     """
-    recommendations = ai_recommendations.recommend_projects_for_user(
+    recommendations = await ai_recommendations.recommend_projects_for_user.run_async(
         user=current_user,
         db=db,
         limit=limit
@@ -2068,7 +2221,7 @@ async def get_guild_recommendations(
     """
     Get personalized guild/community recommendations for the current user
     """
-    recommendations = ai_recommendations.recommend_guilds_for_user(
+    recommendations = await ai_recommendations.recommend_guilds_for_user.run_async(
         user=current_user,
         db=db,
         limit=limit
@@ -2090,7 +2243,7 @@ async def get_similar_projects(
     """
     Find projects similar to the given project
     """
-    similar = ai_recommendations.recommend_similar_projects(
+    similar = await ai_recommendations.recommend_similar_projects.run_async(
         project_id=project_id,
         db=db,
         limit=limit
@@ -2116,7 +2269,7 @@ async def get_recommended_products_for_project(
     if not project:
         raise HTTPException(status_code=404, detail="Project not found")
 
-    recommendations = ai_recommendations.recommend_products_for_project(
+    recommendations = await ai_recommendations.recommend_products_for_project.run_async(
         project=project,
         db=db,
         limit=limit
@@ -2138,7 +2291,7 @@ async def get_trending_projects(
     """
     Get trending projects with optional personalization
     """
-    trending = ai_recommendations.get_trending_projects(
+    trending = await ai_recommendations.get_trending_projects.run_async(
         db=db,
         user=current_user,
         limit=limit
@@ -2162,7 +2315,7 @@ class ChatMessage(BaseModel):
 
 
 @app.post("/ai/chat")
-async def chat_with_assistant(
+def chat_with_assistant(
     chat_data: ChatMessage,
     current_user: User = Depends(get_current_user_optional),
     db: Session = Depends(get_db)
@@ -2186,6 +2339,31 @@ async def chat_with_assistant(
     return result
 
 
+@app.post("/ai/chat/stream")
+async def chat_with_assistant_stream(
+    chat_data: ChatMessage,
+    current_user: User = Depends(get_current_user_optional)
+):
+    """
+    Server-Sent Events variant of /ai/chat
+    Streams `meta` (intent, links, suggestions), `token` (text deltas) and a final
+    `done` event carrying the same payload /ai/chat returns. Conversation memory
+    and quota accounting are recorded after the stream closes.
+    """
+    chat_stream = ai_assistant.ChatStream(
+        chat_data.message,
+        current_user.id if current_user else None,
+        conversation_history=chat_data.conversation_history,
+        session_id=chat_data.session_id
+    )
+    return StreamingResponse(
+        chat_stream.stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        background=BackgroundTask(chat_stream.finish_unstarted)
+    )
+
+
 @app.post("/ai/analyze-query")
 async def analyze_user_query(
     chat_data: ChatMessage,
@@ -2228,6 +2406,125 @@ async def get_quick_answer(
         }
 
 
+@app.get("/ai/cache/stats")
+async def get_ai_cache_stats(current_admin = Depends(get_current_admin)):
+    """
+    Response cache hit rate, tokens saved and staleness counters (admin only)
+    """
+    return ai_response_cache.response_cache.get_stats()
+
+
+@app.get("/ai/pipeline/stats")
+async def get_ai_pipeline_stats(current_admin = Depends(get_current_admin)):
+    """
+    Per-stage chat latencies, LLM calls per message, prompt packing, summary folds
+    and project chat negotiation checks (admin only)
+    """
+    return {
+        **ai_assistant.pipeline_stats.snapshot(),
+        "context_packer": context_packer.get_stats(),
+        "summaries": conversation_summary.get_stats(),
+        "usage_ledger": ai_token_manager.usage_ledger.get_stats(),
+        "negotiation": negotiation_detector.get_stats(),
+    }
+
+
+@app.get("/ai/llm/stats")
+async def get_llm_gateway_stats(current_admin = Depends(get_current_admin)):
+    """
+    OpenAI call metrics per call site, circuit breaker states and limits (admin only)
+    """
+    return llm_gateway.get_stats()
+
+
+@app.get("/system/jobs/stats")
+async def get_job_queue_stats(current_admin = Depends(get_current_admin)):
+    """
+    Background job queue depth, dead-lettered jobs and outcomes handled by this worker (admin only)
+    """
+    return job_queue.worker.get_stats()
+
+
+@app.get("/system/retention/stats")
+async def get_retention_stats(
+    current_admin = Depends(get_current_admin),
+    db: Session = Depends(get_db)
+):
+    """
+    Retention policies and archived segments/rows per table (admin only)
+    """
+    return retention.get_stats(db)
+
+
+@app.get("/system/digest/stats")
+async def get_digest_stats(
+    current_admin = Depends(get_current_admin),
+    db: Session = Depends(get_db)
+):
+    """
+    Digest email transport, opted-in users and recent runs (admin only)
+    """
+    return digest.get_stats(db)
+
+
+@app.get("/system/activity/stats")
+async def get_activity_stats(current_admin = Depends(get_current_admin)):
+    """
+    Activity log writer: events buffered, batches flushed and failed flushes (admin only)
+    """
+    return activity_log.writer.get_stats()
+
+
+@app.post("/system/jobs/{job_id}/retry")
+async def retry_dead_job(
+    job_id: int,
+    current_admin = Depends(get_current_admin),
+    db: Session = Depends(get_db)
+):
+    """
+    Requeue a dead-lettered job (admin only)
+    """
+    if not job_queue.retry_dead(db, job_id):
+        raise HTTPException(status_code=404, detail="No dead job with this id")
+    return {"message": "Job requeued", "job_id": job_id}
+
+
+@app.get("/system/coalescing/stats")
+async def get_coalescing_stats(current_admin = Depends(get_current_admin)):
+    """
+    Single-flight counters: calls collapsed into an identical in-flight call, per operation (admin only)
+    """
+    return single_flight.get_stats()
+
+
+@app.get("/debug/traces")
+async def list_request_traces(
+    limit: int = Query(50, ge=1, le=200),
+    current_admin = Depends(get_current_admin)
+):
+    """
+    Recently kept request traces, newest first, plus sampling counters (admin only)
+    """
+    return {"traces": tracing.recent_traces(limit), "stats": tracing.get_stats()}
+
+
+@app.get("/debug/traces/{trace_id}")
+async def get_request_trace(
+    trace_id: str,
+    format: str = Query("json", description="json or text"),
+    current_admin = Depends(get_current_admin)
+):
+    """
+    Span waterfall for one trace; ?format=text renders it for a terminal (admin only)
+    """
+    data = tracing.waterfall(trace_id)
+    if data is None:
+        raise HTTPException(status_code=404, detail="Trace not found (not sampled, or evicted from the buffer)")
+    if format == "text":
+        return PlainTextResponse(tracing.render_waterfall(data))
+    return data
+
+
 @app.post("/ai/track")
 async def track_ai_interaction(
     interaction_data: dict,
@@ -2392,4 +2689,5 @@ async def detect_and_execute_action(
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=True)
+    # Realtime frames are small JSON; per-connection deflate state costs ~90 KB per socket
+    uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=True, ws_per_message_deflate=False)
@@ -14,6 +14,8 @@ from marketplace_semantic_search import (
     detect_category,
     index_product as index_product_vector
 )
+import spell_correction
+from single_flight import coalesce
 import logging
 
 logger = logging.getLogger(__name__)
@@ -65,11 +67,16 @@ async def get_featured_products(
     """
     Get featured products for homepage
     """
+    return await _featured_products.run_async(db, limit)
+
+
+@coalesce("marketplace.featured")
+def _featured_products(db: Session, limit: int) -> List[dict]:
+    # Serialized here: followers get this result, not rows bound to the leader's session
     products = db.query(Product).filter(
         Product.is_active == True
     ).order_by(desc(Product.created_at)).limit(limit).all()
-    
-    return products
+    return [ProductResponse.model_validate(product).model_dump() for product in products]
 
 
 @router.get("/categories")
@@ -109,13 +116,21 @@ async def search_products(
     Search and filter products
     """
     query = db.query(Product).filter(Product.is_active == True)
+    corrected_query = None
     
     if q:
+        # Match the query as typed and its local spelling correction in one pass
+        terms = [q]
+        corrected = spell_correction.corrector.correct_query(q)
+        if corrected.lower() != q.lower():
+            corrected_query = corrected
+            terms.append(corrected)
         query = query.filter(
-            or_(
-                Product.name.ilike(f"%{q}%"),
-                Product.description.ilike(f"%{q}%")
-            )
+            or_(*[
+                condition
+                for term in terms
+                for condition in (Product.name.ilike(f"%{term}%"), Product.description.ilike(f"%{term}%"))
+            ])
         )
     
     if category:
@@ -143,7 +158,8 @@ async def search_products(
     
     return {
         "total": total,
-        "products": products
+        "products": products,
+        "corrected_query": corrected_query
     }
 
 
@@ -230,6 +246,11 @@ async def get_marketplace_stats(db: Session = Depends(get_db)):
     """
     Get marketplace statistics
     """
+    return await _marketplace_stats.run_async(db)
+
+
+@coalesce("marketplace.stats")
+def _marketplace_stats(db: Session) -> dict:
     total_products = db.query(func.count(Product.id)).filter(
         Product.is_active == True
     ).scalar() or 0
@@ -286,7 +307,7 @@ async def semantic_search(request: SemanticSearchRequest):
         logger.info(f"🔍 Semantic search: '{request.query}'")
 
         # Perform semantic search
-        results = semantic_search_marketplace(
+        results = await semantic_search_marketplace.run_async(
             query=request.query,
             category_filter=request.category,
             limit=request.limit,
@@ -464,10 +485,11 @@ async def ai_health_check():
     Returns:
         Status of semantic search services
     """
-    from marketplace_semantic_search import qdrant_client, openai_client
+    from marketplace_semantic_search import qdrant_client
+    import llm_gateway
 
     qdrant_ok = qdrant_client is not None
-    openai_ok = openai_client is not None
+    openai_ok = llm_gateway.is_configured()
     semantic_search_ok = qdrant_ok and openai_ok
 
     return {
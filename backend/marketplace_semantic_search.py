@@ -25,12 +25,14 @@ from qdrant_client.models import (
     PayloadSchemaType,
     OptimizersConfigDiff
 )
-from openai import OpenAI
 import os
 from dotenv import load_dotenv
 import logging
 import json
 
+import llm_gateway
+from single_flight import coalesce
+
 load_dotenv()
 
 # Configure logging
@@ -40,10 +42,6 @@ logger = logging.getLogger(__name__)
 # Initialize clients
 QDRANT_URL = os.getenv("QDRANT_URL", "http://localhost:6333")
 QDRANT_API_KEY = os.getenv("QDRANT_API_KEY")
-OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
-
-# Initialize OpenAI client
-openai_client = OpenAI(api_key=OPENAI_API_KEY) if OPENAI_API_KEY and OPENAI_API_KEY != "your-openai-api-key-here" else None
 
 # Initialize Qdrant client
 qdrant_client = None
@@ -86,6 +84,7 @@ _category_embeddings_cache: Optional[Dict[str, List[float]]] = None
 # EMBEDDING GENERATION
 # ============================================================================
 
+@coalesce("embeddings.marketplace")
 def get_embedding(text: str) -> Optional[List[float]]:
     """
     Generate embedding vector for text using OpenAI.
@@ -96,16 +95,12 @@ def get_embedding(text: str) -> Optional[List[float]]:
     Returns:
         List of floats representing the embedding vector, or None if error
     """
-    if not openai_client:
+    if not llm_gateway.is_configured():
         logger.warning("⚠️ OpenAI client not initialized. Check your OPENAI_API_KEY.")
         return None
 
     try:
-        response = openai_client.embeddings.create(
-            model=EMBEDDING_MODEL,
-            input=text
-        )
-        return response.data[0].embedding
+        return llm_gateway.embed("embeddings.marketplace", text, model=EMBEDDING_MODEL)
     except Exception as e:
         logger.error(f"❌ Error generating embedding: {e}")
         return None
@@ -207,7 +202,7 @@ def index_product(
     Returns:
         bool: True if indexing successful, False otherwise
     """
-    if not qdrant_client or not openai_client:
+    if not qdrant_client or not llm_gateway.is_configured():
         logger.warning("⚠️ Cannot index product: Qdrant or OpenAI not configured")
         return False
 
@@ -270,7 +265,7 @@ def bulk_index_products(products: List[Dict[str, Any]]) -> Tuple[int, int]:
     Returns:
         Tuple of (successful_count, failed_count)
     """
-    if not qdrant_client or not openai_client:
+    if not qdrant_client or not llm_gateway.is_configured():
         logger.warning("⚠️ Cannot bulk index: Qdrant or OpenAI not configured")
         return 0, len(products)
 
@@ -315,7 +310,7 @@ def _initialize_category_embeddings():
     if _category_embeddings_cache is not None:
         return  # Already initialized
 
-    if not openai_client:
+    if not llm_gateway.is_configured():
         logger.warning("⚠️ Cannot initialize category embeddings: OpenAI not configured")
         return
 
@@ -347,7 +342,7 @@ def detect_category(query: str) -> Tuple[str, float]:
         - detected_category: The canonical category name
         - confidence_score: Similarity score (0.0 to 1.0)
     """
-    if not openai_client:
+    if not llm_gateway.is_configured():
         logger.warning("⚠️ Cannot detect category: OpenAI not configured")
         return "uncategorized", 0.0
 
@@ -412,6 +407,7 @@ def _cosine_similarity(vec1: List[float], vec2: List[float]) -> float:
 # SEMANTIC SEARCH
 # ============================================================================
 
+@coalesce("qdrant.search_marketplace")
 def semantic_search_marketplace(
     query: str,
     category_filter: Optional[str] = None,
@@ -444,7 +440,7 @@ def semantic_search_marketplace(
             "total_results": int
         }
     """
-    if not qdrant_client or not openai_client:
+    if not qdrant_client or not llm_gateway.is_configured():
         logger.warning("⚠️ Semantic search not available: Qdrant or OpenAI not configured")
         return {
             "category_detected": None,
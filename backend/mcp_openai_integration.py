@@ -5,21 +5,21 @@ Provides MCP client functionality for OpenAI Assistants
 
 import os
 import json
+import asyncio
 import logging
 from typing import Dict, Any, List, Optional
 from datetime import datetime
 
-from openai import OpenAI
 import httpx
 
 from database import get_db, User
 from mcp_server import tool_registry
 from auth import get_current_user_optional
+import llm_gateway
 
 logger = logging.getLogger(__name__)
 
-# Initialize OpenAI client
-openai_client = OpenAI(api_key=os.getenv("OPENAI_API_KEY")) if os.getenv("OPENAI_API_KEY") else None
+ASSISTANT_POLL_SECONDS = 0.5
 
 class MCPOpenAIClient:
     """MCP Client for OpenAI Assistants integration"""
@@ -94,17 +94,17 @@ class MCPOpenAIClient:
 
     def create_assistant_with_mcp_tools(self, name: str, instructions: str, model: str = "gpt-4o-mini") -> str:
         """Create an OpenAI Assistant with MCP tools"""
-        if not openai_client:
+        if not llm_gateway.is_configured():
             raise ValueError("OpenAI client not configured")
 
         tools = self.get_available_tools()
 
-        assistant = openai_client.beta.assistants.create(
+        assistant = llm_gateway.run("mcp.assistants", lambda client: client.beta.assistants.create(
             name=name,
             instructions=instructions,
             model=model,
             tools=tools
-        )
+        ))
 
         logger.info(f"Created OpenAI Assistant with MCP tools: {assistant.id}")
         return assistant.id
@@ -131,35 +131,38 @@ class MCPOpenAIClient:
 
     async def run_assistant_conversation(self, assistant_id: str, user_message: str, thread_id: Optional[str] = None) -> Dict[str, Any]:
         """Run a conversation with an OpenAI Assistant that has MCP tools"""
-        if not openai_client:
+        if not llm_gateway.is_configured():
             raise ValueError("OpenAI client not configured")
 
         # Create or retrieve thread
         if thread_id:
-            thread = openai_client.beta.threads.retrieve(thread_id)
+            thread = await llm_gateway.arun("mcp.assistants", lambda client: client.beta.threads.retrieve(thread_id))
         else:
-            thread = openai_client.beta.threads.create()
+            thread = await llm_gateway.arun("mcp.assistants", lambda client: client.beta.threads.create())
             thread_id = thread.id
 
         # Add user message to thread
-        openai_client.beta.threads.messages.create(
+        await llm_gateway.arun("mcp.assistants", lambda client: client.beta.threads.messages.create(
             thread_id=thread_id,
             role="user",
             content=user_message
-        )
+        ))
 
         # Run the assistant
-        run = openai_client.beta.threads.runs.create(
+        run = await llm_gateway.arun("mcp.assistants", lambda client: client.beta.threads.runs.create(
             thread_id=thread_id,
             assistant_id=assistant_id
-        )
+        ))
 
         # Wait for completion and handle tool calls
         while run.status in ["queued", "in_progress"]:
-            run = openai_client.beta.threads.runs.retrieve(
+            # Polls share the gateway rate limit; don't spin on it
+            await asyncio.sleep(ASSISTANT_POLL_SECONDS)
+            run_id = run.id
+            run = await llm_gateway.arun("mcp.assistants", lambda client: client.beta.threads.runs.retrieve(
                 thread_id=thread_id,
-                run_id=run.id
-            )
+                run_id=run_id
+            ))
 
             if run.status == "requires_action":
                 # Handle tool calls
@@ -170,14 +173,15 @@ class MCPOpenAIClient:
                         tool_outputs.append(output)
 
                     # Submit tool outputs
-                    openai_client.beta.threads.runs.submit_tool_outputs(
+                    run_id = run.id
+                    await llm_gateway.arun("mcp.assistants", lambda client: client.beta.threads.runs.submit_tool_outputs(
                         thread_id=thread_id,
-                        run_id=run.id,
+                        run_id=run_id,
                         tool_outputs=tool_outputs
-                    )
+                    ))
 
         # Get the final response
-        messages = openai_client.beta.threads.messages.list(thread_id=thread_id)
+        messages = await llm_gateway.arun("mcp.assistants", lambda client: client.beta.threads.messages.list(thread_id=thread_id))
         assistant_message = None
 
         for message in messages.data:
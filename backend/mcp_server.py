@@ -7,6 +7,7 @@ Model Context Protocol router for AI assistants to interact with the Avalanche p
 from fastapi import Depends, HTTPException, status, Request, Response
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from sqlalchemy.orm import Session
+from sqlalchemy import or_
 from pydantic import BaseModel, Field, ValidationError, validator
 from typing import List, Dict, Any, Optional, Union
 import json
@@ -30,6 +31,7 @@ from schemas import (
     UserResponse, GuildResponse, ProjectResponse, ProductResponse,
     GuildCreate, ProjectCreate, ProductCreate
 )
+import spell_correction
 
 # Configure logging
 logger = logging.getLogger(__name__)
@@ -496,11 +498,17 @@ def search_products_handler(params: Dict[str, Any], user: Optional[User], db: Se
     """Search products with filters"""
     query = db.query(Product).filter(Product.is_active == True)
 
+    corrected_search = None
     if params.get("search"):
-        search_term = f"%{params['search']}%"
-        query = query.filter(
-            (Product.name.ilike(search_term)) | (Product.description.ilike(search_term))
-        )
+        terms = [params["search"]]
+        corrected = spell_correction.corrector.correct_query(params["search"])
+        if corrected.lower() != params["search"].lower():
+            corrected_search = corrected
+            terms.append(corrected)
+        query = query.filter(or_(*[
+            (Product.name.ilike(f"%{term}%")) | (Product.description.ilike(f"%{term}%"))
+            for term in terms
+        ]))
 
     if params.get("category"):
         query = query.filter(Product.category.ilike(params["category"]))
@@ -526,7 +534,8 @@ def search_products_handler(params: Dict[str, Any], user: Optional[User], db: Se
                 "image_url": p.image_url
             } for p in products
         ],
-        "count": len(products)
+        "count": len(products),
+        "corrected_search": corrected_search
     }
 
 def get_product_details_handler(params: Dict[str, Any], user: Optional[User], db: Session) -> Dict[str, Any]:
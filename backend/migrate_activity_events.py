@@ -0,0 +1,100 @@
+"""
+Migration script to add the activity_events table and backfill it from
+existing signups, guilds, memberships, posts, comments, orders, products
+and projects
+
+The backfill only runs while the table is empty (before the first deploy
+that writes events), so it is safe to re-run. Each source is read as one
+stream ordered by created_at and the streams are merged, so event ids
+follow time like live events do and memory stays flat; rows are inserted
+in batches of BATCH_SIZE.
+"""
+
+import heapq
+import json
+from datetime import datetime
+
+from sqlalchemy import text
+
+from database import engine, ActivityEvent
+
+BATCH_SIZE = 5000
+
+# (query, row -> event): every query yields created_at first, ordered by it
+SOURCES = [
+    ("SELECT created_at, id FROM users WHERE created_at IS NOT NULL ORDER BY created_at",
+     lambda r: (r.id, "signed_up", "user", r.id, None, None, None)),
+    ("SELECT created_at, id, owner_id, name FROM guilds WHERE created_at IS NOT NULL ORDER BY created_at",
+     lambda r: (r.owner_id, "created", "guild", r.id, "guild", r.id, {"name": r.name})),
+    ("""SELECT gm.joined_at AS created_at, gm.user_id, gm.guild_id, g.name FROM guild_members gm
+        JOIN guilds g ON g.id = gm.guild_id
+        WHERE gm.joined_at IS NOT NULL AND gm.user_id <> g.owner_id ORDER BY gm.joined_at""",
+     lambda r: (r.user_id, "joined", "guild", r.guild_id, "guild", r.guild_id, {"name": r.name})),
+    ("""SELECT p.created_at, p.id, p.author_id, p.guild_id, g.name FROM posts p
+        JOIN guilds g ON g.id = p.guild_id WHERE p.created_at IS NOT NULL ORDER BY p.created_at""",
+     lambda r: (r.author_id, "created", "post", r.id, "guild", r.guild_id, {"guild": r.name})),
+    ("""SELECT c.created_at, c.id, c.author_id, c.post_id, p.guild_id, g.name FROM comments c
+        JOIN posts p ON p.id = c.post_id JOIN guilds g ON g.id = p.guild_id
+        WHERE c.created_at IS NOT NULL ORDER BY c.created_at""",
+     lambda r: (r.author_id, "created", "comment", r.id, "guild", r.guild_id,
+                {"guild": r.name, "post_id": r.post_id})),
+    ("""SELECT created_at, id, buyer_id, order_number, total_amount FROM orders
+        WHERE created_at IS NOT NULL ORDER BY created_at""",
+     lambda r: (r.buyer_id, "created", "order", r.id, None, None,
+                {"order_number": r.order_number, "amount": float(r.total_amount or 0)})),
+    ("SELECT created_at, id, seller_id, name FROM products WHERE created_at IS NOT NULL ORDER BY created_at",
+     lambda r: (r.seller_id, "created", "product", r.id, None, None, {"name": r.name})),
+    ("""SELECT created_at, id, owner_id, guild_id, title FROM projects
+        WHERE created_at IS NOT NULL ORDER BY created_at""",
+     lambda r: (r.owner_id, "created", "project", r.id, "guild" if r.guild_id else None, r.guild_id,
+                {"title": r.title})),
+]
+
+
+def stream(conn, sql, to_event):
+    for row in conn.execution_options(stream_results=True, yield_per=BATCH_SIZE).execute(text(sql)):
+        actor_id, verb, object_type, object_id, target_type, target_id, extra = to_event(row)
+        created_at = row.created_at
+        if isinstance(created_at, str):  # SQLite hands raw text back
+            created_at = datetime.fromisoformat(created_at)
+        yield created_at, {
+            "actor_id": actor_id,
+            "verb": verb,
+            "object_type": object_type,
+            "object_id": object_id,
+            "target_type": target_type,
+            "target_id": target_id,
+            "extra_data": json.dumps(extra) if extra else None,
+            "created_at": created_at,
+        }
+
+
+def backfill(conn) -> int:
+    events = heapq.merge(*(stream(conn, sql, to_event) for sql, to_event in SOURCES), key=lambda item: item[0])
+    written, batch = 0, []
+    for _, event in events:
+        batch.append(event)
+        if len(batch) == BATCH_SIZE:
+            conn.execute(ActivityEvent.__table__.insert(), batch)
+            written += len(batch)
+            batch = []
+    if batch:
+        conn.execute(ActivityEvent.__table__.insert(), batch)
+        written += len(batch)
+    return written
+
+
+def migrate():
+    ActivityEvent.__table__.create(bind=engine, checkfirst=True)
+    print("✓ activity_events table ready")
+
+    with engine.begin() as conn:
+        if conn.execute(text("SELECT 1 FROM activity_events LIMIT 1")).first():
+            print("✓ activity_events already has events, skipping backfill")
+        else:
+            print(f"✓ Backfilled {backfill(conn)} events")
+    print("✅ Activity events migration complete")
+
+
+if __name__ == "__main__":
+    migrate()
@@ -0,0 +1,28 @@
+"""
+Migration script to add ai_conversations.usage_flushed
+(marks conversation rows whose tokens have been charged to users.ai_tokens_used)
+"""
+
+from sqlalchemy import inspect, text
+
+from database import engine
+
+
+def migrate():
+    columns = {column["name"] for column in inspect(engine).get_columns("ai_conversations")}
+    with engine.connect() as conn:
+        if "usage_flushed" in columns:
+            print("✓ usage_flushed column already exists")
+        else:
+            # Existing rows were charged synchronously by the old accounting
+            conn.execute(text("ALTER TABLE ai_conversations ADD COLUMN usage_flushed BOOLEAN DEFAULT TRUE"))
+            print("✓ Added usage_flushed column")
+        conn.execute(text(
+            "CREATE INDEX IF NOT EXISTS ix_ai_conversations_usage_flushed ON ai_conversations (usage_flushed)"
+        ))
+        conn.commit()
+    print("✅ AI usage ledger migration complete")
+
+
+if __name__ == "__main__":
+    migrate()
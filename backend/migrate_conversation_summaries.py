@@ -0,0 +1,16 @@
+"""
+Migration script to add the ai_conversation_summaries table
+(rolling per-session summaries with a watermark into ai_conversations)
+"""
+
+from database import engine, AIConversationSummary
+
+
+def migrate():
+    # create_all with checkfirst works for both SQLite and PostgreSQL
+    AIConversationSummary.__table__.create(bind=engine, checkfirst=True)
+    print("✅ ai_conversation_summaries table ready")
+
+
+if __name__ == "__main__":
+    migrate()
@@ -0,0 +1,144 @@
+"""
+Migration script to add the conversations table and messages.conversation_id,
+and backfill both from existing direct messages
+
+Run it before deploying the code that reads conversations. It is set-based
+(a handful of INSERT ... SELECT / UPDATE statements) and safe to re-run:
+only pairs without a conversation and messages without a conversation_id
+are touched, and read cursors are derived from messages.is_read only for
+conversations created by this run.
+
+On SQLite it also rebuilds messages with AUTOINCREMENT (once): read cursors
+and inbox pages compare message ids, and without it SQLite hands a deleted
+max id to the next message, which would land under a cursor and never count
+as unread.
+"""
+
+from sqlalchemy import inspect, text
+from sqlalchemy.schema import CreateTable
+
+from database import engine, Conversation, Message
+
+
+def low(table: str) -> str:
+    return f"CASE WHEN {table}.sender_id < {table}.recipient_id THEN {table}.sender_id ELSE {table}.recipient_id END"
+
+
+def high(table: str) -> str:
+    return f"CASE WHEN {table}.sender_id < {table}.recipient_id THEN {table}.recipient_id ELSE {table}.sender_id END"
+
+
+def migrate():
+    Conversation.__table__.create(bind=engine, checkfirst=True)
+    print("✓ conversations table ready")
+
+    columns = {column["name"] for column in inspect(engine).get_columns("messages")}
+    with engine.connect() as conn:
+        if "conversation_id" in columns:
+            print("✓ conversation_id column already exists")
+        else:
+            conn.execute(text("ALTER TABLE messages ADD COLUMN conversation_id INTEGER REFERENCES conversations(id)"))
+            print("✓ Added conversation_id column")
+        conn.execute(text(
+            "CREATE INDEX IF NOT EXISTS ix_messages_conversation_id ON messages (conversation_id, id)"
+        ))
+
+        existing = conn.execute(text("SELECT COALESCE(MAX(id), 0) FROM conversations")).scalar()
+
+        # One conversation per pair that has messages (Ava, sender 0, isn't a participant)
+        created = conn.execute(text(f"""
+            INSERT INTO conversations (user_low_id, user_high_id, last_message_id, last_activity_at,
+                                       low_unread_count, high_unread_count, low_last_read_id, high_last_read_id,
+                                       created_at)
+            SELECT {low("m")}, {high("m")}, MAX(m.id), MAX(m.created_at), 0, 0, 0, 0, MIN(m.created_at)
+            FROM messages m
+            WHERE m.sender_id <> 0 AND m.sender_id <> m.recipient_id
+              AND NOT EXISTS (
+                  SELECT 1 FROM conversations c WHERE c.user_low_id = {low("m")} AND c.user_high_id = {high("m")}
+              )
+            GROUP BY {low("m")}, {high("m")}
+        """)).rowcount
+        print(f"✓ Created {created} conversations")
+
+        attached = conn.execute(text(f"""
+            UPDATE messages SET conversation_id = (
+                SELECT c.id FROM conversations c
+                WHERE c.user_low_id = {low("messages")} AND c.user_high_id = {high("messages")}
+            )
+            WHERE conversation_id IS NULL AND sender_id <> 0 AND sender_id <> recipient_id
+        """)).rowcount
+        # Ava's replies belong to the conversation of the user's message just before them
+        attached += conn.execute(text("""
+            UPDATE messages SET conversation_id = (
+                SELECT asked.conversation_id FROM messages asked
+                WHERE asked.sender_id = messages.recipient_id AND asked.id < messages.id
+                  AND asked.conversation_id IS NOT NULL
+                ORDER BY asked.id DESC LIMIT 1
+            )
+            WHERE conversation_id IS NULL AND sender_id = 0
+        """)).rowcount
+        print(f"✓ Attached {attached} messages to conversations")
+
+        # Cursor: the newest message the participant has read (opening a conversation
+        # used to mark everything read); unread: their received messages after it
+        for side, other in (("low", "high"), ("high", "low")):
+            conn.execute(text(f"""
+                UPDATE conversations SET {side}_last_read_id = COALESCE((
+                    SELECT MAX(m.id) FROM messages m
+                    WHERE m.conversation_id = conversations.id AND m.sender_id = conversations.user_{other}_id
+                      AND m.is_read = :read
+                ), 0)
+                WHERE id > :existing
+            """), {"read": True, "existing": existing})
+            conn.execute(text(f"""
+                UPDATE conversations SET {side}_unread_count = (
+                    SELECT COUNT(*) FROM messages m
+                    WHERE m.conversation_id = conversations.id AND m.sender_id = conversations.user_{other}_id
+                      AND m.id > conversations.{side}_last_read_id
+                )
+                WHERE id > :existing
+            """), {"existing": existing})
+        conn.commit()
+
+    if engine.dialect.name == "sqlite":
+        rebuild_messages_with_autoincrement()
+    print("✅ Conversations migration complete")
+
+
+def rebuild_messages_with_autoincrement():
+    """Recreate the SQLite messages table from the model (AUTOINCREMENT), keeping rows, ids and indexes"""
+    with engine.begin() as conn:
+        table_sql = conn.execute(text(
+            "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'messages'"
+        )).scalar()
+        if "AUTOINCREMENT" in table_sql.upper():
+            print("✓ messages already uses AUTOINCREMENT")
+            return
+
+        # Indexes added by other migrations are recreated after the swap
+        extra_indexes = conn.execute(text(
+            "SELECT name, sql FROM sqlite_master WHERE type = 'index' AND tbl_name = 'messages' AND sql IS NOT NULL"
+        )).all()
+        old_columns = {row[1] for row in conn.execute(text("PRAGMA table_info(messages)"))}
+        columns = ", ".join(column.name for column in Message.__table__.columns if column.name in old_columns)
+
+        create = str(CreateTable(Message.__table__).compile(dialect=conn.dialect)).strip()
+        conn.execute(text(create.replace("CREATE TABLE messages", "CREATE TABLE messages_rebuild", 1)))
+        copied = conn.execute(text(
+            f"INSERT INTO messages_rebuild ({columns}) SELECT {columns} FROM messages"
+        )).rowcount
+        conn.execute(text("DROP TABLE messages"))
+        conn.execute(text("ALTER TABLE messages_rebuild RENAME TO messages"))
+        for index in Message.__table__.indexes:
+            index.create(conn, checkfirst=True)
+        existing = {row[0] for row in conn.execute(text(
+            "SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = 'messages'"
+        ))}
+        for name, sql in extra_indexes:
+            if name not in existing:
+                conn.execute(text(sql))
+    print(f"✓ Rebuilt messages with AUTOINCREMENT ({copied} rows)")
+
+
+if __name__ == "__main__":
+    migrate()
@@ -0,0 +1,26 @@
+"""
+Migration script to add the digest_runs table and the indexes digest
+batches aggregate on (guild memberships by user, guild posts by time,
+orders by buyer/seller and time)
+"""
+
+from sqlalchemy import text
+
+from database import engine, DigestRun
+
+
+def migrate():
+    DigestRun.__table__.create(bind=engine, checkfirst=True)
+    print("✓ digest_runs table ready")
+    with engine.connect() as conn:
+        conn.execute(text("CREATE INDEX IF NOT EXISTS ix_guild_members_user_id ON guild_members (user_id, guild_id)"))
+        conn.execute(text("CREATE INDEX IF NOT EXISTS ix_posts_guild_created ON posts (guild_id, created_at)"))
+        conn.execute(text("CREATE INDEX IF NOT EXISTS ix_orders_buyer_updated ON orders (buyer_id, updated_at)"))
+        conn.execute(text("CREATE INDEX IF NOT EXISTS ix_orders_seller_updated ON orders (seller_id, updated_at)"))
+        conn.commit()
+    print("✓ digest indexes ready")
+    print("✅ Digest migration complete")
+
+
+if __name__ == "__main__":
+    migrate()
@@ -0,0 +1,15 @@
+"""
+Migration script to add the jobs table (background job queue)
+"""
+
+from database import engine, Job
+
+
+def migrate():
+    Job.__table__.create(bind=engine, checkfirst=True)
+    print("✓ jobs table ready")
+    print("✅ Job queue migration complete")
+
+
+if __name__ == "__main__":
+    migrate()
@@ -0,0 +1,24 @@
+"""
+Migration script to add composite indexes on messages
+(sender/recipient pairs in both directions, for the inbox aggregate query)
+"""
+
+from sqlalchemy import text
+
+from database import engine
+
+
+def migrate():
+    with engine.connect() as conn:
+        conn.execute(text(
+            "CREATE INDEX IF NOT EXISTS ix_messages_sender_recipient_id ON messages (sender_id, recipient_id, id)"
+        ))
+        conn.execute(text(
+            "CREATE INDEX IF NOT EXISTS ix_messages_recipient_sender_id ON messages (recipient_id, sender_id, id)"
+        ))
+        conn.commit()
+    print("✅ Message indexes ready")
+
+
+if __name__ == "__main__":
+    migrate()
@@ -0,0 +1,17 @@
+"""
+Migration script to add the notifications and notification_preferences tables
+"""
+
+from database import engine, Notification, NotificationPreference
+
+
+def migrate():
+    Notification.__table__.create(bind=engine, checkfirst=True)
+    print("✓ notifications table ready")
+    NotificationPreference.__table__.create(bind=engine, checkfirst=True)
+    print("✓ notification_preferences table ready")
+    print("✅ Notifications migration complete")
+
+
+if __name__ == "__main__":
+    migrate()
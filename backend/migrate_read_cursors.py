@@ -0,0 +1,73 @@
+"""
+Migration script to add read_cursors and the (chat, id) indexes on guild and
+project chat messages, and move direct messages off messages.is_read
+
+Direct message cursors live on the conversations row, so that part is the
+conversations migration. Guild and project chats had no read state at all;
+their members start with a cursor at the newest existing message so nothing
+old shows up as unread. Safe to re-run: only missing cursors are inserted.
+"""
+
+from sqlalchemy import text
+
+from database import engine, ReadCursor
+import migrate_conversations
+
+
+def migrate():
+    ReadCursor.__table__.create(bind=engine, checkfirst=True)
+    print("✓ read_cursors table ready")
+
+    migrate_conversations.migrate()
+
+    with engine.connect() as conn:
+        conn.execute(text(
+            "CREATE INDEX IF NOT EXISTS ix_guild_chat_messages_chat_id ON guild_chat_messages (guild_chat_id, id)"
+        ))
+        conn.execute(text(
+            "CREATE INDEX IF NOT EXISTS ix_project_chat_messages_chat_id ON project_chat_messages (chat_id, id)"
+        ))
+        print("✓ Chat message indexes ready")
+
+        guild = conn.execute(text("""
+            INSERT INTO read_cursors (user_id, channel, last_read_message_id, updated_at)
+            SELECT members.user_id, 'guild_chat:' || CAST(gc.guild_id AS VARCHAR),
+                   (SELECT COALESCE(MAX(m.id), 0) FROM guild_chat_messages m WHERE m.guild_chat_id = gc.id),
+                   CURRENT_TIMESTAMP
+            FROM guild_chats gc
+            JOIN (
+                SELECT user_id, guild_id FROM guild_members
+                UNION
+                SELECT owner_id, id FROM guilds WHERE owner_id IS NOT NULL
+            ) members ON members.guild_id = gc.guild_id
+            WHERE NOT EXISTS (
+                SELECT 1 FROM read_cursors rc
+                WHERE rc.user_id = members.user_id AND rc.channel = 'guild_chat:' || CAST(gc.guild_id AS VARCHAR)
+            )
+        """)).rowcount
+        print(f"✓ Created {guild} guild chat cursors")
+
+        project = conn.execute(text("""
+            INSERT INTO read_cursors (user_id, channel, last_read_message_id, updated_at)
+            SELECT members.user_id, 'project_chat:' || CAST(members.chat_id AS VARCHAR),
+                   (SELECT COALESCE(MAX(m.id), 0) FROM project_chat_messages m WHERE m.chat_id = members.chat_id),
+                   CURRENT_TIMESTAMP
+            FROM (
+                SELECT pc.freelancer_id AS user_id, pc.id AS chat_id FROM project_chats pc
+                UNION
+                SELECT COALESCE(p.creator_id, p.owner_id), pc.id
+                FROM project_chats pc JOIN projects p ON p.id = pc.project_id
+                WHERE COALESCE(p.creator_id, p.owner_id) IS NOT NULL
+            ) members
+            WHERE NOT EXISTS (
+                SELECT 1 FROM read_cursors rc
+                WHERE rc.user_id = members.user_id AND rc.channel = 'project_chat:' || CAST(members.chat_id AS VARCHAR)
+            )
+        """)).rowcount
+        print(f"✓ Created {project} project chat cursors")
+        conn.commit()
+    print("✅ Read cursors migration complete")
+
+
+if __name__ == "__main__":
+    migrate()
@@ -0,0 +1,26 @@
+"""
+Migration script to add the archive segment tables used by retention and the
+conversations.last_message_id index it relies on
+"""
+
+from sqlalchemy import text
+
+from database import engine, ArchiveSegment, ArchiveSegmentScope
+
+
+def migrate():
+    ArchiveSegment.__table__.create(bind=engine, checkfirst=True)
+    ArchiveSegmentScope.__table__.create(bind=engine, checkfirst=True)
+    print("✓ archive_segments and archive_segment_scopes tables ready")
+
+    with engine.connect() as conn:
+        conn.execute(text(
+            "CREATE INDEX IF NOT EXISTS ix_conversations_last_message_id ON conversations (last_message_id)"
+        ))
+        conn.commit()
+    print("✓ conversations.last_message_id index ready")
+    print("✅ Retention migration complete")
+
+
+if __name__ == "__main__":
+    migrate()
@@ -0,0 +1,422 @@
+"""
+Negotiation Detector
+Rule-based tracking of project chat negotiations, confirmed by the LLM only when needed
+
+Every message posted to a project chat goes through observe_message(), which
+is pure string work plus (for a chat this worker hasn't seen yet) one query
+to replay recent messages:
+
+- prices ("₦150,000", "150k", "NGN 1.2m", "budget of 80000") and deadlines
+  ("in 2 weeks", "within 10 days", "by Friday") are extracted from the text
+- agreement ("deal", "sounds good", "let's proceed"), rejection ("too high",
+  "I don't agree") and counter-offer phrases classify the message
+- a per-chat state machine follows offer -> counter-offer -> agreement, and
+  only an agreement that accepts the other party's standing offer (or terms
+  with no open counter-offer) is a likely conclusion
+
+Likely conclusions are confirmed by ai_assistant.detect_negotiation_end in a
+background thread, at most once per NEGOTIATION_LLM_DEBOUNCE_SECONDS per chat.
+When the model agrees, Ava posts the escrow prompt into the chat and the
+realtime hub pushes it to participants. State is per worker process; a worker
+that restarts rebuilds a chat's state from its recent messages.
+"""
+
+from typing import Any, Callable, Dict, List, Optional
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, asdict
+import os
+import re
+import threading
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+AVA_SENDER_ID = 0
+
+# At most one LLM confirmation per chat in this window
+NEGOTIATION_LLM_DEBOUNCE_SECONDS = float(os.getenv("NEGOTIATION_LLM_DEBOUNCE_SECONDS", "120"))
+# Messages replayed to rebuild a chat's state the first time a worker sees it
+NEGOTIATION_REPLAY_MESSAGES = 30
+# Messages the LLM sees when confirming
+CONFIRM_CONTEXT_MESSAGES = 10
+# Chats whose state is kept in memory (least recently active evicted first)
+MAX_TRACKED_CHATS = 5000
+
+_SCALES = {"k": 1_000, "m": 1_000_000}
+_NUMBER = r"(\d{1,3}(?:,\d{3})+|\d+)(?:\.(\d+))?"
+_CURRENCY_PREFIX = re.compile(rf"(?:₦|\bngn\s?|\bn(?=\d)|\$|\busd\s?)\s?{_NUMBER}\s?([km])?\b", re.IGNORECASE)
+_SCALED = re.compile(rf"\b{_NUMBER}\s?([km])\b(?!\s*(?:days?|weeks?|months?|hours?))", re.IGNORECASE)
+_CURRENCY_SUFFIX = re.compile(rf"\b{_NUMBER}\s?(naira|ngn|dollars?|usd)\b", re.IGNORECASE)
+_PRICE_CONTEXT = re.compile(r"\b(price|budget|pay|paying|rate|offer|cost|charge|fee|quote|for|at|amount|total)\b", re.IGNORECASE)
+_BARE_AMOUNT = re.compile(rf"\b{_NUMBER}\b")
+
+_WORD_NUMBERS = {
+    "a": 1, "an": 1, "one": 1, "two": 2, "three": 3, "four": 4, "five": 5, "six": 6,
+    "seven": 7, "eight": 8, "nine": 9, "ten": 10, "eleven": 11, "twelve": 12,
+}
+_UNIT_DAYS = {"day": 1, "week": 7, "month": 30}
+_DURATION = re.compile(
+    r"\b(?:in|within|takes?|need|deliver(?:ed)?\s+in|timeline\s+of|deadline\s+(?:of|is|in)?)\s*"
+    r"(\d+|a|an|one|two|three|four|five|six|seven|eight|nine|ten|eleven|twelve)\s*(day|week|month)s?\b",
+    re.IGNORECASE,
+)
+_BARE_DURATION = re.compile(r"\b(\d+)\s*(day|week|month)s?\b", re.IGNORECASE)
+_WEEKDAYS = ("monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday")
+_BY_DAY = re.compile(r"\bby\s+(tomorrow|next week|end of (?:the )?(?:week|month)|" + "|".join(_WEEKDAYS) + r")\b",
+                     re.IGNORECASE)
+
+_AGREEMENT = re.compile(
+    r"\b(agreed|i agree|we agree|(?:it'?s a |we have a |great |ok(?:ay)? |then )?deal\b(?! with)|deal closed|"
+    r"sounds (?:good|great|fair)|works for me|that works|fine by me|i accept|accepted|"
+    r"let'?s (?:proceed|do it|go ahead|get started|start|begin)|ready to (?:start|proceed|begin)|"
+    r"terms (?:are |look )?(?:good|fine|agreed|finalized|finalised)|negotiation (?:is )?complete)",
+    re.IGNORECASE,
+)
+_NEGATED = re.compile(
+    r"\b(not|don'?t|do not|can'?t|cannot|won'?t|isn'?t|no|never)\s+(?:\w+\s+)?"
+    r"(agree|agreed|accept|deal|works?|proceed|good|ready|fine)\b",
+    re.IGNORECASE,
+)
+_REJECTION = re.compile(
+    r"\b(too (?:high|low|much|expensive|cheap|short|tight)|can you (?:lower|reduce|do|go)|lower|reduce|"
+    r"counter|how about|what about|would you (?:do|take|accept)|instead|more time|negotiable|"
+    r"not (?:enough|possible)|best (?:price|offer))\b",
+    re.IGNORECASE,
+)
+
+
+def _to_amount(whole: str, decimals: Optional[str], scale: Optional[str]) -> float:
+    value = float(whole.replace(",", "") + (f".{decimals}" if decimals else ""))
+    return value * _SCALES.get((scale or "").lower(), 1)
+
+
+def extract_amount(text: str) -> Optional[float]:
+    """The price a message proposes or restates, if any"""
+    for pattern in (_CURRENCY_PREFIX, _CURRENCY_SUFFIX):
+        match = pattern.search(text)
+        if match:
+            scale = match.group(3) if pattern is _CURRENCY_PREFIX else None
+            return _to_amount(match.group(1), match.group(2), scale)
+    match = _SCALED.search(text)
+    if match:
+        return _to_amount(match.group(1), match.group(2), match.group(3))
+    if _PRICE_CONTEXT.search(text):
+        # Bare numbers only count next to pricing words, and only when they
+        # can't be a quantity, a day of the month or a year
+        for match in _BARE_AMOUNT.finditer(text):
+            value = _to_amount(match.group(1), match.group(2), None)
+            if value >= 1000 and not 1900 <= value <= 2100:
+                return value
+    return None
+
+
+def extract_deadline_days(text: str) -> Optional[int]:
+    """A proposed deadline as days from now, if any"""
+    match = _DURATION.search(text) or _BARE_DURATION.search(text)
+    if match:
+        count = match.group(1).lower()
+        count = int(count) if count.isdigit() else _WORD_NUMBERS[count]
+        return count * _UNIT_DAYS[match.group(2).lower()]
+    match = _BY_DAY.search(text)
+    if match:
+        when = match.group(1).lower()
+        if when == "tomorrow":
+            return 1
+        if when == "next week" or "week" in when:
+            return 7
+        if "month" in when:
+            return 30
+        return (_WEEKDAYS.index(when) - time.localtime().tm_wday) % 7 or 7
+    return None
+
+
+@dataclass
+class MessageSignal:
+    kind: str  # agreement, rejection, offer, chat
+    amount: Optional[float] = None
+    deadline_days: Optional[int] = None
+
+
+def classify(text: str) -> MessageSignal:
+    amount = extract_amount(text)
+    deadline_days = extract_deadline_days(text)
+    if _NEGATED.search(text) or _REJECTION.search(text):
+        kind = "rejection" if amount is None and deadline_days is None else "offer"
+    elif _AGREEMENT.search(text) and not text.rstrip().endswith("?"):
+        kind = "agreement"
+    elif amount is not None or deadline_days is not None:
+        kind = "offer"
+    else:
+        kind = "chat"
+    return MessageSignal(kind, amount, deadline_days)
+
+
+@dataclass
+class Offer:
+    sender_id: int
+    amount: Optional[float] = None
+    deadline_days: Optional[int] = None
+
+
+@dataclass
+class NegotiationState:
+    """offer -> countered -> agreed -> confirmed, or back to open/countered"""
+    phase: str = "open"
+    offer: Optional[Offer] = None
+    agreed: Optional[Offer] = None
+    offers: int = 0
+    last_message_id: int = 0
+    last_check: Optional[float] = None
+    checks: int = 0
+
+    def apply(self, sender_id: int, signal: MessageSignal) -> bool:
+        """Advance the state machine; True when this message makes agreement likely"""
+        if signal.kind == "offer":
+            terms = Offer(
+                sender_id,
+                signal.amount if signal.amount is not None else (self.offer.amount if self.offer else None),
+                signal.deadline_days if signal.deadline_days is not None else (self.offer.deadline_days if self.offer else None),
+            )
+            countered = self.offer is not None and self.offer.sender_id != sender_id
+            if self.phase == "confirmed" and self.agreed and (terms.amount, terms.deadline_days) == (
+                    self.agreed.amount, self.agreed.deadline_days):
+                return False  # restating confirmed terms
+            self.offer = terms
+            self.offers += 1
+            self.phase = "countered" if countered or self.phase in ("agreed", "confirmed") else "offer"
+            return False
+
+        if signal.kind == "rejection":
+            if self.phase != "confirmed":
+                self.phase = "countered" if self.offer else "open"
+            return False
+
+        if signal.kind != "agreement" or self.phase in ("agreed", "confirmed"):
+            return False
+
+        restated = signal.amount is not None or signal.deadline_days is not None
+        if self.offer is not None and self.offer.sender_id == sender_id and not restated:
+            # "Deal." right after your own offer is still your offer
+            return False
+        self.agreed = Offer(
+            sender_id,
+            signal.amount if signal.amount is not None else (self.offer.amount if self.offer else None),
+            signal.deadline_days if signal.deadline_days is not None else (self.offer.deadline_days if self.offer else None),
+        )
+        self.phase = "agreed"
+        return True
+
+
+@dataclass
+class DetectorStats:
+    messages: int = 0
+    likely_conclusions: int = 0
+    replays: int = 0
+    confirmations_scheduled: int = 0
+    debounced: int = 0
+    confirmed: int = 0
+    not_confirmed: int = 0
+    failures: int = 0
+
+
+class NegotiationDetector:
+    """Per-chat negotiation states with debounced LLM confirmation"""
+
+    def __init__(self, debounce_seconds: float = NEGOTIATION_LLM_DEBOUNCE_SECONDS,
+                 max_chats: int = MAX_TRACKED_CHATS, clock: Callable[[], float] = time.monotonic):
+        self.debounce_seconds = debounce_seconds
+        self.max_chats = max_chats
+        self.clock = clock
+        self.stats = DetectorStats()
+        self._lock = threading.Lock()
+        self._states: "OrderedDict[int, NegotiationState]" = OrderedDict()
+        self._in_flight = set()
+
+    def has_state(self, chat_id: int) -> bool:
+        with self._lock:
+            return chat_id in self._states
+
+    def state(self, chat_id: int) -> NegotiationState:
+        with self._lock:
+            state = self._states.get(chat_id)
+            if state is None:
+                state = self._states[chat_id] = NegotiationState()
+                while len(self._states) > self.max_chats:
+                    self._states.popitem(last=False)
+            else:
+                self._states.move_to_end(chat_id)
+            return state
+
+    def observe(self, chat_id: int, sender_id: int, text: str, message_id: int = 0) -> bool:
+        """Feed one message; True when it makes a concluded negotiation likely"""
+        if sender_id == AVA_SENDER_ID:
+            return False
+        state = self.state(chat_id)
+        with self._lock:
+            if message_id and message_id <= state.last_message_id:
+                return False
+            state.last_message_id = max(state.last_message_id, message_id)
+            self.stats.messages += 1
+            likely = state.apply(sender_id, classify(text))
+            if likely:
+                self.stats.likely_conclusions += 1
+            return likely
+
+    def replay(self, chat_id: int, messages: List[Any]):
+        """Rebuild a chat's state from its earlier messages (oldest first)"""
+        with self._lock:
+            self.stats.replays += 1
+        for message in messages:
+            self.observe(chat_id, message.sender_id, message.content, message.id)
+        with self._lock:
+            state = self._states.get(chat_id)
+            if state and state.phase == "agreed":
+                # An agreement from before this worker saw the chat was handled already
+                state.phase = "confirmed"
+
+    def claim_check(self, chat_id: int) -> bool:
+        """Reserve the chat's LLM confirmation unless one ran recently or is running"""
+        now = self.clock()
+        state = self.state(chat_id)
+        with self._lock:
+            if chat_id in self._in_flight or (
+                    state.last_check is not None and now - state.last_check < self.debounce_seconds):
+                self.stats.debounced += 1
+                return False
+            self._in_flight.add(chat_id)
+            state.last_check = now
+            state.checks += 1
+            self.stats.confirmations_scheduled += 1
+            return True
+
+    def finish_check(self, chat_id: int, confirmed: Optional[bool]):
+        """Record the LLM verdict (None when the check failed)"""
+        state = self.state(chat_id)
+        with self._lock:
+            self._in_flight.discard(chat_id)
+            if confirmed is None:
+                self.stats.failures += 1
+            elif confirmed:
+                self.stats.confirmed += 1
+                state.phase = "confirmed"
+            else:
+                self.stats.not_confirmed += 1
+                if state.phase == "agreed":
+                    # Let a later agreement try again once the debounce window passes
+                    state.phase = "countered" if state.offer else "open"
+
+    def mark_confirmed(self, chat_id: int):
+        """An escrow prompt was sent another way (e.g. an @Ava request)"""
+        state = self.state(chat_id)
+        with self._lock:
+            state.phase = "confirmed"
+            state.agreed = state.agreed or state.offer
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            phases: Dict[str, int] = {}
+            for state in self._states.values():
+                phases[state.phase] = phases.get(state.phase, 0) + 1
+            return {
+                **asdict(self.stats),
+                "tracked_chats": len(self._states),
+                "phases": phases,
+                "in_flight": len(self._in_flight),
+                "debounce_seconds": self.debounce_seconds,
+            }
+
+
+detector = NegotiationDetector()
+_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="negotiation-confirm")
+
+
+def observe_message(db, chat, message) -> bool:
+    """
+    Track a newly stored project chat message. Returns True when the
+    negotiation looks concluded (the caller then schedules confirmation).
+    """
+    from database import ProjectChatMessage
+
+    if not detector.has_state(chat.id):
+        earlier = db.query(ProjectChatMessage).filter(
+            ProjectChatMessage.chat_id == chat.id,
+            ProjectChatMessage.id < message.id
+        ).order_by(ProjectChatMessage.id.desc()).limit(NEGOTIATION_REPLAY_MESSAGES).all()
+        detector.replay(chat.id, list(reversed(earlier)))
+    return detector.observe(chat.id, message.sender_id, message.content, message.id)
+
+
+def escrow_prompt(project, agreed: Optional[Offer]) -> str:
+    terms = []
+    if agreed and agreed.amount is not None:
+        terms.append(f"Agreed price: ₦{agreed.amount:,.0f}")
+    elif project.budget:
+        terms.append(f"Budget: ₦{project.budget:,.0f}")
+    if agreed and agreed.deadline_days is not None:
+        terms.append(f"Timeline: {agreed.deadline_days} day{'s' if agreed.deadline_days != 1 else ''}")
+    terms_text = "\n".join(terms)
+    return f"""Great! It looks like you've reached an agreement on the project terms. To protect both parties, I recommend setting up escrow for the payment.
+
+Project: {project.title}
+{terms_text}
+
+Would you like me to guide you through the escrow setup process? This will:
+1. Securely hold the funds until work is completed
+2. Release payment automatically when the project is approved
+3. Provide protection for both buyer and freelancer
+
+Type 'yes' to start escrow setup or 'no' to continue discussing."""
+
+
+def _confirm_in_background(chat_id: int):
+    from database import SessionLocal, ProjectChat, ProjectChatMessage
+    import ai_assistant
+    import project_chat
+    import tracing
+
+    db = SessionLocal()
+    confirmed = None
+    try:
+        with tracing.trace("negotiation.confirm", chat_id=chat_id):
+            recent = db.query(ProjectChatMessage).filter(
+                ProjectChatMessage.chat_id == chat_id
+            ).order_by(ProjectChatMessage.id.desc()).limit(CONFIRM_CONTEXT_MESSAGES).all()
+            conversation_text = "\n".join(f"{msg.sender_id}: {msg.content}" for msg in reversed(recent))
+            confirmed = ai_assistant.detect_negotiation_end(conversation_text)
+            if confirmed:
+                chat = db.query(ProjectChat).filter(ProjectChat.id == chat_id).first()
+                agreed = detector.state(chat_id).agreed
+                prompt = ProjectChatMessage(
+                    chat_id=chat_id,
+                    sender_id=AVA_SENDER_ID,
+                    content=escrow_prompt(chat.project, agreed)
+                )
+                db.add(prompt)
+                db.commit()
+                project_chat.publish_message(prompt)
+                logger.info(f"💰 Negotiation confirmed, escrow prompt sent in project chat {chat_id}")
+            else:
+                logger.info(f"🤝 Negotiation in project chat {chat_id} not concluded yet")
+    except Exception as e:
+        logger.warning(f"Negotiation confirmation failed for project chat {chat_id}: {e}")
+        db.rollback()
+        confirmed = None
+    finally:
+        db.close()
+        detector.finish_check(chat_id, confirmed)
+
+
+def schedule_confirmation(chat_id: int) -> bool:
+    """Confirm a likely conclusion with the LLM off the request path (debounced)"""
+    import llm_gateway
+
+    if not llm_gateway.is_configured() or not detector.claim_check(chat_id):
+        return False
+    _executor.submit(_confirm_in_background, chat_id)
+    return True
+
+
+def get_stats() -> Dict[str, Any]:
+    return detector.snapshot()
@@ -4,8 +4,11 @@ from typing import List, Optional
 from datetime import datetime, timedelta
 from pydantic import BaseModel
 
-from database import get_db, User
+from database import get_db, User, Notification
 from auth import get_current_user, get_current_admin
+import notifications
+import digest
+import activity_log
 
 router = APIRouter(prefix="/notifications", tags=["Notifications"])
 
@@ -20,36 +23,29 @@ class NotificationResponse(BaseModel):
     created_at: datetime
 
 
-# TODO: Create Notification model in database.py
-# For now using mock data
+class MarkReadRequest(BaseModel):
+    ids: Optional[List[int]] = None
+    up_to: Optional[int] = None  # Everything with id <= up_to
 
 
 @router.get("/list")
 async def get_notifications(
     limit: int = 20,
-    offset: int = 0,
+    before: Optional[int] = None,
     unread_only: bool = False,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """
-    Get user notifications with pagination
+    Get user notifications, newest first. Pass the returned next_before to get the next page.
     """
-    # TODO: Query from Notification table when model is created
-    # For now returning mock data
-    
-    notifications = generate_mock_notifications(current_user.id)
-    
-    if unread_only:
-        notifications = [n for n in notifications if not n["is_read"]]
-    
-    total = len(notifications)
-    notifications = notifications[offset:offset + limit]
-    
+    limit = max(1, min(limit, 100))
+    rows = notifications.page(db, current_user.id, before=before, limit=limit, unread_only=unread_only)
+
     return {
-        "notifications": notifications,
-        "total": total,
-        "unread_count": sum(1 for n in notifications if not n["is_read"])
+        "notifications": [notifications.serialize(row) for row in rows],
+        "next_before": rows[-1].id if len(rows) == limit else None,
+        "unread_count": notifications.unread_count(db, current_user.id)
     }
 
 
@@ -61,11 +57,7 @@ async def get_unread_count(
     """
     Get count of unread notifications
     """
-    # TODO: Query from Notification table
-    notifications = generate_mock_notifications(current_user.id)
-    unread_count = sum(1 for n in notifications if not n["is_read"])
-    
-    return {"unread_count": unread_count}
+    return {"unread_count": notifications.unread_count(db, current_user.id)}
 
 
 @router.post("/{notification_id}/read")
@@ -77,15 +69,32 @@ async def mark_notification_read(
     """
     Mark single notification as read
     """
-    # TODO: Update Notification table
-    # For now just returning success
-    
+    notifications.mark_read(db, current_user.id, ids=[notification_id])
+    db.commit()
+
     return {
         "message": "Notification marked as read",
         "notification_id": notification_id
     }
 
 
+@router.post("/mark-read")
+async def mark_notifications_read(
+    read_data: MarkReadRequest,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Mark several notifications (ids) or everything up to an id as read
+    """
+    if read_data.ids is None and read_data.up_to is None:
+        raise HTTPException(status_code=400, detail="Provide ids or up_to")
+    updated = notifications.mark_read(db, current_user.id, ids=read_data.ids, up_to=read_data.up_to)
+    db.commit()
+
+    return {"message": "Notifications marked as read", "updated": updated}
+
+
 @router.post("/mark-all-read")
 async def mark_all_read(
     current_user: User = Depends(get_current_user),
@@ -94,10 +103,12 @@ async def mark_all_read(
     """
     Mark all notifications as read
     """
-    # TODO: Bulk update Notification table
-    
+    updated = notifications.mark_read(db, current_user.id)
+    db.commit()
+
     return {
-        "message": "All notifications marked as read"
+        "message": "All notifications marked as read",
+        "updated": updated
     }
 
 
@@ -110,8 +121,14 @@ async def delete_notification(
     """
     Delete a notification
     """
-    # TODO: Delete from Notification table
-    
+    deleted = db.query(Notification).filter(
+        Notification.id == notification_id,
+        Notification.user_id == current_user.id
+    ).delete(synchronize_session=False)
+    db.commit()
+    if not deleted:
+        raise HTTPException(status_code=404, detail="Notification not found")
+
     return {
         "message": "Notification deleted",
         "notification_id": notification_id
@@ -126,18 +143,7 @@ async def get_notification_settings(
     """
     Get user notification preferences
     """
-    # TODO: Query from UserNotificationSettings table
-    
-    return {
-        "email_notifications": True,
-        "push_notifications": True,
-        "guild_updates": True,
-        "marketplace_updates": True,
-        "project_updates": True,
-        "message_notifications": True,
-        "ai_insights": True,
-        "weekly_digest": False
-    }
+    return notifications.get_preferences(db, current_user.id)
 
 
 @router.put("/settings")
@@ -147,128 +153,36 @@ async def update_notification_settings(
     db: Session = Depends(get_db)
 ):
     """
-    Update user notification preferences
+    Update user notification preferences (unknown keys are ignored)
     """
-    # TODO: Update UserNotificationSettings table
-    
     return {
         "message": "Notification settings updated",
-        "settings": settings
+        "settings": notifications.update_preferences(db, current_user.id, settings)
     }
 
 
-@router.get("/recent-activity")
-async def get_recent_activity(
-    limit: int = 10,
+@router.get("/digest/preview")
+async def preview_digest(
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """
-    Get user's recent activity feed
+    The digest email the user would get for the current interval
     """
-    # TODO: Query from ActivityLog table
-    
-    activities = [
-        {
-            "id": 1,
-            "type": "purchase",
-            "title": "Order Completed",
-            "description": "Your order #1234 has been delivered",
-            "timestamp": datetime.utcnow() - timedelta(hours=2),
-            "icon": "shopping-bag"
-        },
-        {
-            "id": 2,
-            "type": "guild",
-            "title": "New Guild Member",
-            "description": "John Doe joined your guild 'Web Developers'",
-            "timestamp": datetime.utcnow() - timedelta(hours=5),
-            "icon": "users"
-        },
-        {
-            "id": 3,
-            "type": "project",
-            "title": "Task Completed",
-            "description": "Sarah completed 'Design Homepage' in Project Alpha",
-            "timestamp": datetime.utcnow() - timedelta(hours=12),
-            "icon": "check-circle"
-        }
-    ]
-    
-    return activities[:limit]
+    return digest.preview(db, current_user) or {"subject": None, "text": None, "html": None}
 
 
-def generate_mock_notifications(user_id: int) -> List[dict]:
+@router.get("/recent-activity")
+async def get_recent_activity(
+    limit: int = 10,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
     """
-    Generate mock notifications for testing
+    Get user's recent activity feed
     """
-    now = datetime.utcnow()
-
-    return [
-        {
-            "id": 1,
-            "type": "message",
-            "title": "New Message",
-            "message": "You have a new message from John Doe",
-            "link": "/messages",
-            "is_read": False,
-            "created_at": now - timedelta(minutes=15)
-        },
-        {
-            "id": 2,
-            "type": "order",
-            "title": "Order Shipped",
-            "message": "Your order #1234 has been shipped",
-            "link": "/orders/1234",
-            "is_read": False,
-            "created_at": now - timedelta(hours=2)
-        },
-        {
-            "id": 3,
-            "type": "guild",
-            "title": "Guild Invitation",
-            "message": "You've been invited to join 'Tech Innovators' guild",
-            "link": "/guilds/invite/abc123",
-            "is_read": True,
-            "created_at": now - timedelta(hours=5)
-        },
-        {
-            "id": 4,
-            "type": "payment",
-            "title": "Payment Received",
-            "message": "You received $50.00 for Product Sale",
-            "link": "/wallet",
-            "is_read": True,
-            "created_at": now - timedelta(hours=8)
-        },
-        {
-            "id": 5,
-            "type": "project",
-            "title": "Task Assignment",
-            "message": "You've been assigned to 'Design Landing Page' task",
-            "link": "/projects/5",
-            "is_read": False,
-            "created_at": now - timedelta(hours=12)
-        },
-        {
-            "id": 6,
-            "type": "ai",
-            "title": "AI Insight",
-            "message": "Your marketplace listing could use better photos",
-            "link": "/marketplace/my-listings",
-            "is_read": True,
-            "created_at": now - timedelta(days=1)
-        },
-        {
-            "id": 7,
-            "type": "system",
-            "title": "Platform Update",
-            "message": "New features available! Check out our marketplace improvements",
-            "link": "/whats-new",
-            "is_read": True,
-            "created_at": now - timedelta(days=2)
-        }
-    ]
+    limit = max(1, min(limit, 100))
+    return [activity_log.describe_for_user(row) for row in activity_log.history(db, current_user.id, limit=limit)]
 
 
 def generate_admin_mock_notifications(admin_id: int) -> List[dict]:
@@ -0,0 +1,217 @@
+"""
+Notifications
+In-app notifications emitted from domain events, with preferences and live delivery
+
+Routes call notify() inside their own transaction when something happens to
+a user (order created, escrow funded/released, message received, post
+replied, guild joined):
+
+- the recipient's preferences are checked at emit time (the category of the
+  notification type, e.g. marketplace_updates for orders)
+- a collapse_key keeps one unread notification per key (one per DM sender,
+  not one per message)
+- once the transaction commits, the notification is pushed as
+  notification.created on the user's realtime channel (/realtime/ws or
+  /realtime/sse) unless they turned push_notifications off; nothing is
+  pushed for rolled-back work
+
+Group events (a post to every guild member) go through the job queue:
+fan_out_to_guild() enqueues one job whose handler inserts the members'
+rows in batches of NOTIFICATION_FANOUT_BATCH, skipping members who opted
+out, so the request that caused it isn't held up by large guilds.
+
+Listing is keyset-paginated on id (newest first) and unread counts and
+mark-read are single statements on the (user_id, is_read, id) index.
+"""
+
+from typing import Any, Dict, List, Optional
+from sqlalchemy import event, func, insert, or_, select
+from sqlalchemy.orm import Session
+import os
+import logging
+
+from database import Notification, NotificationPreference, Guild, guild_members
+import job_queue
+import realtime_hub
+
+logger = logging.getLogger(__name__)
+
+NOTIFICATION_FANOUT_BATCH = int(os.getenv("NOTIFICATION_FANOUT_BATCH", "1000"))
+
+DEFAULT_PREFERENCES = {
+    "email_notifications": True,
+    "push_notifications": True,
+    "guild_updates": True,
+    "marketplace_updates": True,
+    "project_updates": True,
+    "message_notifications": True,
+    "ai_insights": True,
+    "weekly_digest": False,
+}
+
+# Preference that switches each notification type on or off
+TYPE_CATEGORIES = {
+    "order.created": "marketplace_updates",
+    "order.escrow_funded": "marketplace_updates",
+    "order.escrow_released": "marketplace_updates",
+    "project.escrow_funded": "project_updates",
+    "project.escrow_released": "project_updates",
+    "message.received": "message_notifications",
+    "post.replied": "guild_updates",
+    "guild.joined": "guild_updates",
+    "guild.post": "guild_updates",
+}
+
+_PENDING = "notifications_pending"
+
+
+@event.listens_for(Session, "after_commit")
+def _push_committed(session: Session):
+    for user_id, payload in session.info.pop(_PENDING, []):
+        realtime_hub.publish(realtime_hub.user_channel(user_id), "notification.created", payload)
+
+
+@event.listens_for(Session, "after_rollback")
+def _drop_rolled_back(session: Session):
+    session.info.pop(_PENDING, None)
+
+
+def serialize(notification: Notification) -> Dict[str, Any]:
+    return {
+        "id": notification.id,
+        "type": notification.type,
+        "title": notification.title,
+        "message": notification.message,
+        "link": notification.link,
+        "actor_id": notification.actor_id,
+        "is_read": notification.is_read,
+        "created_at": notification.created_at,
+    }
+
+
+def get_preferences(db: Session, user_id: int) -> Dict[str, bool]:
+    row = db.query(NotificationPreference).filter(NotificationPreference.user_id == user_id).first()
+    if row is None:
+        return dict(DEFAULT_PREFERENCES)
+    return {key: getattr(row, key) for key in DEFAULT_PREFERENCES}
+
+
+def update_preferences(db: Session, user_id: int, changes: Dict[str, Any]) -> Dict[str, bool]:
+    """Apply known preference keys (others are ignored) and commit"""
+    row = db.query(NotificationPreference).filter(NotificationPreference.user_id == user_id).first()
+    if row is None:
+        row = NotificationPreference(user_id=user_id, **DEFAULT_PREFERENCES)
+        db.add(row)
+    for key, value in changes.items():
+        if key in DEFAULT_PREFERENCES:
+            setattr(row, key, bool(value))
+    db.commit()
+    return get_preferences(db, user_id)
+
+
+def notify(db: Session, user_id: int, type: str, title: str, message: str, link: Optional[str] = None,
+           actor_id: Optional[int] = None, collapse_key: Optional[str] = None) -> Optional[Notification]:
+    """
+    Add a notification for user_id in the caller's transaction, if their
+    preferences allow it; pushed live once the caller commits
+    """
+    if actor_id is not None and actor_id == user_id:
+        return None
+    preferences = get_preferences(db, user_id)
+    category = TYPE_CATEGORIES.get(type)
+    if category is not None and not preferences[category]:
+        return None
+    if collapse_key is not None:
+        unread = db.query(Notification.id).filter(
+            Notification.user_id == user_id,
+            Notification.is_read == False,
+            Notification.collapse_key == collapse_key
+        ).first()
+        if unread is not None:
+            return None
+
+    notification = Notification(user_id=user_id, type=type, title=title, message=message, link=link,
+                                actor_id=actor_id, collapse_key=collapse_key, is_read=False)
+    db.add(notification)
+    db.flush()
+    if preferences["push_notifications"]:
+        db.info.setdefault(_PENDING, []).append((user_id, serialize(notification)))
+    return notification
+
+
+def fan_out_to_guild(db: Session, guild_id: int, type: str, title: str, message: str,
+                     link: Optional[str] = None, actor_id: Optional[int] = None):
+    """Notify every member of a guild (and its owner) except the actor, via the job queue"""
+    return job_queue.enqueue(db, "notifications.guild_fan_out", {
+        "guild_id": guild_id, "type": type, "title": title, "message": message,
+        "link": link, "actor_id": actor_id
+    })
+
+
+@job_queue.handler("notifications.guild_fan_out")
+def guild_fan_out(db: Session, payload: dict):
+    guild_id, actor_id = payload["guild_id"], payload["actor_id"]
+    category = getattr(NotificationPreference, TYPE_CATEGORIES.get(payload["type"], "guild_updates"))
+    push = func.coalesce(NotificationPreference.push_notifications, True)
+    row = {key: payload[key] for key in ("type", "title", "message", "link", "actor_id")}
+
+    owner_id = db.query(Guild.owner_id).filter(Guild.id == guild_id).scalar()
+    after, sent = 0, 0
+    while True:
+        # Members (plus the owner) in user id order, minus the actor and anyone who opted out
+        members = select(guild_members.c.user_id.label("user_id")).where(guild_members.c.guild_id == guild_id)
+        if owner_id is not None:
+            members = members.union(select(Guild.owner_id.label("user_id")).where(Guild.id == guild_id))
+        members = members.subquery()
+        batch = db.query(members.c.user_id, push).outerjoin(
+            NotificationPreference, NotificationPreference.user_id == members.c.user_id
+        ).filter(
+            members.c.user_id > after,
+            members.c.user_id != (actor_id or 0),
+            or_(category == None, category == True)
+        ).order_by(members.c.user_id).limit(NOTIFICATION_FANOUT_BATCH).all()
+        if not batch:
+            break
+
+        inserted = db.execute(
+            insert(Notification).returning(Notification.id, Notification.user_id, Notification.created_at),
+            [{**row, "user_id": user_id, "is_read": False} for user_id, _ in batch]
+        ).all()
+        pushed = {user_id for user_id, wants_push in batch if wants_push}
+        pending = db.info.setdefault(_PENDING, [])
+        for notification_id, user_id, created_at in inserted:
+            if user_id in pushed:
+                pending.append((user_id, {**row, "id": notification_id, "is_read": False, "created_at": created_at}))
+        sent += len(batch)
+        after = batch[-1][0]
+
+    logger.info(f"🔔 Guild {guild_id} {payload['type']} notification sent to {sent} members")
+    return None
+
+
+def page(db: Session, user_id: int, before: Optional[int] = None, limit: int = 20,
+         unread_only: bool = False) -> List[Notification]:
+    """Newest first, older than notification id `before`"""
+    query = db.query(Notification).filter(Notification.user_id == user_id)
+    if unread_only:
+        query = query.filter(Notification.is_read == False)
+    if before is not None:
+        query = query.filter(Notification.id < before)
+    return query.order_by(Notification.id.desc()).limit(limit).all()
+
+
+def unread_count(db: Session, user_id: int) -> int:
+    return db.query(func.count(Notification.id)).filter(
+        Notification.user_id == user_id,
+        Notification.is_read == False
+    ).scalar() or 0
+
+
+def mark_read(db: Session, user_id: int, ids: Optional[List[int]] = None, up_to: Optional[int] = None) -> int:
+    """Mark the given ids, everything up to an id, or (neither given) everything read in one UPDATE"""
+    query = db.query(Notification).filter(Notification.user_id == user_id, Notification.is_read == False)
+    if ids is not None:
+        query = query.filter(Notification.id.in_(ids))
+    if up_to is not None:
+        query = query.filter(Notification.id <= up_to)
+    return query.update({Notification.is_read: True}, synchronize_session=False)
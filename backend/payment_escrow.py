@@ -17,6 +17,8 @@ from schemas import (
     PaymentInitialize, PaymentResponse, PaymentVerify
 )
 from auth import get_current_user
+import activity_log
+import notifications
 
 router = APIRouter()
 
@@ -65,6 +67,14 @@ async def create_order(
     )
 
     db.add(new_order)
+    db.flush()
+    notifications.notify(
+        db, new_order.seller_id, "order.created", "New Order",
+        f"New order {new_order.order_number}: {new_order.item_name}",
+        link=f"/orders/{new_order.id}", actor_id=current_user.id
+    )
+    activity_log.emit(db, current_user.id, "created", "order", new_order,
+                      extra={"order_number": new_order.order_number, "amount": float(new_order.total_amount or 0)})
     db.commit()
     db.refresh(new_order)
 
@@ -178,6 +188,13 @@ async def create_escrow(
 
     # Update order status
     order.status = "processing"
+    notifications.notify(
+        db, order.seller_id, "order.escrow_funded", "Payment Held in Escrow",
+        f"${new_escrow.amount:.2f} for order {order.order_number} is held in escrow",
+        link=f"/orders/{order.id}", actor_id=current_user.id
+    )
+    activity_log.emit(db, current_user.id, "paid", "order", order.id,
+                      extra={"order_number": order.order_number, "amount": float(new_escrow.amount)})
 
     db.commit()
     db.refresh(new_escrow)
@@ -260,6 +277,8 @@ async def escrow_action(
             raise HTTPException(status_code=403, detail="Not authorized")
         escrow.status = "disputed"
         escrow.dispute_reason = action_data.reason
+        activity_log.emit(db, current_user.id, "disputed", "order", order.id,
+                          extra={"order_number": order.order_number})
 
     elif action_data.action == "release":
         # Release funds to seller
@@ -289,6 +308,13 @@ async def escrow_action(
                 related_order_id=order.id
             )
             db.add(transaction)
+        notifications.notify(
+            db, order.seller_id, "order.escrow_released", "Escrow Released",
+            f"${escrow.amount:.2f} for order {order.order_number} was released to you",
+            link=f"/orders/{order.id}", actor_id=current_user.id
+        )
+        activity_log.emit(db, current_user.id, "released", "order", order.id,
+                          extra={"order_number": order.order_number, "amount": float(escrow.amount)})
 
     elif action_data.action == "refund":
         # Refund to buyer
@@ -298,6 +324,8 @@ async def escrow_action(
         escrow.status = "refunded"
         escrow.refunded_at = datetime.utcnow()
         order.status = "refunded"
+        activity_log.emit(db, current_user.id, "refunded", "order", order.id,
+                          extra={"order_number": order.order_number})
 
     else:
         raise HTTPException(status_code=400, detail="Invalid action")
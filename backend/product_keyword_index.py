@@ -0,0 +1,345 @@
+"""
+Product Keyword Index
+In-memory lookup that maps words in a chat message to product categories
+
+Built from the built-in PRODUCT_TERMS plus every ProductKeyword row, with:
+- exact matches for single words and multi-word keywords (1-3 word n-grams)
+- stemmed matches so plurals hit ("laptops" -> "laptop")
+- a symmetric-delete typo index (edit distance 1) for misspellings ("keybord"),
+  only for words of MIN_TYPO_LENGTH or more letters that aren't ordinary
+  English (COMMON_WORDS), so "house" never becomes "mouse"
+
+Keyword writes are applied incrementally through change_tracker, and the whole
+table is reloaded every KEYWORD_INDEX_REFRESH_SECONDS to pick up other workers'
+writes. Once start() has run, that reload happens on a background thread, and
+writes applied while it is querying are re-applied after the swap. Lookups
+never touch the database or the LLM.
+"""
+
+from typing import List, Dict, Any, Optional, Set, Tuple
+from collections import defaultdict
+import os
+import re
+import time
+import threading
+import logging
+
+from database import SessionLocal, ProductKeyword
+import change_tracker
+
+logger = logging.getLogger(__name__)
+
+KEYWORD_INDEX_REFRESH_SECONDS = int(os.getenv("KEYWORD_INDEX_REFRESH_SECONDS", "600"))
+# How long a term the LLM rejected as "not a product" is kept out of the fallback
+NON_PRODUCT_TTL_SECONDS = int(os.getenv("NON_PRODUCT_TTL_SECONDS", "86400"))
+MAX_NON_PRODUCT_TERMS = 10000
+
+# Built-in category vocabulary (always available, even with an empty keyword table)
+PRODUCT_TERMS = {
+    'shoe': ['sneaker', 'shoe', 'shoes', 'footwear', 'nike', 'adidas', 'running', 'dress shoe'],
+    'mouse': ['mouse', 'mice', 'computer mouse', 'wireless mouse'],
+    'keyboard': ['keyboard', 'mechanical keyboard'],
+    'laptop': ['laptop', 'computer', 'notebook', 'macbook', 'dell', 'hp', 'lenovo', 'thinkpad'],
+    'phone': ['phone', 'smartphone', 'mobile', 'iphone', 'samsung', 'galaxy'],
+    'headphone': ['headphone', 'earphone', 'earbud', 'airpod', 'headset'],
+    'watch': ['watch', 'smartwatch', 'wristwatch'],
+    'bag': ['bag', 'backpack', 'handbag', 'purse'],
+}
+
+# Words that never name a product; they are not sent to the LLM fallback either
+STOPWORDS = {
+    'a', 'an', 'the', 'and', 'or', 'of', 'for', 'to', 'in', 'on', 'at', 'by', 'with', 'from',
+    'i', 'me', 'my', 'we', 'us', 'you', 'your', 'it', 'its', 'this', 'that', 'these', 'those',
+    'is', 'are', 'was', 'be', 'am', 'do', 'does', 'can', 'could', 'would', 'should', 'will',
+    'want', 'need', 'buy', 'get', 'find', 'show', 'looking', 'look', 'search', 'some', 'any',
+    'have', 'has', 'there', 'what', 'which', 'where', 'how', 'much', 'many', 'please', 'cheap',
+    'cheapest', 'best', 'good', 'new', 'available', 'under', 'below', 'budget', 'price', 'naira',
+    'cost', 'about', 'like', "i'm", 'im', 'hi', 'hello', 'hey', 'thanks', 'one', 'two', 'more',
+}
+
+# Ordinary words that are one edit away from a product term ("house" -> mouse,
+# "shows" -> shoes, "speaker" -> sneaker) plus frequent chat words; they are
+# real words, not misspellings, so they are never typo-corrected. Unlike
+# STOPWORDS they may still name a product and go to the LLM fallback.
+COMMON_WORDS = {
+    'about', 'above', 'after', 'again', 'agree', 'ahead', 'allow', 'alone', 'along', 'already', 'always',
+    'amount', 'another', 'answer', 'anyone', 'anything', 'around', 'arrive', 'asked', 'batch', 'because',
+    'before', 'begin', 'being', 'believe', 'below', 'better', 'between', 'bring', 'brown', 'build', 'called',
+    'cannot', 'carry', 'catch', 'cause', 'change', 'check', 'child', 'choose', 'clean', 'clear', 'close',
+    'coming', 'commuter', 'could', 'count', 'course', 'cover', 'cunning', 'curse', 'daily', 'delivery',
+    'different', 'dinner', 'doing', 'doubt', 'during', 'early', 'either', 'enough', 'every', 'everyone',
+    'everything', 'exactly', 'family', 'father', 'feeling', 'first', 'found', 'friend', 'front', 'funny',
+    'getting', 'given', 'going', 'gonna', 'great', 'group', 'guess', 'happy', 'hatch', 'heard', 'heart',
+    'hello', 'helping', 'hoping', 'horse', 'hours', 'house', 'houses', 'however', 'important', 'inside',
+    'instead', 'issue', 'items', 'journey', 'kinda', 'knock', 'known', 'later', 'latch', 'learn', 'least',
+    'leave', 'letter', 'light', 'little', 'local', 'lovely', 'lunch', 'maybe', 'match', 'matter', 'means',
+    'message', 'might', 'minute', 'money', 'month', 'morning', 'mother', 'mouth', 'moving', 'music', 'myself',
+    'never', 'night', 'nobody', 'nothing', 'notice', 'number', 'nurse', 'offer', 'often', 'order', 'other',
+    'others', 'outside', 'owner', 'paper', 'parse', 'party', 'patch', 'people', 'perfect', 'person', 'phony',
+    'place', 'plans', 'pleased', 'point', 'pretty', 'prone', 'problem', 'product', 'project', 'prove',
+    'purge', 'quick', 'quite', 'rather', 'ready', 'really', 'reason', 'remember', 'reply', 'right', 'round',
+    'saying', 'school', 'second', 'seems', 'selling', 'seller', 'sending', 'shall', 'share', 'shine', 'shone',
+    'short', 'should', 'shown', 'shows', 'since', 'small', 'something', 'sorry', 'sound', 'speak', 'speaker',
+    'stand', 'start', 'still', 'store', 'story', 'street', 'study', 'stuff', 'sure', 'table', 'taking',
+    'teach', 'tells', 'thank', 'their', 'there', 'these', 'thing', 'things', 'think', 'those', 'though',
+    'thought', 'three', 'through', 'times', 'today', 'together', 'tomorrow', 'total', 'touch', 'towards',
+    'trust', 'truth', 'under', 'until', 'using', 'usually', 'water', 'watching', 'where', 'which', 'while',
+    'whole', 'whose', 'witch', 'woman', 'words', 'world', 'worth', 'would', 'write', 'wrong', 'years',
+    'yesterday', 'young', 'yours',
+}
+
+MAX_NGRAM = 3
+MIN_TYPO_LENGTH = 5
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+(?:'[a-z]+)?")
+
+
+def tokenize(text: str) -> List[str]:
+    return _TOKEN_RE.findall(text.lower())
+
+
+def stem(word: str) -> str:
+    """Light plural stemmer: good enough to fold "laptops", "watches", "accessories" """
+    if len(word) > 4 and word.endswith("ies"):
+        return word[:-3] + "y"
+    if len(word) > 4 and word.endswith(("ches", "shes", "sses", "xes", "zes")):
+        return word[:-2]
+    if len(word) > 3 and word.endswith("s") and not word.endswith(("ss", "us")):
+        return word[:-1]
+    return word
+
+
+def _deletes(word: str) -> Set[str]:
+    return {word[:i] + word[i + 1:] for i in range(len(word))}
+
+
+def _within_one_edit(a: str, b: str) -> bool:
+    """True if a and b differ by at most one insert, delete, substitution or adjacent swap"""
+    if a == b:
+        return True
+    la, lb = len(a), len(b)
+    if abs(la - lb) > 1:
+        return False
+    if la == lb:
+        diff = [i for i in range(la) if a[i] != b[i]]
+        if len(diff) == 1:
+            return True
+        return len(diff) == 2 and diff[1] == diff[0] + 1 and a[diff[0]] == b[diff[1]] and a[diff[1]] == b[diff[0]]
+    if la > lb:
+        a, b = b, a
+    # b is one longer than a
+    for i in range(len(a) + 1):
+        if a == b[:i] + b[i + 1:]:
+            return True
+    return False
+
+
+class ProductKeywordIndex:
+    """Thread-safe, lazily (re)built keyword -> category lookup"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._db_keywords: Dict[int, Tuple[str, str]] = {}  # keyword row id -> (keyword, category)
+        self._exact: Dict[str, Set[str]] = {}
+        self._stemmed: Dict[str, Set[str]] = {}
+        self._typo: Dict[str, Set[str]] = {}
+        self._non_products: Dict[str, float] = {}  # term -> rejected at
+        self._dirty = True
+        self.version = 0
+        self.loaded_at = 0.0
+        self._refresh_lock = threading.Lock()  # one reload at a time
+        self._pending: Optional[List[Tuple[str, Dict[str, Any]]]] = None  # changes seen mid-reload
+        self._stop = threading.Event()
+        self._worker: Optional[threading.Thread] = None
+
+    # ------------------------------------------------------------------
+    # Maintenance
+    # ------------------------------------------------------------------
+
+    def refresh(self, db=None):
+        """Reload ProductKeyword rows from the database"""
+        with self._refresh_lock:
+            with self._lock:
+                self._pending = []
+            try:
+                own_session = db is None
+                db = db or SessionLocal()
+                try:
+                    rows = db.query(ProductKeyword.id, ProductKeyword.keyword, ProductKeyword.category).all()
+                finally:
+                    if own_session:
+                        db.close()
+
+                with self._lock:
+                    self._db_keywords = {
+                        row_id: (keyword, category) for row_id, keyword, category in rows if keyword and category
+                    }
+                    # Changes committed after the query ran would otherwise be lost
+                    for op, row in self._pending:
+                        self._apply(op, row)
+                    self._dirty = True
+                    self.loaded_at = time.time()
+            finally:
+                with self._lock:
+                    self._pending = None
+        logger.info(f"📚 Product keyword index loaded: {len(rows)} keywords")
+
+    def apply_change(self, op: str, row: Dict[str, Any]):
+        """Apply a committed ProductKeyword insert/update/delete"""
+        if row.get("id") is None:
+            return
+        with self._lock:
+            self._apply(op, row)
+            if self._pending is not None:
+                self._pending.append((op, row))
+            self._dirty = True
+
+    def _apply(self, op: str, row: Dict[str, Any]):
+        row_id = row["id"]
+        if op == "delete" or not row.get("keyword") or not row.get("category"):
+            self._db_keywords.pop(row_id, None)
+        else:
+            self._db_keywords[row_id] = (row["keyword"], row["category"])
+
+    def _reload(self):
+        try:
+            self.refresh()
+        except Exception as e:
+            # Keep serving the previous keywords; retry on the next refresh window
+            logger.error(f"Product keyword index refresh failed: {e}")
+            self.loaded_at = time.time()
+
+    def start(self):
+        """Reload every KEYWORD_INDEX_REFRESH_SECONDS on a background thread"""
+        if self._worker is not None:
+            return
+
+        def run():
+            while not self._stop.is_set():
+                due = self.loaded_at + KEYWORD_INDEX_REFRESH_SECONDS - time.time()
+                if self._stop.wait(min(max(due, 0), KEYWORD_INDEX_REFRESH_SECONDS)):
+                    break
+                if time.time() - self.loaded_at > KEYWORD_INDEX_REFRESH_SECONDS:
+                    self._reload()
+
+        self._stop.clear()
+        self._worker = threading.Thread(target=run, name="keyword-index-reloader", daemon=True)
+        self._worker.start()
+
+    def stop(self):
+        self._stop.set()
+        self._worker = None
+
+    def mark_not_product(self, terms: List[str]):
+        """Remember terms the LLM fallback rejected so they are not asked about again"""
+        now = time.time()
+        with self._lock:
+            if len(self._non_products) + len(terms) > MAX_NON_PRODUCT_TERMS:
+                self._non_products = {t: at for t, at in self._non_products.items() if now - at < NON_PRODUCT_TTL_SECONDS}
+            for term in terms:
+                self._non_products[term] = now
+
+    def _is_known_non_product(self, term: str) -> bool:
+        rejected_at = self._non_products.get(term)
+        return rejected_at is not None and time.time() - rejected_at < NON_PRODUCT_TTL_SECONDS
+
+    def _ensure_current(self):
+        if self._worker is None and time.time() - self.loaded_at > KEYWORD_INDEX_REFRESH_SECONDS:
+            self._reload()  # no background reloader (scripts, tests)
+
+        with self._lock:
+            if not self._dirty:
+                return
+            exact: Dict[str, Set[str]] = defaultdict(set)
+            stemmed: Dict[str, Set[str]] = defaultdict(set)
+            typo: Dict[str, Set[str]] = defaultdict(set)
+
+            entries = [(term, category) for category, terms in PRODUCT_TERMS.items() for term in terms]
+            entries.extend(self._db_keywords.values())
+
+            for term, category in entries:
+                tokens = tokenize(term)
+                if not tokens:
+                    continue
+                category = category.lower()
+                phrase = " ".join(tokens)
+                exact[phrase].add(category)
+                stemmed[" ".join(stem(t) for t in tokens)].add(category)
+                if len(tokens) == 1 and len(phrase) >= MIN_TYPO_LENGTH:
+                    typo[phrase].add(phrase)
+                    for deleted in _deletes(phrase):
+                        typo[deleted].add(phrase)
+
+            self._exact, self._stemmed, self._typo = dict(exact), dict(stemmed), dict(typo)
+            self._dirty = False
+            self.version += 1
+
+    # ------------------------------------------------------------------
+    # Lookup
+    # ------------------------------------------------------------------
+
+    def correct(self, word: str) -> Optional[str]:
+        """Closest known single-word keyword within one edit, or None (short and ordinary words are left alone)"""
+        if len(word) < MIN_TYPO_LENGTH or word in COMMON_WORDS:
+            return None
+        candidates = set(self._typo.get(word, ()))
+        for deleted in _deletes(word):
+            candidates.update(self._typo.get(deleted, ()))
+        matches = sorted(c for c in candidates if _within_one_edit(word, c))
+        return matches[0] if matches else None
+
+    def lookup(self, message: str) -> Tuple[List[str], List[str]]:
+        """
+        Map a message to product categories.
+        Returns (categories in order of first appearance, unknown content words).
+        Unknown words exclude stopwords, numbers and recently rejected terms.
+        """
+        self._ensure_current()
+        exact, stemmed = self._exact, self._stemmed
+
+        tokens = tokenize(message)
+        categories: List[str] = []
+        covered = [False] * len(tokens)
+
+        def add(found, start, length):
+            for category in sorted(found):
+                if category not in categories:
+                    categories.append(category)
+            for i in range(start, start + length):
+                covered[i] = True
+
+        # Longest n-grams first so "dress shoe" wins over "dress"
+        for n in range(min(MAX_NGRAM, len(tokens)), 0, -1):
+            for i in range(len(tokens) - n + 1):
+                if n > 1 and any(covered[i:i + n]):
+                    continue
+                window = tokens[i:i + n]
+                found = exact.get(" ".join(window)) or stemmed.get(" ".join(stem(t) for t in window))
+                if found:
+                    add(found, i, n)
+
+        unknown = []
+        for i, token in enumerate(tokens):
+            if covered[i] or token in STOPWORDS or token.isdigit():
+                continue
+            corrected = self.correct(token) or self.correct(stem(token))
+            if corrected:
+                logger.info(f"🔄 Typo corrected locally: {token} -> {corrected}")
+                add(exact.get(corrected, ()), i, 1)
+            elif token not in unknown and not self._is_known_non_product(token):
+                unknown.append(token)
+
+        return categories, unknown
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "keywords": len(self._db_keywords),
+            "terms": len(self._exact),
+            "non_products": len(self._non_products),
+            "version": self.version,
+            "loaded_at": self.loaded_at,
+        }
+
+
+keyword_index = ProductKeywordIndex()
+change_tracker.subscribe(ProductKeyword.__tablename__, keyword_index.apply_change)
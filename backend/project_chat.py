@@ -15,6 +15,11 @@ from schemas import ProjectChatCreate, ProjectChatResponse, ProjectChatMessageCr
 from auth import get_current_user
 import ai_assistant
 import ai_actions
+import negotiation_detector
+import hydration
+import job_queue
+import read_state
+import realtime_hub
 import logging
 
 logger = logging.getLogger(__name__)
@@ -22,6 +27,14 @@ logger = logging.getLogger(__name__)
 router = APIRouter()
 
 
+def publish_message(msg: ProjectChatMessage):
+    """Push a committed project chat message to the chat's realtime channel"""
+    realtime_hub.publish(
+        realtime_hub.project_chat_channel(msg.chat_id), "message.created",
+        ProjectChatMessageResponse.model_validate(msg).model_dump()
+    )
+
+
 @router.post("/project-chats", response_model=ProjectChatResponse, status_code=status.HTTP_201_CREATED)
 async def create_project_chat(
     chat_data: ProjectChatCreate,
@@ -72,7 +85,15 @@ async def get_project_chats(
         (Project.creator_id == current_user.id) | (ProjectChat.freelancer_id == current_user.id)
     ).all()
 
-    return chats
+    unread = read_state.unread_counts(db, current_user.id, "project_chat", {
+        realtime_hub.project_chat_channel(chat.id): chat.id for chat in chats
+    })
+    return [
+        ProjectChatResponse.model_validate(chat).model_copy(
+            update={"unread_count": unread[realtime_hub.project_chat_channel(chat.id)]}
+        )
+        for chat in chats
+    ]
 
 
 @router.get("/project-chats/{chat_id}", response_model=ProjectChatResponse)
@@ -128,177 +149,174 @@ async def send_project_chat_message(
 
     db.add(new_message)
     chat.last_message_at = datetime.utcnow()
-    db.commit()
-    db.refresh(new_message)
+    db.flush()
 
-    # Check if message mentions @Ava
-    if "@ava" in message_data.content.lower() or "@Ava" in message_data.content:
-        logger.info(f"🤖 @Ava mentioned in project chat {chat_id} by user {current_user.id}")
-
-        # Get recent messages for context (last 15 messages for better context)
-        recent_messages = db.query(ProjectChatMessage).filter(
-            ProjectChatMessage.chat_id == chat_id
-        ).order_by(desc(ProjectChatMessage.created_at)).limit(15).all()
-
-        # Build enhanced conversation context with project details
-        conversation_context = []
-        project_context = {
-            "project_id": chat.project.id,
-            "project_title": chat.project.title,
-            "project_budget": float(chat.project.budget) if chat.project.budget else None,
-            "project_status": chat.project.status,
-            "is_creator": chat.project.creator_id == current_user.id,
-            "is_freelancer": chat.freelancer_id == current_user.id
-        }
-
-        for msg in reversed(recent_messages):
-            sender = db.query(User).filter(User.id == msg.sender_id).first()
-            role = "assistant" if msg.sender_id == 0 else "user"  # 0 = Ava
-            conversation_context.append({
-                "role": role,
-                "content": f"{sender.first_name if sender else 'User'}: {msg.content}"
-            })
-
-        # Extract the query (remove @Ava mention)
-        query = message_data.content.replace("@Ava", "").replace("@ava", "").strip()
-
-        # Enhanced negotiation detection using AI actions
-        negotiation_detection = ai_actions.detect_action_intent(query, current_user)
-        is_negotiation_end = (
-            negotiation_detection.get("action") == "detect_negotiation_end" or
-            any(keyword in query.lower() for keyword in [
-                "agreed", "terms agreed", "we agree", "deal closed", "negotiation complete",
-                "ready to start", "let's proceed", "terms finalized", "we have a deal",
-                "terms are good", "ready to proceed", "let's get started"
-            ])
-        )
-
-        if is_negotiation_end:
-            logger.info(f"🎯 Negotiation end detected in project chat {chat_id}")
-            # Use AI action for escrow prompting
-            try:
-                escrow_action = ai_actions.execute_action(
-                    "prompt_escrow",
-                    current_user,
-                    db,
-                    {
-                        "project_id": chat.project_id,
-                        "chat_id": chat_id,
-                        "amount": float(chat.project.budget) if chat.project.budget else None,
-                        "terms": f"Project: {chat.project.title}"
-                    }
-                )
-
-                if escrow_action.get("success"):
-                    # Create detailed escrow prompt message from Ava
-                    escrow_content = f"""🎉 Great! I detected that you've reached an agreement on the project terms.
+    # Offers and agreement are tracked locally; the LLM only confirms likely conclusions
+    try:
+        likely_conclusion = negotiation_detector.observe_message(db, chat, new_message)
+    except Exception as e:
+        logger.error(f"❌ Error tracking negotiation state: {e}")
+        likely_conclusion = False
 
-**Project:** {chat.project.title}
-**Budget:** ₦{chat.project.budget:,} (if agreed upon)
+    # @Ava replies are generated by the job queue, so the sender isn't held up by the LLM
+    mentions_ava = "@ava" in message_data.content.lower()
+    if mentions_ava:
+        logger.info(f"🤖 @Ava mentioned in project chat {chat_id} by user {current_user.id}")
+        job_queue.enqueue(db, "ava_reply.project_chat", {
+            "user_id": current_user.id,
+            "chat_id": chat_id,
+            "message_id": new_message.id,
+            "query": message_data.content.replace("@Ava", "").replace("@ava", "").strip(),
+            "likely_conclusion": likely_conclusion
+        })
+    db.commit()
+    db.refresh(new_message)
+    publish_message(new_message)
 
-{escrow_action['message']}
+    if likely_conclusion and not mentions_ava:
+        logger.info(f"🎯 Likely negotiation end in project chat {chat_id}, confirming in background")
+        negotiation_detector.schedule_confirmation(chat_id)
 
-**Next Steps:**
-{chr(10).join(f'• {step}' for step in escrow_action.get('next_steps', []))}
+    return new_message
 
-**Security Note:** All payments are protected by our trusted escrow system. Funds are held securely until work is completed and approved.
 
-Would you like me to help you set up the escrow payment now? Just reply with 'yes' to proceed or 'no' to continue discussing."""
+def ava_reply_failed(db: Session, payload: dict, error: str):
+    """Dead-lettered Ava reply: tell the chat instead of leaving the mention unanswered"""
+    return post_ava_reply(db, payload["chat_id"], ai_assistant.AVA_UNAVAILABLE_MESSAGE)
 
-                    escrow_message = ProjectChatMessage(
-                        chat_id=chat_id,
-                        sender_id=0,  # Ava
-                        content=escrow_content
-                    )
-                    db.add(escrow_message)
-                    db.commit()
-                    logger.info(f"✅ Enhanced escrow prompt sent in project chat {chat_id}")
-                    return new_message  # Return early, escrow prompt sent
 
-            except Exception as e:
-                logger.error(f"❌ Error triggering escrow prompt: {e}")
+@job_queue.handler("ava_reply.project_chat", on_dead=ava_reply_failed)
+def ava_reply(db: Session, payload: dict):
+    """Answer an @Ava mention in a project chat (job queue handler)"""
+    chat_id = payload["chat_id"]
+    chat = db.query(ProjectChat).filter(ProjectChat.id == chat_id).first()
+    current_user = db.get(User, payload["user_id"])
+    if chat is None or current_user is None:
+        logger.warning(f"⚠️ Dropping Ava reply for project chat message {payload['message_id']}: chat no longer exists")
+        return None
+    query = payload["query"]
+
+    # Get recent messages for context (last 15 up to the mention, for better context)
+    recent_messages = db.query(ProjectChatMessage).filter(
+        ProjectChatMessage.chat_id == chat_id,
+        ProjectChatMessage.id <= payload["message_id"]
+    ).order_by(desc(ProjectChatMessage.id)).limit(15).all()
+
+    # Build enhanced conversation context with project details
+    conversation_context = []
+    senders = hydration.load_users(db, (msg.sender_id for msg in recent_messages))
+    for msg in reversed(recent_messages):
+        sender = senders.get(msg.sender_id)
+        role = "assistant" if msg.sender_id == 0 else "user"  # 0 = Ava
+        conversation_context.append({
+            "role": role,
+            "content": f"{sender.first_name if sender else 'User'}: {msg.content}"
+        })
+
+    # Enhanced negotiation detection using AI actions
+    negotiation_detection = ai_actions.detect_action_intent(query, current_user)
+    is_negotiation_end = (
+        negotiation_detection.get("action") == "detect_negotiation_end" or
+        any(keyword in query.lower() for keyword in [
+            "agreed", "terms agreed", "we agree", "deal closed", "negotiation complete",
+            "ready to start", "let's proceed", "terms finalized", "we have a deal",
+            "terms are good", "ready to proceed", "let's get started"
+        ])
+    )
 
-        # Get AI response with enhanced project context
+    if is_negotiation_end:
+        logger.info(f"🎯 Negotiation end detected in project chat {chat_id}")
+        # Use AI action for escrow prompting
         try:
-            # Add project context to the message for better AI understanding
-            enhanced_query = f"[Project Context: {chat.project.title} - Budget: ₦{chat.project.budget:,} - Status: {chat.project.status}]\n\n{query}"
-
-            ai_response = ai_assistant.chat_with_ai(
-                message=enhanced_query,
-                user=current_user,
-                db=db,
-                conversation_history=conversation_context
+            escrow_action = ai_actions.execute_action(
+                "prompt_escrow",
+                current_user,
+                db,
+                {
+                    "project_id": chat.project_id,
+                    "chat_id": chat_id,
+                    "amount": float(chat.project.budget) if chat.project.budget else None,
+                    "terms": f"Project: {chat.project.title}"
+                }
             )
 
-            # Create Ava's response message with enhanced formatting
-            message_content = ai_response["response"]
-
-            # Add project-specific guidance if relevant
-            if any(word in query.lower() for word in ["payment", "pay", "escrow", "fund", "money"]):
-                message_content += "\n\n💰 **Payment Security:** All transactions on Avalanche are protected by our escrow system. Funds are held securely until work is completed and approved."
+            if escrow_action.get("success"):
+                # Create detailed escrow prompt message from Ava
+                budget_line = (f"**Budget:** ₦{chat.project.budget:,.0f} (if agreed upon)" if chat.project.budget
+                               else "**Budget:** to be agreed")
+                escrow_content = f"""🎉 Great! I detected that you've reached an agreement on the project terms.
 
-            # If links are present, append them to the content in a parseable format
-            if ai_response.get("links"):
-                links_json = json.dumps(ai_response["links"])
-                message_content += f"\n\n__LINKS__:{links_json}"
-
-            ava_message = ProjectChatMessage(
-                chat_id=chat_id,
-                sender_id=0,  # Special ID for Ava
-                content=message_content
-            )
-
-            db.add(ava_message)
-            db.commit()
-            logger.info(f"✅ Ava responded in project chat {chat_id} with enhanced context")
-
-        except Exception as e:
-            logger.error(f"❌ Error getting Ava response: {e}")
-
-    # Check for negotiation completion and prompt escrow
-    try:
-        # Get recent messages to analyze conversation
-        recent_messages = db.query(ProjectChatMessage).filter(
-            ProjectChatMessage.chat_id == chat_id
-        ).order_by(ProjectChatMessage.created_at.desc()).limit(10).all()
-
-        # Reverse to get chronological order
-        recent_messages.reverse()
-
-        conversation_text = "\n".join([f"{msg.sender_id}: {msg.content}" for msg in recent_messages])
-
-        # Use AI to detect if negotiation is complete
-        if ai_assistant.detect_negotiation_end(conversation_text):
-            logger.info(f"🎯 Negotiation end detected in project chat {chat_id}")
+**Project:** {chat.project.title}
+{budget_line}
 
-            # Get project details for escrow prompt
-            project = chat.project
-            escrow_prompt = f"""Great! It looks like you've reached an agreement on the project terms. To protect both parties, I recommend setting up escrow for the payment.
+{escrow_action['message']}
 
-Project: {project.title}
-Budget: ₦{project.budget:,}
+**Next Steps:**
+{chr(10).join(f'• {step}' for step in escrow_action.get('next_steps', []))}
 
-Would you like me to guide you through the escrow setup process? This will:
-1. Securely hold the funds until work is completed
-2. Release payment automatically when the project is approved
-3. Provide protection for both buyer and freelancer
+**Security Note:** All payments are protected by our trusted escrow system. Funds are held securely until work is completed and approved.
 
-Type 'yes' to start escrow setup or 'no' to continue discussing."""
+Would you like me to help you set up the escrow payment now? Just reply with 'yes' to proceed or 'no' to continue discussing."""
 
-            # Send escrow prompt as Ava message
-            escrow_message = ProjectChatMessage(
-                chat_id=chat_id,
-                sender_id=0,  # Special ID for Ava
-                content=escrow_prompt
-            )
-            db.add(escrow_message)
-            db.commit()
-            logger.info(f"💰 Escrow prompt sent in project chat {chat_id}")
+                push = post_ava_reply(db, chat_id, escrow_content)
 
-    except Exception as e:
-        logger.error(f"❌ Error checking negotiation status: {e}")
+                def push_escrow_prompt():
+                    push()
+                    negotiation_detector.mark_confirmed(chat_id)
+                    logger.info(f"✅ Enhanced escrow prompt sent in project chat {chat_id}")
+                return push_escrow_prompt  # Escrow prompt replaces the regular answer
 
-    return new_message
+        except Exception as e:
+            logger.error(f"❌ Error triggering escrow prompt: {e}")
+
+    # Get AI response with enhanced project context (LLM errors raise, so the queue retries, then
+    # dead-letters; the exchange and its quota charge commit with the reply)
+    # Add project context to the message for better AI understanding
+    project_context = [chat.project.title]
+    if chat.project.budget:
+        project_context.append(f"Budget: ₦{chat.project.budget:,.0f}")
+    project_context.append(f"Status: {chat.project.status}")
+    enhanced_query = f"[Project Context: {' - '.join(project_context)}]\n\n{query}"
+
+    turn = ai_assistant.prepare_chat_turn(enhanced_query, current_user, db, conversation_context, commit=False)
+    if "result" in turn:
+        ai_response = turn["result"]
+    else:
+        ai_response = ai_assistant.complete_chat_turn(turn, current_user, db, commit=False)
+
+    # Create Ava's response message with enhanced formatting
+    message_content = ai_response["response"]
+
+    # Add project-specific guidance if relevant
+    if any(word in query.lower() for word in ["payment", "pay", "escrow", "fund", "money"]):
+        message_content += "\n\n💰 **Payment Security:** All transactions on Avalanche are protected by our escrow system. Funds are held securely until work is completed and approved."
+
+    # If links are present, append them to the content in a parseable format
+    if ai_response.get("links"):
+        links_json = json.dumps(ai_response["links"])
+        message_content += f"\n\n__LINKS__:{links_json}"
+
+    push = post_ava_reply(db, chat_id, message_content)
+
+    def push_reply():
+        push()
+        logger.info(f"✅ Ava responded in project chat {chat_id} with enhanced context")
+        if payload.get("likely_conclusion"):
+            logger.info(f"🎯 Likely negotiation end in project chat {chat_id}, confirming in background")
+            negotiation_detector.schedule_confirmation(chat_id)
+    return push_reply
+
+
+def post_ava_reply(db: Session, chat_id: int, content: str):
+    """Add an Ava message to the project chat; returns the push to run after commit"""
+    ava_message = ProjectChatMessage(
+        chat_id=chat_id,
+        sender_id=0,  # Special ID for Ava
+        content=content
+    )
+    db.add(ava_message)
+    db.flush()
+    return lambda: publish_message(ava_message)
 
 
 @router.get("/project-chats/{chat_id}/messages", response_model=List[ProjectChatMessageResponse])
@@ -328,7 +346,12 @@ async def get_project_chat_messages(
         ProjectChatMessage.chat_id == chat_id
     ).order_by(ProjectChatMessage.created_at.asc()).offset(skip).limit(limit).all()
 
-    return messages
+    # Serialize before committing the read cursor, which would expire every row
+    result = [ProjectChatMessageResponse.model_validate(msg) for msg in messages]
+    if messages:
+        read_state.commit_read(db, current_user.id, realtime_hub.project_chat_channel(chat_id),
+                               max(msg.id for msg in messages))
+    return result
 
 
 @router.get("/projects/{project_id}/chats", response_model=List[ProjectChatResponse])
@@ -15,6 +15,8 @@ from sqlalchemy.orm import Session
 from datetime import datetime
 from database import get_db, Project, User, Wallet, WalletTransaction, Payment, Order, WorkSubmission
 from auth import get_current_user
+import activity_log
+import notifications
 from pydantic import BaseModel
 from typing import Optional, List
 import cloudinary
@@ -272,6 +274,14 @@ async def fund_escrow(
     project.escrow_funded_at = datetime.utcnow()
     project.workflow_status = "escrow_funded"
     project.updated_at = datetime.utcnow()
+    notifications.notify(
+        db, project.freelancer_id, "project.escrow_funded", "Escrow Funded",
+        f"${project.escrow_amount:.2f} for {project.title} is held in escrow. You can start working.",
+        link=f"/projects/{project.id}", actor_id=current_user.id
+    )
+    activity_log.emit(db, current_user.id, "funded", "project", project.id,
+                      "guild" if project.guild_id else None, project.guild_id,
+                      extra={"title": project.title, "amount": float(project.escrow_amount or 0)})
 
     db.commit()
 
@@ -389,6 +399,14 @@ async def release_payment(
     project.payment_released_at = datetime.utcnow()
     project.escrow_funded = False  # Escrow is now empty
     project.updated_at = datetime.utcnow()
+    notifications.notify(
+        db, project.freelancer_id, "project.escrow_released", "Payment Released",
+        f"${project.escrow_amount:.2f} for {project.title} was released to your wallet",
+        link=f"/projects/{project.id}", actor_id=current_user.id
+    )
+    activity_log.emit(db, current_user.id, "released", "project", project.id,
+                      "guild" if project.guild_id else None, project.guild_id,
+                      extra={"title": project.title, "amount": float(project.escrow_amount or 0)})
 
     db.commit()
 
@@ -590,6 +608,9 @@ async def submit_work(
     # Update project status
     project.workflow_status = "pending_approval"
     project.updated_at = datetime.utcnow()
+    activity_log.emit(db, current_user.id, "submitted", "project", project.id,
+                      "guild" if project.guild_id else None, project.guild_id,
+                      extra={"title": project.title})
 
     db.commit()
     db.refresh(submission)
@@ -670,6 +691,14 @@ async def approve_work(
     project.payment_released_at = datetime.utcnow()
     project.escrow_funded = False  # Escrow is now released
     project.updated_at = datetime.utcnow()
+    notifications.notify(
+        db, project.freelancer_id, "project.escrow_released", "Work Approved",
+        f"Your work on {project.title} was approved and ${project.escrow_amount:.2f} released to your wallet",
+        link=f"/projects/{project.id}", actor_id=current_user.id
+    )
+    activity_log.emit(db, current_user.id, "released", "project", project.id,
+                      "guild" if project.guild_id else None, project.guild_id,
+                      extra={"title": project.title, "amount": float(project.escrow_amount or 0)})
 
     db.commit()
 
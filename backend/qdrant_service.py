@@ -5,11 +5,13 @@ Handles semantic search using vector embeddings with OpenAI and Qdrant Cloud
 
 from typing import List, Dict, Any, Optional
 import httpx
-from openai import OpenAI
 import os
 from dotenv import load_dotenv
 import logging
 
+import llm_gateway
+from single_flight import coalesce
+
 load_dotenv()
 
 # Configure logging
@@ -19,18 +21,13 @@ logger = logging.getLogger(__name__)
 # Initialize clients
 QDRANT_URL: Optional[str] = None
 QDRANT_API_KEY: Optional[str] = None
-openai_client: Optional[OpenAI] = None
 http_client: Optional[httpx.Client] = None
 
 def init_qdrant_clients():
-    global QDRANT_URL, QDRANT_API_KEY, openai_client, http_client
+    global QDRANT_URL, QDRANT_API_KEY, http_client
 
     QDRANT_URL = os.getenv("QDRANT_URL", "http://localhost:6333")
     QDRANT_API_KEY = os.getenv("QDRANT_API_KEY")
-    OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
-
-    # Initialize OpenAI client
-    openai_client = OpenAI(api_key=OPENAI_API_KEY) if OPENAI_API_KEY and OPENAI_API_KEY != "your-openai-api-key-here" else None
 
     # Initialize HTTP client for Qdrant REST API
     try:
@@ -57,20 +54,17 @@ PRODUCTS_COLLECTION = "products"
 GUILDS_COLLECTION = "guilds"
 
 
+@coalesce("embeddings.search")
 def get_embedding(text: str) -> Optional[List[float]]:
     """
     Generate embedding vector for text using OpenAI
     """
-    if not openai_client:
+    if not llm_gateway.is_configured():
         logger.warning("OpenAI client not initialized. Skipping embedding generation.")
         return None
 
     try:
-        response = openai_client.embeddings.create(
-            model=EMBEDDING_MODEL,
-            input=text
-        )
-        return response.data[0].embedding
+        return llm_gateway.embed("embeddings.search", text, model=EMBEDDING_MODEL)
     except Exception as e:
         logger.error(f"Error generating embedding: {e}")
         return None
@@ -117,7 +111,7 @@ def index_project(project_id: int, title: str, description: str, metadata: Dict[
     """
     Index a project in Qdrant for semantic search
     """
-    if not http_client or not openai_client:
+    if not http_client or not llm_gateway.is_configured():
         return False
 
     try:
@@ -161,7 +155,7 @@ def index_product(product_id: int, name: str, description: str, metadata: Dict[s
     """
     Index a product in Qdrant for semantic search
     """
-    if not http_client or not openai_client:
+    if not http_client or not llm_gateway.is_configured():
         return False
 
     try:
@@ -205,7 +199,7 @@ def index_guild(guild_id: int, name: str, description: str, metadata: Dict[str,
     """
     Index a guild in Qdrant for semantic search
     """
-    if not http_client or not openai_client:
+    if not http_client or not llm_gateway.is_configured():
         return False
 
     try:
@@ -245,11 +239,12 @@ def index_guild(guild_id: int, name: str, description: str, metadata: Dict[str,
         return False
 
 
+@coalesce("qdrant.search_projects")
 def semantic_search_projects(query: str, limit: int = 10, score_threshold: float = 0.7) -> List[Dict[str, Any]]:
     """
     Perform semantic search on projects
     """
-    if not http_client or not openai_client:
+    if not http_client or not llm_gateway.is_configured():
         logger.warning("Semantic search not available. OpenAI or Qdrant not configured.")
         return []
 
@@ -290,11 +285,12 @@ def semantic_search_projects(query: str, limit: int = 10, score_threshold: float
         return []
 
 
+@coalesce("qdrant.search_products")
 def semantic_search_products(query: str, limit: int = 10, score_threshold: float = 0.7) -> List[Dict[str, Any]]:
     """
     Perform semantic search on products
     """
-    if not http_client or not openai_client:
+    if not http_client or not llm_gateway.is_configured():
         logger.warning("Semantic search not available. OpenAI or Qdrant not configured.")
         return []
 
@@ -335,11 +331,12 @@ def semantic_search_products(query: str, limit: int = 10, score_threshold: float
         return []
 
 
+@coalesce("qdrant.search_guilds")
 def semantic_search_guilds(query: str, limit: int = 10, score_threshold: float = 0.7) -> List[Dict[str, Any]]:
     """
     Perform semantic search on guilds
     """
-    if not http_client or not openai_client:
+    if not http_client or not llm_gateway.is_configured():
         logger.warning("Semantic search not available. OpenAI or Qdrant not configured.")
         return []
 
@@ -380,6 +377,25 @@ def semantic_search_guilds(query: str, limit: int = 10, score_threshold: float =
         return []
 
 
+def search_points(collection_name: str, vector: List[float], limit: int = 10,
+                  score_threshold: Optional[float] = None) -> List[Dict[str, Any]]:
+    """
+    Raw vector search: scored points ({"id", "score", "payload"}) for an
+    embedding the caller already has. Raises on Qdrant errors.
+    """
+    search_payload = {
+        "vector": vector,
+        "limit": limit,
+        "with_payload": True
+    }
+    if score_threshold is not None:
+        search_payload["score_threshold"] = score_threshold
+
+    response = http_client.post(f"/collections/{collection_name}/points/search", json=search_payload)
+    response.raise_for_status()
+    return response.json().get("result", [])
+
+
 def delete_project(project_id: int):
     """
     Delete a project from the vector database
@@ -0,0 +1,180 @@
+"""
+Read State
+Per-user read cursors for direct messages, guild chats and project chats
+
+Read state is a (user, channel) -> last_read_message_id cursor, using the
+realtime channel names (dm:{low}:{high}, guild_chat:{guild_id},
+project_chat:{chat_id}). Opening a chat or acknowledging a message is one
+monotonic upsert, whatever the backlog: cursors only move forward, so
+repeated or out-of-order acknowledgements are harmless.
+
+- guild and project chat cursors are rows in read_cursors; their unread
+  counts are id-range counts on the (chat, id) indexes
+- direct message cursors are the per-participant columns on the
+  conversations row, next to the maintained unread counters (conversations.py)
+
+Every accepted move is pushed as read.updated on the user's own realtime
+channel so their other devices can clear badges.
+"""
+
+from typing import Dict, Optional
+from datetime import datetime
+from fastapi import APIRouter, Depends, HTTPException
+from pydantic import BaseModel
+from sqlalchemy import and_, func, or_
+from sqlalchemy.orm import Session
+import logging
+
+from database import get_db, User, ReadCursor, GuildChatMessage, ProjectChatMessage
+from auth import get_current_user
+from realtime_routes import can_access
+import conversations
+import realtime_hub
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(prefix="/read-state", tags=["Read State"])
+
+# Message table and chat column behind each cursor-backed channel kind
+_MESSAGES = {
+    "guild_chat": (GuildChatMessage, GuildChatMessage.guild_chat_id),
+    "project_chat": (ProjectChatMessage, ProjectChatMessage.chat_id),
+}
+
+
+def _upsert(db: Session):
+    dialect = db.get_bind().dialect.name
+    if dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    elif dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        return None
+    return insert
+
+
+def _advance(db: Session, user_id: int, channel: str, message_id: int) -> bool:
+    insert = _upsert(db)
+    now = datetime.utcnow()
+    if insert is None:
+        # No native upsert: update forward, insert if there was nothing to update
+        moved = db.query(ReadCursor).filter(
+            ReadCursor.user_id == user_id,
+            ReadCursor.channel == channel,
+            ReadCursor.last_read_message_id < message_id
+        ).update({ReadCursor.last_read_message_id: message_id, ReadCursor.updated_at: now}, synchronize_session=False)
+        if moved or get_cursor(db, user_id, channel) >= message_id:
+            return bool(moved)
+        db.add(ReadCursor(user_id=user_id, channel=channel, last_read_message_id=message_id, updated_at=now))
+        db.flush()
+        return True
+
+    statement = insert(ReadCursor).values(
+        user_id=user_id, channel=channel, last_read_message_id=message_id, updated_at=now
+    )
+    statement = statement.on_conflict_do_update(
+        index_elements=[ReadCursor.user_id, ReadCursor.channel],
+        set_={"last_read_message_id": statement.excluded.last_read_message_id, "updated_at": now},
+        where=ReadCursor.last_read_message_id < statement.excluded.last_read_message_id
+    )
+    return db.execute(statement).rowcount > 0
+
+
+def mark_read(db: Session, user_id: int, channel: str, message_id: int) -> bool:
+    """
+    Move user_id's cursor in channel forward to message_id (no-op if it is
+    already there or beyond). Returns whether it moved; the caller commits.
+    """
+    parsed = realtime_hub.parse_channel(channel)
+    if parsed is None:
+        raise ValueError(f"Unknown channel: {channel}")
+    kind, ids = parsed
+    if kind == "dm":
+        conversation = conversations.find(db, *ids)
+        if conversation is None:
+            return False
+        return conversations.mark_read(db, conversation, user_id, up_to=message_id)
+    if kind not in _MESSAGES:
+        raise ValueError(f"Channel has no read state: {channel}")
+    return _advance(db, user_id, channel, message_id)
+
+
+def commit_read(db: Session, user_id: int, channel: str, message_id: Optional[int]) -> bool:
+    """mark_read, commit and notify the user's other connections"""
+    if not message_id or not mark_read(db, user_id, channel, message_id):
+        return False
+    db.commit()
+    realtime_hub.publish(realtime_hub.user_channel(user_id), "read.updated", {
+        "channel": channel,
+        "last_read_message_id": message_id
+    })
+    return True
+
+
+def get_cursor(db: Session, user_id: int, channel: str) -> int:
+    return get_cursors(db, user_id, [channel]).get(channel, 0)
+
+
+def get_cursors(db: Session, user_id: int, channels) -> Dict[str, int]:
+    """Cursor per guild/project channel in one query (0 when never read)"""
+    channels = list(channels)
+    if not channels:
+        return {}
+    rows = db.query(ReadCursor.channel, ReadCursor.last_read_message_id).filter(
+        ReadCursor.user_id == user_id,
+        ReadCursor.channel.in_(channels)
+    ).all()
+    cursors = {channel: 0 for channel in channels}
+    cursors.update({channel: last_read for channel, last_read in rows})
+    return cursors
+
+
+def unread_counts(db: Session, user_id: int, kind: str, chat_ids: Dict[str, int]) -> Dict[str, int]:
+    """
+    Unread messages per channel for chats of one kind, given {channel: chat id}
+    (the chat id the message table references). Two queries: the cursors,
+    then one grouped count over an id range per chat. Own and deleted
+    messages don't count.
+    """
+    if not chat_ids:
+        return {}
+    model, chat_column = _MESSAGES[kind]
+    cursors = get_cursors(db, user_id, chat_ids)
+    rows = db.query(chat_column, func.count(model.id)).filter(
+        or_(*[and_(chat_column == chat_id, model.id > cursors[channel]) for channel, chat_id in chat_ids.items()]),
+        model.sender_id != user_id,
+        model.is_deleted == False
+    ).group_by(chat_column).all()
+    by_chat = dict(rows)
+    return {channel: by_chat.get(chat_id, 0) for channel, chat_id in chat_ids.items()}
+
+
+# ============================================================================
+# ENDPOINT
+# ============================================================================
+
+class ReadRequest(BaseModel):
+    channel: str
+    message_id: int
+
+
+@router.post("")
+async def acknowledge_read(
+    read_data: ReadRequest,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Mark everything up to message_id in a channel as read (dm:{low}:{high},
+    guild_chat:{guild_id} or project_chat:{chat_id}); idempotent
+    """
+    if read_data.channel.startswith("user:") or not can_access(current_user.id, read_data.channel):
+        raise HTTPException(status_code=403, detail="Not authorized for this channel")
+    moved = commit_read(db, current_user.id, read_data.channel, read_data.message_id)
+    if moved and read_data.channel.startswith("dm:"):
+        # The sender's client shows read receipts for direct messages
+        realtime_hub.publish(read_data.channel, "messages.read", {
+            "reader_id": current_user.id,
+            "last_read_id": read_data.message_id
+        })
+    return {"channel": read_data.channel, "message_id": read_data.message_id, "moved": moved}
@@ -0,0 +1,514 @@
+"""
+Realtime Hub
+Push delivery for direct messages, guild chat and project chat
+
+Clients hold one WebSocket (/realtime/ws) or SSE stream (/realtime/sse) and
+subscribe to channels instead of polling the message endpoints:
+
+    dm:{low_user_id}:{high_user_id}   direct messages between two users
+    guild_chat:{guild_id}             a guild's chat
+    project_chat:{chat_id}            a project negotiation chat
+    user:{user_id}                    personal events (always subscribed)
+
+Send handlers call publish() after their commit. Each event is encoded once
+and queued on every subscribed connection; a connection whose outbox fills
+up (a client that stopped reading) is closed rather than buffered without
+bound. Presence (presence.join / presence.leave when a user's first
+connection subscribes or last one leaves) and typing events are ephemeral and
+never stored. Events carry no history: after (re)connecting, a client loads
+the page once over REST and then applies events.
+
+Delivery inside a worker is in-process. Other workers are reached through a
+broker chosen by REALTIME_BROKER_URL:
+
+    (unset) / local            single worker, no broker
+    tcp://host:port            the stand-in relay: python realtime_hub.py broker --port 7070
+    redis://host:port/0        Redis pub/sub (needs the redis package)
+
+Run uvicorn with --ws-per-message-deflate false (as the Procfile does):
+frames are small JSON, and each socket's zlib state would cost ~90 KB.
+"""
+
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Set, Tuple
+from collections import defaultdict
+from urllib.parse import urlparse
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import threading
+import time
+import uuid
+import logging
+
+logger = logging.getLogger(__name__)
+
+REALTIME_BROKER_URL = os.getenv("REALTIME_BROKER_URL", "")
+# Frames queued per connection before a slow client is disconnected
+REALTIME_OUTBOX_SIZE = int(os.getenv("REALTIME_OUTBOX_SIZE", "256"))
+REALTIME_MAX_CONNECTIONS_PER_USER = int(os.getenv("REALTIME_MAX_CONNECTIONS_PER_USER", "10"))
+# SSE keep-alive comment interval (WebSockets use protocol pings)
+REALTIME_KEEPALIVE_SECONDS = float(os.getenv("REALTIME_KEEPALIVE_SECONDS", "25"))
+MAX_CHANNELS_PER_CONNECTION = 100
+# A user's typing events per channel are forwarded at most this often
+TYPING_MIN_INTERVAL_SECONDS = 2.0
+
+CHANNEL_KINDS = ("dm", "guild_chat", "project_chat", "user")
+
+
+def dm_channel(user_a: int, user_b: int) -> str:
+    low, high = sorted((int(user_a), int(user_b)))
+    return f"dm:{low}:{high}"
+
+
+def guild_chat_channel(guild_id: int) -> str:
+    return f"guild_chat:{guild_id}"
+
+
+def project_chat_channel(chat_id: int) -> str:
+    return f"project_chat:{chat_id}"
+
+
+def user_channel(user_id: int) -> str:
+    return f"user:{user_id}"
+
+
+def parse_channel(channel: str) -> Optional[Tuple[str, Tuple[int, ...]]]:
+    """('dm', (3, 9)) for 'dm:3:9'; None for anything malformed"""
+    kind, _, rest = channel.partition(":")
+    if kind not in CHANNEL_KINDS or not rest:
+        return None
+    try:
+        ids = tuple(int(part) for part in rest.split(":"))
+    except ValueError:
+        return None
+    if kind == "dm":
+        if len(ids) != 2 or ids[0] >= ids[1]:
+            return None
+    elif len(ids) != 1:
+        return None
+    return kind, ids
+
+
+def _json_default(value: Any) -> Any:
+    """Datetimes as ISO 8601 (like the REST responses); anything else as a string"""
+    return value.isoformat() if hasattr(value, "isoformat") else str(value)
+
+
+class Connection:
+    """One WebSocket or SSE client; frames wait in a bounded outbox"""
+
+    __slots__ = ("id", "user_id", "transport", "channels", "outbox", "overflowed", "closed", "connected_at")
+    _ids = itertools.count(1)
+
+    def __init__(self, user_id: int, transport: str, outbox_size: int):
+        self.id = next(self._ids)
+        self.user_id = user_id
+        self.transport = transport
+        self.channels: Set[str] = set()
+        self.outbox: asyncio.Queue = asyncio.Queue(outbox_size)
+        self.overflowed = False
+        self.closed = False
+        self.connected_at = time.time()
+
+    def offer(self, frame: str) -> bool:
+        try:
+            self.outbox.put_nowait(frame)
+            return True
+        except asyncio.QueueFull:
+            return False
+
+    def close(self):
+        """Wake the writer with the end-of-stream marker (None)"""
+        if self.closed:
+            return
+        self.closed = True
+        while True:
+            try:
+                self.outbox.put_nowait(None)
+                return
+            except asyncio.QueueFull:
+                self.outbox.get_nowait()
+
+
+# ============================================================================
+# BROKERS (cross-worker fan-out)
+# ============================================================================
+
+class Broker:
+    """Carries serialized events between workers; local delivery never waits on it"""
+
+    name = "local"
+
+    async def start(self, on_message: Callable[[str], Awaitable[None]]):
+        pass
+
+    async def publish(self, message: str):
+        pass
+
+    async def stop(self):
+        pass
+
+
+class LocalBroker(Broker):
+    """Single worker: everything is delivered in-process"""
+
+
+class TCPBroker(Broker):
+    """Newline-delimited JSON to the stand-in relay (run_relay); reconnects with backoff"""
+
+    name = "tcp"
+
+    def __init__(self, host: str, port: int):
+        self.host, self.port = host, port
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._task: Optional[asyncio.Task] = None
+        self._on_message = None
+        self.dropped = 0
+
+    async def start(self, on_message):
+        self._on_message = on_message
+        self._task = asyncio.create_task(self._run())
+
+    async def _run(self):
+        delay = 0.5
+        while True:
+            try:
+                reader, self._writer = await asyncio.open_connection(self.host, self.port, limit=2 ** 20)
+                logger.info(f"📡 Realtime broker connected: tcp://{self.host}:{self.port}")
+                delay = 0.5
+                while True:
+                    line = await reader.readline()
+                    if not line:
+                        break
+                    await self._on_message(line.decode())
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"⚠️ Realtime broker connection failed: {e}")
+            self._writer = None
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 10)
+
+    async def publish(self, message: str):
+        if self._writer is None:
+            self.dropped += 1
+            return
+        self._writer.write(message.encode() + b"\n")
+        await self._writer.drain()
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+        if self._writer:
+            self._writer.close()
+
+
+class RedisBroker(Broker):
+    """Redis pub/sub on one pattern subscription per worker"""
+
+    name = "redis"
+    CHANNEL_PREFIX = "avalanche:realtime:"
+
+    def __init__(self, url: str):
+        import redis.asyncio as redis_asyncio  # optional dependency, only for redis:// URLs
+        self._redis = redis_asyncio.from_url(url)
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self, on_message):
+        pubsub = self._redis.pubsub()
+        await pubsub.psubscribe(self.CHANNEL_PREFIX + "*")
+
+        async def listen():
+            async for item in pubsub.listen():
+                if item.get("type") == "pmessage":
+                    data = item["data"]
+                    await on_message(data.decode() if isinstance(data, bytes) else data)
+
+        self._task = asyncio.create_task(listen())
+
+    async def publish(self, message: str):
+        await self._redis.publish(self.CHANNEL_PREFIX + "events", message)
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+        await self._redis.close()
+
+
+def broker_from_url(url: str) -> Broker:
+    if not url or url == "local":
+        return LocalBroker()
+    parsed = urlparse(url)
+    if parsed.scheme == "tcp":
+        return TCPBroker(parsed.hostname or "127.0.0.1", parsed.port or 7070)
+    if parsed.scheme in ("redis", "rediss"):
+        return RedisBroker(url)
+    raise ValueError(f"Unsupported REALTIME_BROKER_URL: {url}")
+
+
+async def run_relay(host: str = "127.0.0.1", port: int = 7070):
+    """Stand-in broker: relays every line from one worker to all the others"""
+    peers: Set[asyncio.StreamWriter] = set()
+
+    async def handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        peers.add(writer)
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                for peer in list(peers):
+                    if peer is not writer:
+                        peer.write(line)
+        finally:
+            peers.discard(writer)
+            writer.close()
+
+    server = await asyncio.start_server(handle, host, port, limit=2 ** 20)
+    print(f"📡 Realtime relay listening on tcp://{host}:{port}")
+    async with server:
+        await server.serve_forever()
+
+
+# ============================================================================
+# HUB
+# ============================================================================
+
+class RealtimeHub:
+    """Channel subscriptions, presence and fan-out for one worker"""
+
+    def __init__(self, broker: Optional[Broker] = None, outbox_size: int = REALTIME_OUTBOX_SIZE,
+                 max_connections_per_user: int = REALTIME_MAX_CONNECTIONS_PER_USER):
+        self.worker_id = uuid.uuid4().hex[:12]
+        self.broker = broker or LocalBroker()
+        self.outbox_size = outbox_size
+        self.max_connections_per_user = max_connections_per_user
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self._connections: Dict[int, Connection] = {}
+        self._by_user: Dict[int, Set[Connection]] = defaultdict(set)
+        self._channels: Dict[str, Set[Connection]] = defaultdict(set)
+        # channel -> user -> local connection count
+        self._presence: Dict[str, Dict[int, int]] = defaultdict(dict)
+        # channel -> user -> workers that reported the user present
+        self._remote_presence: Dict[str, Dict[int, Set[str]]] = defaultdict(dict)
+        self._typing_at: Dict[Tuple[int, str], float] = {}
+        self._sequence = itertools.count(1)
+        self._lock = threading.Lock()  # stats only; hub state is touched on the loop thread
+        self.stats: Dict[str, int] = defaultdict(int)
+
+    # -- lifecycle ---------------------------------------------------------
+
+    async def start(self):
+        self.loop = asyncio.get_running_loop()
+        await self.broker.start(self._on_broker_message)
+        logger.info(f"⚡ Realtime hub started (worker {self.worker_id}, broker {self.broker.name})")
+
+    async def stop(self):
+        for connection in list(self._connections.values()):
+            connection.close()
+        await self.broker.stop()
+
+    # -- connections and subscriptions (event loop thread) ------------------
+
+    def connect(self, user_id: int, transport: str) -> Optional[Connection]:
+        if len(self._by_user[user_id]) >= self.max_connections_per_user:
+            self.stats["rejected_connections"] += 1
+            return None
+        connection = Connection(user_id, transport, self.outbox_size)
+        self._connections[connection.id] = connection
+        self._by_user[user_id].add(connection)
+        self.stats["connections_opened"] += 1
+        self.subscribe(connection, user_channel(user_id))
+        return connection
+
+    def disconnect(self, connection: Connection):
+        if self._connections.pop(connection.id, None) is None:
+            return
+        for channel in list(connection.channels):
+            self.unsubscribe(connection, channel)
+        users = self._by_user.get(connection.user_id)
+        if users is not None:
+            users.discard(connection)
+            if not users:
+                del self._by_user[connection.user_id]
+        connection.close()
+        self.stats["connections_closed"] += 1
+
+    def subscribe(self, connection: Connection, channel: str) -> bool:
+        if channel in connection.channels:
+            return True
+        if len(connection.channels) >= MAX_CHANNELS_PER_CONNECTION:
+            return False
+        counts = self._presence[channel]
+        counts[connection.user_id] = counts.get(connection.user_id, 0) + 1
+        if counts[connection.user_id] == 1 and not channel.startswith("user:"):
+            # Announced before joining: the subscribe reply already carries presence
+            self.publish(channel, "presence.join", {"user_id": connection.user_id})
+        connection.channels.add(channel)
+        self._channels[channel].add(connection)
+        return True
+
+    def unsubscribe(self, connection: Connection, channel: str):
+        if channel not in connection.channels:
+            return
+        connection.channels.discard(channel)
+        subscribers = self._channels.get(channel)
+        if subscribers is not None:
+            subscribers.discard(connection)
+            if not subscribers:
+                del self._channels[channel]
+        counts = self._presence.get(channel, {})
+        remaining = counts.get(connection.user_id, 1) - 1
+        if remaining > 0:
+            counts[connection.user_id] = remaining
+            return
+        counts.pop(connection.user_id, None)
+        if not counts:
+            self._presence.pop(channel, None)
+        if not channel.startswith("user:"):
+            self.publish(channel, "presence.leave", {"user_id": connection.user_id})
+
+    def presence(self, channel: str) -> List[int]:
+        local = set(self._presence.get(channel, {}))
+        remote = {user for user, workers in self._remote_presence.get(channel, {}).items() if workers}
+        return sorted(local | remote)
+
+    def typing(self, user_id: int, channel: str) -> bool:
+        """Forward a typing indicator unless the user sent one for this channel very recently"""
+        now = time.monotonic()
+        key = (user_id, channel)
+        if now - self._typing_at.get(key, 0.0) < TYPING_MIN_INTERVAL_SECONDS:
+            self.stats["typing_throttled"] += 1
+            return False
+        self._typing_at[key] = now
+        if len(self._typing_at) > 10000:
+            cutoff = now - TYPING_MIN_INTERVAL_SECONDS
+            self._typing_at = {k: t for k, t in self._typing_at.items() if t > cutoff}
+        self.publish(channel, "typing", {"user_id": user_id})
+        return True
+
+    # -- publishing (any thread) --------------------------------------------
+
+    def publish(self, channel: str, event: str, data: Dict[str, Any]):
+        """
+        Deliver an event to every subscriber of the channel, on this worker and
+        (through the broker) on the others. Safe to call from request handlers,
+        worker threads and background jobs; a no-op until the hub has started.
+        """
+        loop = self.loop
+        if loop is None or loop.is_closed():
+            self._bump("published_before_start")
+            return
+        frame = json.dumps({
+            "type": "event", "channel": channel, "event": event, "data": data,
+            "id": f"{self.worker_id}-{next(self._sequence)}", "ts": time.time(),
+        }, default=_json_default)
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is loop:
+            self._publish_on_loop(channel, event, data, frame)
+        else:
+            loop.call_soon_threadsafe(self._publish_on_loop, channel, event, data, frame)
+
+    def _publish_on_loop(self, channel: str, event: str, data: Dict[str, Any], frame: str):
+        self.stats["published"] += 1
+        self._deliver(channel, frame)
+        if not isinstance(self.broker, LocalBroker):
+            message = json.dumps({"origin": self.worker_id, "channel": channel, "event": event,
+                                  "user_id": data.get("user_id"), "frame": frame})
+            task = asyncio.ensure_future(self.broker.publish(message))
+            task.add_done_callback(self._broker_publish_done)
+
+    def _broker_publish_done(self, task: asyncio.Task):
+        if not task.cancelled() and task.exception() is not None:
+            self.stats["broker_errors"] += 1
+
+    def _deliver(self, channel: str, frame: str):
+        subscribers = self._channels.get(channel)
+        if not subscribers:
+            return
+        for connection in list(subscribers):
+            if connection.offer(frame):
+                self.stats["delivered"] += 1
+            elif not connection.overflowed:
+                connection.overflowed = True
+                self.stats["slow_consumers_dropped"] += 1
+                logger.warning(f"⚠️ Realtime connection {connection.id} (user {connection.user_id}) "
+                               f"fell {self.outbox_size} frames behind, closing it")
+                self.disconnect(connection)
+
+    async def _on_broker_message(self, raw: str):
+        try:
+            message = json.loads(raw)
+        except ValueError:
+            return
+        origin = message.get("origin")
+        if origin == self.worker_id:
+            return
+        self.stats["broker_received"] += 1
+        channel, event, user_id = message.get("channel"), message.get("event"), message.get("user_id")
+        if event in ("presence.join", "presence.leave") and user_id is not None:
+            workers = self._remote_presence[channel].setdefault(user_id, set())
+            if event == "presence.join":
+                workers.add(origin)
+            else:
+                workers.discard(origin)
+                if not workers:
+                    self._remote_presence[channel].pop(user_id, None)
+        self._deliver(channel, message["frame"])
+
+    def _bump(self, name: str):
+        with self._lock:
+            self.stats[name] += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        transports: Dict[str, int] = defaultdict(int)
+        for connection in list(self._connections.values()):
+            transports[connection.transport] += 1
+        return {
+            "worker_id": self.worker_id,
+            "broker": self.broker.name,
+            "started": self.loop is not None,
+            "connections": len(self._connections),
+            "transports": dict(transports),
+            "users_online": len(self._by_user),
+            "channels": len(self._channels),
+            **dict(self.stats),
+        }
+
+
+hub = RealtimeHub(broker_from_url(REALTIME_BROKER_URL))
+
+
+def publish(channel: str, event: str, data: Dict[str, Any]):
+    hub.publish(channel, event, data)
+
+
+def publish_many(channels: Iterable[str], event: str, data: Dict[str, Any]):
+    for channel in channels:
+        hub.publish(channel, event, data)
+
+
+def get_stats() -> Dict[str, Any]:
+    return hub.snapshot()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    subcommands = parser.add_subparsers(dest="command", required=True)
+    relay = subcommands.add_parser("broker", help="run the stand-in cross-worker relay")
+    relay.add_argument("--host", default="127.0.0.1")
+    relay.add_argument("--port", type=int, default=7070)
+    args = parser.parse_args()
+    try:
+        asyncio.run(run_relay(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
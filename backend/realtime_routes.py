@@ -0,0 +1,253 @@
+"""
+Realtime Endpoints
+WebSocket and SSE access to the realtime hub, authenticated with the usual JWT
+
+WebSocket /realtime/ws?token=<jwt>
+    Without ?token the first frame must be {"type": "auth", "token": "<jwt>"}.
+    Client frames: {"type": "subscribe" | "unsubscribe" | "typing", "channel": "..."},
+    {"type": "ping"}. Server frames: {"type": "ready"}, {"type": "subscribed",
+    "channel", "presence"}, {"type": "event", "channel", "event", "data", "id"},
+    {"type": "error", "detail"}, {"type": "pong"}.
+
+GET /realtime/sse?token=<jwt>&channels=dm:3:9,guild_chat:4
+    The same event frames as `data:` lines; typing goes through POST /realtime/typing.
+
+The personal user:{id} channel is always subscribed. Channel access is
+checked against the database once, when subscribing.
+"""
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, WebSocket, WebSocketDisconnect
+from fastapi.responses import StreamingResponse
+from starlette.concurrency import run_in_threadpool
+from pydantic import BaseModel
+from typing import Optional
+import asyncio
+import json
+import logging
+
+from database import SessionLocal, User, Guild, ProjectChat, guild_members
+from auth import get_current_user, get_current_admin, verify_token
+import realtime_hub
+from realtime_hub import hub, parse_channel, REALTIME_KEEPALIVE_SECONDS
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(prefix="/realtime", tags=["Realtime"])
+
+AUTH_TIMEOUT_SECONDS = 10
+WS_CLOSE_UNAUTHORIZED = 4401
+WS_CLOSE_TOO_MANY = 4429
+WS_CLOSE_SLOW_CONSUMER = 1013  # "try again later"
+
+
+class TypingRequest(BaseModel):
+    channel: str
+
+
+class _Unauthorized(Exception):
+    pass
+
+
+def authenticate(token: Optional[str]) -> Optional[int]:
+    """User id for a JWT, or None (runs a short query on its own session)"""
+    if not token:
+        return None
+    try:
+        token_data = verify_token(token, _Unauthorized())
+    except _Unauthorized:
+        return None
+    db = SessionLocal()
+    try:
+        user = db.query(User.id).filter(User.email == token_data.email, User.is_active != False).first()
+        return user.id if user else None
+    finally:
+        db.close()
+
+
+def can_access(user_id: int, channel: str) -> bool:
+    """Whether a user may subscribe to (and send typing events on) a channel"""
+    parsed = parse_channel(channel)
+    if parsed is None:
+        return False
+    kind, ids = parsed
+    if kind == "user":
+        return ids[0] == user_id
+    if kind == "dm":
+        return user_id in ids
+    db = SessionLocal()
+    try:
+        if kind == "guild_chat":
+            guild = db.query(Guild.owner_id).filter(Guild.id == ids[0]).first()
+            if guild is None:
+                return False
+            return guild.owner_id == user_id or db.query(guild_members).filter(
+                guild_members.c.user_id == user_id,
+                guild_members.c.guild_id == ids[0]
+            ).first() is not None
+        chat = db.query(ProjectChat).filter(ProjectChat.id == ids[0]).first()
+        if chat is None:
+            return False
+        project = chat.project
+        return user_id in (chat.freelancer_id, project.creator_id, project.owner_id)
+    finally:
+        db.close()
+
+
+async def _write_frames(websocket: WebSocket, connection: realtime_hub.Connection):
+    """Single writer per socket: drains the connection's outbox"""
+    try:
+        while True:
+            frame = await connection.outbox.get()
+            if frame is None:
+                break
+            await websocket.send_text(frame)
+    except Exception:
+        pass  # the reader notices the disconnect
+    finally:
+        code = WS_CLOSE_SLOW_CONSUMER if connection.overflowed else 1000
+        try:
+            await websocket.close(code=code)
+        except Exception:
+            pass
+
+
+def _frame(**payload) -> str:
+    return json.dumps(payload)
+
+
+@router.websocket("/ws")
+async def realtime_socket(websocket: WebSocket, token: Optional[str] = Query(None)):
+    """Bidirectional realtime connection (subscribe, typing, events)"""
+    user_id = await run_in_threadpool(authenticate, token) if token else None
+    if token and user_id is None:
+        await websocket.close(code=WS_CLOSE_UNAUTHORIZED)
+        return
+    await websocket.accept()
+
+    if user_id is None:
+        try:
+            first = json.loads(await asyncio.wait_for(websocket.receive_text(), AUTH_TIMEOUT_SECONDS))
+            user_id = await run_in_threadpool(authenticate, first.get("token")) if first.get("type") == "auth" else None
+        except (asyncio.TimeoutError, ValueError, AttributeError, WebSocketDisconnect):
+            user_id = None
+        if user_id is None:
+            await websocket.close(code=WS_CLOSE_UNAUTHORIZED)
+            return
+
+    connection = hub.connect(user_id, "ws")
+    if connection is None:
+        await websocket.close(code=WS_CLOSE_TOO_MANY)
+        return
+    writer = asyncio.create_task(_write_frames(websocket, connection))
+    connection.offer(_frame(type="ready", user_id=user_id, connection_id=connection.id,
+                            channels=sorted(connection.channels)))
+
+    try:
+        while not connection.closed:
+            raw = await websocket.receive_text()
+            try:
+                message = json.loads(raw)
+                kind, channel = message.get("type"), message.get("channel")
+            except (ValueError, AttributeError):
+                connection.offer(_frame(type="error", detail="Frames must be JSON objects"))
+                continue
+
+            if kind == "ping":
+                connection.offer(_frame(type="pong"))
+            elif kind == "subscribe" and isinstance(channel, str):
+                if not await run_in_threadpool(can_access, user_id, channel):
+                    connection.offer(_frame(type="error", channel=channel, detail="Not authorized for this channel"))
+                elif not hub.subscribe(connection, channel):
+                    connection.offer(_frame(type="error", channel=channel, detail="Too many subscriptions"))
+                else:
+                    connection.offer(_frame(type="subscribed", channel=channel, presence=hub.presence(channel)))
+            elif kind == "unsubscribe" and isinstance(channel, str):
+                hub.unsubscribe(connection, channel)
+                connection.offer(_frame(type="unsubscribed", channel=channel))
+            elif kind == "typing" and isinstance(channel, str):
+                if channel in connection.channels:
+                    hub.typing(user_id, channel)
+            else:
+                connection.offer(_frame(type="error", detail=f"Unknown frame type: {kind}"))
+    except WebSocketDisconnect:
+        pass
+    except Exception as e:
+        logger.warning(f"⚠️ Realtime socket for user {user_id} failed: {e}")
+    finally:
+        hub.disconnect(connection)
+        await writer
+
+
+@router.get("/sse")
+async def realtime_events(
+    request: Request,
+    token: str = Query(..., description="JWT (EventSource can't send headers)"),
+    channels: str = Query("", description="Comma-separated channels to subscribe to")
+):
+    """One-way realtime stream for clients that can't use WebSockets"""
+    user_id = await run_in_threadpool(authenticate, token)
+    if user_id is None:
+        raise HTTPException(status_code=401, detail="Could not validate credentials")
+    requested = [c.strip() for c in channels.split(",") if c.strip()]
+    if len(requested) > realtime_hub.MAX_CHANNELS_PER_CONNECTION:
+        raise HTTPException(status_code=400, detail="Too many channels")
+    for channel in requested:
+        if not await run_in_threadpool(can_access, user_id, channel):
+            raise HTTPException(status_code=403, detail=f"Not authorized for channel {channel}")
+
+    connection = hub.connect(user_id, "sse")
+    if connection is None:
+        raise HTTPException(status_code=429, detail="Too many realtime connections")
+    for channel in requested:
+        hub.subscribe(connection, channel)
+    ready = _frame(type="ready", user_id=user_id, connection_id=connection.id, channels=sorted(connection.channels))
+
+    async def stream():
+        try:
+            yield f"data: {ready}\n\n"
+            while True:
+                try:
+                    frame = await asyncio.wait_for(connection.outbox.get(), REALTIME_KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        break
+                    yield ": keepalive\n\n"
+                    continue
+                if frame is None:
+                    break
+                yield f"data: {frame}\n\n"
+        finally:
+            hub.disconnect(connection)
+
+    return StreamingResponse(stream(), media_type="text/event-stream", headers={
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no",  # don't let a proxy buffer the stream
+    })
+
+
+@router.post("/typing")
+async def send_typing(
+    typing_data: TypingRequest,
+    current_user: User = Depends(get_current_user)
+):
+    """Typing indicator for SSE clients (WebSocket clients send a typing frame)"""
+    if not await run_in_threadpool(can_access, current_user.id, typing_data.channel):
+        raise HTTPException(status_code=403, detail="Not authorized for this channel")
+    return {"forwarded": hub.typing(current_user.id, typing_data.channel)}
+
+
+@router.get("/presence")
+async def get_presence(
+    channel: str,
+    current_user: User = Depends(get_current_user)
+):
+    """Users currently connected to a channel"""
+    if not await run_in_threadpool(can_access, current_user.id, channel):
+        raise HTTPException(status_code=403, detail="Not authorized for this channel")
+    return {"channel": channel, "online_user_ids": hub.presence(channel)}
+
+
+@router.get("/stats")
+async def get_realtime_stats(current_admin = Depends(get_current_admin)):
+    """Connections, channels, fan-out and broker counters for this worker (admin only)"""
+    return realtime_hub.get_stats()
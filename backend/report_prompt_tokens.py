@@ -0,0 +1,192 @@
+"""
+Prompt Token Report
+Replays recorded conversations through three prompt assemblies and prints
+prompt tokens per intent:
+
+    legacy  - full system prompt, character-truncated history, capped data block
+    packed  - full system prompt, token-budgeted context packer
+    current - per-intent system prompt (core + modules), context packer
+
+Usage:
+    python report_prompt_tokens.py                      # ai_conversations in DATABASE_URL
+    python report_prompt_tokens.py --corpus turns.jsonl # exported turns
+    python report_prompt_tokens.py --json
+
+Corpus lines are {"session_id", "message", "response", "intent"} and may carry
+the "context" gather_context() produced for that turn. Recorded database turns
+have no stored context, so for them the report covers system prompt, memory
+and user message only.
+"""
+
+import argparse
+import json
+import statistics
+from collections import defaultdict
+from typing import Any, Dict, List
+
+import ai_prompts
+import context_packer
+from context_packer import count_tokens, MESSAGE_OVERHEAD_TOKENS
+
+
+def load_database_turns(limit: int) -> List[Dict[str, Any]]:
+    from database import SessionLocal, AIConversation
+
+    db = SessionLocal()
+    try:
+        rows = db.query(
+            AIConversation.id, AIConversation.session_id, AIConversation.user_message,
+            AIConversation.ai_response, AIConversation.intent
+        ).order_by(AIConversation.id.desc()).limit(limit).all()
+    finally:
+        db.close()
+    return [
+        {"session_id": row.session_id, "message": row.user_message, "response": row.ai_response,
+         "intent": row.intent or "general_question"}
+        for row in reversed(rows)
+    ]
+
+
+def load_corpus(path: str) -> List[Dict[str, Any]]:
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def _history_messages(history: List[Dict[str, Any]], tag_intent: bool) -> List[Dict[str, str]]:
+    messages = []
+    for turn in history:
+        content = turn["message"]
+        if tag_intent and turn["intent"] != "general_question":
+            content += f" [Context: {turn['intent']}]"
+        messages.append({"role": "user", "content": content})
+        messages.append({"role": "assistant", "content": turn["response"]})
+    return messages
+
+
+def legacy_messages(history: List[Dict[str, Any]], turn: Dict[str, Any]) -> List[Dict[str, str]]:
+    """Prompt as assembled before the context packer (unsummarized session)"""
+    messages = [{"role": "system", "content": ai_prompts.FULL_SYSTEM_PROMPT}]
+    total_length = sum(len(t["message"] + t["response"]) for t in history)
+    if total_length < 3000 and len(history) <= 12:
+        messages.extend(
+            m for t in history for m in (
+                {"role": "user", "content": f"{t['message']} [Intent: {t['intent']}]"},
+                {"role": "assistant", "content": t["response"]},
+            )
+        )
+    else:
+        recent = _history_messages(history[-8:], tag_intent=True)
+        if sum(len(m["content"]) for m in recent) > 3000:
+            recent = recent[-12:]
+        messages.extend(recent)
+
+    context = turn.get("context")
+    if context:
+        compact = {}
+        if context.get("matching_products"):
+            compact["products"] = [{"name": p["name"], "price": p["price"], "id": p["id"]} for p in context["matching_products"][:5]]
+        if context.get("guilds"):
+            compact["guilds"] = [{"name": g["name"], "desc": g.get("description", "")[:80]} for g in context["guilds"][:5]]
+        if context.get("projects"):
+            compact["projects"] = [{"title": p["title"], "desc": p.get("description", "")[:80]} for p in context["projects"][:5]]
+        if context.get("user_projects"):
+            compact["user_projects"] = [{"title": p["title"], "status": p.get("status", "")} for p in context["user_projects"][:3]]
+        if context.get("user_guilds"):
+            compact["user_guilds"] = [{"name": g["name"], "role": g.get("role", "member")} for g in context["user_guilds"][:3]]
+        if context.get("trending_products"):
+            compact["trending_products"] = [{"name": p["name"], "price": p["price"]} for p in context["trending_products"][:3]]
+        if context.get("platform_stats"):
+            compact["platform_stats"] = context["platform_stats"]
+        messages.append({"role": "system", "content": f"\nRelevant data:\n{json.dumps(compact)}"})
+
+    messages.append({"role": "user", "content": turn["message"]})
+    return messages
+
+
+def packed_messages(history: List[Dict[str, Any]], turn: Dict[str, Any], system_prompt: str) -> List[Dict[str, str]]:
+    memory = {"recent_messages": _history_messages(history[-25:], tag_intent=True), "summary": ""}
+    messages, _ = context_packer.build_messages(
+        [{"role": "system", "content": system_prompt}],
+        turn["message"], turn["intent"], turn.get("context"), memory
+    )
+    return messages
+
+
+STRATEGIES = {
+    "legacy": legacy_messages,
+    "packed": lambda history, turn: packed_messages(history, turn, ai_prompts.FULL_SYSTEM_PROMPT),
+    "current": lambda history, turn: packed_messages(history, turn, ai_prompts.build_system_prompt(turn["intent"])),
+}
+
+
+def prompt_tokens(messages: List[Dict[str, str]]) -> int:
+    return sum(count_tokens(m["content"]) + MESSAGE_OVERHEAD_TOKENS for m in messages)
+
+
+def percentile(values: List[int], pct: int) -> int:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def build_report(turns: List[Dict[str, Any]]) -> Dict[str, Any]:
+    sessions: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+    per_intent: Dict[str, Dict[str, List[int]]] = defaultdict(lambda: {name: [] for name in STRATEGIES})
+    for turn in turns:
+        history = sessions[turn["session_id"]]
+        samples = per_intent[turn["intent"]]
+        for name, assemble in STRATEGIES.items():
+            samples[name].append(prompt_tokens(assemble(history, turn)))
+        history.append(turn)
+
+    def summarize(values: List[int]) -> Dict[str, Any]:
+        return {"mean": round(statistics.mean(values), 1), "p95": percentile(values, 95), "max": max(values)}
+
+    def reduction(before: int, after: int) -> float:
+        return round(100 * (before - after) / before, 1) if before else 0.0
+
+    report = {"turns": len(turns), "intents": {}}
+    for intent, samples in sorted(per_intent.items()):
+        report["intents"][intent] = {
+            "turns": len(samples["legacy"]),
+            "system_prompt_tokens": count_tokens(ai_prompts.build_system_prompt(intent)),
+            **{name: summarize(values) for name, values in samples.items()},
+            "reduction_pct": reduction(sum(samples["legacy"]), sum(samples["current"])),
+        }
+    totals = {name: sum(sum(s[name]) for s in per_intent.values()) for name in STRATEGIES}
+    report["totals"] = totals
+    report["full_system_prompt_tokens"] = count_tokens(ai_prompts.FULL_SYSTEM_PROMPT)
+    report["reduction_pct"] = reduction(totals["legacy"], totals["current"])
+    return report
+
+
+def print_report(report: Dict[str, Any]):
+    print(f"{'intent':<24}{'turns':>6}{'sys':>6}  " + "".join(f"{name + ' mean/p95/max':>24}" for name in STRATEGIES) + f"{'saved':>8}")
+    for intent, row in report["intents"].items():
+        columns = "".join(f"{row[name]['mean']:>10}/{row[name]['p95']:>6}/{row[name]['max']:>6}" for name in STRATEGIES)
+        print(f"{intent:<24}{row['turns']:>6}{row['system_prompt_tokens']:>6}  {columns}{row['reduction_pct']:>7}%")
+    totals = report["totals"]
+    print(f"\n{report['turns']} turns, full system prompt {report['full_system_prompt_tokens']} tokens")
+    print("prompt tokens: " + ", ".join(f"{name} {totals[name]}" for name in STRATEGIES)
+          + f" ({report['reduction_pct']}% saved)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--corpus", help="JSONL file of recorded turns (default: read ai_conversations)")
+    parser.add_argument("--limit", type=int, default=5000, help="most recent database turns to replay")
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    args = parser.parse_args()
+
+    turns = load_corpus(args.corpus) if args.corpus else load_database_turns(args.limit)
+    if not turns:
+        print("No recorded turns to replay")
+        return
+    report = build_report(turns)
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_report(report)
+
+
+if __name__ == "__main__":
+    main()
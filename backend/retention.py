@@ -0,0 +1,318 @@
+"""
+Retention
+Archival of old chat/AI history and purging of soft-deleted chat messages
+
+Per-table policies keep the hot tables (and their indexes) bounded:
+
+- archive: rows older than the policy's days move, in batches of
+  RETENTION_BATCH_SIZE ordered by id, into gzip JSONL segments under
+  RETENTION_ARCHIVE_DIR. Each batch writes its file, records it in
+  archive_segments (with the chats it covers in archive_segment_scopes) and
+  deletes the rows in one short transaction, so no long locks are held and
+  a crash never loses or half-deletes a batch (an unrecorded file is ignored)
+- purge: soft-deleted guild/project chat messages older than
+  RETENTION_SOFT_DELETED_DAYS are deleted outright, also in batches
+
+Every chat keeps its newest message in the hot table (the inbox and chat
+lists point at it), and AI conversation turns are only archived once their
+usage has been flushed (ai_token_manager). Archiving needs persistent
+storage, so it only runs when RETENTION_ARCHIVE_DIR is set; purging always
+runs. A policy with 0 days is off.
+
+Runs are jobs on the job queue (retention.run), each rescheduling the next,
+so one worker runs it at a time. Archived history stays readable through
+archived_history() and GET /archive/{channel}.
+"""
+
+from typing import Any, Dict, List, Optional
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy import and_, exists, inspect as sqlalchemy_inspect
+from sqlalchemy.orm import Session, aliased
+import gzip
+import json
+import os
+import time
+import logging
+
+from database import (
+    get_db, User, Message, Conversation, GuildChat, GuildChatMessage, ProjectChatMessage,
+    AIConversation, AIConversationSummary, ArchiveSegment, ArchiveSegmentScope, Job
+)
+from auth import get_current_user
+from realtime_routes import can_access
+import conversations
+import job_queue
+import realtime_hub
+
+logger = logging.getLogger(__name__)
+
+RETENTION_ARCHIVE_DIR = os.getenv("RETENTION_ARCHIVE_DIR", "")
+RETENTION_MESSAGES_DAYS = int(os.getenv("RETENTION_MESSAGES_DAYS", "365"))
+RETENTION_GUILD_CHAT_DAYS = int(os.getenv("RETENTION_GUILD_CHAT_DAYS", "365"))
+RETENTION_PROJECT_CHAT_DAYS = int(os.getenv("RETENTION_PROJECT_CHAT_DAYS", "730"))
+RETENTION_AI_CONVERSATIONS_DAYS = int(os.getenv("RETENTION_AI_CONVERSATIONS_DAYS", "90"))
+RETENTION_SOFT_DELETED_DAYS = int(os.getenv("RETENTION_SOFT_DELETED_DAYS", "30"))
+RETENTION_BATCH_SIZE = int(os.getenv("RETENTION_BATCH_SIZE", "1000"))
+# Batches per policy per run; a run that hits it comes back sooner
+RETENTION_MAX_BATCHES = int(os.getenv("RETENTION_MAX_BATCHES", "50"))
+RETENTION_BATCH_PAUSE_SECONDS = float(os.getenv("RETENTION_BATCH_PAUSE_SECONDS", "0.1"))
+RETENTION_INTERVAL_HOURS = float(os.getenv("RETENTION_INTERVAL_HOURS", "6"))
+RETENTION_BACKLOG_DELAY_SECONDS = 60
+
+router = APIRouter(prefix="/archive", tags=["Archive"])
+
+
+@dataclass
+class Policy:
+    table: str
+    model: Any
+    scope_column: Any  # The chat (or user) a row belongs to
+    archive_days: int
+    soft_delete_column: Any = None
+
+    def archivable(self, cutoff: datetime):
+        """Rows old enough to archive that must not stay hot"""
+        model = self.model
+        criteria = [model.created_at < cutoff]
+        if self.soft_delete_column is not None:
+            criteria.append(self.soft_delete_column == False)  # purged instead
+        if model is Message:
+            criteria.append(~exists().where(Conversation.last_message_id == Message.id))
+        elif model is AIConversation:
+            criteria.append(AIConversation.usage_flushed == True)
+        else:
+            # The chat's newest message stays for chat lists
+            newer = aliased(model)
+            newer_scope = getattr(newer, self.scope_column.key)
+            criteria.append(exists().where(and_(
+                newer_scope == self.scope_column, newer.id > model.id, newer.is_deleted == False
+            )))
+        return and_(*criteria)
+
+
+def policies() -> List[Policy]:
+    return [
+        Policy("messages", Message, Message.conversation_id, RETENTION_MESSAGES_DAYS),
+        Policy("guild_chat_messages", GuildChatMessage, GuildChatMessage.guild_chat_id, RETENTION_GUILD_CHAT_DAYS,
+               soft_delete_column=GuildChatMessage.is_deleted),
+        Policy("project_chat_messages", ProjectChatMessage, ProjectChatMessage.chat_id, RETENTION_PROJECT_CHAT_DAYS,
+               soft_delete_column=ProjectChatMessage.is_deleted),
+        Policy("ai_conversations", AIConversation, AIConversation.user_id, RETENTION_AI_CONVERSATIONS_DAYS),
+    ]
+
+
+def _policy(table: str) -> Policy:
+    return next(policy for policy in policies() if policy.table == table)
+
+
+def _record(row) -> Dict[str, Any]:
+    return {column.key: getattr(row, column.key) for column in sqlalchemy_inspect(type(row)).column_attrs}
+
+
+def _write_segment(archive_dir: str, table: str, records: List[Dict[str, Any]]) -> str:
+    """Write records as a gzip JSONL file; returns its path relative to archive_dir"""
+    first, last = records[0], records[-1]
+    relative = os.path.join(table, f"{first['created_at']:%Y-%m}", f"{first['id']}-{last['id']}.jsonl.gz")
+    path = os.path.join(archive_dir, relative)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with gzip.open(path + ".tmp", "wt", encoding="utf-8") as segment:
+        for record in records:
+            segment.write(json.dumps(record, default=lambda value: value.isoformat()) + "\n")
+    os.replace(path + ".tmp", path)
+    return relative
+
+
+def archive_batch(db: Session, policy: Policy, cutoff: datetime, archive_dir: str) -> int:
+    """Move one batch of old rows to a segment; returns rows archived"""
+    model = policy.model
+    rows = db.query(model).filter(policy.archivable(cutoff)).order_by(model.id).limit(RETENTION_BATCH_SIZE).all()
+    if not rows:
+        return 0
+    records = [_record(row) for row in rows]
+    relative = _write_segment(archive_dir, policy.table, records)
+    try:
+        segment = ArchiveSegment(
+            table_name=policy.table,
+            path=relative,
+            first_id=records[0]["id"],
+            last_id=records[-1]["id"],
+            row_count=len(records),
+            oldest_at=min(record["created_at"] for record in records),
+            newest_at=max(record["created_at"] for record in records)
+        )
+        db.add(segment)
+        db.flush()
+        scopes = {record[policy.scope_column.key] for record in records} - {None}
+        db.bulk_insert_mappings(ArchiveSegmentScope, [
+            {"segment_id": segment.id, "table_name": policy.table, "scope_id": scope_id} for scope_id in scopes
+        ])
+        db.query(model).filter(model.id.in_([record["id"] for record in records])).delete(synchronize_session=False)
+        if model is AIConversation:
+            # Summaries go once none of their session's turns are left
+            db.query(AIConversationSummary).filter(
+                AIConversationSummary.updated_at < cutoff,
+                ~exists().where(AIConversation.session_id == AIConversationSummary.session_id)
+            ).delete(synchronize_session=False)
+        db.commit()
+    except Exception:
+        db.rollback()
+        os.remove(os.path.join(archive_dir, relative))
+        raise
+    return len(records)
+
+
+def purge_batch(db: Session, policy: Policy, cutoff: datetime) -> int:
+    """Delete one batch of soft-deleted rows; returns rows deleted"""
+    model = policy.model
+    ids = [row.id for row in db.query(model.id).filter(
+        policy.soft_delete_column == True, model.created_at < cutoff
+    ).order_by(model.id).limit(RETENTION_BATCH_SIZE)]
+    if not ids:
+        return 0
+    db.query(model).filter(model.id.in_(ids)).delete(synchronize_session=False)
+    db.commit()
+    return len(ids)
+
+
+def _drain(db: Session, step, max_batches: int) -> Dict[str, Any]:
+    rows, batches = 0, 0
+    while batches < max_batches:
+        done = step()
+        if not done:
+            break
+        rows += done
+        batches += 1
+        job_queue.heartbeat(db)  # a run can outlast the job lock; stops here if it was reclaimed
+        time.sleep(RETENTION_BATCH_PAUSE_SECONDS)
+    return {"rows": rows, "batches": batches, "backlog": batches == max_batches}
+
+
+def run_retention(db: Session, now: Optional[datetime] = None, archive_dir: Optional[str] = None,
+                  max_batches: int = RETENTION_MAX_BATCHES) -> Dict[str, Any]:
+    """Apply every policy once (bounded by max_batches each); returns what was moved per table"""
+    now = now or datetime.utcnow()
+    archive_dir = RETENTION_ARCHIVE_DIR if archive_dir is None else archive_dir
+    report = {}
+    for policy in policies():
+        result = {}
+        if policy.soft_delete_column is not None and RETENTION_SOFT_DELETED_DAYS > 0:
+            cutoff = now - timedelta(days=RETENTION_SOFT_DELETED_DAYS)
+            result["purged"] = _drain(db, lambda: purge_batch(db, policy, cutoff), max_batches)
+        if archive_dir and policy.archive_days > 0:
+            cutoff = now - timedelta(days=policy.archive_days)
+            result["archived"] = _drain(db, lambda: archive_batch(db, policy, cutoff, archive_dir), max_batches)
+        report[policy.table] = result
+        moved = {action: outcome["rows"] for action, outcome in result.items() if outcome["rows"]}
+        if moved:
+            logger.info(f"🧹 Retention on {policy.table}: {moved}")
+    return report
+
+
+def archived_history(db: Session, table: str, scope_id: int, before_id: Optional[int] = None,
+                     limit: int = 50, archive_dir: Optional[str] = None) -> List[Dict[str, Any]]:
+    """A chat's archived rows (dicts), newest first, older than before_id"""
+    archive_dir = RETENTION_ARCHIVE_DIR if archive_dir is None else archive_dir
+    policy = _policy(table)
+    segments = db.query(ArchiveSegment).join(
+        ArchiveSegmentScope, ArchiveSegmentScope.segment_id == ArchiveSegment.id
+    ).filter(
+        ArchiveSegmentScope.table_name == table,
+        ArchiveSegmentScope.scope_id == scope_id
+    )
+    if before_id is not None:
+        segments = segments.filter(ArchiveSegment.first_id < before_id)
+
+    found: List[Dict[str, Any]] = []
+    for segment in segments.order_by(ArchiveSegment.last_id.desc()):
+        with gzip.open(os.path.join(archive_dir, segment.path), "rt", encoding="utf-8") as lines:
+            rows = [json.loads(line) for line in lines]
+        found.extend(
+            row for row in reversed(rows)
+            if row[policy.scope_column.key] == scope_id and (before_id is None or row["id"] < before_id)
+        )
+        if len(found) >= limit:
+            break
+    return found[:limit]
+
+
+# ============================================================================
+# SCHEDULING (job queue)
+# ============================================================================
+
+def schedule(db: Session):
+    """Queue a retention run unless one is already queued or running (called on startup)"""
+    pending = db.query(Job.id).filter(Job.kind == "retention.run", Job.status.in_(["queued", "running"])).first()
+    if pending is None:
+        job_queue.enqueue(db, "retention.run", {})
+        db.commit()
+
+
+def _retry_next_interval(db: Session, payload: dict, error: str):
+    # A dead-lettered run must not end the chain; the next interval tries again
+    job_queue.enqueue(db, "retention.run", {}, delay_seconds=RETENTION_INTERVAL_HOURS * 3600)
+    return None
+
+
+@job_queue.handler("retention.run", on_dead=_retry_next_interval)
+def retention_job(db: Session, payload: dict):
+    report = run_retention(db)
+    backlog = any(outcome["backlog"] for result in report.values() for outcome in result.values())
+    # The next run is queued with this one's completion
+    job_queue.enqueue(db, "retention.run", {},
+                      delay_seconds=RETENTION_BACKLOG_DELAY_SECONDS if backlog else RETENTION_INTERVAL_HOURS * 3600)
+    return None
+
+
+def get_stats(db: Session) -> Dict[str, Any]:
+    segments = db.query(ArchiveSegment.table_name, ArchiveSegment.row_count).all()
+    archived: Dict[str, Dict[str, int]] = {}
+    for table, row_count in segments:
+        totals = archived.setdefault(table, {"segments": 0, "rows": 0})
+        totals["segments"] += 1
+        totals["rows"] += row_count
+    return {
+        "archiving": bool(RETENTION_ARCHIVE_DIR),
+        "policies": {policy.table: policy.archive_days for policy in policies()},
+        "soft_deleted_days": RETENTION_SOFT_DELETED_DAYS,
+        "archived": archived,
+    }
+
+
+# ============================================================================
+# ENDPOINT
+# ============================================================================
+
+@router.get("/{channel}")
+async def get_archived_history(
+    channel: str,
+    before: Optional[int] = None,
+    limit: int = 50,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Archived messages of a chat (dm:{low}:{high}, guild_chat:{guild_id} or
+    project_chat:{chat_id}), newest first, older than message id `before`
+    """
+    parsed = realtime_hub.parse_channel(channel)
+    if parsed is None or parsed[0] == "user" or not can_access(current_user.id, channel):
+        raise HTTPException(status_code=403, detail="Not authorized for this channel")
+    kind, ids = parsed
+    limit = max(1, min(limit, 100))
+
+    if kind == "dm":
+        conversation = conversations.find(db, *ids)
+        if conversation is None:
+            return {"messages": []}
+        rows = archived_history(db, "messages", conversation.id, before, limit * 2)
+        # Ava's replies are private to the user who asked
+        rows = [row for row in rows if row["sender_id"] != conversations.AVA_SENDER_ID
+                or row["recipient_id"] == current_user.id][:limit]
+    elif kind == "guild_chat":
+        guild_chat = db.query(GuildChat).filter(GuildChat.guild_id == ids[0]).first()
+        rows = archived_history(db, "guild_chat_messages", guild_chat.id, before, limit) if guild_chat else []
+    else:
+        rows = archived_history(db, "project_chat_messages", ids[0], before, limit)
+    return {"messages": rows}
@@ -375,6 +375,7 @@ class ProjectChatResponse(BaseModel):
     status: str
     last_message_at: datetime
     created_at: datetime
+    unread_count: int = 0
 
     class Config:
         from_attributes = True
@@ -4,6 +4,7 @@ Script to seed the database with sample data for development and testing
 """
 
 from database import SessionLocal, User, Guild, Project, Product, Message, Order, Escrow, Payment, init_db
+import migrate_conversations
 from auth import get_password_hash
 import random
 from datetime import datetime, timedelta
@@ -210,6 +211,7 @@ def seed_database():
             db.add(message)
         
         db.commit()
+        migrate_conversations.migrate()  # thread the new messages into conversations
         print("✅ Created 15 sample messages")
         
         print("\n" + "="*50)
@@ -3,6 +3,7 @@ Seed script to add sample messages to the database
 """
 
 from database import SessionLocal, User, Message
+import migrate_conversations
 from datetime import datetime, timedelta
 import random
 
@@ -65,6 +66,7 @@ def seed_messages():
                 messages_created += 1
         
         db.commit()
+        migrate_conversations.migrate()  # thread the new messages into conversations
         print(f"✅ Successfully created {messages_created} sample messages!")
         print(f"📨 Created conversations between {min(3, len(users) - 1)} pairs of users")
         
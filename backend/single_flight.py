@@ -0,0 +1,225 @@
+"""
+Single-Flight Request Coalescing
+Concurrent identical calls share one in-flight computation
+
+While a call for a key is running, further calls with the same key wait for
+it and receive the same result (or exception) instead of running again. Once
+it finishes the key is released, so this is not a cache: a call that starts
+after the leader finished computes fresh data.
+
+Sync callers block on the shared result; async callers await it without
+blocking the event loop. The coalesce() decorator keys calls by function and
+arguments (Session arguments are ignored, ORM objects are keyed by id):
+
+    @coalesce("embeddings.search")
+    def get_embedding(text): ...
+
+    @coalesce("admin.stats_overview")
+    def overview_stats(db): ...
+    stats = await overview_stats.run_async(db)   # leader runs in the threadpool
+
+Results are shared between callers, so they must be treated as read-only.
+"""
+
+from typing import Any, Callable, Dict, Hashable, Iterable, Optional, Tuple
+from concurrent.futures import Future
+from contextvars import copy_context
+import asyncio
+import functools
+import inspect
+import threading
+import logging
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_IGNORED_ARGS = ("db",)
+
+
+class SingleFlight:
+    """In-flight calls for one operation, keyed by an arbitrary hashable key"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, Future] = {}
+        self._tasks = set()  # strong refs to async leaders
+        self.calls = 0
+        self.executions = 0
+        self.collapsed = 0
+        self.errors = 0
+
+    def _join(self, key: Hashable) -> Tuple[Future, bool]:
+        """Return the key's in-flight future and whether the caller must run it"""
+        with self._lock:
+            self.calls += 1
+            future = self._calls.get(key)
+            if future is not None:
+                self.collapsed += 1
+                return future, False
+            future = Future()
+            # Running futures can't be cancelled, so one impatient waiter
+            # can't fail the call for everybody else
+            future.set_running_or_notify_cancel()
+            self._calls[key] = future
+            self.executions += 1
+            return future, True
+
+    def _finish(self, key: Hashable, future: Future, result: Any = None, error: Optional[BaseException] = None):
+        with self._lock:
+            # Release the key before resolving: later callers start a fresh call
+            self._calls.pop(key, None)
+            if error is not None:
+                self.errors += 1
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+
+    def _lead(self, key: Hashable, future: Future, fn: Callable, args: tuple, kwargs: dict) -> Any:
+        try:
+            result = fn(*args, **kwargs)
+        except BaseException as e:
+            self._finish(key, future, error=e)
+            raise
+        self._finish(key, future, result)
+        return result
+
+    def do(self, key: Hashable, fn: Callable, *args, **kwargs) -> Any:
+        """Run fn(*args, **kwargs) unless an identical call is in flight; then share its result"""
+        future, leader = self._join(key)
+        if leader:
+            return self._lead(key, future, fn, args, kwargs)
+        return future.result()
+
+    async def do_async(self, key: Hashable, fn: Callable, *args, **kwargs) -> Any:
+        """
+        Async variant. Coroutine functions run as a task on the current loop,
+        plain functions in the loop's default executor; either way the call
+        completes even if the caller that started it is cancelled.
+        """
+        future, leader = self._join(key)
+        if leader:
+            if inspect.iscoroutinefunction(fn):
+                task = asyncio.ensure_future(self._lead_async(key, future, fn, args, kwargs))
+                self._tasks.add(task)
+                task.add_done_callback(self._tasks.discard)
+            else:
+                # run_in_executor doesn't carry contextvars (request tracing) over
+                asyncio.get_running_loop().run_in_executor(
+                    None, functools.partial(copy_context().run, self._lead_quietly, key, future, fn, args, kwargs)
+                )
+        return await asyncio.wrap_future(future)
+
+    async def _lead_async(self, key, future, fn, args, kwargs):
+        try:
+            result = await fn(*args, **kwargs)
+        except BaseException as e:
+            self._finish(key, future, error=e)
+            return
+        self._finish(key, future, result)
+
+    def _lead_quietly(self, key, future, fn, args, kwargs):
+        # Errors reach the waiters through the future
+        try:
+            self._lead(key, future, fn, args, kwargs)
+        except BaseException:
+            pass
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "calls": self.calls,
+                "executions": self.executions,
+                "collapsed": self.collapsed,
+                "errors": self.errors,
+                "in_flight": len(self._calls),
+                "collapse_rate": round(self.collapsed / self.calls, 3) if self.calls else 0.0,
+            }
+
+
+_registry_lock = threading.Lock()
+_registry: Dict[str, SingleFlight] = {}
+
+
+def get_flight(name: str) -> SingleFlight:
+    """Shared SingleFlight for an operation name (created on first use)"""
+    with _registry_lock:
+        flight = _registry.get(name)
+        if flight is None:
+            flight = _registry[name] = SingleFlight(name)
+        return flight
+
+
+def freeze(value: Any) -> Hashable:
+    """Hashable stand-in for an argument value"""
+    if isinstance(value, (str, int, float, bool, bytes, type(None))):
+        return value
+    if isinstance(value, (list, tuple)):
+        return tuple(freeze(v) for v in value)
+    if isinstance(value, dict):
+        return tuple(sorted((str(k), freeze(v)) for k, v in value.items()))
+    if isinstance(value, (set, frozenset)):
+        return tuple(sorted(repr(freeze(v)) for v in value))
+    if hasattr(value, "__table__") and hasattr(value, "id"):
+        # ORM instance: identity, not state
+        return (type(value).__name__, value.id)
+    try:
+        hash(value)
+        return value
+    except TypeError:
+        return repr(value)
+
+
+def coalesce(name: Optional[str] = None, key: Optional[Callable[..., Hashable]] = None,
+             ignore: Iterable[str] = DEFAULT_IGNORED_ARGS):
+    """
+    Decorator: coalesce concurrent calls with equal arguments. Works on sync
+    and async functions; sync functions also get `.run_async(...)` for use
+    from async endpoints. `key` overrides argument-based keys; arguments named
+    in `ignore` (the request's db Session by default) are left out of the key.
+    Followers share the leader's result, so it must be plain data (dicts,
+    Pydantic models), never ORM rows bound to the leader's session.
+    """
+    ignored = frozenset(ignore)
+
+    def decorate(fn: Callable) -> Callable:
+        flight = get_flight(name or f"{fn.__module__}.{fn.__qualname__}")
+        signature = inspect.signature(fn)
+
+        def make_key(args: tuple, kwargs: dict) -> Hashable:
+            if key is not None:
+                return key(*args, **kwargs)
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            return tuple((arg, freeze(value)) for arg, value in bound.arguments.items() if arg not in ignored)
+
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                return await flight.do_async(make_key(args, kwargs), fn, *args, **kwargs)
+            async_wrapper.flight = flight
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            return flight.do(make_key(args, kwargs), fn, *args, **kwargs)
+
+        async def run_async(*args, **kwargs):
+            return await flight.do_async(make_key(args, kwargs), fn, *args, **kwargs)
+
+        wrapper.flight = flight
+        wrapper.run_async = run_async
+        return wrapper
+
+    return decorate
+
+
+def get_stats() -> Dict[str, Any]:
+    with _registry_lock:
+        flights = dict(_registry)
+    operations = {name: flight.snapshot() for name, flight in sorted(flights.items())}
+    return {
+        "collapsed": sum(op["collapsed"] for op in operations.values()),
+        "executions": sum(op["executions"] for op in operations.values()),
+        "operations": operations,
+    }
@@ -0,0 +1,456 @@
+"""
+Spelling Correction Service
+Local SymSpell-style correction for search queries
+
+The dictionary is built from product names and categories, product keywords,
+guild names and categories, and common skill terms. Each word is weighted by
+how often it occurs. Deletes up to MAX_EDIT_DISTANCE are precomputed for every
+word, so a lookup only generates the deletes of the query word and probes a
+hash table: microseconds per word and no network round trip.
+
+Writes in this process are applied through change_tracker as deltas: the
+words of a row's old text are taken back and those of its new text added,
+so an update that leaves the text alone changes nothing. Writes in other
+workers are picked up by the periodic reload (SPELL_DICTIONARY_REFRESH_SECONDS).
+Once start() has run, reloads happen on a background thread and requests only
+read the published dictionary; deltas that arrive while a reload is querying
+are replayed onto the new dictionary before it is published.
+
+Run `python spell_correction.py` for a typo benchmark over the dictionary.
+"""
+
+from typing import List, Dict, Any, Optional, Set, Iterable, Tuple
+from collections import Counter, deque
+from dataclasses import dataclass
+import os
+import re
+import random
+import time
+import threading
+import logging
+
+from database import SessionLocal, Product, ProductKeyword, Guild
+import change_tracker
+from product_keyword_index import PRODUCT_TERMS, STOPWORDS
+
+logger = logging.getLogger(__name__)
+
+SPELL_DICTIONARY_REFRESH_SECONDS = int(os.getenv("SPELL_DICTIONARY_REFRESH_SECONDS", "600"))
+
+MAX_EDIT_DISTANCE = 2
+# Only the first PREFIX_LENGTH characters get deletes, which bounds memory for long words
+PREFIX_LENGTH = 7
+MIN_WORD_LENGTH = 3
+
+# Skills and roles users search collaborators by (there is no skills table)
+SKILL_TERMS = [
+    "developer", "programmer", "coder", "engineer", "designer", "graphic", "visual",
+    "writer", "content", "copywriter", "author", "marketer", "marketing", "seo",
+    "artist", "illustrator", "creative", "manager", "photographer", "videographer",
+    "editor", "animator", "translator", "consultant", "accountant", "frontend",
+    "backend", "fullstack", "mobile", "python", "javascript", "react", "django",
+]
+
+# Extra weight for curated vocabulary over words seen once in a product name
+CURATED_WEIGHT = 50
+
+_WORD_RE = re.compile(r"[a-z]+")
+
+
+def tokenize(text: str) -> List[str]:
+    return _WORD_RE.findall(text.lower())
+
+
+def edit_distance(a: str, b: str, max_distance: int) -> int:
+    """
+    Optimal string alignment distance (Damerau-Levenshtein with adjacent swaps).
+    Returns max_distance + 1 as soon as the distance is known to exceed max_distance.
+    """
+    if a == b:
+        return 0
+    la, lb = len(a), len(b)
+    if abs(la - lb) > max_distance:
+        return max_distance + 1
+
+    previous2: List[int] = []
+    previous = list(range(lb + 1))
+    for i in range(1, la + 1):
+        current = [i] + [0] * lb
+        row_min = i
+        for j in range(1, lb + 1):
+            cost = 0 if a[i - 1] == b[j - 1] else 1
+            value = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                value = min(value, previous2[j - 2] + 1)
+            current[j] = value
+            row_min = min(row_min, value)
+        if row_min > max_distance:
+            return max_distance + 1
+        previous2, previous = previous, current
+    return min(previous[lb], max_distance + 1)
+
+
+@dataclass
+class Suggestion:
+    term: str
+    distance: int
+    count: int
+
+
+class SymSpell:
+    """Symmetric-delete spelling dictionary"""
+
+    def __init__(self, max_edit_distance: int = MAX_EDIT_DISTANCE, prefix_length: int = PREFIX_LENGTH):
+        self.max_edit_distance = max_edit_distance
+        self.prefix_length = prefix_length
+        self.words: Dict[str, int] = {}
+        self._deletes: Dict[str, List[str]] = {}
+
+    def _edits(self, word: str, distance: int, into: Set[str]):
+        """Collect all deletes of word within the remaining edit distance"""
+        distance += 1
+        if len(word) <= 1:
+            return
+        for i in range(len(word)):
+            deleted = word[:i] + word[i + 1:]
+            if deleted not in into:
+                into.add(deleted)
+                if distance < self.max_edit_distance:
+                    self._edits(deleted, distance, into)
+
+    def _word_deletes(self, word: str) -> Set[str]:
+        prefix = word[:self.prefix_length]
+        deletes = {prefix}
+        self._edits(prefix, 0, deletes)
+        return deletes
+
+    def add_word(self, word: str, count: int = 1):
+        """Add a word (or increase its frequency)"""
+        if word in self.words:
+            self.words[word] += count
+            return
+        self.words[word] = count
+        for deleted in self._word_deletes(word):
+            self._deletes.setdefault(deleted, []).append(word)
+
+    def remove_word(self, word: str, count: int = 1):
+        """Lower a word's frequency; the word is dropped once nothing counts it"""
+        if word not in self.words:
+            return
+        self.words[word] -= count
+        if self.words[word] > 0:
+            return
+        del self.words[word]
+        for deleted in self._word_deletes(word):
+            suggestions = self._deletes.get(deleted)
+            if suggestions and word in suggestions:
+                suggestions.remove(word)
+                if not suggestions:
+                    del self._deletes[deleted]
+
+    def lookup(self, phrase: str, max_distance: Optional[int] = None) -> Optional[Suggestion]:
+        """
+        Closest dictionary word to phrase, ties broken by frequency.
+        Returns None if nothing is within max_distance.
+        """
+        max_distance = self.max_edit_distance if max_distance is None else min(max_distance, self.max_edit_distance)
+        if phrase in self.words:
+            return Suggestion(phrase, 0, self.words[phrase])
+
+        phrase_len = len(phrase)
+        best: Optional[Suggestion] = None
+        seen_candidates: Set[str] = set()
+        seen_suggestions: Set[str] = set()
+
+        candidates = deque([phrase[:self.prefix_length]])
+        while candidates:
+            candidate = candidates.popleft()
+            candidate_len = len(candidate)
+            length_diff = min(phrase_len, self.prefix_length) - candidate_len
+            # Candidates come out in order of increasing deletes; stop once they can't beat best
+            if length_diff > max_distance or (best and length_diff > best.distance):
+                break
+
+            for suggestion in self._deletes.get(candidate, ()):
+                if suggestion in seen_suggestions or abs(len(suggestion) - phrase_len) > max_distance:
+                    continue
+                seen_suggestions.add(suggestion)
+                limit = best.distance if best else max_distance
+                distance = edit_distance(phrase, suggestion, limit)
+                if distance > limit:
+                    continue
+                count = self.words[suggestion]
+                if best is None or distance < best.distance or (distance == best.distance and count > best.count):
+                    best = Suggestion(suggestion, distance, count)
+
+            if length_diff < max_distance and candidate_len > 1:
+                for i in range(candidate_len):
+                    deleted = candidate[:i] + candidate[i + 1:]
+                    if deleted not in seen_candidates:
+                        seen_candidates.add(deleted)
+                        candidates.append(deleted)
+
+        return best
+
+
+class SpellCorrector:
+    """Platform vocabulary spelling corrector with periodic reload"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()  # one reload at a time
+        self._symspell = SymSpell()
+        self.loaded_at = 0.0
+        # Deltas seen while a reload is in flight: (sign, texts, weight)
+        self._pending: Optional[List[Tuple[int, Tuple[Optional[str], ...], int]]] = None
+        self._stop = threading.Event()
+        self._worker: Optional[threading.Thread] = None
+        self._add_curated(self._symspell)
+
+    @staticmethod
+    def _add_curated(symspell: SymSpell):
+        for category, terms in PRODUCT_TERMS.items():
+            symspell.add_word(category, CURATED_WEIGHT)
+            for term in terms:
+                for word in tokenize(term):
+                    symspell.add_word(word, CURATED_WEIGHT)
+        for term in SKILL_TERMS:
+            symspell.add_word(term, CURATED_WEIGHT)
+        # Common query words, so "lookng" corrects to "looking" rather than a product word
+        for word in STOPWORDS:
+            if len(word) >= MIN_WORD_LENGTH and word.isalpha():
+                symspell.add_word(word, 1)
+
+    @staticmethod
+    def _count_text(texts: Iterable[Optional[str]]) -> Counter:
+        counts = Counter()
+        for text in texts:
+            if text:
+                counts.update(w for w in tokenize(text) if len(w) >= MIN_WORD_LENGTH and w not in STOPWORDS)
+        return counts
+
+    @classmethod
+    def _add_text(cls, symspell: SymSpell, texts: Iterable[Optional[str]], weight: int = 1):
+        for word, count in cls._count_text(texts).items():
+            symspell.add_word(word, count * weight)
+
+    @classmethod
+    def _remove_text(cls, symspell: SymSpell, texts: Iterable[Optional[str]], weight: int = 1):
+        for word, count in cls._count_text(texts).items():
+            symspell.remove_word(word, count * weight)
+
+    def refresh(self, db=None):
+        """Rebuild the dictionary from the database (column-only queries)"""
+        with self._refresh_lock:
+            with self._lock:
+                self._pending = []
+            try:
+                self._load(db)
+            finally:
+                with self._lock:
+                    self._pending = None
+
+    def _load(self, db=None):
+        own_session = db is None
+        db = db or SessionLocal()
+        try:
+            products = db.query(Product.name, Product.category).filter(Product.is_active == True).all()
+            keywords = db.query(ProductKeyword.keyword, ProductKeyword.category).all()
+            guilds = db.query(Guild.name, Guild.category).all()
+        finally:
+            if own_session:
+                db.close()
+
+        symspell = SymSpell()
+        self._add_curated(symspell)
+        self._add_text(symspell, (name for name, _ in products))
+        self._add_text(symspell, (category for _, category in products), weight=5)
+        self._add_text(symspell, (text for row in keywords for text in row), weight=10)
+        self._add_text(symspell, (name for name, _ in guilds))
+        self._add_text(symspell, (category for _, category in guilds), weight=5)
+
+        with self._lock:
+            # Writes committed after the queries ran are only in the old dictionary
+            for sign, texts, weight in self._pending:
+                (self._add_text if sign > 0 else self._remove_text)(symspell, texts, weight)
+            self._symspell = symspell
+            self.loaded_at = time.time()
+        logger.info(f"🔤 Spelling dictionary loaded: {len(symspell.words)} words")
+
+    def add_texts(self, *texts: Optional[str], weight: int = 1):
+        """Add words from newly written rows without a full reload"""
+        with self._lock:
+            self._add_text(self._symspell, texts, weight)
+            if self._pending is not None:
+                self._pending.append((1, texts, weight))
+
+    def remove_texts(self, *texts: Optional[str], weight: int = 1):
+        """Take back the words add_texts (or a reload) counted for texts"""
+        with self._lock:
+            self._remove_text(self._symspell, texts, weight)
+            if self._pending is not None:
+                self._pending.append((-1, texts, weight))
+
+    def _reload(self):
+        try:
+            self.refresh()
+        except Exception as e:
+            # Keep serving the previous dictionary; retry on the next refresh window
+            logger.error(f"Spelling dictionary refresh failed: {e}")
+            self.loaded_at = time.time()
+
+    def _current(self) -> SymSpell:
+        if self._worker is None and time.time() - self.loaded_at > SPELL_DICTIONARY_REFRESH_SECONDS:
+            self._reload()  # no background reloader (scripts, tests)
+        return self._symspell
+
+    def start(self):
+        """Reload every SPELL_DICTIONARY_REFRESH_SECONDS on a background thread"""
+        if self._worker is not None:
+            return
+
+        def run():
+            while not self._stop.is_set():
+                due = self.loaded_at + SPELL_DICTIONARY_REFRESH_SECONDS - time.time()
+                if self._stop.wait(min(max(due, 0), SPELL_DICTIONARY_REFRESH_SECONDS)):
+                    break
+                if time.time() - self.loaded_at > SPELL_DICTIONARY_REFRESH_SECONDS:
+                    self._reload()
+
+        self._stop.clear()
+        self._worker = threading.Thread(target=run, name="spelling-reloader", daemon=True)
+        self._worker.start()
+
+    def stop(self):
+        self._stop.set()
+        self._worker = None
+
+    def correct_word(self, word: str) -> str:
+        """Best correction for a single lowercase word (the word itself if none)"""
+        if len(word) < MIN_WORD_LENGTH or word in STOPWORDS or not word.isalpha():
+            return word
+        # Short words only tolerate one edit, otherwise everything corrects to something
+        max_distance = 1 if len(word) <= 4 else MAX_EDIT_DISTANCE
+        suggestion = self._current().lookup(word, max_distance)
+        return suggestion.term if suggestion else word
+
+    def correct_query(self, query: str) -> str:
+        """Correct every word of a query; numbers and punctuation are kept as-is"""
+        self._current()
+        return re.sub(r"[A-Za-z]+", lambda m: _match_case(m.group(0), self.correct_word(m.group(0).lower())), query)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "words": len(self._symspell.words),
+            "deletes": len(self._symspell._deletes),
+            "loaded_at": self.loaded_at,
+        }
+
+
+def _match_case(original: str, corrected: str) -> str:
+    if original.lower() == corrected:
+        return original
+    if original.isupper():
+        return corrected.upper()
+    if original[:1].isupper():
+        return corrected.capitalize()
+    return corrected
+
+
+corrector = SpellCorrector()
+
+
+def _delta_subscriber(weights: Dict[str, int], active_column: Optional[str] = None):
+    """
+    change_tracker callback that moves a row's words from its old text to its
+    new one, with the weights refresh() gives each column
+    """
+    def texts(values: Dict[str, Any]) -> Dict[str, Any]:
+        if active_column and not values.get(active_column, True):
+            return {}
+        return {column: values.get(column) for column in weights}
+
+    def on_change(op: str, row: Dict[str, Any], previous: Dict[str, Any]):
+        old = texts({**row, **previous}) if op != "insert" else {}
+        new = texts(row) if op != "delete" else {}
+        for column, weight in weights.items():
+            if old.get(column) != new.get(column):
+                corrector.remove_texts(old.get(column), weight=weight)
+                corrector.add_texts(new.get(column), weight=weight)
+
+    return on_change
+
+
+change_tracker.subscribe(Product.__tablename__, _delta_subscriber({"name": 1, "category": 5}, "is_active"),
+                         previous=True)
+change_tracker.subscribe(ProductKeyword.__tablename__, _delta_subscriber({"keyword": 10, "category": 10}),
+                         previous=True)
+change_tracker.subscribe(Guild.__tablename__, _delta_subscriber({"name": 1, "category": 5}), previous=True)
+
+
+# ----------------------------------------------------------------------
+# Typo benchmark
+# ----------------------------------------------------------------------
+
+_ALPHABET = "abcdefghijklmnopqrstuvwxyz"
+
+
+def make_typo(word: str, rng: random.Random, edits: int = 1) -> str:
+    """Apply random deletes, inserts, substitutions or adjacent swaps"""
+    for _ in range(edits):
+        i = rng.randrange(len(word))
+        kind = rng.choice(("delete", "insert", "substitute", "swap"))
+        if kind == "delete" and len(word) > 1:
+            word = word[:i] + word[i + 1:]
+        elif kind == "insert":
+            word = word[:i] + rng.choice(_ALPHABET) + word[i:]
+        elif kind == "swap" and i < len(word) - 1:
+            word = word[:i] + word[i + 1] + word[i] + word[i + 2:]
+        else:
+            word = word[:i] + rng.choice(_ALPHABET.replace(word[i], "")) + word[i + 1:]
+    return word
+
+
+def run_benchmark(spell: SpellCorrector, samples: int = 2000, seed: int = 42) -> Dict[str, Any]:
+    """
+    Generate misspellings of dictionary words and measure how often the
+    corrector restores the original, plus the mean lookup time.
+    """
+    rng = random.Random(seed)
+    words = sorted(w for w in spell._current().words if len(w) >= 5)
+    if not words:
+        return {"samples": 0}
+
+    results = {}
+    for edits in (1, 2):
+        cases = []
+        for _ in range(samples):
+            word = rng.choice(words)
+            typo = make_typo(word, rng, edits)
+            cases.append((word, typo))
+
+        started = time.perf_counter()
+        corrected = [spell.correct_word(typo) for _, typo in cases]
+        elapsed = time.perf_counter() - started
+
+        correct = sum(1 for (word, _), fixed in zip(cases, corrected) if fixed == word)
+        results[f"distance_{edits}"] = {
+            "accuracy": round(correct / len(cases), 4),
+            "mean_lookup_us": round(elapsed / len(cases) * 1e6, 1),
+        }
+
+    results["samples"] = samples
+    results["dictionary_words"] = len(words)
+    return results
+
+
+if __name__ == "__main__":
+    import json
+
+    logging.basicConfig(level=logging.INFO)
+    try:
+        corrector.refresh()
+    except Exception as e:
+        logger.warning(f"Benchmarking built-in vocabulary only ({e})")
+        corrector.loaded_at = time.time()
+    print(json.dumps(run_benchmark(corrector), indent=2))
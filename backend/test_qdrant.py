@@ -3,6 +3,7 @@ Test script for Qdrant integration
 """
 
 import qdrant_service
+import llm_gateway
 from dotenv import load_dotenv
 import os
 
@@ -23,10 +24,10 @@ def test_qdrant_connection():
     # Check client initialization
     print("\n2. Client Status:")
     print(f"   Qdrant Client: {'Initialized' if qdrant_service.qdrant_client else 'Not initialized'}")
-    print(f"   OpenAI Client: {'Initialized' if qdrant_service.openai_client else 'Not initialized'}")
+    print(f"   OpenAI Client: {'Initialized' if llm_gateway.is_configured() else 'Not initialized'}")
 
     # Try to get embedding (if OpenAI is configured)
-    if qdrant_service.openai_client:
+    if llm_gateway.is_configured():
         print("\n3. Testing OpenAI Embeddings:")
         try:
             embedding = qdrant_service.get_embedding("Test project for AI development")
@@ -59,7 +60,7 @@ def test_qdrant_connection():
     print("Summary:")
     print("=" * 50)
 
-    if not qdrant_service.openai_client:
+    if not llm_gateway.is_configured():
         print("⚠ Set your OpenAI API key in .env to enable semantic search")
         print("  OPENAI_API_KEY=your-actual-openai-api-key")
 
@@ -68,7 +69,7 @@ def test_qdrant_connection():
         print("  Option 1 (Docker): docker run -p 6333:6333 qdrant/qdrant")
         print("  Option 2 (Binary): Download from https://qdrant.tech/documentation/quick-start/")
 
-    if qdrant_service.openai_client and qdrant_service.qdrant_client:
+    if llm_gateway.is_configured() and qdrant_service.qdrant_client:
         print("✓ All systems ready for semantic search!")
 
     print("=" * 50)
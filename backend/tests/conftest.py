@@ -0,0 +1,33 @@
+"""
+Shared fixtures: a fresh in-memory database per test and test users
+"""
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from database import Base, User
+
+
+@pytest.fixture
+def engine():
+    # One shared connection, so every session (and thread) sees the same in-memory database
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(engine)
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture
+def session_factory(engine):
+    return sessionmaker(bind=engine)
+
+
+@pytest.fixture
+def add_users():
+    """add_users(session, ids): users named User<id> with email user<id>@example.com (not committed)"""
+    def add(session, ids):
+        session.add_all([User(id=user_id, email=f"user{user_id}@example.com", first_name=f"User{user_id}",
+                              last_name="Test", country="Nigeria", hashed_password="x") for user_id in ids])
+    return add
@@ -0,0 +1,40 @@
+"""
+Unit tests for the action pre-classifier
+"""
+
+import pytest
+
+from action_classifier import LinearActionModel, SEED_EXAMPLES, classify, evaluate
+
+
+class TestActionClassifier:
+    """Test the gate in front of LLM action detection"""
+
+    @pytest.mark.parametrize("message", [
+        "Join the Web Developers guild",
+        "add the red sneakers to my cart",
+        "please release the escrow for order 12",
+        "sell my old camera for $120",
+        "update my bio to UX designer",
+    ])
+    def test_actions_are_plausible(self, message):
+        assert classify(message)["plausible"]
+
+    @pytest.mark.parametrize("message", [
+        "what's trending on the marketplace?",
+        "show me cheap logos",
+        "how does escrow work",
+        "hello",
+    ])
+    def test_questions_skip_the_llm(self, message):
+        assert not classify(message)["plausible"]
+
+    def test_training_is_deterministic(self):
+        first = LinearActionModel().train(SEED_EXAMPLES)
+        second = LinearActionModel().train(SEED_EXAMPLES)
+        assert first.weights == second.weights
+
+    def test_no_seed_action_is_missed(self):
+        results = evaluate(SEED_EXAMPLES)
+        assert results["action_recall"] == 1.0
+        assert results["llm_calls_skipped"] > 0.3
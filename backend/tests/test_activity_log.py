@@ -0,0 +1,107 @@
+"""
+Tests for the activity log: events written after commit in batches, paging, guild charts and display
+"""
+
+from datetime import datetime, timedelta
+
+import pytest
+
+import activity_log
+from database import ActivityEvent, Guild, Post
+
+NOW = datetime(2026, 6, 3, 15)  # a Wednesday
+
+
+@pytest.fixture
+def session_factory(session_factory, add_users, monkeypatch):
+    monkeypatch.setattr(activity_log, "writer", activity_log.ActivityWriter(session_factory))
+    session = session_factory()
+    add_users(session, (1,))
+    session.add(Guild(id=1, name="<Sneakerheads>", owner_id=1))
+    session.commit()
+    session.close()
+    return session_factory
+
+
+class TestWriting:
+    def test_events_are_written_after_commit_and_dropped_on_rollback(self, session_factory):
+        db = session_factory()
+        post = Post(content="hi", author_id=1, guild_id=1)
+        db.add(post)
+        activity_log.emit(db, 1, "created", "post", post, "guild", 1, extra={"guild": "<Sneakerheads>"})
+        assert activity_log.writer.get_stats()["buffered"] == 0
+        db.commit()
+
+        activity_log.emit(db, 1, "liked", "post", post.id, "guild", 1)
+        db.rollback()
+
+        assert activity_log.writer.get_stats()["buffered"] == 1
+        assert db.query(ActivityEvent).count() == 0  # buffered, not written yet
+        assert activity_log.writer.flush() == 1
+        (row,) = db.query(ActivityEvent).all()
+        assert (row.verb, row.object_id, row.target_id) == ("created", post.id, 1)
+
+    def test_a_failing_batch_never_blocks_newer_events(self, session_factory, monkeypatch):
+        monkeypatch.setattr(activity_log, "ACTIVITY_FLUSH_ATTEMPTS", 2)
+        writer = activity_log.writer
+        event = {"actor_id": 1, "object_type": "guild", "object_id": 1, "target_type": None,
+                 "target_id": None, "extra_data": None, "created_at": NOW}
+        writer.record([{**event, "verb": None}])  # violates NOT NULL
+        assert writer.flush() == 0
+        writer.record([{**event, "verb": "joined"}])
+        assert writer.flush() == 1  # the failed batch was retried on its own, then dropped
+        assert writer.flush() == 0
+        stats = writer.get_stats()
+        assert (stats["buffered"], stats["retrying"], stats["events_dropped"]) == (0, 0, 1)
+        db = session_factory()
+        assert [row.verb for row in db.query(ActivityEvent)] == ["joined"]
+
+    def test_a_full_buffer_drops_the_oldest_instead_of_writing_inline(self, session_factory, monkeypatch):
+        monkeypatch.setattr(activity_log, "ACTIVITY_BUFFER_MAX", 3)
+        db = session_factory()
+        for n in range(5):
+            activity_log.emit(db, 1, "created", "order", n)
+            db.commit()
+        assert db.query(ActivityEvent).count() == 0  # commits never write the log themselves
+        assert activity_log.writer.get_stats()["events_dropped"] == 2
+        activity_log.writer.flush()
+        assert [row.object_id for row in db.query(ActivityEvent).order_by(ActivityEvent.id)] == [2, 3, 4]
+
+
+class TestReading:
+    def test_history_pages_and_describes_events(self, session_factory):
+        db = session_factory()
+        for n in range(5):
+            activity_log.emit(db, 1, "created", "order", n,
+                              extra={"order_number": f"AV-{n}", "amount": 1250.5})
+        db.commit()
+        activity_log.writer.flush()
+
+        first = activity_log.history(db, 1, limit=2)
+        second = activity_log.history(db, 1, before=first[-1].id, limit=2)
+        assert [row.object_id for row in first + second] == [4, 3, 2, 1]
+
+        assert activity_log.describe_for_user(first[0])["description"] == "You placed order AV-4 (₦1,250.50)"
+        (row, actor), = activity_log.feed(db, limit=1)
+        assert activity_log.describe_for_admin(row, actor)["text"] == (
+            "<strong>New Order:</strong> @user1 placed order AV-4 (₦1,250.50)."
+        )
+
+    def test_guild_chart_buckets_and_escapes(self, session_factory):
+        db = session_factory()
+        db.execute(ActivityEvent.__table__.insert(), [
+            {"actor_id": 1, "verb": "joined", "object_type": "guild", "object_id": 1, "target_type": "guild",
+             "target_id": 1, "extra_data": '{"name": "<Sneakerheads>"}', "created_at": NOW - timedelta(days=days)}
+            for days in (0, 0, 1, 10)
+        ])
+        db.commit()
+
+        weekly = activity_log.guild_chart(db, 1, "weekly", now=NOW)
+        assert [item["day"] for item in weekly][-2:] == ["Tue", "Wed"]
+        assert [item["value"] for item in weekly] == [0, 0, 0, 0, 0, 1, 2]
+        assert weekly[-2]["percentage"] == 50
+        monthly = activity_log.guild_chart(db, 1, "monthly", now=NOW)
+        assert [item["value"] for item in monthly] == [0, 0, 1, 3]
+
+        row, actor = activity_log.feed(db, limit=1)[0]
+        assert "&lt;Sneakerheads&gt;" in activity_log.describe_for_admin(row, actor)["text"]
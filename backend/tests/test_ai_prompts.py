@@ -0,0 +1,28 @@
+"""
+Tests for per-intent system prompts: stable prefix, deterministic assembly
+"""
+
+import ai_prompts
+from ai_prompts import CORE_PROMPT, INTENT_MODULES, MODULE_ORDER, PROMPT_MODULES, build_system_prompt
+
+
+class TestSystemPrompts:
+    def test_every_intent_starts_with_the_core_prefix(self):
+        for intent in list(INTENT_MODULES) + ["unknown_intent"]:
+            assert build_system_prompt(intent).startswith(CORE_PROMPT)
+
+    def test_modules_follow_canonical_order(self, monkeypatch):
+        monkeypatch.setitem(INTENT_MODULES, "test_intent", ("payments", "navigation"))
+        build_system_prompt.cache_clear()
+        prompt = build_system_prompt("test_intent")
+        assert prompt.index(PROMPT_MODULES["navigation"]) < prompt.index(PROMPT_MODULES["payments"])
+        build_system_prompt.cache_clear()
+
+    def test_intents_only_reference_known_modules(self):
+        assert set(MODULE_ORDER) == set(PROMPT_MODULES)
+        for modules in INTENT_MODULES.values():
+            assert set(modules) <= set(PROMPT_MODULES)
+
+    def test_intent_prompts_are_smaller_than_the_full_prompt(self):
+        for intent in INTENT_MODULES:
+            assert len(build_system_prompt(intent)) < len(ai_prompts.FULL_SYSTEM_PROMPT)
@@ -0,0 +1,93 @@
+"""
+Unit tests for the AI response cache
+"""
+
+import pytest
+
+import change_tracker
+from ai_response_cache import ResponseCache, normalize_message
+
+VECTORS = {
+    "how do i create a guild": [1.0, 0.0, 0.0],
+    "how can i create a guild": [0.99, 0.1, 0.0],
+    "laptops under 50k": [0.0, 1.0, 0.0],
+    "laptops under 80k": [0.0, 1.0, 0.01],
+    "what is trending": [0.0, 0.0, 1.0],
+}
+
+
+def fake_embed(text):
+    return VECTORS.get(text)
+
+
+class TestResponseCache:
+    """Test exact and semantic tiers, invalidation and exclusions"""
+
+    @pytest.fixture
+    def cache(self):
+        return ResponseCache(embed=fake_embed, similarity_threshold=0.95)
+
+    def _fill(self, cache, message, intent, mentions=()):
+        response, state = cache.lookup(message, intent, list(mentions))
+        assert response is None
+        cache.store(state, {"response": f"answer to {message}", "intent": intent, "session_id": "s1"}, tokens=300)
+        # Attach the embedding inline rather than waiting for the background thread
+        cache._attach_embedding(cache._entries[state["key"]])
+
+    def test_exact_hit_ignores_case_and_punctuation(self, cache):
+        self._fill(cache, "How do I create a guild?", "create")
+        response, _ = cache.lookup("how do i create a GUILD", "create", [])
+        assert response["response"] == "answer to How do I create a guild?"
+        assert response["cached"]["tier"] == "exact"
+        assert "session_id" not in response
+        assert cache.get_stats()["tokens_saved"] == 300
+
+    def test_semantic_hit(self, cache):
+        self._fill(cache, "how do i create a guild", "create")
+        response, _ = cache.lookup("how can i create a guild", "create", [])
+        assert response["cached"]["tier"] == "semantic"
+
+    def test_number_guard(self, cache):
+        self._fill(cache, "laptops under 50k", "search_products_budget")
+        response, _ = cache.lookup("laptops under 80k", "search_products_budget", [])
+        assert response is None
+        assert cache.get_stats()["staleness"]["number_guard_rejections"] == 1
+
+    def test_invalidated_when_dependency_changes(self, cache):
+        self._fill(cache, "laptops under 50k", "search_products_budget")
+        change_tracker.bump_version("products")
+        response, _ = cache.lookup("laptops under 50k", "search_products_budget", [])
+        assert response is None
+
+    def test_personalized_intents_and_user_mentions_bypass(self, cache):
+        response, state = cache.lookup("recommend me projects", "recommendations", [])
+        assert response is None and not state["cacheable"]
+
+        mention = [{"type": "user", "id": 3}]
+        response, state = cache.lookup("what is trending", "general_search", mention)
+        assert not state["cacheable"]
+
+    def test_history_answers_are_not_shared(self, cache):
+        _, state = cache.lookup("what is trending", "general_search", [], has_history=True)
+        cache.store(state, {"response": "based on what you said earlier..."}, tokens=10)
+        assert cache.get_stats()["entries"] == 0
+
+    def test_stale_entries_evicted(self, cache):
+        self._fill(cache, "how do i create a guild", "create")
+        for entry in cache._entries.values():
+            entry.created_at -= 10_000
+        response, _ = cache.lookup("how do i create a guild", "create", [])
+        assert response is None
+        assert cache.get_stats()["staleness"]["stale_evictions"] == 1
+
+    def test_answers_listing_users_are_never_served_again(self, cache):
+        # general_search answers include other users' profiles and live stats
+        _, state = cache.lookup("what is trending", "general_search", [])
+        assert not state["cacheable"]
+        cache.store(state, {"response": "Ada Obi (ada@example.com) builds websites"}, tokens=10)
+        change_tracker.bump_version("users")  # Ada edits her profile or deletes her account
+        response, _ = cache.lookup("what is trending", "general_search", [])
+        assert response is None and cache.get_stats()["entries"] == 0
+
+    def test_normalize_message(self):
+        assert normalize_message("  What's   TRENDING?! ") == "what s trending"
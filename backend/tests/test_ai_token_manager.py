@@ -0,0 +1,71 @@
+"""
+Tests for AI usage accounting: the write-behind ledger flush and reconciling unflushed rows
+"""
+
+from datetime import datetime, timedelta
+
+import pytest
+
+import ai_token_manager
+from ai_token_manager import UsageLedger
+from database import AIConversation, User
+
+
+@pytest.fixture
+def db(session_factory, add_users, monkeypatch):
+    monkeypatch.setattr(ai_token_manager, "SessionLocal", session_factory)
+    session = session_factory()
+    add_users(session, (1, 2))
+    session.commit()
+    yield session
+    session.close()
+
+
+def turn(db, user_id, tokens, age=timedelta(0)):
+    row = AIConversation(user_id=user_id, session_id="s1", user_message="hi", ai_response="hello",
+                         tokens_used=tokens, created_at=datetime.utcnow() - age)
+    db.add(row)
+    db.commit()
+    return row.id
+
+
+class TestLedger:
+    def test_flush_adds_deltas_and_marks_rows_counted(self, db):
+        ledger = UsageLedger()
+        first, second = turn(db, 1, 40), turn(db, 1, 2)
+        ledger.charge(1, 40, first)
+        ledger.charge(1, 2, second)
+        assert ledger.usage(db.get(User, 1))["tokens_used"] == 42  # admission sees unflushed usage
+
+        assert ledger.flush() == 1
+        db.expire_all()
+        user = db.get(User, 1)
+        assert (user.ai_tokens_used, user.ai_requests_used) == (42, 2)
+        assert ledger.usage(user)["tokens_used"] == 42  # counted once, not twice
+        assert db.query(AIConversation).filter(AIConversation.usage_flushed.is_(False)).count() == 0
+
+    def test_failed_flush_keeps_the_deltas(self, db, monkeypatch):
+        ledger = UsageLedger()
+        ledger.charge(1, 10)
+
+        def broken(db, batch):
+            raise RuntimeError("database down")
+
+        monkeypatch.setattr(ai_token_manager, "_apply_usage", broken)
+        assert ledger.flush() == 0
+        ledger.charge(1, 5)
+        assert ledger.usage(db.get(User, 1))["tokens_used"] == 15
+
+
+class TestReconcile:
+    def test_replays_only_rows_past_the_grace_period(self, db):
+        stale = turn(db, 2, 30, age=timedelta(hours=1))
+        recent = turn(db, 2, 7)  # may still be pending on a live worker
+
+        assert ai_token_manager.reconcile_usage(db) == {"conversations": 1, "users": 1}
+        db.expire_all()
+        assert db.get(User, 2).ai_tokens_used == 30
+        assert (db.get(AIConversation, stale).usage_flushed, db.get(AIConversation, recent).usage_flushed) == (
+            True, False
+        )
+        assert ai_token_manager.reconcile_usage(db) == {"conversations": 0, "users": 0}
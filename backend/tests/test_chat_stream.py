@@ -0,0 +1,94 @@
+"""
+Tests for streamed chat turns: the turn is recorded and the session closed once, never beside a running next()
+"""
+
+import asyncio
+import threading
+
+import pytest
+from sqlalchemy.orm import Session, sessionmaker
+
+import ai_assistant
+
+
+class TrackedSession(Session):
+    closes = 0
+
+    def close(self):
+        TrackedSession.closes += 1
+        super().close()
+
+
+@pytest.fixture
+def session_factory(engine):
+    TrackedSession.closes = 0
+    return sessionmaker(bind=engine, class_=TrackedSession)
+
+
+@pytest.fixture
+def pipeline(monkeypatch):
+    """A stream whose second step blocks (like the LLM) until released"""
+    state = {"running": False, "finished_while_running": None, "finishes": 0}
+    release = threading.Event()
+    blocked = threading.Event()
+
+    def fake_stream(turn_state, **kwargs):
+        turn_state["parts"] = ["Hello"]
+        yield "token", {"delta": "Hello"}
+        state["running"] = True
+        blocked.set()
+        release.wait(5)
+        state["running"] = False
+        turn_state["parts"].append(" world")
+        yield "token", {"delta": " world"}
+        yield "done", {"response": "Hello world"}
+
+    def fake_finish(turn_state, user, db):
+        state["finishes"] += 1
+        state["finished_while_running"] = state["running"]
+        state["parts"] = list(turn_state["parts"])
+
+    monkeypatch.setattr(ai_assistant, "stream_chat_with_ai", lambda **kwargs: fake_stream(**kwargs))
+    monkeypatch.setattr(ai_assistant, "finish_streamed_turn", fake_finish)
+    return state, release, blocked
+
+
+class TestChatStream:
+    def test_complete_stream_records_once(self, session_factory, pipeline):
+        state, release, _ = pipeline
+        release.set()
+        chat_stream = ai_assistant.ChatStream("hi", None, session_factory=session_factory)
+
+        async def consume():
+            return [chunk async for chunk in chat_stream.stream()]
+
+        chunks = asyncio.run(consume())
+        chat_stream.finish_unstarted()  # the response's background task
+        assert chunks[-1].startswith("event: done") and '"ai_response": "Hello world"' in chunks[-1]
+        assert state["finishes"] == 1 and TrackedSession.closes == 1
+
+    def test_disconnect_mid_stream_waits_for_the_running_step(self, session_factory, pipeline):
+        state, release, blocked = pipeline
+        chat_stream = ai_assistant.ChatStream("hi", None, session_factory=session_factory)
+
+        async def disconnect_mid_stream():
+            body = chat_stream.stream()
+            assert "Hello" in await body.__anext__()
+            pending = asyncio.ensure_future(body.__anext__())
+            await asyncio.get_running_loop().run_in_executor(None, blocked.wait, 5)
+            pending.cancel()  # the client goes away while the step is in the threadpool
+            threading.Timer(0.2, release.set).start()
+            with pytest.raises((asyncio.CancelledError, StopAsyncIteration)):
+                await pending
+
+        asyncio.run(disconnect_mid_stream())
+        chat_stream.finish_unstarted()
+        assert state["finishes"] == 1 and state["finished_while_running"] is False
+        assert state["parts"] == ["Hello", " world"]  # the step that was running completed first
+        assert TrackedSession.closes == 1
+
+    def test_never_started_stream_is_finished_by_the_background_task(self, session_factory, pipeline):
+        state, _, _ = pipeline
+        chat_stream = ai_assistant.ChatStream("hi", None, session_factory=session_factory)
+        chat_stream.finish_unstarted()
+        assert state["finishes"] == 1 and TrackedSession.closes == 1
@@ -0,0 +1,90 @@
+"""
+Tests for the context packer: budget bound, value-density selection, ordering
+"""
+
+import ast
+from pathlib import Path
+
+import context_packer
+from context_packer import ContextItem, pack, items_from_context, items_from_memory, build_messages
+
+
+def turns(count, words=40):
+    messages = []
+    for i in range(count):
+        messages.append({"role": "user", "content": f"question {i} " + "word " * words})
+        messages.append({"role": "assistant", "content": f"answer {i} " + "word " * words})
+    return messages
+
+
+class TestPack:
+    """Greedy selection under a token budget"""
+
+    def test_rendered_prompt_never_exceeds_budget(self):
+        memory = {"recent_messages": turns(20), "summary": "User wants a cheap laptop. " * 20}
+        context = {"matching_products": [{"id": i, "name": f"Laptop {i}", "price": i * 100,
+                                          "description": "fast " * 80} for i in range(10)],
+                   "platform_stats": {"users": 10}}
+        items = items_from_memory(memory, "search_products") + items_from_context(context, "search_products")
+        for budget in (50, 200, 600, 1000):
+            result = pack(items, budget)
+            assert result.tokens <= budget
+            assert len(result.selected) + len(result.dropped) == len(items)
+
+    def test_prefers_dense_items_and_reports_drops(self):
+        cheap = ContextItem(kind="fact", key="budget", value=3.0, order=1, data=500, tokens=5)
+        bulky = ContextItem(kind="stats", key="platform_stats", value=0.6, order=2, data={"x": "y" * 400}, tokens=120)
+        result = pack([bulky, cheap], budget=40)
+        assert [item.key for item in result.selected] == ["budget"]
+        assert result.report()["dropped"][0]["key"] == "platform_stats"
+
+    def test_newest_turns_survive_and_stay_chronological(self):
+        items = items_from_memory({"recent_messages": turns(10)}, "general_question")
+        result = pack(items, budget=300)
+        kept = [m["content"].split()[1] for m in result.messages if m["role"] == "user"]
+        assert kept
+        assert kept[-1] == "9"
+        assert kept == sorted(kept, key=int)
+
+
+class TestItems:
+    def test_cards_drop_personal_and_bulky_fields(self):
+        context = {"collaborators": [{"id": 1, "name": "Ada", "email": "ada@example.com",
+                                      "avatar": "a.png", "bio": "x" * 500}]}
+        card = items_from_context(context, "search_collaborators")[0].data
+        assert "email" not in card and "avatar" not in card
+        assert len(card["bio"]) == context_packer.MAX_FIELD_CHARS
+
+    def test_user_message_is_capped_and_last(self, monkeypatch):
+        monkeypatch.setattr(context_packer, "MAX_USER_MESSAGE_TOKENS", 10)
+        messages, _ = build_messages([{"role": "system", "content": "core"}], "long " * 500, "help", None, None)
+        assert messages[0]["content"] == "core"
+        assert messages[-1]["role"] == "user"
+        assert context_packer.count_tokens(messages[-1]["content"]) <= 10
+
+
+def gather_context_keys():
+    """Every key ai_assistant.gather_context() can put in its context"""
+    tree = ast.parse((Path(__file__).parent.parent / "ai_assistant.py").read_text(encoding="utf-8"))
+    (function,) = [node for node in ast.walk(tree) if isinstance(node, ast.FunctionDef) and node.name == "gather_context"]
+    keys = set()
+    for node in ast.walk(function):
+        if isinstance(node, ast.Subscript) and isinstance(node.ctx, ast.Store) \
+                and isinstance(node.value, ast.Name) and node.value.id == "context":
+            keys.add(node.slice.value)
+        elif isinstance(node, ast.Assign) and isinstance(node.value, ast.Dict) \
+                and any(isinstance(target, ast.Name) and target.id == "context" for target in node.targets):
+            keys.update(key.value for key in node.value.keys)
+    return keys
+
+
+class TestCoverage:
+    def test_every_gathered_key_is_packed_or_dropped(self):
+        keys = gather_context_keys()
+        assert {"negotiation_complete", "escrow_ready", "budget"} <= keys
+        handled = set(context_packer.CONTEXT_KEYS) | set(context_packer.FACT_KEYS) | context_packer.DROP_FIELDS
+        assert keys - handled == set()
+
+    def test_negotiation_facts_reach_the_model(self):
+        items = items_from_context({"negotiation_complete": True, "escrow_ready": True}, "general_question")
+        assert [item.key for item in items] == ["negotiation_complete", "escrow_ready"]
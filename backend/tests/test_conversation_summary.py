@@ -0,0 +1,66 @@
+"""
+Tests for rolling conversation summaries: fold threshold, chunked folds and the watermark
+"""
+
+import pytest
+
+import conversation_summary
+from database import AIConversation, AIConversationSummary
+
+
+@pytest.fixture
+def db(session_factory, add_users, monkeypatch):
+    monkeypatch.setattr(conversation_summary, "AI_SUMMARY_FOLD_TOKENS", 10)
+    monkeypatch.setattr(conversation_summary, "MAX_FOLD_TURNS", 4)
+    monkeypatch.setattr(conversation_summary.ai_token_manager, "count_tokens", lambda text: len(text.split()))
+    session = session_factory()
+    add_users(session, (1,))
+    session.commit()
+    yield session
+    session.close()
+
+
+@pytest.fixture
+def summarized(monkeypatch):
+    """Turn ids each summarization call was given"""
+    calls = []
+
+    def summarize(previous, turns):
+        calls.append([turn.id for turn in turns])
+        return f"{previous} +{len(turns)}".strip()
+
+    monkeypatch.setattr(conversation_summary, "summarize_turns", summarize)
+    return calls
+
+
+def add_turns(db, count, words=2):
+    db.add_all([AIConversation(user_id=1, session_id="s1", user_message="word " * words,
+                               ai_response="reply", intent="general_question") for _ in range(count)])
+    db.commit()
+    return [row.id for row in db.query(AIConversation.id).order_by(AIConversation.id)]
+
+
+class TestFold:
+    def test_below_threshold_leaves_the_tail_verbatim(self, db, summarized):
+        add_turns(db, 5)  # 2 foldable turns, 6 tokens
+        assert conversation_summary.fold_session("s1", db) is False
+        assert summarized == [] and conversation_summary.get_summary("s1", db) is None
+
+    def test_long_tail_folds_in_chunks_up_to_the_verbatim_window(self, db, summarized):
+        ids = add_turns(db, 13)
+        assert conversation_summary.fold_session("s1", db) is True
+
+        foldable = ids[:-conversation_summary.KEEP_RECENT_TURNS]
+        assert summarized == [foldable[0:4], foldable[4:8], foldable[8:10]]
+        stored = db.query(AIConversationSummary).one()
+        assert (stored.summarized_through_id, stored.summarized_turns) == (foldable[-1], 10)
+        assert stored.summary == "+4 +4 +2"
+
+    def test_a_failed_chunk_keeps_the_watermark_after_the_last_folded_one(self, db, monkeypatch):
+        ids = add_turns(db, 13)
+        results = iter(["first", None])
+        monkeypatch.setattr(conversation_summary, "summarize_turns", lambda previous, turns: next(results))
+
+        assert conversation_summary.fold_session("s1", db) is True
+        stored = db.query(AIConversationSummary).one()
+        assert (stored.summary, stored.summarized_through_id) == ("first", ids[3])
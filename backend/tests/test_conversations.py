@@ -0,0 +1,119 @@
+"""
+Tests for maintained conversation pointers, unread counters and read cursors
+"""
+
+import pytest
+
+import conversations
+from database import Message, User
+
+
+@pytest.fixture
+def db(session_factory, add_users):
+    session = session_factory()
+    add_users(session, (1, 2, 3))
+    session.commit()
+    yield session
+    session.close()
+
+
+def send(db, sender_id, recipient_id, content="hi"):
+    conversation = conversations.get_or_create(db, sender_id, recipient_id)
+    message = Message(sender_id=sender_id, recipient_id=recipient_id, content=content,
+                      conversation_id=conversation.id)
+    db.add(message)
+    db.flush()
+    conversations.record_message(db, conversation, message)
+    db.commit()
+    return conversation, message
+
+
+class TestCounters:
+    def test_send_and_read(self, db):
+        conversation, _ = send(db, 2, 1)
+        send(db, 1, 2)
+        _, third = send(db, 2, 1)
+        assert (conversation.user_low_id, conversation.user_high_id) == (1, 2)
+        assert conversations.unread_count(conversation, 1) == 2
+        assert conversations.unread_count(conversation, 2) == 1
+        assert conversation.last_message_id == third.id
+        assert conversations.unread_total(db, 1) == 2
+
+        assert conversations.mark_read(db, conversation, 1)
+        db.commit()
+        assert conversations.unread_count(conversation, 1) == 0
+        assert conversations.is_read(conversation, third)
+        assert not conversations.mark_read(db, conversation, 1)  # idempotent
+
+    def test_cursor_only_moves_forward(self, db):
+        conversation, first = send(db, 2, 1)
+        _, second = send(db, 2, 1)
+        send(db, 2, 1)
+        assert conversations.mark_read(db, conversation, 1, up_to=second.id)
+        db.commit()
+        assert conversations.unread_count(conversation, 1) == 1
+        assert not conversations.mark_read(db, conversation, 1, up_to=first.id)
+        assert conversations.last_read_id(conversation, 1) == second.id
+
+    def test_delete_repairs_pointer_and_counter(self, db):
+        conversation, first = send(db, 2, 1)
+        _, second = send(db, 2, 1)
+        db.delete(second)
+        db.flush()
+        conversations.forget_message(db, conversation, second)
+        db.commit()
+        assert conversation.last_message_id == first.id
+        assert conversations.unread_count(conversation, 1) == 1
+
+    def test_inbox_pages_by_last_message(self, db):
+        send(db, 2, 1)
+        send(db, 3, 1)
+        first_page = conversations.inbox(db, 1, limit=1)
+        assert [user.id for _, user, _ in first_page] == [3]
+        before = first_page[0][2].id
+        assert [user.id for _, user, _ in conversations.inbox(db, 1, limit=1, before=before)] == [2]
+
+
+class TestSending:
+    def test_every_send_endpoint_goes_through_the_conversation(self, db, monkeypatch):
+        import chat_routes
+        import realtime_hub
+        from schemas import MessageCreate
+
+        monkeypatch.setattr(realtime_hub, "publish", lambda channel, event, data: None)
+        message = chat_routes.deliver_message(db, db.get(User, 2), MessageCreate(recipient_id=1, content="hi"))
+        conversation = conversations.find(db, 1, 2)
+        assert message.conversation_id == conversation.id
+        assert conversations.unread_total(db, 1) == 1
+        assert [m.id for m in conversations.thread_query(db, conversation, 1)] == [message.id]
+
+
+
+class TestInboxEndpoint:
+    def test_list_is_one_query_whatever_the_conversation_count(self, db, engine, add_users):
+        import asyncio
+        from sqlalchemy import event
+
+        import chat_routes
+
+        add_users(db, range(4, 10))
+        for sender_id in range(2, 10):
+            send(db, sender_id, 1, content=f"from {sender_id}")
+        send(db, 1, 9, content="reply")
+        me = db.get(User, 1)
+
+        queries = []
+
+        def record(conn, cursor, statement, *args):
+            queries.append(statement)
+
+        event.listen(engine, "before_cursor_execute", record)
+        try:
+            listed = asyncio.run(chat_routes.get_conversations(limit=50, before=None, current_user=me, db=db))
+        finally:
+            event.remove(engine, "before_cursor_execute", record)
+
+        assert len(queries) == 1
+        assert [item["user_id"] for item in listed] == [9, 8, 7, 6, 5, 4, 3, 2]
+        assert (listed[0]["last_message"]["content"], listed[0]["last_message"]["is_from_me"]) == ("reply", True)
+        assert listed[1]["unread_count"] == 1
@@ -0,0 +1,113 @@
+"""
+Tests for digest emails: per-batch aggregation, rendering and checkpointed runs
+"""
+
+import mailbox
+from datetime import datetime, timedelta
+
+import pytest
+
+import digest
+from database import (
+    DigestRun, Guild, Notification, NotificationPreference, Order, Post, Product, guild_members
+)
+
+NOW = datetime(2026, 6, 1)
+DAY = timedelta(days=1)
+
+
+@pytest.fixture
+def db(session_factory, add_users, monkeypatch):
+    monkeypatch.setattr(digest, "DIGEST_BATCH_SIZE", 2)
+    session = session_factory()
+    add_users(session, range(1, 6))
+    for user_id in range(1, 6):
+        # User 5 never opted in
+        session.add(NotificationPreference(user_id=user_id, weekly_digest=user_id != 5, email_notifications=True))
+    session.add(Guild(id=1, name="Sneakerheads", owner_id=1))
+    session.execute(guild_members.insert(), [{"user_id": 2, "guild_id": 1}, {"user_id": 5, "guild_id": 1}])
+    session.add_all([
+        Post(content="old", author_id=2, guild_id=1, created_at=NOW - 30 * DAY),
+        Post(content="new", author_id=2, guild_id=1, created_at=NOW - DAY),
+        Notification(user_id=3, type="order.created", title="New Order", message="AV-1",
+                     is_read=False, created_at=NOW - DAY),
+        Notification(user_id=3, type="order.created", title="Read", message="AV-0",
+                     is_read=True, created_at=NOW - DAY),
+        Product(id=1, name="Runner", price=120.0, category="shoes", stock=3, seller_id=3, is_active=True),
+        Product(id=2, name="Boot", price=90.0, category="shoes", stock=1, seller_id=4, is_active=True),
+        Order(order_number="AV-1", buyer_id=2, seller_id=3, product_id=1, item_name="Runner", item_cost=120.0,
+              total_amount=126.0, status="paid", created_at=NOW - DAY, updated_at=NOW - DAY),
+    ])
+    session.commit()
+    yield session
+    session.close()
+
+
+class TestBuildDigests:
+    def test_sections_per_user_and_inactive_users_skipped(self, db):
+        users = digest.recipients(db, 0, 10)
+        assert [user.id for user in users] == [1, 2, 3, 4]
+
+        digests = {d.user_id: d for d in digest.build_digests(db, users, NOW - 7 * DAY, NOW)}
+        assert sorted(digests) == [1, 2, 3]  # user 4 has nothing to report
+
+        assert digests[1].guild_posts.items[0]["text"] == "Sneakerheads: 1 new post"
+        assert digests[2].guild_posts is None  # their own post
+        assert digests[2].orders.items[0]["text"] == "Purchase AV-1 (Runner): paid"
+        assert digests[3].orders.items[0]["text"] == "Sale AV-1 (Runner): paid"
+        assert digests[3].notifications.total == 1
+        # Seller 3 isn't recommended their own shoes
+        assert [item["text"] for item in digests[3].recommendations.items] == ["Boot ($90.00)"]
+
+    def test_compose_escapes_html(self, db):
+        db.query(Guild).update({Guild.name: "<b>Sneakerheads</b>"})
+        users = digest.recipients(db, 0, 1)
+        user_digest = digest.build_digests(db, users, NOW - 7 * DAY, NOW)[0]
+        parts = digest.compose(user_digest, NOW - 7 * DAY, NOW)
+        assert "<b>Sneakerheads</b>: 1 new post" in parts["text"]
+        assert "&lt;b&gt;Sneakerheads&lt;/b&gt;" in parts["html"]
+
+        message = digest.render(user_digest, NOW - 7 * DAY, NOW)
+        assert message["To"] == "User1 <user1@example.com>"
+        assert [part.get_content_type() for part in message.get_payload()] == ["text/plain", "text/html"]
+
+
+class FailingTransport:
+    def send(self, messages):
+        raise ConnectionError("SMTP down")
+
+
+class TestRuns:
+    def test_runs_resume_from_the_checkpoint(self, db, tmp_path):
+        transport = digest.MaildirTransport(str(tmp_path / "mail"))
+        first = digest.run_digest(db, transport, now=NOW, max_batches=1)
+        assert first == {"run_id": 1, "sent": 2, "skipped": 0, "finished": False}
+        assert db.get(DigestRun, 1).last_user_id == 2
+
+        with pytest.raises(ConnectionError):
+            digest.run_digest(db, FailingTransport(), now=NOW)
+        db.rollback()
+        assert db.get(DigestRun, 1).last_user_id == 2
+
+        second = digest.run_digest(db, transport, now=NOW)
+        assert second == {"run_id": 1, "sent": 3, "skipped": 1, "finished": True}
+        assert len(mailbox.Maildir(str(tmp_path / "mail"))) == 3
+
+        # The next window isn't due until an interval later
+        assert digest.run_digest(db, transport, now=NOW + DAY)["run_id"] is None
+
+    def test_a_dead_job_resumes_later(self, db, session_factory, monkeypatch):
+        import job_queue
+        from database import Job
+
+        monkeypatch.setattr(digest, "DIGEST_TRANSPORT", "smtp://localhost")
+        monkeypatch.setattr(digest, "transport_from_url", lambda url: FailingTransport())
+        monkeypatch.setattr(job_queue, "JOB_RETRY_BASE_SECONDS", 0)
+        job_queue.enqueue(db, "digest.run", {}, max_attempts=2)
+        db.commit()
+
+        worker = job_queue.JobWorker(session_factory)
+        worker.run_pending()
+        assert [(job.status, job.run_at > datetime.utcnow()) for job in db.query(Job).order_by(Job.id)] == [
+            ("dead", False), ("queued", True)
+        ]
@@ -0,0 +1,145 @@
+"""
+Unit tests for the entity mention matcher
+"""
+
+import threading
+import time
+
+import pytest
+
+from entity_matcher import AhoCorasick, EntityIndex, normalize
+
+
+class TestAhoCorasick:
+    """Test the multi-pattern automaton"""
+
+    def test_finds_overlapping_patterns(self):
+        automaton = AhoCorasick()
+        for pattern in ["he", "she", "his", "hers"]:
+            automaton.add(pattern)
+        automaton.build()
+
+        found = {(start, end, automaton.patterns[i]) for start, end, i in automaton.iter_matches("ushers")}
+        assert found == {(1, 4, "she"), (2, 4, "he"), (2, 6, "hers")}
+
+    def test_no_match(self):
+        automaton = AhoCorasick()
+        automaton.add("laptop")
+        automaton.build()
+        assert list(automaton.iter_matches("looking for a phone")) == []
+
+    def test_normalize_preserves_offsets(self):
+        text = "Join İstanbul Devs"
+        assert len(normalize(text)) == len(text)
+
+
+class TestEntityIndex:
+    """Test incremental maintenance and word-boundary matching"""
+
+    @pytest.fixture
+    def index(self):
+        index = EntityIndex()
+        index.loaded_at = float("inf")  # never hit the database in tests
+        index.apply_change("guild", "insert", {"id": 1, "name": "Web Developers"})
+        index.apply_change("guild", "insert", {"id": 2, "name": "Art"})
+        index.apply_change("product", "insert", {"id": 7, "name": "MacBook Air M2", "is_active": True})
+        index.apply_change("user", "insert", {"id": 3, "first_name": "Ada", "last_name": "Obi", "username": "adaobi"})
+        return index
+
+    def test_match_returns_ids_and_spans(self, index):
+        message = "Is the MacBook Air M2 good for Web Developers?"
+        matches = {(m["type"], m["id"]): m for m in index.match(message)}
+
+        assert set(matches) == {("product", 7), ("guild", 1)}
+        product = matches[("product", 7)]
+        assert message[product["start"]:product["end"]] == "MacBook Air M2"
+
+    def test_word_boundaries(self, index):
+        assert index.match("I want to start a project") == []
+        assert [m["id"] for m in index.match("Any art guilds?")] == [2]
+
+    def test_user_matched_by_full_name_or_username(self, index):
+        assert [m["id"] for m in index.match("message Ada Obi")] == [3]
+        assert [m["id"] for m in index.match("ping adaobi please")] == [3]
+
+    def test_incremental_update_and_delete(self, index):
+        index.apply_change("guild", "update", {"id": 1, "name": "Python Devs"})
+        assert index.match("web developers") == []
+        assert [m["id"] for m in index.match("python devs")] == [1]
+
+        index.apply_change("guild", "delete", {"id": 1, "name": "Python Devs"})
+        assert index.match("python devs") == []
+
+    def test_inactive_product_removed(self, index):
+        index.apply_change("product", "update", {"id": 7, "name": "MacBook Air M2", "is_active": False})
+        assert index.match("macbook air m2") == []
+
+    def test_unchanged_names_do_not_rebuild(self, index):
+        index.match("warm up")
+        version = index.version
+        index.apply_change("user", "update", {"id": 3, "first_name": "Ada", "last_name": "Obi", "username": "adaobi"})
+        index.match("warm up")
+        assert index.version == version
+
+
+class TestPublishing:
+    """Matching reads published snapshots; rebuilds run off the request thread"""
+
+    @pytest.fixture
+    def index(self):
+        index = EntityIndex()
+        index.loaded_at = time.time()
+        index.apply_change("guild", "insert", {"id": 1, "name": "Web Developers"})
+        index.rebuild()
+        return index
+
+    def test_matching_never_sees_a_half_applied_change(self, index):
+        stop = threading.Event()
+
+        def churn():
+            n = 0
+            while not stop.is_set():
+                index.apply_change("guild", "insert", {"id": 100 + n % 50, "name": f"Guild {n}"})
+                index.apply_change("guild", "delete", {"id": 100 + (n + 25) % 50})
+                index.rebuild()
+                n += 1
+
+        writer = threading.Thread(target=churn)
+        writer.start()
+        try:
+            for _ in range(300):
+                assert [m["id"] for m in index.match("any web developers here?")] == [1]
+        finally:
+            stop.set()
+            writer.join()
+
+    def test_change_during_refresh_survives_the_swap(self, index, session_factory, add_users):
+        db = session_factory()
+        add_users(db, (1,))
+        db.commit()
+
+        query = db.query
+        def racing_query(*columns):
+            if not index._entities.get(("guild", 2)):
+                # a guild is created while the reload is querying
+                index.apply_change("guild", "insert", {"id": 2, "name": "Python Devs"})
+            return query(*columns)
+
+        db.query = racing_query
+        index.refresh(db)
+        assert [m["id"] for m in index.match("python devs")] == [2]
+        assert [m["id"] for m in index.match("user1 test")] == [1]
+        assert index._pending is None
+
+    def test_changes_are_published_by_the_builder_thread(self, index, monkeypatch):
+        index.start()
+        try:
+            version = index.version
+            index.apply_change("guild", "insert", {"id": 2, "name": "Python Devs"})
+            deadline = time.time() + 5
+            while index.version == version and time.time() < deadline:
+                time.sleep(0.01)
+            monkeypatch.setattr(index, "rebuild", lambda: pytest.fail("rebuilt on the request thread"))
+            assert [m["id"] for m in index.match("python devs")] == [2]
+        finally:
+            index.stop()
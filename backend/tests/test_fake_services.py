@@ -0,0 +1,96 @@
+"""
+Tests for the offline fake OpenAI and Qdrant servers
+"""
+
+import httpx
+import pytest
+from qdrant_client import QdrantClient
+from qdrant_client.models import FieldCondition, Filter, MatchValue, PointStruct, VectorParams, Distance
+
+from fake_services import FakeOpenAI, FakeQdrant, FakeServer, embed_text
+
+
+def cosine(a, b):
+    return sum(x * y for x, y in zip(a, b))
+
+
+@pytest.fixture
+def qdrant():
+    server = FakeServer(FakeQdrant()).start()
+    yield server
+    server.stop()
+
+
+class TestEmbeddings:
+    def test_deterministic_unit_vectors(self):
+        vector = embed_text("Dell XPS 15 Laptop")
+        assert vector == embed_text("Dell XPS 15 Laptop")
+        assert len(vector) == 1536
+        assert cosine(vector, vector) == pytest.approx(1.0)
+
+    def test_shared_words_score_higher(self):
+        query = embed_text("laptops for programming")
+        laptop = embed_text("Premium Laptop in great condition")
+        chair = embed_text("Office Chair in great condition")
+        assert cosine(query, laptop) > cosine(query, chair)
+        assert cosine(query, chair) > 0.3  # unrelated texts keep a baseline, like real embeddings
+
+
+class TestFakeOpenAI:
+    def test_scripted_completion_and_json_fallback(self):
+        fake = FakeOpenAI(script=[{"match": "escrow", "response": "Escrow answer for: {message}", "role": "user"}])
+        server = FakeServer(fake).start()
+        try:
+            with httpx.Client(base_url=f"{server.url}/v1") as client:
+                reply = client.post("/chat/completions", json={
+                    "model": "gpt-4o-mini", "messages": [{"role": "user", "content": "how does escrow work?"}]}).json()
+                assert reply["choices"][0]["message"]["content"] == "Escrow answer for: how does escrow work?"
+
+                reply = client.post("/chat/completions", json={
+                    "messages": [{"role": "user", "content": "hi"}], "response_format": {"type": "json_object"}}).json()
+                assert reply["choices"][0]["message"]["content"] == "{}"
+        finally:
+            server.stop()
+
+    def test_error_injection(self):
+        server = FakeServer(FakeOpenAI(error_rate=1.0, error_status=429)).start()
+        try:
+            response = httpx.post(f"{server.url}/v1/embeddings", json={"input": "laptop"})
+            assert response.status_code == 429
+            assert response.headers["Retry-After"] == "0"
+            assert server.service.stats["errors_injected"] == 1
+        finally:
+            server.stop()
+
+
+class TestFakeQdrant:
+    def test_rest_upsert_and_search(self, qdrant):
+        with httpx.Client(base_url=qdrant.url) as client:
+            client.put("/collections/products", json={"vectors": {"size": 1536, "distance": "Cosine"}}).raise_for_status()
+            client.put("/collections/products/points", json={"points": [
+                {"id": 1, "vector": embed_text("Premium Laptop"), "payload": {"name": "Premium Laptop"}},
+                {"id": 2, "vector": embed_text("Running Shoes"), "payload": {"name": "Running Shoes"}},
+            ]}).raise_for_status()
+            results = client.post("/collections/products/points/search", json={
+                "vector": embed_text("laptops"), "limit": 5, "score_threshold": 0.6, "with_payload": True,
+            }).json()["result"]
+            assert [r["payload"]["name"] for r in results] == ["Premium Laptop"]
+
+            client.post("/collections/products/points/delete", json={"points": [1]}).raise_for_status()
+            assert client.get("/collections/products").json()["result"]["points_count"] == 1
+            assert client.post("/collections/missing/points/search", json={"vector": [0.0]}).status_code == 404
+
+    def test_qdrant_client_with_payload_filter(self, qdrant):
+        client = QdrantClient(url=qdrant.url)
+        client.create_collection("marketplace_products", vectors_config=VectorParams(size=1536, distance=Distance.COSINE))
+        assert [c.name for c in client.get_collections().collections] == ["marketplace_products"]
+        client.upsert("marketplace_products", points=[
+            PointStruct(id=1, vector=embed_text("Gaming Laptop"), payload={"category": "electronics"}),
+            PointStruct(id=2, vector=embed_text("Laptop Bag"), payload={"category": "fashion"}),
+        ])
+        results = client.search(
+            collection_name="marketplace_products", query_vector=embed_text("laptop"), limit=5,
+            query_filter=Filter(must=[FieldCondition(key="category", match=MatchValue(value="fashion"))]),
+        )
+        assert [r.id for r in results] == [2]
+        assert results[0].payload == {"category": "fashion"}
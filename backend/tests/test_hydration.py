@@ -0,0 +1,69 @@
+"""
+Tests for batched sender hydration: list endpoints cost the same number of
+queries whatever the page size
+"""
+
+import asyncio
+
+import pytest
+from sqlalchemy import event
+
+import guild_chat_routes
+import hydration
+from database import Guild, GuildChat, GuildChatMessage, User, guild_members
+
+
+@pytest.fixture
+def db(engine, session_factory, add_users):
+    session = session_factory()
+    add_users(session, range(1, 21))
+    session.commit()
+    session.queries = []
+    event.listen(engine, "before_cursor_execute",
+                 lambda conn, cursor, statement, *args: session.queries.append(statement))
+    yield session
+    session.close()
+
+
+def add_guild(db, guild_id, messages):
+    db.add(Guild(id=guild_id, name=f"Guild {guild_id}", owner_id=1))
+    db.add(GuildChat(id=guild_id, guild_id=guild_id))
+    db.flush()
+    for user_id in range(2, 21):
+        db.execute(guild_members.insert().values(user_id=user_id, guild_id=guild_id))
+    for i in range(messages):
+        # Twenty senders, with an Ava reply (sender 0) every seventh message
+        db.add(GuildChatMessage(guild_chat_id=guild_id, sender_id=i % 20 + 1 if i % 7 else 0, content=f"m{i}"))
+    db.commit()
+
+
+def count_queries(db, call):
+    me = db.get(User, 1)
+    db.queries.clear()
+    result = asyncio.run(call(me))
+    return len(db.queries), result
+
+
+class TestHydration:
+    def test_last_messages_one_per_chat(self, db):
+        add_guild(db, 1, 3)
+        add_guild(db, 2, 5)
+        latest = hydration.last_messages(db, GuildChatMessage, GuildChatMessage.guild_chat_id, [1, 2])
+        assert {chat_id: msg.content for chat_id, msg in latest.items()} == {1: "m2", 2: "m4"}
+
+    def test_message_page_query_count_is_constant(self, db):
+        add_guild(db, 1, 60)
+        small, page = count_queries(db, lambda me: guild_chat_routes.get_guild_chat_messages(1, 0, 5, me, db))
+        large, page = count_queries(db, lambda me: guild_chat_routes.get_guild_chat_messages(1, 5, 50, me, db))
+        assert len(page) == 50
+        assert small == large
+        assert {m.sender_name for m in page if m.sender_id == 0} == {"Ava AI"}
+
+    def test_chat_list_query_count_is_constant(self, db):
+        add_guild(db, 1, 10)
+        one, _ = count_queries(db, lambda me: guild_chat_routes.get_user_guild_chats(me, db))
+        for guild_id in range(2, 8):
+            add_guild(db, guild_id, 10)
+        many, chats = count_queries(db, lambda me: guild_chat_routes.get_user_guild_chats(me, db))
+        assert len(chats) == 7
+        assert one == many
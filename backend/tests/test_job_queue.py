@@ -0,0 +1,218 @@
+"""
+Tests for the background job queue: claiming, retries and dead-lettering
+"""
+
+from datetime import datetime, timedelta
+
+import pytest
+
+import job_queue
+from database import Job, User
+
+
+@pytest.fixture
+def session_factory(session_factory, monkeypatch):
+    monkeypatch.setattr(job_queue, "JOB_RETRY_BASE_SECONDS", 0)
+    return session_factory
+
+
+class TestRunning:
+    def test_handler_writes_commit_with_the_job(self, session_factory):
+        pushed = []
+
+        @job_queue.handler("test.create_user")
+        def create_user(db, payload):
+            db.add(User(id=payload["id"], email="a@example.com", first_name="A", last_name="B",
+                        country="Nigeria", hashed_password="x"))
+            return lambda: pushed.append(payload["id"])
+
+        db = session_factory()
+        job_queue.enqueue(db, "test.create_user", {"id": 7})
+        db.commit()
+
+        worker = job_queue.JobWorker(session_factory)
+        assert worker.run_pending() == 1
+        assert pushed == [7]
+        assert db.get(User, 7) is not None
+        assert db.query(Job).one().status == "done"
+        assert worker.run_pending() == 0
+
+    def test_failures_retry_then_dead_letter(self, session_factory):
+        attempts, dead = [], []
+
+        def give_up(db, payload, error):
+            dead.append(error)
+
+        @job_queue.handler("test.flaky", on_dead=give_up)
+        def flaky(db, payload):
+            attempts.append(1)
+            raise RuntimeError("LLM unavailable")
+
+        db = session_factory()
+        job_queue.enqueue(db, "test.flaky", {}, max_attempts=3)
+        db.commit()
+
+        worker = job_queue.JobWorker(session_factory)
+        worker.run_pending()
+        job = db.query(Job).one()
+        assert len(attempts) == 3
+        assert (job.status, job.attempts) == ("dead", 3)
+        assert dead == ["RuntimeError: LLM unavailable"]
+        assert worker.outcomes == {"done": 0, "queued": 2, "dead": 1, "lost": 0}
+
+        assert job_queue.retry_dead(db, job.id)
+        db.expire_all()
+        assert db.query(Job).one().status == "queued"
+
+
+class TestClaiming:
+    def test_a_claimed_job_is_not_claimed_again(self, session_factory):
+        db = session_factory()
+        job_queue.enqueue(db, "test.noop", {})
+        db.commit()
+        assert len(job_queue.claim(session_factory(), "worker-a")) == 1
+        assert job_queue.claim(session_factory(), "worker-b") == []
+
+    def test_heartbeat_renews_the_lock(self, session_factory):
+        seen = []
+
+        @job_queue.handler("test.long")
+        def long_job(db, payload):
+            db.query(Job).update({Job.locked_at: datetime.utcnow() - timedelta(hours=1)})  # a long first batch
+            job_queue.heartbeat(db)
+            seen.append(job_queue.claim(session_factory(), "worker-b"))
+
+        db = session_factory()
+        job_queue.enqueue(db, "test.long", {})
+        db.commit()
+        (job,) = job_queue.claim(db, "worker-a")
+        assert job_queue.run_job(db, job) == "done"
+        assert seen == [[]]  # renewed, so not reclaimed
+        db.expire_all()
+        assert db.query(Job).one().status == "done"
+
+    def test_a_reclaimed_run_stops_without_finishing_or_queueing(self, session_factory):
+        @job_queue.handler("test.chain")
+        def chain(db, payload):
+            job_queue.enqueue(db, "test.chain", {"next": True})
+            # The lock timed out mid-run and another worker took the job over
+            other = session_factory()
+            other.query(Job).filter(Job.kind == "test.chain").update({Job.locked_by: "worker-b"})
+            other.commit()
+
+        db = session_factory()
+        job_queue.enqueue(db, "test.chain", {})
+        db.commit()
+        (job,) = job_queue.claim(db, "worker-a")
+        assert job_queue.run_job(db, job) == "lost"
+        db.expire_all()
+        (job,) = db.query(Job).all()  # no fork of the chain
+        assert (job.status, job.locked_by) == ("running", "worker-b")
+
+
+class TestAvaReplies:
+    @pytest.fixture
+    def dm_job(self, session_factory, add_users):
+        import chat_routes
+        import conversations
+        from database import Message
+
+        db = session_factory()
+        add_users(db, (1, 2))
+        conversation = conversations.get_or_create(db, 1, 2)
+        db.flush()
+        message = Message(content="@Ava how do I post a project?", sender_id=1, recipient_id=2,
+                          conversation_id=conversation.id)
+        db.add(message)
+        db.flush()
+        job_queue.enqueue(db, "ava_reply.dm", {
+            "user_id": 1, "recipient_id": 2, "conversation_id": conversation.id,
+            "message_id": message.id, "query": "how do I post a project?"
+        }, max_attempts=2)
+        db.commit()
+        return db
+
+    def test_llm_failures_are_retried_then_dead_lettered(self, session_factory, dm_job, monkeypatch):
+        import ai_assistant
+        import llm_gateway
+        from database import AIConversation, Message
+
+        calls = []
+
+        def provider_down(call_site, **kwargs):
+            calls.append(call_site)
+            raise ConnectionError("provider down")
+
+        monkeypatch.setattr(llm_gateway, "is_configured", lambda: True)
+        monkeypatch.setattr(llm_gateway, "chat", provider_down)
+
+        worker = job_queue.JobWorker(session_factory)
+        worker.run_pending()
+        assert calls.count("assistant.completion") == 2
+        assert worker.outcomes == {"done": 0, "queued": 1, "dead": 1, "lost": 0}
+        assert dm_job.query(AIConversation).count() == 0
+        (reply,) = dm_job.query(Message).filter(Message.sender_id == 0).all()
+        assert reply.content == ai_assistant.AVA_UNAVAILABLE_MESSAGE
+
+    def test_answer_and_usage_commit_with_the_job(self, session_factory, dm_job, monkeypatch):
+        from types import SimpleNamespace
+
+        import ai_token_manager
+        import llm_gateway
+        from database import AIConversation, Message
+
+        monkeypatch.setattr(llm_gateway, "is_configured", lambda: True)
+        monkeypatch.setattr(llm_gateway, "chat", lambda *args, **kwargs: SimpleNamespace(
+            choices=[SimpleNamespace(message=SimpleNamespace(content="Open Projects and click New."))],
+            usage=SimpleNamespace(total_tokens=42)
+        ))
+        ledger = ai_token_manager.UsageLedger()
+        monkeypatch.setattr(ai_token_manager, "usage_ledger", ledger)
+
+        assert job_queue.JobWorker(session_factory).run_pending() == 1
+        assert dm_job.query(Job).one().status == "done"
+        assert dm_job.query(Message).filter(Message.sender_id == 0).one().content.startswith("Open Projects")
+        conversation = dm_job.query(AIConversation).one()
+        assert ledger.usage(dm_job.get(User, 1))["tokens_used"] == 42
+        assert ledger._pending[1].conversation_ids == [conversation.id]
+
+    def test_project_chat_reply_without_a_budget(self, session_factory, add_users, monkeypatch):
+        from types import SimpleNamespace
+
+        import llm_gateway
+        import project_chat
+        from database import Project, ProjectChat, ProjectChatMessage
+
+        db = session_factory()
+        add_users(db, (1, 2))
+        project = Project(title="Logo design", owner_id=1, budget=None)
+        db.add(project)
+        db.flush()
+        chat = ProjectChat(project_id=project.id, freelancer_id=2)
+        db.add(chat)
+        db.flush()
+        message = ProjectChatMessage(chat_id=chat.id, sender_id=1, content="@Ava what should we cover first?")
+        db.add(message)
+        db.flush()
+        job_queue.enqueue(db, "ava_reply.project_chat", {
+            "user_id": 1, "chat_id": chat.id, "message_id": message.id, "query": "what should we cover first?"
+        }, max_attempts=2)
+        db.commit()
+
+        prompts = []
+
+        def answer(call_site, **kwargs):
+            prompts.append(kwargs["messages"][-1]["content"])
+            return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content="Start with the brief."))],
+                                   usage=SimpleNamespace(total_tokens=10))
+
+        monkeypatch.setattr(llm_gateway, "is_configured", lambda: True)
+        monkeypatch.setattr(llm_gateway, "chat", answer)
+
+        worker = job_queue.JobWorker(session_factory)
+        worker.run_pending()
+        assert worker.outcomes["done"] == 1
+        assert db.query(ProjectChatMessage).filter(ProjectChatMessage.sender_id == 0).one().content == (
+            "Start with the brief."
+        )
+        assert any("[Project Context: Logo design - Status: active]" in prompt for prompt in prompts)
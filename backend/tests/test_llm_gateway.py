@@ -0,0 +1,165 @@
+"""
+Tests for the LLM gateway: retries, deadlines, circuit breaker and limits
+Runs against a scripted local HTTP server speaking the OpenAI chat API.
+"""
+
+import json
+import time
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import llm_gateway
+from llm_gateway import CallSite, CircuitBreaker, LLMGateway, LLMUnavailable, TokenBucket
+
+
+class ScriptedOpenAI:
+    """Serves queued (status, delay) responses, then 200s"""
+
+    def __init__(self):
+        self.script = []
+        self.requests = 0
+        outer = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+            def do_POST(self):
+                self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                outer.requests += 1
+                status, delay = outer.script.pop(0) if outer.script else (200, 0)
+                time.sleep(delay)
+                payload = {"error": {"message": "boom"}} if status != 200 else {
+                    "id": "chatcmpl-test", "object": "chat.completion", "created": 0, "model": "test",
+                    "choices": [{"index": 0, "finish_reason": "stop",
+                                 "message": {"role": "assistant", "content": "ok"}}],
+                    "usage": {"prompt_tokens": 7, "completion_tokens": 1, "total_tokens": 8},
+                }
+                body = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.base_url = f"http://127.0.0.1:{self.server.server_port}/v1"
+
+
+@pytest.fixture
+def upstream(monkeypatch):
+    server = ScriptedOpenAI()
+    monkeypatch.setenv("OPENAI_API_KEY", "sk-test")
+    monkeypatch.setenv("OPENAI_BASE_URL", server.base_url)
+    monkeypatch.setattr(llm_gateway, "LLM_RETRY_BASE_SECONDS", 0.01)
+    monkeypatch.setitem(llm_gateway.CALL_SITES, "test.chat", CallSite(2.0, 2))
+    yield server
+    server.server.shutdown()
+
+
+def ask(gateway):
+    return gateway.chat("test.chat", model="test", messages=[{"role": "user", "content": "hi"}])
+
+
+class TestGatewayCalls:
+    """End-to-end behaviour against the scripted server"""
+
+    def test_retries_server_errors_then_succeeds(self, upstream):
+        gateway = LLMGateway()
+        upstream.script = [(503, 0), (429, 0)]
+        response = ask(gateway)
+        assert response.choices[0].message.content == "ok"
+        assert upstream.requests == 3
+        stats = gateway.get_stats()["call_sites"]["test.chat"]
+        assert stats["retries"] == 2
+        assert stats["successes"] == 1
+        assert stats["prompt_tokens"] == 7
+
+    def test_client_errors_are_not_retried(self, upstream):
+        gateway = LLMGateway()
+        upstream.script = [(400, 0)]
+        with pytest.raises(Exception):
+            ask(gateway)
+        assert upstream.requests == 1
+        assert gateway.breakers["chat"].state == "closed"
+
+    def test_deadline_bounds_a_slow_upstream(self, upstream, monkeypatch):
+        monkeypatch.setitem(llm_gateway.CALL_SITES, "test.chat", CallSite(0.3, 2))
+        gateway = LLMGateway()
+        upstream.script = [(200, 1.0)]
+        started = time.monotonic()
+        with pytest.raises(LLMUnavailable) as error:
+            ask(gateway)
+        assert error.value.reason == "timeout"
+        assert time.monotonic() - started < 0.8
+
+    def test_open_circuit_fails_fast_without_calling_upstream(self, upstream, monkeypatch):
+        monkeypatch.setitem(llm_gateway.CALL_SITES, "test.chat", CallSite(2.0, 0))
+        gateway = LLMGateway()
+        gateway.breakers["chat"] = CircuitBreaker("chat", failure_threshold=2, cooldown_seconds=60)
+        upstream.script = [(500, 0), (500, 0)]
+        for _ in range(2):
+            with pytest.raises(Exception):
+                ask(gateway)
+        with pytest.raises(LLMUnavailable) as error:
+            ask(gateway)
+        assert error.value.reason == "circuit_open"
+        assert upstream.requests == 2
+
+    def test_not_configured(self, monkeypatch):
+        monkeypatch.setenv("OPENAI_API_KEY", "your-openai-api-key-here")
+        with pytest.raises(LLMUnavailable) as error:
+            ask(LLMGateway())
+        assert error.value.reason == "not_configured"
+
+
+class TestCircuitBreaker:
+    """State machine with a controllable clock"""
+
+    def make(self):
+        self.now = 0.0
+        return CircuitBreaker("test", failure_threshold=3, cooldown_seconds=10, clock=lambda: self.now)
+
+    def test_opens_after_consecutive_failures(self):
+        breaker = self.make()
+        for _ in range(3):
+            assert breaker.allow()
+            breaker.record(TimeoutError())
+        assert breaker.state == "open"
+        assert not breaker.allow()
+
+    def test_success_resets_failure_count(self):
+        breaker = self.make()
+        breaker.record(TimeoutError())
+        breaker.record(TimeoutError())
+        breaker.record(None)
+        breaker.record(TimeoutError())
+        assert breaker.state == "closed"
+
+    def test_half_open_allows_a_single_probe(self):
+        breaker = self.make()
+        for _ in range(3):
+            breaker.record(TimeoutError())
+        self.now = 11
+        assert breaker.allow()
+        assert not breaker.allow()
+        breaker.record(TimeoutError())
+        assert breaker.state == "open"
+        self.now = 22
+        assert breaker.allow()
+        breaker.record(None)
+        assert breaker.state == "closed"
+
+
+class TestTokenBucket:
+    def test_burst_then_wait(self):
+        now = [0.0]
+        bucket = TokenBucket(rate=10, capacity=2, clock=lambda: now[0])
+        assert bucket.reserve() == 0
+        assert bucket.reserve() == 0
+        assert bucket.reserve() == pytest.approx(0.1)
+        now[0] = 1.0
+        assert bucket.reserve() == 0
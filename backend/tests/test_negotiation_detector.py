@@ -0,0 +1,83 @@
+"""
+Tests for rule-based negotiation tracking and debounced LLM confirmation
+"""
+
+from types import SimpleNamespace
+
+from negotiation_detector import NegotiationDetector, classify, extract_amount, extract_deadline_days
+
+CLIENT, FREELANCER = 1, 2
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestExtraction:
+    def test_prices(self):
+        assert extract_amount("I can do it for ₦150,000") == 150000
+        assert extract_amount("how about 120k?") == 120000
+        assert extract_amount("we have a deal at NGN 1.2m") == 1200000
+        assert extract_amount("My budget is 80000") == 80000
+        assert extract_amount("built in 2024 for 3 clients") is None
+        assert extract_amount("I have 5 years experience") is None
+
+    def test_deadlines(self):
+        assert extract_deadline_days("delivered in 2 weeks") == 14
+        assert extract_deadline_days("within three days") == 3
+        assert extract_deadline_days("150k and 10 days?") == 10
+        assert extract_deadline_days("hello there") is None
+
+    def test_classification(self):
+        assert classify("Deal, let's proceed").kind == "agreement"
+        assert classify("Agreed?").kind == "chat"
+        assert classify("I don't agree with that").kind == "rejection"
+        assert classify("That is too high, how about 120k").kind == "offer"
+
+
+class TestStateMachine:
+    def test_accepting_counterpart_offer_is_likely_conclusion(self):
+        detector = NegotiationDetector()
+        assert not detector.observe(7, CLIENT, "Budget is ₦100,000, done in 2 weeks")
+        assert not detector.observe(7, FREELANCER, "Too low, how about 150k?")
+        assert detector.state(7).phase == "countered"
+        assert detector.observe(7, CLIENT, "Okay deal, let's proceed")
+        agreed = detector.state(7).agreed
+        assert (agreed.amount, agreed.deadline_days) == (150000, 14)
+
+    def test_agreeing_to_own_offer_or_rejecting_is_not(self):
+        detector = NegotiationDetector()
+        detector.observe(7, FREELANCER, "I can do it for 150k")
+        assert not detector.observe(7, FREELANCER, "Deal!")
+        assert not detector.observe(7, CLIENT, "I don't agree, that's too much")
+        assert not detector.observe(7, 0, "Ava: Sounds good")  # Ava's own messages are ignored
+
+    def test_replayed_agreement_is_not_prompted_again(self):
+        detector = NegotiationDetector()
+        history = [SimpleNamespace(id=1, sender_id=CLIENT, content="₦90,000 in 10 days?"),
+                   SimpleNamespace(id=2, sender_id=FREELANCER, content="Sounds good, let's start")]
+        detector.replay(7, history)
+        assert detector.state(7).phase == "confirmed"
+        assert not detector.observe(7, CLIENT, "Great, agreed")
+        assert not detector.observe(7, FREELANCER, "Sounds good, let's start", message_id=2)
+
+
+class TestDebounce:
+    def test_one_llm_check_per_window(self):
+        clock = FakeClock()
+        detector = NegotiationDetector(debounce_seconds=60, clock=clock)
+        assert detector.claim_check(7)
+        assert not detector.claim_check(7)  # still running
+        detector.finish_check(7, False)
+        clock.now += 30
+        assert not detector.claim_check(7)  # inside the window
+        clock.now += 31
+        assert detector.claim_check(7)
+        detector.finish_check(7, True)
+        assert detector.state(7).phase == "confirmed"
+        stats = detector.snapshot()
+        assert (stats["confirmations_scheduled"], stats["debounced"]) == (2, 2)
@@ -0,0 +1,90 @@
+"""
+Tests for notifications: preferences at emit time, collapsing, guild fan-out, paging and mark-read
+"""
+
+import pytest
+
+import job_queue
+import notifications
+import realtime_hub
+from database import Guild, Notification, guild_members
+
+
+@pytest.fixture
+def session_factory(session_factory, add_users, monkeypatch):
+    monkeypatch.setattr(notifications, "NOTIFICATION_FANOUT_BATCH", 2)
+    session = session_factory()
+    add_users(session, range(1, 6))
+    session.add(Guild(id=1, name="Guild", owner_id=1))
+    session.execute(guild_members.insert(), [{"user_id": user_id, "guild_id": 1} for user_id in (2, 3, 4, 5)])
+    session.commit()
+    session.close()
+    return session_factory
+
+
+@pytest.fixture
+def pushed(monkeypatch):
+    events = []
+    monkeypatch.setattr(realtime_hub, "publish", lambda channel, event, data: events.append((channel, data["type"])))
+    return events
+
+
+class TestNotify:
+    def test_preferences_and_push_are_honored(self, session_factory, pushed):
+        db = session_factory()
+        notifications.update_preferences(db, 2, {"marketplace_updates": False})
+        notifications.update_preferences(db, 3, {"push_notifications": False})
+
+        assert notifications.notify(db, 2, "order.created", "New Order", "x", actor_id=1) is None
+        assert notifications.notify(db, 3, "order.created", "New Order", "x", actor_id=1) is not None
+        assert notifications.notify(db, 4, "order.created", "New Order", "x", actor_id=4) is None
+        assert pushed == []
+        db.commit()
+
+        assert notifications.unread_count(db, 3) == 1
+        assert pushed == []
+
+    def test_collapse_key_keeps_one_unread(self, session_factory, pushed):
+        db = session_factory()
+        for _ in range(3):
+            notifications.notify(db, 2, "message.received", "New Message", "hi", actor_id=3, collapse_key="dm:3")
+        db.commit()
+        assert notifications.unread_count(db, 2) == 1
+        assert pushed == [("user:2", "message.received")]
+
+        notifications.mark_read(db, 2)
+        db.commit()
+        notifications.notify(db, 2, "message.received", "New Message", "again", actor_id=3, collapse_key="dm:3")
+        db.rollback()
+        assert notifications.unread_count(db, 2) == 0
+        assert len(pushed) == 1
+
+
+class TestGuildFanOut:
+    def test_batches_skip_the_actor_and_opted_out_members(self, session_factory, pushed):
+        db = session_factory()
+        notifications.update_preferences(db, 4, {"guild_updates": False})
+        notifications.update_preferences(db, 5, {"push_notifications": False})
+        notifications.fan_out_to_guild(db, 1, "guild.post", "New Guild Post", "posted", actor_id=2)
+        db.commit()
+
+        assert job_queue.JobWorker(session_factory).run_pending() == 1
+        assert sorted(user_id for (user_id,) in db.query(Notification.user_id)) == [1, 3, 5]
+        assert sorted(pushed) == [("user:1", "guild.post"), ("user:3", "guild.post")]
+
+
+class TestListing:
+    def test_keyset_pages_and_bulk_mark_read(self, session_factory):
+        db = session_factory()
+        ids = [notifications.notify(db, 2, "post.replied", "New Comment", str(n), actor_id=3).id for n in range(5)]
+        db.commit()
+
+        first = notifications.page(db, 2, limit=2)
+        second = notifications.page(db, 2, before=first[-1].id, limit=2)
+        assert [n.id for n in first + second] == ids[::-1][:4]
+
+        assert notifications.mark_read(db, 2, ids=[ids[4]]) == 1
+        assert notifications.mark_read(db, 2, up_to=ids[1]) == 2
+        db.commit()
+        assert notifications.unread_count(db, 2) == 2
+        assert [n.id for n in notifications.page(db, 2, unread_only=True)] == [ids[3], ids[2]]
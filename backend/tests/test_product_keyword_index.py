@@ -0,0 +1,113 @@
+"""
+Unit tests for the product keyword index
+"""
+
+import threading
+import time
+
+import pytest
+
+from database import ProductKeyword
+from product_keyword_index import ProductKeywordIndex, stem
+
+
+class TestProductKeywordIndex:
+    """Test exact, plural, n-gram and typo-tolerant lookups"""
+
+    @pytest.fixture
+    def index(self):
+        index = ProductKeywordIndex()
+        index.loaded_at = float("inf")  # never hit the database in tests
+        index.apply_change("insert", {"id": 1, "keyword": "ankara", "category": "clothing"})
+        index.apply_change("insert", {"id": 2, "keyword": "gaming chair", "category": "furniture"})
+        return index
+
+    def test_exact_and_plural(self, index):
+        assert index.lookup("I need a laptop")[0] == ["laptop"]
+        assert index.lookup("show me laptops and watches")[0] == ["laptop", "watch"]
+
+    def test_multi_word_keyword(self, index):
+        assert index.lookup("any gaming chairs under 50k?")[0] == ["furniture"]
+
+    def test_db_keyword_and_delete(self, index):
+        assert index.lookup("ankara fabric")[0] == ["clothing"]
+        index.apply_change("delete", {"id": 1, "keyword": "ankara", "category": "clothing"})
+        categories, unknown = index.lookup("ankara fabric")
+        assert categories == []
+        assert unknown == ["ankara", "fabric"]
+
+    def test_typo_corrected_locally(self, index):
+        assert index.lookup("looking for a keybord")[0] == ["keyboard"]
+        assert index.lookup("i want to buy runnign shoes")[0] == ["shoe"]
+
+    @pytest.mark.parametrize("message", [
+        "tell me about it",  # tell -> dell
+        "I need a house",  # house -> mouse
+        "sell my car",  # sell -> dell
+        "the shows were great",  # shows -> shoes
+    ])
+    def test_ordinary_words_are_not_typos(self, index, message):
+        assert index.lookup(message)[0] == []
+
+    def test_short_words_still_reach_the_fallback(self, index):
+        # "nice" used to become "mice", which also kept "shirt" from the LLM fallback
+        categories, unknown = index.lookup("looking for a nice shirt")
+        assert categories == []
+        assert "shirt" in unknown
+
+    def test_unknown_terms_skip_stopwords_and_rejections(self, index):
+        categories, unknown = index.lookup("I want to buy a drone for 50000")
+        assert categories == []
+        assert unknown == ["drone"]
+
+        index.mark_not_product(["drone"])
+        assert index.lookup("I want to buy a drone")[1] == []
+
+    def test_stem(self):
+        assert stem("accessories") == "accessory"
+        assert stem("watches") == "watch"
+        assert stem("glass") == "glass"
+
+
+class TestReload:
+    """Reloads run off the request thread and keep changes that race them"""
+
+    @pytest.fixture
+    def index(self):
+        index = ProductKeywordIndex()
+        index.loaded_at = float("inf")
+        return index
+
+    def test_change_during_reload_survives_the_swap(self, index, session_factory):
+        db = session_factory()
+        db.add(ProductKeyword(keyword="ankara", category="clothing"))
+        db.commit()
+
+        query = db.query
+        def racing_query(*columns):
+            # a keyword commits after the reload's query snapshot
+            index.apply_change("insert", {"id": 99, "keyword": "gaming chair", "category": "furniture"})
+            return query(*columns)
+
+        db.query = racing_query
+        index.refresh(db)
+        assert sorted(index.lookup("ankara gaming chair")[0]) == ["clothing", "furniture"]
+
+    def test_lookup_leaves_reloads_to_the_background_thread(self, index, monkeypatch):
+        reloaded_on = []
+
+        def refresh(db=None):
+            reloaded_on.append(threading.current_thread().name)
+            index.loaded_at = time.time()
+
+        monkeypatch.setattr(index, "refresh", refresh)
+        index.loaded_at = 0.0  # stale from the start
+        index.start()
+        try:
+            index.lookup("a laptop")
+            deadline = time.time() + 5
+            while not reloaded_on and time.time() < deadline:
+                time.sleep(0.01)
+            assert reloaded_on == ["keyword-index-reloader"]
+        finally:
+            index.stop()
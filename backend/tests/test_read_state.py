@@ -0,0 +1,53 @@
+"""
+Tests for per-user read cursors and cursor-derived unread counts
+"""
+
+import pytest
+
+import read_state
+from database import Guild, GuildChat, GuildChatMessage
+
+
+@pytest.fixture
+def db(session_factory, add_users):
+    session = session_factory()
+    add_users(session, (1, 2))
+    session.add_all([Guild(id=i, name=f"Guild {i}", owner_id=1) for i in (1, 2)])
+    session.add_all([GuildChat(id=i, guild_id=i) for i in (1, 2)])
+    session.commit()
+    yield session
+    session.close()
+
+
+def post(db, chat_id, sender_id, deleted=False):
+    message = GuildChatMessage(guild_chat_id=chat_id, sender_id=sender_id, content="hi", is_deleted=deleted)
+    db.add(message)
+    db.commit()
+    return message
+
+
+class TestCursors:
+    def test_upsert_is_monotonic_and_idempotent(self, db):
+        first, second = post(db, 1, 2), post(db, 1, 2)
+        assert read_state.mark_read(db, 1, "guild_chat:1", second.id)
+        assert not read_state.mark_read(db, 1, "guild_chat:1", second.id)
+        assert not read_state.mark_read(db, 1, "guild_chat:1", first.id)
+        db.commit()
+        assert read_state.get_cursor(db, 1, "guild_chat:1") == second.id
+        assert read_state.get_cursor(db, 2, "guild_chat:1") == 0
+
+    def test_unknown_channel_is_rejected(self, db):
+        with pytest.raises(ValueError):
+            read_state.mark_read(db, 1, "user:1", 5)
+
+
+class TestUnreadCounts:
+    def test_counts_messages_after_cursor_per_chat(self, db):
+        seen = post(db, 1, 2)
+        post(db, 1, 2)
+        post(db, 1, 1)  # own message
+        post(db, 1, 2, deleted=True)
+        post(db, 2, 2)
+        read_state.commit_read(db, 1, "guild_chat:1", seen.id)
+        counts = read_state.unread_counts(db, 1, "guild_chat", {"guild_chat:1": 1, "guild_chat:2": 2})
+        assert counts == {"guild_chat:1": 1, "guild_chat:2": 1}
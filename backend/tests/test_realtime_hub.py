@@ -0,0 +1,109 @@
+"""
+Tests for realtime channel fan-out, presence and slow-consumer handling
+"""
+
+import asyncio
+import json
+import threading
+
+from realtime_hub import RealtimeHub, dm_channel, parse_channel
+
+
+def drain(connection):
+    frames = []
+    while not connection.outbox.empty():
+        frame = connection.outbox.get_nowait()
+        frames.append(None if frame is None else json.loads(frame))
+    return frames
+
+
+def run(scenario):
+    async def main():
+        hub = RealtimeHub()
+        await hub.start()
+        try:
+            return await scenario(hub)
+        finally:
+            await hub.stop()
+    return asyncio.run(main())
+
+
+class TestChannels:
+    def test_parse_channel(self):
+        assert dm_channel(9, 3) == "dm:3:9"
+        assert parse_channel("dm:3:9") == ("dm", (3, 9))
+        assert parse_channel("guild_chat:4") == ("guild_chat", (4,))
+        assert parse_channel("dm:9:3") is None  # not canonical
+        assert parse_channel("guild_chat:x") is None
+        assert parse_channel("admin:1") is None
+
+
+class TestFanOut:
+    def test_publish_reaches_every_subscriber_once(self):
+        async def scenario(hub):
+            alice, bob, carol = hub.connect(1, "ws"), hub.connect(2, "sse"), hub.connect(3, "ws")
+            channel = dm_channel(1, 2)
+            hub.subscribe(alice, channel)
+            hub.subscribe(bob, channel)
+            for connection in (alice, bob, carol):
+                drain(connection)
+            hub.publish(channel, "message.created", {"id": 5, "content": "hi"})
+            return drain(alice), drain(bob), drain(carol)
+
+        alice, bob, carol = run(scenario)
+        assert [f["event"] for f in alice] == ["message.created"]
+        assert alice[0]["data"] == {"id": 5, "content": "hi"}
+        assert alice[0]["id"] == bob[0]["id"]
+        assert carol == []
+
+    def test_publish_from_worker_thread(self):
+        async def scenario(hub):
+            connection = hub.connect(1, "ws")
+            thread = threading.Thread(target=hub.publish, args=("user:1", "dm.received", {"id": 1}))
+            thread.start()
+            thread.join()
+            return json.loads(await asyncio.wait_for(connection.outbox.get(), 1))
+
+        assert run(scenario)["event"] == "dm.received"
+
+
+class TestPresenceAndTyping:
+    def test_join_leave_counts_connections_per_user(self):
+        async def scenario(hub):
+            watcher = hub.connect(2, "ws")
+            hub.subscribe(watcher, "guild_chat:4")
+            first, second = hub.connect(1, "ws"), hub.connect(1, "sse")
+            hub.subscribe(first, "guild_chat:4")
+            hub.subscribe(second, "guild_chat:4")
+            online = hub.presence("guild_chat:4")
+            hub.disconnect(first)
+            still_online = hub.presence("guild_chat:4")
+            hub.disconnect(second)
+            events = [(f["event"], f["data"]["user_id"]) for f in drain(watcher)]
+            return online, still_online, events, hub.presence("guild_chat:4")
+
+        online, still_online, events, after = run(scenario)
+        assert online == still_online == [1, 2]
+        assert events == [("presence.join", 1), ("presence.leave", 1)]  # not its own join
+        assert after == [2]
+
+    def test_typing_is_throttled(self):
+        async def scenario(hub):
+            return [hub.typing(1, "project_chat:7") for _ in range(3)]
+
+        assert run(scenario) == [True, False, False]
+
+
+class TestSlowConsumer:
+    def test_full_outbox_disconnects_instead_of_buffering(self):
+        async def scenario(hub):
+            hub.outbox_size = 4
+            slow = hub.connect(1, "ws")
+            for i in range(10):
+                hub.publish("user:1", "dm.received", {"id": i})
+            return slow, hub.snapshot()
+
+        slow, stats = run(scenario)
+        assert slow.closed and slow.overflowed
+        assert stats["connections"] == 0
+        assert stats["slow_consumers_dropped"] == 1
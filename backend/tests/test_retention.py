@@ -0,0 +1,93 @@
+"""
+Tests for retention: batched archival to JSONL segments, purging and archive lookups
+"""
+
+from datetime import datetime, timedelta
+
+import pytest
+
+import retention
+from database import (
+    AIConversation, ArchiveSegment, Guild, GuildChat, GuildChatMessage
+)
+
+NOW = datetime(2026, 6, 1)
+
+
+@pytest.fixture
+def db(session_factory, add_users, monkeypatch):
+    monkeypatch.setattr(retention, "RETENTION_BATCH_SIZE", 2)
+    monkeypatch.setattr(retention, "RETENTION_BATCH_PAUSE_SECONDS", 0)
+    session = session_factory()
+    add_users(session, (1,))
+    session.add_all([Guild(id=1, name="Guild", owner_id=1), GuildChat(id=1, guild_id=1)])
+    session.commit()
+    yield session
+    session.close()
+
+
+def post(db, days_ago, deleted=False):
+    message = GuildChatMessage(guild_chat_id=1, sender_id=1, content=f"{days_ago} days ago",
+                               is_deleted=deleted, created_at=NOW - timedelta(days=days_ago))
+    db.add(message)
+    db.commit()
+    return message.id
+
+
+class TestGuildChatRetention:
+    def test_archives_in_batches_and_keeps_the_newest(self, db, tmp_path):
+        old = [post(db, days) for days in (900, 800, 700)]
+        deleted = post(db, 400, deleted=True)
+        newest = post(db, 600)  # old, but the chat's newest message
+
+        report = retention.run_retention(db, now=NOW, archive_dir=str(tmp_path))
+
+        assert [row.id for row in db.query(GuildChatMessage.id)] == [newest]
+        assert report["guild_chat_messages"]["purged"]["rows"] == 1
+        assert report["guild_chat_messages"]["archived"] == {"rows": 3, "batches": 2, "backlog": False}
+        assert db.query(ArchiveSegment).count() == 2
+
+        history = retention.archived_history(db, "guild_chat_messages", 1, archive_dir=str(tmp_path))
+        assert [row["id"] for row in history] == old[::-1]
+        assert deleted not in [row["id"] for row in history]
+        older = retention.archived_history(db, "guild_chat_messages", 1, before_id=old[2], limit=1,
+                                           archive_dir=str(tmp_path))
+        assert [row["id"] for row in older] == [old[1]]
+
+    def test_without_archive_dir_only_purges(self, db):
+        post(db, 900)
+        post(db, 900, deleted=True)
+        post(db, 1)
+        report = retention.run_retention(db, now=NOW, archive_dir="")
+        assert "archived" not in report["guild_chat_messages"]
+        assert db.query(GuildChatMessage).count() == 2
+
+
+class TestAIConversationRetention:
+    def test_unflushed_usage_is_not_archived(self, db, tmp_path):
+        for flushed in (True, False):
+            db.add(AIConversation(user_id=1, session_id="s", user_message="q", ai_response="a",
+                                  usage_flushed=flushed, created_at=NOW - timedelta(days=200)))
+        db.commit()
+        retention.run_retention(db, now=NOW, archive_dir=str(tmp_path))
+        assert [row.usage_flushed for row in db.query(AIConversation)] == [False]
+
+
+class TestScheduling:
+    def test_a_dead_run_queues_the_next_one(self, db, session_factory, monkeypatch):
+        import job_queue
+        from database import Job
+
+        def broken(db, **kwargs):
+            raise RuntimeError("disk full")
+
+        monkeypatch.setattr(retention, "run_retention", broken)
+        monkeypatch.setattr(job_queue, "JOB_RETRY_BASE_SECONDS", 0)
+        job_queue.enqueue(db, "retention.run", {}, max_attempts=1)
+        db.commit()
+
+        worker = job_queue.JobWorker(session_factory)
+        worker.run_pending()
+        assert [(job.status, job.run_at > datetime.utcnow()) for job in db.query(Job).order_by(Job.id)] == [
+            ("dead", False), ("queued", True)
+        ]
@@ -0,0 +1,131 @@
+"""
+Tests for single-flight coalescing of concurrent identical calls
+"""
+
+import asyncio
+import threading
+import time
+
+from single_flight import SingleFlight, coalesce, freeze
+
+
+def run_concurrently(count, fn):
+    results, threads = [None] * count, []
+    for i in range(count):
+        def target(i=i):
+            results[i] = fn()
+        threads.append(threading.Thread(target=target))
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+class TestSyncCoalescing:
+    def test_concurrent_identical_calls_share_one_execution(self):
+        executions = []
+
+        @coalesce("test.sync")
+        def slow(text, db=None):
+            executions.append(text)
+            time.sleep(0.2)
+            return [text]
+
+        results = run_concurrently(8, lambda: slow("laptops", db=object()))
+        assert executions == ["laptops"]
+        assert all(result is results[0] for result in results)
+        assert slow.flight.snapshot()["collapsed"] == 7
+
+    def test_different_arguments_run_separately(self):
+        executions = []
+
+        @coalesce("test.sync_keys")
+        def slow(text):
+            executions.append(text)
+            time.sleep(0.1)
+            return text
+
+        run_concurrently(4, lambda: slow(threading.current_thread().name))
+        assert len(executions) == 4
+
+    def test_errors_reach_every_waiter_and_release_the_key(self):
+        flight = SingleFlight("test.errors")
+        calls = []
+
+        def failing():
+            calls.append(1)
+            time.sleep(0.1)
+            raise ValueError("upstream down")
+
+        def call():
+            try:
+                flight.do("key", failing)
+            except ValueError as e:
+                return str(e)
+
+        assert run_concurrently(4, call) == ["upstream down"] * 4
+        assert len(calls) == 1
+        assert flight.do("key", lambda: "fresh") == "fresh"
+
+
+class TestAsyncCoalescing:
+    def test_async_callers_share_a_threadpool_leader(self):
+        executions = []
+
+        @coalesce("test.run_async")
+        def stats(db):
+            executions.append(1)
+            time.sleep(0.1)
+            return {"total": 3}
+
+        async def main():
+            return await asyncio.gather(*(stats.run_async(object()) for _ in range(5)))
+
+        results = asyncio.run(main())
+        assert len(executions) == 1
+        assert results == [{"total": 3}] * 5
+
+    def test_cancelled_waiter_does_not_cancel_the_call(self):
+        flight = SingleFlight("test.cancel")
+
+        async def compute():
+            await asyncio.sleep(0.1)
+            return 42
+
+        async def main():
+            first = asyncio.ensure_future(flight.do_async("k", compute))
+            second = asyncio.ensure_future(flight.do_async("k", compute))
+            await asyncio.sleep(0.01)
+            first.cancel()
+            return await second
+
+        assert asyncio.run(main()) == 42
+        assert flight.snapshot()["executions"] == 1
+
+
+class TestFreeze:
+    def test_orm_like_objects_key_by_id(self):
+        class User:
+            __table__ = object()
+
+            def __init__(self, id):
+                self.id = id
+
+        assert freeze(User(3)) == freeze(User(3))
+        assert freeze({"b": [1, 2], "a": None}) == freeze({"a": None, "b": [1, 2]})
+
+
+class TestCoalescedQueries:
+    def test_featured_products_outlive_the_leaders_session(self, session_factory, add_users):
+        import marketplace_routes
+        from database import Product
+
+        db = session_factory()
+        add_users(db, (1,))
+        db.add(Product(id=1, name="Runner", price=120.0, stock=3, seller_id=1, is_active=True))
+        db.commit()
+
+        (product,) = marketplace_routes._featured_products(db, 6)
+        db.close()  # the leader's request ends before a follower serializes the shared result
+        assert isinstance(product, dict) and (product["id"], product["name"]) == (1, "Runner")
@@ -0,0 +1,160 @@
+"""
+Unit tests for the local spelling correction service
+"""
+
+import random
+import threading
+import time
+
+import pytest
+
+import spell_correction
+from spell_correction import SymSpell, SpellCorrector, edit_distance, make_typo, run_benchmark
+
+
+class TestEditDistance:
+    """Test the bounded optimal string alignment distance"""
+
+    def test_basic_edits(self):
+        assert edit_distance("keyboard", "keyboard", 2) == 0
+        assert edit_distance("keybord", "keyboard", 2) == 1
+        assert edit_distance("lpatop", "laptop", 2) == 1  # adjacent swap
+        assert edit_distance("runnign", "running", 2) == 1
+
+    def test_bounded(self):
+        assert edit_distance("phone", "backpack", 2) == 3
+
+
+class TestSymSpell:
+    """Test symmetric-delete lookups"""
+
+    @pytest.fixture
+    def symspell(self):
+        symspell = SymSpell()
+        for word, count in [("laptop", 10), ("lapdog", 1), ("sneakers", 5), ("headphones", 3)]:
+            symspell.add_word(word, count)
+        return symspell
+
+    def test_exact_word(self, symspell):
+        assert symspell.lookup("laptop").distance == 0
+
+    def test_distance_two(self, symspell):
+        assert symspell.lookup("snekars").term == "sneakers"
+        assert symspell.lookup("hedphons").term == "headphones"
+
+    def test_frequency_breaks_ties(self, symspell):
+        # "lapdop" is one edit from both words
+        assert symspell.lookup("lapdop").term == "laptop"
+
+    def test_no_suggestion(self, symspell):
+        assert symspell.lookup("xyzzy") is None
+
+
+class TestSpellCorrector:
+    """Test query correction and the typo benchmark"""
+
+    @pytest.fixture
+    def corrector(self):
+        corrector = SpellCorrector()
+        corrector.loaded_at = float("inf")  # never hit the database in tests
+        corrector.add_texts("Ankara Fabric Bundle", "Mechanical Keyboard RGB")
+        return corrector
+
+    def test_correct_query_keeps_case_numbers_and_stopwords(self, corrector):
+        assert corrector.correct_query("Ankra fabrik under 5000") == "Ankara fabric under 5000"
+
+    def test_short_words_tolerate_one_edit(self, corrector):
+        assert corrector.correct_word("bga") == "bag"
+        assert corrector.correct_word("xq") == "xq"
+
+    def test_make_typo_changes_word(self):
+        rng = random.Random(1)
+        assert make_typo("keyboard", rng) != "keyboard"
+
+    def test_benchmark_accuracy(self, corrector):
+        results = run_benchmark(corrector, samples=300)
+        assert results["distance_1"]["accuracy"] > 0.9
+
+
+class TestIncrementalUpdates:
+    """Committed writes reach the dictionary as deltas"""
+
+    @pytest.fixture
+    def corrector(self, monkeypatch):
+        corrector = SpellCorrector()
+        corrector.loaded_at = float("inf")
+        monkeypatch.setattr(spell_correction, "corrector", corrector)
+        return corrector
+
+    def test_updates_move_words_instead_of_re_adding_them(self, corrector, session_factory, add_users):
+        from database import Product
+
+        words = corrector._symspell.words
+        db = session_factory()
+        add_users(db, (1,))
+        product = Product(name="Zorblax Lamp", category="Lumens", price=10.0, stock=1, seller_id=1, is_active=True)
+        db.add(product)
+        db.commit()
+        assert (words["zorblax"], words["lumens"]) == (1, 5)
+
+        for price in (11.0, 12.0):
+            product.price = price
+            db.commit()
+        assert (words["zorblax"], words["lumens"]) == (1, 5)
+
+        product.name = "Quuxon Lamp"
+        db.commit()
+        assert "zorblax" not in words and words["quuxon"] == 1
+        assert corrector.correct_word("zorblx") == "zorblx"
+
+        product.is_active = False
+        db.commit()
+        assert "quuxon" not in words and "lumens" not in words
+
+
+class TestReload:
+    """Reloads run off the request thread and keep deltas that race them"""
+
+    @pytest.fixture
+    def corrector(self):
+        corrector = SpellCorrector()
+        corrector.loaded_at = float("inf")
+        return corrector
+
+    def test_delta_during_reload_reaches_the_new_dictionary(self, corrector, session_factory, add_users):
+        from database import Product
+
+        db = session_factory()
+        add_users(db, (1,))
+        db.add(Product(name="Zorblax Lamp", category="Lumens", price=10.0, stock=1, seller_id=1, is_active=True))
+        db.commit()
+
+        query = db.query
+        def racing_query(*columns):
+            if not corrector._symspell.words.get("quuxon"):
+                corrector.add_texts("Quuxon Lamp")  # a write commits while the reload is querying
+            return query(*columns)
+
+        db.query = racing_query
+        corrector.refresh(db)
+        assert corrector._symspell.words["zorblax"] == 1 and corrector._symspell.words["quuxon"] == 1
+        assert corrector._pending is None
+
+    def test_request_path_leaves_reloads_to_the_background_thread(self, corrector, monkeypatch):
+        reloaded_on = []
+
+        def refresh(db=None):
+            reloaded_on.append(threading.current_thread().name)
+            corrector.loaded_at = time.time()
+
+        monkeypatch.setattr(corrector, "refresh", refresh)
+        corrector.loaded_at = 0.0  # stale from the start
+        corrector.start()
+        try:
+            corrector.correct_word("lamp")
+            deadline = time.time() + 5
+            while not reloaded_on and time.time() < deadline:
+                time.sleep(0.01)
+            assert reloaded_on == ["spelling-reloader"]
+        finally:
+            corrector.stop()
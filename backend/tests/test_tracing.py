@@ -0,0 +1,78 @@
+"""
+Tests for request tracing: span nesting, propagation, sampling and hooks
+"""
+
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from sqlalchemy import create_engine, text
+
+import tracing
+
+
+def names(trace_id):
+    return [(s["name"], s["depth"]) for s in tracing.waterfall(trace_id)["spans"]]
+
+
+class TestSpans:
+    def test_nested_spans_form_a_waterfall(self):
+        with tracing.trace("request", forced=True) as root:
+            with tracing.span("stage"):
+                with tracing.span("inner") as inner:
+                    inner.set(rows=3)
+        assert names(root.trace.trace_id) == [("request", 0), ("stage", 1), ("inner", 2)]
+        assert tracing.waterfall(root.trace.trace_id)["spans"][2]["attributes"] == {"rows": 3}
+
+    def test_spans_outside_a_trace_are_noops(self):
+        with tracing.span("orphan") as span:
+            span.set(ignored=True)
+        assert tracing.current_span() is None
+
+    def test_errors_are_recorded_and_keep_the_trace(self, monkeypatch):
+        monkeypatch.setattr(tracing, "TRACE_SAMPLE_RATE", 0.0)
+        try:
+            with tracing.trace("failing") as root:
+                with tracing.span("boom"):
+                    raise ValueError("bad input")
+        except ValueError:
+            pass
+        spans = tracing.waterfall(root.trace.trace_id)["spans"]
+        assert spans[1]["error"] == "ValueError: bad input"
+
+    def test_unsampled_fast_traces_are_not_kept(self, monkeypatch):
+        monkeypatch.setattr(tracing, "TRACE_SAMPLE_RATE", 0.0)
+        with tracing.trace("fast") as root:
+            pass
+        assert tracing.waterfall(root.trace.trace_id) is None
+
+
+class TestPropagation:
+    def test_wrap_carries_the_parent_into_a_thread_pool(self):
+        with ThreadPoolExecutor(max_workers=1) as pool:
+            with tracing.trace("request", forced=True) as root:
+                def work():
+                    with tracing.span("worker"):
+                        return threading.current_thread().name
+                pool.submit(tracing.wrap(work)).result()
+        assert ("worker", 1) in names(root.trace.trace_id)
+
+    def test_sqlalchemy_statements_become_child_spans(self):
+        engine = create_engine("sqlite://")
+        tracing.instrument_sqlalchemy(engine)
+        with tracing.trace("request", forced=True) as root:
+            with engine.connect() as conn:
+                conn.execute(text("SELECT 1"))
+        spans = tracing.waterfall(root.trace.trace_id)["spans"]
+        assert spans[1]["name"] == "db.SELECT"
+        assert spans[1]["attributes"]["db.statement"] == "SELECT 1"
+
+
+class TestExport:
+    def test_otlp_json_shape(self):
+        with tracing.trace("request", forced=True, **{"http.status_code": 200}) as root:
+            with tracing.span("child"):
+                pass
+        exported = tracing.to_otlp(root.trace)["resourceSpans"][0]["scopeSpans"][0]["spans"]
+        assert len(exported[0]["traceId"]) == 32 and len(exported[0]["spanId"]) == 16
+        assert exported[1]["parentSpanId"] == exported[0]["spanId"]
+        assert exported[0]["attributes"] == [{"key": "http.status_code", "value": {"intValue": "200"}}]
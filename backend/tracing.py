@@ -0,0 +1,488 @@
+"""
+Request Tracing
+Lightweight spans through the API, AI pipeline, database and outbound HTTP
+
+Each HTTP request (TracingMiddleware) or background job (trace()) opens a
+root span; span() / @traced open child spans, and the current span travels
+in a ContextVar, so nesting follows the code without passing anything
+around. Work handed to our own thread pools keeps its parent through wrap().
+SQLAlchemy statements and httpx / requests calls are recorded as leaf spans
+automatically once instrument_*() has been called.
+
+Every request is recorded (spans are small in-memory objects); when the root
+span ends the trace is kept if it was sampled (TRACE_SAMPLE_RATE), slow
+(TRACE_SLOW_MS), failed, or forced with an `X-Trace-Sample: 1` header. Kept
+traces go to an in-memory ring buffer behind /debug/traces and, when
+TRACE_EXPORT_PATH is set, to an OTLP/JSON lines file that an OpenTelemetry
+collector (or jq) can read.
+"""
+
+from typing import Any, Callable, Dict, List, Optional
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar, copy_context
+import os
+import json
+import time
+import queue
+import random
+import asyncio
+import functools
+import threading
+import logging
+
+logger = logging.getLogger(__name__)
+
+TRACING_ENABLED = os.getenv("TRACING_ENABLED", "true").lower() == "true"
+TRACE_SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE", "0.05"))
+TRACE_SLOW_MS = float(os.getenv("TRACE_SLOW_MS", "2000"))
+TRACE_EXPORT_PATH = os.getenv("TRACE_EXPORT_PATH", "")
+TRACE_BUFFER_SIZE = int(os.getenv("TRACE_BUFFER_SIZE", "200"))
+TRACE_MAX_SPANS = 500  # per trace; N+1 query loops shouldn't eat memory
+MAX_STATEMENT_CHARS = 300
+SERVICE_NAME = "avalanche-backend"
+FORCE_HEADER = b"x-trace-sample"
+# Long-lived push connections: a trace per connection would never finish
+UNTRACED_PATH_PREFIXES = ("/realtime/",)
+
+
+class Trace:
+    __slots__ = ("trace_id", "spans", "dropped_spans", "forced", "kept")
+
+    def __init__(self, forced: bool = False):
+        self.trace_id = os.urandom(16).hex()
+        self.spans: List["Span"] = []
+        self.dropped_spans = 0
+        self.forced = forced
+        self.kept = False
+
+
+class Span:
+    __slots__ = ("trace", "span_id", "parent_id", "name", "start_ns", "end_ns", "attributes", "error")
+
+    def __init__(self, trace: Trace, name: str, parent_id: Optional[str], attributes: Dict[str, Any]):
+        self.trace = trace
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent_id
+        self.name = name
+        self.start_ns = time.time_ns()
+        self.end_ns: Optional[int] = None
+        self.attributes = attributes
+        self.error: Optional[str] = None
+        if len(trace.spans) < TRACE_MAX_SPANS:
+            trace.spans.append(self)
+        else:
+            trace.dropped_spans += 1
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    def fail(self, error: BaseException):
+        self.error = f"{type(error).__name__}: {error}"[:300]
+
+    def end(self):
+        if self.end_ns is None:
+            self.end_ns = time.time_ns()
+            if self.parent_id is None:
+                _finish_trace(self)
+
+    @property
+    def duration_ms(self) -> float:
+        return ((self.end_ns or time.time_ns()) - self.start_ns) / 1e6
+
+
+class _NoopSpan:
+    """Stand-in when there is no trace to attach to"""
+
+    def set(self, **attributes):
+        pass
+
+    def fail(self, error: BaseException):
+        pass
+
+
+NOOP_SPAN = _NoopSpan()
+_current: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+_UNSET = object()
+
+
+def current_span() -> Optional[Span]:
+    return _current.get()
+
+
+def set_attribute(name: str, value: Any):
+    span = _current.get()
+    if span is not None:
+        span.attributes[name] = value
+
+
+def _restore(span_: Span, previous: Optional[Span]):
+    # Not ContextVar.reset(): a sync generator streamed by Starlette resumes
+    # each step in a fresh context copy, where the token isn't valid
+    if _current.get() is span_:
+        _current.set(previous)
+
+
+@contextmanager
+def span(name: str, parent: Any = _UNSET, **attributes):
+    """Child span of the current (or given) span; no-op outside a trace"""
+    parent_span = _current.get() if parent is _UNSET else parent
+    if not TRACING_ENABLED or parent_span is None:
+        yield NOOP_SPAN
+        return
+    child = Span(parent_span.trace, name, parent_span.span_id, attributes)
+    previous = _current.get()
+    _current.set(child)
+    try:
+        yield child
+    except BaseException as e:
+        child.fail(e)
+        raise
+    finally:
+        _restore(child, previous)
+        child.end()
+
+
+@contextmanager
+def trace(name: str, forced: bool = False, **attributes):
+    """Root span: starts a new trace (HTTP requests, background jobs)"""
+    if not TRACING_ENABLED:
+        yield NOOP_SPAN
+        return
+    root = Span(Trace(forced), name, None, attributes)
+    previous = _current.get()
+    _current.set(root)
+    try:
+        yield root
+    except BaseException as e:
+        root.fail(e)
+        raise
+    finally:
+        _restore(root, previous)
+        root.end()
+
+
+def traced(name: Optional[str] = None):
+    """Decorator: run the function inside a span (sync or async)"""
+    def decorate(fn):
+        span_name = name or f"{fn.__module__}.{fn.__qualname__}"
+        if asyncio.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                with span(span_name):
+                    return await fn(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(span_name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def wrap(fn: Callable) -> Callable:
+    """Bind fn to the caller's context, for submitting to a thread pool"""
+    context = copy_context()
+    return functools.partial(context.run, fn)
+
+
+# ----------------------------------------------------------------------
+# Keeping and exporting traces
+# ----------------------------------------------------------------------
+
+_recent: deque = deque(maxlen=TRACE_BUFFER_SIZE)
+_stats_lock = threading.Lock()
+_stats = {"traces": 0, "kept": 0, "dropped_spans": 0, "export_errors": 0}
+
+
+def _finish_trace(root: Span):
+    trace_ = root.trace
+    keep = (
+        trace_.forced
+        or root.error is not None
+        or root.attributes.get("http.status_code", 0) >= 500
+        or root.duration_ms >= TRACE_SLOW_MS
+        or random.random() < TRACE_SAMPLE_RATE
+    )
+    with _stats_lock:
+        _stats["traces"] += 1
+        _stats["dropped_spans"] += trace_.dropped_spans
+        if keep:
+            _stats["kept"] += 1
+    if not keep:
+        return
+    trace_.kept = True
+    _recent.append(trace_)
+    if _exporter is not None:
+        _exporter.export(trace_)
+
+
+def _otlp_value(value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def to_otlp(trace_: Trace) -> Dict[str, Any]:
+    """OTLP/JSON ExportTraceServiceRequest for one trace"""
+    spans = []
+    for s in list(trace_.spans):
+        otlp_span = {
+            "traceId": trace_.trace_id,
+            "spanId": s.span_id,
+            "name": s.name,
+            "kind": 2 if s.parent_id is None else 1,  # SERVER / INTERNAL
+            "startTimeUnixNano": str(s.start_ns),
+            "endTimeUnixNano": str(s.end_ns or s.start_ns),
+            "attributes": [{"key": k, "value": _otlp_value(v)} for k, v in s.attributes.items()],
+            "status": {"code": 2, "message": s.error} if s.error else {"code": 1},
+        }
+        if s.parent_id:
+            otlp_span["parentSpanId"] = s.parent_id
+        spans.append(otlp_span)
+    return {"resourceSpans": [{
+        "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": SERVICE_NAME}}]},
+        "scopeSpans": [{"scope": {"name": "avalanche.tracing"}, "spans": spans}],
+    }]}
+
+
+class JsonlExporter:
+    """Appends one OTLP/JSON line per kept trace, from a background thread"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._queue: "queue.Queue" = queue.Queue(maxsize=1000)
+        threading.Thread(target=self._run, name="trace-exporter", daemon=True).start()
+
+    def export(self, trace_: Trace):
+        try:
+            self._queue.put_nowait(trace_)
+        except queue.Full:
+            with _stats_lock:
+                _stats["export_errors"] += 1
+
+    def _run(self):
+        while True:
+            trace_ = self._queue.get()
+            try:
+                with open(self.path, "a") as f:
+                    f.write(json.dumps(to_otlp(trace_)) + "\n")
+            except Exception as e:
+                logger.warning(f"Trace export failed: {e}")
+                with _stats_lock:
+                    _stats["export_errors"] += 1
+
+
+_exporter: Optional[JsonlExporter] = JsonlExporter(TRACE_EXPORT_PATH) if TRACING_ENABLED and TRACE_EXPORT_PATH else None
+
+
+def recent_traces(limit: int = 50) -> List[Dict[str, Any]]:
+    """Newest kept traces, summarized"""
+    summaries = []
+    for trace_ in reversed(list(_recent)):
+        root = next((s for s in trace_.spans if s.parent_id is None), None)
+        if root is None:
+            continue
+        summaries.append({
+            "trace_id": trace_.trace_id,
+            "name": root.name,
+            "start": root.start_ns // 1_000_000,
+            "duration_ms": round(root.duration_ms, 1),
+            "spans": len(trace_.spans),
+            "status_code": root.attributes.get("http.status_code"),
+            "error": root.error,
+        })
+        if len(summaries) >= limit:
+            break
+    return summaries
+
+
+def waterfall(trace_id: str) -> Optional[Dict[str, Any]]:
+    """Spans of a kept trace in start order with depth and offsets"""
+    trace_ = next((t for t in _recent if t.trace_id == trace_id), None)
+    if trace_ is None:
+        return None
+    spans = sorted(trace_.spans, key=lambda s: s.start_ns)
+    by_id = {s.span_id: s for s in spans}
+    origin = spans[0].start_ns if spans else 0
+
+    def depth(s: Span) -> int:
+        level = 0
+        while s.parent_id in by_id:
+            s = by_id[s.parent_id]
+            level += 1
+        return level
+
+    return {
+        "trace_id": trace_id,
+        "dropped_spans": trace_.dropped_spans,
+        "spans": [
+            {
+                "span_id": s.span_id,
+                "parent_id": s.parent_id,
+                "name": s.name,
+                "depth": depth(s),
+                "offset_ms": round((s.start_ns - origin) / 1e6, 2),
+                "duration_ms": round(s.duration_ms, 2),
+                "attributes": s.attributes,
+                "error": s.error,
+            }
+            for s in spans
+        ],
+    }
+
+
+def render_waterfall(data: Dict[str, Any], width: int = 60) -> str:
+    """Plain-text waterfall for a terminal"""
+    spans = data["spans"]
+    total = max((s["offset_ms"] + s["duration_ms"] for s in spans), default=0) or 1
+    lines = [f"trace {data['trace_id']}  {total:.1f} ms"]
+    for s in spans:
+        start = int(s["offset_ms"] / total * width)
+        length = max(1, int(s["duration_ms"] / total * width))
+        label = ("  " * s["depth"] + s["name"])[:40]
+        flag = " !" if s["error"] else ""
+        lines.append(f"{label:<40} {' ' * start}{'█' * length}{' ' * (width - start - length)} {s['duration_ms']:>9.1f} ms{flag}")
+    return "\n".join(lines)
+
+
+def get_stats() -> Dict[str, Any]:
+    with _stats_lock:
+        snapshot = dict(_stats)
+    snapshot.update({
+        "enabled": TRACING_ENABLED,
+        "sample_rate": TRACE_SAMPLE_RATE,
+        "slow_ms": TRACE_SLOW_MS,
+        "buffered": len(_recent),
+        "export_path": TRACE_EXPORT_PATH or None,
+    })
+    return snapshot
+
+
+# ----------------------------------------------------------------------
+# Instrumentation
+# ----------------------------------------------------------------------
+
+class TracingMiddleware:
+    """ASGI middleware: one root span per HTTP request, ended when the body is sent"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not TRACING_ENABLED or scope["path"].startswith(UNTRACED_PATH_PREFIXES):
+            return await self.app(scope, receive, send)
+
+        forced = dict(scope.get("headers") or []).get(FORCE_HEADER) == b"1"
+        with trace(f"{scope['method']} {scope['path']}", forced=forced,
+                   **{"http.method": scope["method"], "http.target": scope["path"]}) as root:
+            trace_id = root.trace.trace_id
+
+            async def traced_send(message):
+                if message["type"] == "http.response.start":
+                    root.set(**{"http.status_code": message["status"]})
+                    message.setdefault("headers", [])
+                    message["headers"] = list(message["headers"]) + [(b"x-trace-id", trace_id.encode())]
+                await send(message)
+
+            try:
+                await self.app(scope, receive, traced_send)
+            finally:
+                route = scope.get("route")
+                if route is not None and getattr(route, "path", None):
+                    root.name = f"{scope['method']} {route.path}"
+                    root.set(**{"http.route": route.path})
+
+
+def instrument_sqlalchemy(engine):
+    """Record every statement on the engine as a leaf span of the current span"""
+    from sqlalchemy import event
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        parent = _current.get()
+        if parent is None:
+            return
+        operation = statement.lstrip().split(" ", 1)[0].upper()
+        child = Span(parent.trace, f"db.{operation}", parent.span_id, {
+            "db.statement": statement[:MAX_STATEMENT_CHARS],
+            "db.executemany": bool(executemany),
+        })
+        conn.info.setdefault("trace_spans", []).append(child)
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        spans = conn.info.get("trace_spans")
+        if spans:
+            child = spans.pop()
+            child.set(**{"db.rows": cursor.rowcount})
+            child.end()
+
+    @event.listens_for(engine, "handle_error")
+    def handle_error(exception_context):
+        conn = exception_context.connection
+        spans = conn.info.get("trace_spans") if conn is not None else None
+        if spans:
+            child = spans.pop()
+            child.fail(exception_context.original_exception)
+            child.end()
+
+
+def _httpx_attributes(request) -> Dict[str, Any]:
+    url = request.url
+    return {"http.method": request.method, "http.url": f"{url.scheme}://{url.host}{url.path}"}
+
+
+_instrumented = set()
+
+
+def instrument_httpx():
+    """Span around every httpx request (Qdrant, the OpenAI SDK, webhooks)"""
+    import httpx
+    if "httpx" in _instrumented:
+        return
+    _instrumented.add("httpx")
+    sync_send, async_send = httpx.Client.send, httpx.AsyncClient.send
+
+    def send(self, request, *args, **kwargs):
+        if _current.get() is None:
+            return sync_send(self, request, *args, **kwargs)
+        with span(f"http.{request.method}", **_httpx_attributes(request)) as child:
+            response = sync_send(self, request, *args, **kwargs)
+            child.set(**{"http.status_code": response.status_code})
+            return response
+
+    async def asend(self, request, *args, **kwargs):
+        if _current.get() is None:
+            return await async_send(self, request, *args, **kwargs)
+        with span(f"http.{request.method}", **_httpx_attributes(request)) as child:
+            response = await async_send(self, request, *args, **kwargs)
+            child.set(**{"http.status_code": response.status_code})
+            return response
+
+    httpx.Client.send = send
+    httpx.AsyncClient.send = asend
+
+
+def instrument_requests():
+    """Span around every requests.Session call (Paystack, currency rates)"""
+    import requests
+    if "requests" in _instrumented:
+        return
+    _instrumented.add("requests")
+    original = requests.Session.send
+
+    def send(self, request, **kwargs):
+        if _current.get() is None:
+            return original(self, request, **kwargs)
+        with span(f"http.{request.method}", **{"http.method": request.method, "http.url": request.url.split("?")[0]}) as child:
+            response = original(self, request, **kwargs)
+            child.set(**{"http.status_code": response.status_code})
+            return response
+
+    requests.Session.send = send